@@ -0,0 +1,7 @@
+# neurohub_common - Spanner plumbing shared by the NeuroHub web app and agents
+#
+# Installed into both images (see pyproject.toml next to this package), so a
+# fix here reaches every service:
+#   spanner_pool   process-wide Spanner client and session pool
+#   rows           decoding result rows into dicts (timestamp formats)
+#   pagination     keyset cursors, page conditions and Page
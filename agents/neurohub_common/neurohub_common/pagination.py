@@ -0,0 +1,209 @@
+# pagination.py - Keyset (cursor) pagination for NeuroHub list fetchers
+#
+# Shared by the web app's fetchers (db_neurohub.py) and the agents' tools, so
+# both hand out and accept the same cursors.
+#
+# A page is read with "WHERE (sort_key, id) comes after the cursor ... LIMIT n"
+# instead of OFFSET, so fetching page 1000 costs the same as page 1: Spanner
+# seeks to the cursor position instead of reading and discarding earlier rows.
+#
+# The cursor is opaque to clients: URL-safe base64 of a JSON list holding the
+# last row's (sort value, id). Fetchers request limit + 1 rows; the extra row
+# only tells whether another page exists.
+#
+# Example:
+#     keyset, params, types = keyset_filter("name", "researcher_id", cursor)
+#     limit_sql = limit_clause(limit, params, types)
+#     sql = f"SELECT ... WHERE {keyset} ORDER BY name, researcher_id {limit_sql}"
+#
+# Rows decoded with timestamp_format="iso" (neurohub_common.rows) hold
+# timestamps as ISO strings; cursors built from them are accepted wherever
+# sort_type is TIMESTAMP.
+
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from google.api_core.datetime_helpers import DatetimeWithNanoseconds, to_rfc3339
+from google.cloud.spanner_v1 import param_types
+
+
+class InvalidCursor(ValueError):
+    """Raised when a cursor was not produced by encode_cursor()."""
+
+
+class Page(list):
+    """A list of rows plus the cursor of the following page (None on the last page)."""
+
+    def __init__(self, rows=(), next_cursor=None):
+        super().__init__(rows)
+        self.next_cursor = next_cursor
+
+    def to_dict(self):
+        return {"items": list(self), "next_cursor": self.next_cursor}
+
+
+def _encode_value(value):
+    # Spanner timestamps keep nanoseconds; the cursor must too, or rows that
+    # differ below a microsecond would be skipped or repeated.
+    if isinstance(value, DatetimeWithNanoseconds):
+        return {"ts": value.rfc3339()}
+    if isinstance(value, datetime):
+        return {"ts": to_rfc3339(value, ignore_zone=False)}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict) and "ts" in value:
+        return DatetimeWithNanoseconds.from_rfc3339(value["ts"])
+    return value
+
+
+def encode_cursor(*values):
+    """Encodes the key values of the last row on a page as an opaque string."""
+    payload = json.dumps([_encode_value(v) for v in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor, size=2):
+    """
+    Decodes a cursor from encode_cursor().
+
+    Returns:
+        list or None: The key values, or None for an empty cursor (first page).
+
+    Raises:
+        InvalidCursor: If the cursor is malformed or holds the wrong number of values.
+    """
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, TypeError, binascii.Error, UnicodeError) as e:
+        raise InvalidCursor(f"Malformed cursor: {e}") from None
+    if not isinstance(values, list) or len(values) != size:
+        raise InvalidCursor("Malformed cursor: unexpected key size")
+    try:
+        return [_decode_value(v) for v in values]
+    except ValueError as e:
+        raise InvalidCursor(f"Malformed cursor: {e}") from None
+
+
+def _timestamp_value(value):
+    # Cursors built from decoded rows hold the ISO string of the timestamp
+    try:
+        return DatetimeWithNanoseconds.from_rfc3339(value)
+    except ValueError:
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError as e:
+            raise InvalidCursor(f"Malformed cursor: {e}") from None
+
+
+def _ids_after(id_columns, id_params, op):
+    # Lexicographic "comes after" over the tie-breaker columns
+    terms = []
+    for i, (column, param) in enumerate(zip(id_columns, id_params)):
+        equal = [f"{c} = @{p}" for c, p in zip(id_columns[:i], id_params[:i])]
+        terms.append(" AND ".join(equal + [f"{column} {op} @{param}"]))
+    if len(terms) == 1:
+        return terms[0]
+    return "(" + " OR ".join(f"({term})" if " AND " in term else term for term in terms) + ")"
+
+
+def keyset_filter(sort_column, id_column, cursor, descending=False,
+                  sort_type=param_types.STRING, id_type=param_types.STRING):
+    """
+    Builds the WHERE condition selecting rows after the cursor position.
+
+    The query must be ordered by (sort_column, id_column), both ASC or both
+    DESC, and id_column must be unique and non-NULL. sort_column may be NULL:
+    Spanner orders NULLs first ascending and last descending, which the
+    condition follows.
+
+    Args:
+        sort_column (str): SQL expression of the primary sort key.
+        id_column (str | tuple): SQL expression of the unique tie-breaker, or
+            a tuple of expressions that are unique together (a composite
+            primary key), ordered in that sequence.
+        cursor (str): Cursor from a previous page, or None for the first page.
+        descending (bool): Whether the query orders DESC.
+        sort_type, id_type: Spanner types of the key parameters; id_type
+            applies to every tie-breaker column.
+
+    Returns:
+        tuple: (sql_condition, params, param_types). The condition is "TRUE"
+        on the first page.
+    """
+    id_columns = id_column if isinstance(id_column, tuple) else (id_column,)
+    values = decode_cursor(cursor, size=1 + len(id_columns))
+    if values is None:
+        return "TRUE", {}, {}
+
+    sort_value, id_values = values[0], values[1:]
+    if isinstance(sort_value, str) and sort_type == param_types.TIMESTAMP:
+        sort_value = _timestamp_value(sort_value)
+    after = "<" if descending else ">"
+    if len(id_columns) == 1:
+        id_params = ["cursor_id"]
+    else:
+        id_params = [f"cursor_id_{i}" for i in range(len(id_columns))]
+    params = dict(zip(id_params, id_values))
+    types = {param: id_type for param in id_params}
+    ids_after = _ids_after(id_columns, id_params, after)
+
+    if sort_value is None:
+        if descending:
+            # NULLs come last: only the rest of the NULL run remains
+            condition = f"({sort_column} IS NULL AND {ids_after})"
+        else:
+            # NULLs come first: the rest of the NULL run, then every non-NULL row
+            condition = f"({sort_column} IS NOT NULL OR {ids_after})"
+        return condition, params, types
+
+    params["cursor_sort"] = sort_value
+    types["cursor_sort"] = sort_type
+    condition = (f"({sort_column} {after} @cursor_sort"
+                 f" OR ({sort_column} = @cursor_sort AND {ids_after})")
+    if descending:
+        condition += f" OR {sort_column} IS NULL"
+    return condition + ")", params, types
+
+
+def limit_clause(limit, params, types):
+    """
+    Returns the LIMIT clause of a page query and adds its parameter.
+
+    One row beyond the page is read so the caller can tell whether a next
+    page exists (see db_neurohub.run_page_query). A limit of None reads everything after the cursor.
+    """
+    if limit is None:
+        return ""
+    params["limit"] = limit + 1
+    types["limit"] = param_types.INT64
+    return "LIMIT @limit"
+
+
+def paginate(rows, limit, sort_field, id_field):
+    """
+    Turns the limit + 1 decoded rows of a page query into Page.to_dict().
+
+    For callers that read the rows themselves (the agents' tools), where
+    db_neurohub.run_page_query builds the Page while streaming. id_field is a
+    field name, or a tuple of names for a composite key, matching the
+    id_column given to keyset_filter.
+
+    Returns:
+        dict or None: {"items": [...], "next_cursor": ...}, or None when rows
+        is None (query error).
+    """
+    if rows is None:
+        return None
+    page = Page(rows)
+    if limit is not None and len(rows) > limit:
+        page = Page(rows[:limit])
+        id_fields = id_field if isinstance(id_field, tuple) else (id_field,)
+        page.next_cursor = encode_cursor(*(page[-1][name] for name in (sort_field,) + id_fields))
+    return page.to_dict()
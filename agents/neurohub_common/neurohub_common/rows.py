@@ -0,0 +1,107 @@
+# rows.py - Schema-aware decoding of Spanner result rows into dicts
+#
+# Shared by the web app (db_neurohub.py, partitioned_query.py) and the
+# agents' tools, so every service returns timestamps in the same formats and
+# pagination cursors built from decoded rows (see pagination.py) match.
+
+from datetime import datetime, timedelta, timezone
+
+from google.cloud.spanner_v1 import TypeCode
+
+# How TIMESTAMP columns are returned: "iso" strings (pages, agents), "epoch_ms"
+# integers (JSON APIs), or None for the client's datetime objects.
+TIMESTAMP_FORMATS = ("iso", "epoch_ms")
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_MILLISECOND = timedelta(milliseconds=1)
+
+
+def _iso_timestamp(value):
+    # isoformat() stops at microseconds; keep Spanner's nanoseconds when present
+    if getattr(value, "nanosecond", 0) % 1000:
+        return value.rfc3339()
+    return value.isoformat()
+
+
+def _epoch_ms_timestamp(value):
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return (value - _EPOCH) // _MILLISECOND
+
+
+def _timestamp_converter(timestamp_format):
+    if timestamp_format is None:
+        return None
+    if timestamp_format == "iso":
+        return _iso_timestamp
+    if timestamp_format == "epoch_ms":
+        return _epoch_ms_timestamp
+    raise ValueError(f"Unknown timestamp format '{timestamp_format}'; expected one of {TIMESTAMP_FORMATS}")
+
+
+def _date_converter(value):
+    return value.isoformat()
+
+
+def _column_converters(fields, timestamp_format):
+    """Maps column index -> converter for the TIMESTAMP and DATE columns in fields."""
+    convert_timestamp = _timestamp_converter(timestamp_format)
+    if convert_timestamp is None:
+        return {}
+    converters = {}
+    for index, field in enumerate(fields):
+        if field.type_.code == TypeCode.TIMESTAMP:
+            converters[index] = convert_timestamp
+        elif field.type_.code == TypeCode.DATE:
+            converters[index] = _date_converter
+    return converters
+
+
+def build_row_decoder(fields, timestamp_format="iso", field_names=None):
+    """
+    Returns a function that turns a result row into a dict keyed by column name.
+
+    The result metadata is inspected once, so each row only touches the
+    columns that need work:
+
+    - TIMESTAMP columns become ISO 8601 strings ("iso"), milliseconds since
+      the epoch ("epoch_ms"), or stay datetime objects (None). DATE columns
+      become ISO strings unless timestamp_format is None.
+    - ARRAY<STRUCT> columns (from ARRAY(SELECT AS STRUCT ...) subqueries)
+      come back from the client as lists of lists; they are turned into lists
+      of dicts using the struct field names, with the same conversions.
+
+    Args:
+        fields: The result set's fields (known after the first row).
+        timestamp_format (str): "iso", "epoch_ms" or None.
+        field_names (list, optional): Keys to use instead of the column names.
+    """
+    field_names = field_names or [field.name for field in fields]
+    converters = list(_column_converters(fields, timestamp_format).items())
+    struct_columns = []
+    for index, field in enumerate(fields):
+        field_type = field.type_
+        if (field_type.code == TypeCode.ARRAY
+                and field_type.array_element_type.code == TypeCode.STRUCT):
+            struct_fields = field_type.array_element_type.struct_type.fields
+            struct_names = [f.name for f in struct_fields]
+            struct_converters = list(_column_converters(struct_fields, timestamp_format).items())
+            struct_columns.append((index, struct_names, struct_converters))
+
+    def decode_row(row):
+        for index, convert in converters:
+            if row[index] is not None:
+                row[index] = convert(row[index])
+        for index, struct_names, struct_converters in struct_columns:
+            if row[index] is None:
+                continue
+            items = []
+            for item in row[index]:
+                for item_index, convert in struct_converters:
+                    if item[item_index] is not None:
+                        item[item_index] = convert(item[item_index])
+                items.append(dict(zip(struct_names, item)))
+            row[index] = items
+        return dict(zip(field_names, row))
+
+    return decode_row
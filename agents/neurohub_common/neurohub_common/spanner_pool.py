@@ -0,0 +1,132 @@
+# spanner_pool.py - Shared Spanner client and session pool for NeuroHub
+#
+# Every module that talks to Spanner, in the web app and in the agents,
+# should get its Database from get_database() so a process holds exactly one
+# client and one session pool.
+#
+# Pool settings (environment variables):
+#   SPANNER_POOL_TYPE       pinging (default), bursty or fixed
+#   SPANNER_POOL_SIZE       number of sessions kept in the pool (default 10)
+#   SPANNER_POOL_TIMEOUT    seconds to wait for a free session (default 10)
+#   SPANNER_PING_INTERVAL   idle seconds before a pooled session is pinged (default 300)
+#   SPANNER_POOL_KEEPALIVE  set to 0 to disable the background keep-alive thread
+
+import os
+import threading
+import time
+
+from google.cloud import spanner
+from google.cloud.spanner_v1.pool import BurstyPool, FixedSizePool, PingingPool
+from google.api_core import exceptions
+
+# --- Spanner Configuration ---
+INSTANCE_ID = os.environ.get("SPANNER_INSTANCE_ID", "neurohub-graph-instance")
+DATABASE_ID = os.environ.get("SPANNER_DATABASE_ID", "neurohub-db")
+PROJECT_ID = os.environ.get("GOOGLE_CLOUD_PROJECT")
+
+# --- Session Pool Configuration ---
+POOL_TYPE = os.environ.get("SPANNER_POOL_TYPE", "pinging").lower()
+POOL_SIZE = int(os.environ.get("SPANNER_POOL_SIZE", "10"))
+POOL_TIMEOUT = int(os.environ.get("SPANNER_POOL_TIMEOUT", "10"))
+PING_INTERVAL = int(os.environ.get("SPANNER_PING_INTERVAL", "300"))
+POOL_KEEPALIVE = os.environ.get("SPANNER_POOL_KEEPALIVE", "1") != "0"
+
+_lock = threading.Lock()
+_initialized = False
+_database = None
+_keepalive_thread = None
+
+
+def build_pool(pool_type=None, size=None):
+    """
+    Creates a session pool of the configured type.
+
+    A PingingPool pre-creates its sessions and keeps them warm, so requests
+    after idle periods do not pay session-creation latency. A BurstyPool
+    creates sessions on demand and suits short-lived scripts.
+    """
+    pool_type = (pool_type or POOL_TYPE).lower()
+    size = size or POOL_SIZE
+
+    if pool_type == "bursty":
+        return BurstyPool(target_size=size)
+    if pool_type == "fixed":
+        return FixedSizePool(size=size, default_timeout=POOL_TIMEOUT)
+    if pool_type != "pinging":
+        print(f"Warning: Unknown SPANNER_POOL_TYPE '{pool_type}', using 'pinging'.")
+    return PingingPool(size=size, default_timeout=POOL_TIMEOUT, ping_interval=PING_INTERVAL)
+
+
+def _keepalive_loop(pool):
+    """Pings idle sessions so Spanner does not garbage-collect them."""
+    period = max(1, min(30, PING_INTERVAL))
+    while True:
+        time.sleep(period)
+        try:
+            pool.ping()
+        except Exception as e:
+            print(f"Spanner session keep-alive failed: {e}")
+
+
+def start_keepalive(pool):
+    """Starts the background keep-alive thread for pools that support pinging."""
+    global _keepalive_thread
+
+    if not POOL_KEEPALIVE or not isinstance(pool, PingingPool):
+        return None
+    if _keepalive_thread and _keepalive_thread.is_alive():
+        return _keepalive_thread
+
+    _keepalive_thread = threading.Thread(
+        target=_keepalive_loop, args=(pool,), name="spanner-pool-keepalive", daemon=True
+    )
+    _keepalive_thread.start()
+    return _keepalive_thread
+
+
+def _connect():
+    """Builds the client, pool and database. Returns None if unavailable."""
+    if not PROJECT_ID:
+        print("Skipping Spanner client initialization due to missing GOOGLE_CLOUD_PROJECT.")
+        return None
+
+    try:
+        spanner_client = spanner.Client(project=PROJECT_ID)
+        instance = spanner_client.instance(INSTANCE_ID)
+        pool = build_pool()
+        database = instance.database(DATABASE_ID, pool=pool)
+        print(f"Attempting to connect to Spanner: {instance.name}/databases/{database.database_id}")
+
+        if not database.exists():
+            print(f"Error: Database '{database.database_id}' does not exist in instance '{instance.name}'.")
+            return None
+
+        print(f"Spanner database connection check successful "
+              f"({type(pool).__name__}, size={POOL_SIZE}).")
+        start_keepalive(pool)
+        return database
+
+    except exceptions.NotFound:
+        print(f"Error: Spanner instance '{INSTANCE_ID}' not found in project '{PROJECT_ID}'.")
+    except Exception as e:
+        print(f"An unexpected error occurred during Spanner initialization: {e}")
+    return None
+
+
+def get_database():
+    """
+    Returns the process-wide Spanner Database, connecting on first use.
+
+    Returns:
+        Database or None: The shared database object, or None if the
+        connection could not be established.
+    """
+    global _initialized, _database
+
+    if _initialized:
+        return _database
+    with _lock:
+        if not _initialized:
+            _database = _connect()
+            _initialized = True
+    return _database
@@ -1,17 +1,12 @@
 import datetime
 from zoneinfo import ZoneInfo
-from google.adk.agents import LoopAgent, LlmAgent, BaseAgent
-from signal_processor.neurohub import (
-    get_researcher_experiments,
-    get_experiment_sessions, 
-    get_session_signals,
-    get_signal_analyses,
-    get_researcher_id_by_name,
-    get_device_specifications
+from google.adk.agents import SequentialAgent, LlmAgent
+# Async tools: Spanner calls run on a thread pool instead of blocking the event loop
+from signal_processor.neurohub_async import (
+    get_experiment_quality_stats,
+    get_signal_analyses
 )
-from google.adk.agents.invocation_context import InvocationContext
-from google.adk.events import Event, EventActions
-from typing import AsyncGenerator
+from signal_processor.digest import SignalDigestStage
 import logging
 
 from google.genai import types
@@ -21,45 +16,10 @@ from typing import Optional
 # Get a logger instance
 log = logging.getLogger(__name__)
 
-class CheckCondition(BaseAgent):
-    """Checks if all requested signal analyses are complete."""
-    async def _run_async_impl(self, ctx: InvocationContext) -> AsyncGenerator[Event, None]:
-        log.info(f"Analysis summary: {ctx.session.state.get('analysis_summary')}")
-        
-        status = ctx.session.state.get("analysis_status", "fail").strip()
-        is_done = (status == "completed")
-        
-        yield Event(author=self.name, actions=EventActions(escalate=is_done))
-
-# Signal Analysis Agent - analyzes biosignal data one at a time
-signal_analyzer = LlmAgent(
-    name="signal_analyzer",
-    model="gemini-2.5-flash",
-    description=(
-        "Agent that retrieves and analyzes biosignal data from experiments. "
-        "Provide the researcher's name to fetch their experiments and associated signal data."
-    ),
-    instruction=(
-        "You are a specialized agent for analyzing biosignal data from neurotechnology experiments. "
-        "You'll be given researcher names to analyze their experimental data. "
-        "For each researcher, you must: "
-        "1. First get their ID using get_researcher_id_by_name "
-        "2. Fetch their experiments using get_researcher_experiments "
-        "3. For each experiment, get sessions using get_experiment_sessions "
-        "4. For each session, get recorded signals using get_session_signals "
-        "5. For signals of interest, get analyses using get_signal_analyses "
-        "6. If needed, get device specifications using get_device_specifications "
-        "Process one researcher at a time, starting with the first one on the list. "
-        "Return detailed findings about signal quality, processing status, and any analyses performed."
-    ),
-    tools=[
-        get_researcher_id_by_name,
-        get_researcher_experiments,
-        get_experiment_sessions,
-        get_session_signals,
-        get_signal_analyses,
-        get_device_specifications
-    ],
+# Digest Stage - deterministically gathers and aggregates the signal data (no LLM calls)
+signal_digest = SignalDigestStage(
+    name="signal_digest",
+    description="Fetches and aggregates signal quality, processing status and analyses for the requested researchers."
 )
 
 # Summary Agent - synthesizes all signal analyses into a comprehensive report
@@ -74,13 +34,21 @@ summary_agent = LlmAgent(
         """
         Your primary task is to synthesize biosignal analysis information into a single, comprehensive technical report.
         
-        **Input Scope & Default Behavior:**
-        * If specific researchers are named, focus your analysis on their data.
-        * If no individuals are specified, analyze all available signal data in the current context.
+        **Input Data:**
+        The signal data has already been fetched and aggregated into this JSON digest:
+        {signal_digest}
+        
+        * "scope" tells whether it covers the researchers named in the request or all researchers.
+        * Researchers listed in "not_found" have no records; say so in the report.
+        * If "truncated" is true, the digest does not cover every record; acknowledge this.
+        * For signal quality per experiment, call get_experiment_quality_stats with an experiment_id
+          from the digest. It returns quality histograms per signal type and device, processing
+          status counts, confidence quantiles and outliers, computed in the database.
+        * Only call get_signal_analyses for a specific signal (e.g. one listed in "low_quality").
         
         **For each researcher's data, you must analyze:**
         1. **Signal Quality Assessment:**
-           * Review quality scores for all recorded signals
+           * Review the quality score distributions (digest and get_experiment_quality_stats)
            * Identify any signals with quality issues
            * Note processing status (raw, filtered, processed, analyzed)
         
@@ -107,39 +75,26 @@ summary_agent = LlmAgent(
         * If data is missing or sparse, briefly acknowledge this in the report.
         """
     ),
+    tools=[
+        get_experiment_quality_stats,
+        get_signal_analyses
+    ],
     output_key="analysis_summary"
 )
 
-# Check Agent - determines if all analyses are complete
-check_agent = LlmAgent(
-    name="check_agent",
-    model="gemini-2.5-flash",
-    description=(
-        "Check if all requested biosignal analyses have been completed. "
-        "Output 'completed' or 'pending'."
-    ),
-    output_key="analysis_status"
-)
-
 def modify_output_after_agent(callback_context: CallbackContext) -> Optional[types.Content]:
-    """Callback to extract the final analysis summary after the loop completes."""
+    """Callback to return the final analysis summary after the pipeline completes."""
     agent_name = callback_context.agent_name
     invocation_id = callback_context.invocation_id
     current_state = callback_context.state.to_dict()
-    current_user_content = callback_context.user_content
     
     print(f"[Callback] Exiting agent: {agent_name} (Inv: {invocation_id})")
-    print(f"[Callback] Current analysis_status: {current_state.get('analysis_status')}")
-    print(f"[Callback] Current Content: {current_user_content}")
-    
-    status = current_state.get("analysis_status", "").strip()
-    is_done = (status == "completed")
     
     # Retrieve the final analysis summary from the state
     final_summary = current_state.get("analysis_summary")
     print(f"[Callback] final_summary: {final_summary}")
     
-    if final_summary and is_done and isinstance(final_summary, str):
+    if final_summary and isinstance(final_summary, str):
         log.info(f"[Callback] Found final analysis summary, constructing output Content.")
         # Construct the final output Content object to be sent back
         return types.Content(role="model", parts=[types.Part(text=final_summary.strip())])
@@ -147,16 +102,13 @@ def modify_output_after_agent(callback_context: CallbackContext) -> Optional[typ
         log.warning("[Callback] No final summary found in state or it's not a string.")
         return None
 
-# Root Loop Agent - orchestrates the signal analysis workflow
-root_agent = LoopAgent(
+# Root Sequential Agent - one data-gathering pass, then one summary
+root_agent = SequentialAgent(
     name="SignalAnalysisPipeline",
     sub_agents=[
-        signal_analyzer,
-        summary_agent,
-        check_agent,
-        CheckCondition(name="Checker")
+        signal_digest,
+        summary_agent
     ],
     description="Analyze biosignal data from neurotechnology experiments",
-    max_iterations=10,
     after_agent_callback=modify_output_after_agent
 )
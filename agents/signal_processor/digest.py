@@ -0,0 +1,150 @@
+"""
+Signal Digest Stage
+Deterministic data gathering for the signal analysis pipeline.
+
+Finds the researchers named in the request, fetches their whole signal tree
+with one bulk query, and aggregates it into a compact digest (quality
+statistics, processing status, analysis coverage and recent findings). The
+summary agent then writes its report in a single LLM call over the digest
+instead of walking the data tool by tool.
+"""
+
+import json
+from collections import Counter
+from typing import AsyncGenerator
+
+from google.adk.agents import BaseAgent
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.events import Event, EventActions
+
+from signal_processor.neurohub_async import (
+    all_researcher_names,
+    get_researcher_signal_tree,
+    researchers_in_request
+)
+
+# Session state key the digest is stored under (read by the summary agent)
+DIGEST_STATE_KEY = "signal_digest"
+
+# Signals scoring below this (0-1 scale) are listed individually
+LOW_QUALITY_THRESHOLD = 0.8
+MAX_LOW_QUALITY_SIGNALS = 10
+MAX_RECENT_FINDINGS = 5
+
+
+def _stats(values):
+    values = [v for v in values if v is not None]
+    if not values:
+        return None
+    return {
+        "count": len(values),
+        "mean": round(sum(values) / len(values), 3),
+        "min": round(min(values), 3),
+        "max": round(max(values), 3),
+    }
+
+
+def digest_researcher(researcher: dict) -> dict:
+    """Aggregates one researcher node of the signal tree."""
+    experiments = researcher["experiments"]
+    sessions = [session for experiment in experiments for session in experiment["sessions"]]
+    signals = [signal for session in sessions for signal in session["signals"]]
+    analyses = [analysis for signal in signals for analysis in signal["analyses"]]
+
+    minutes = [session["duration_minutes"] for session in sessions if session["duration_minutes"] is not None]
+    low_quality = sorted(
+        (signal for signal in signals
+         if signal["quality_score"] is not None and signal["quality_score"] < LOW_QUALITY_THRESHOLD),
+        key=lambda signal: signal["quality_score"],
+    )
+    # ISO timestamps sort chronologically; analyses without a time go last
+    recent = sorted(analyses, key=lambda analysis: analysis["analyzed_at"] or "", reverse=True)
+
+    return {
+        "researcher": researcher["researcher_name"],
+        "experiments": [
+            {
+                "experiment_id": experiment["experiment_id"],
+                "name": experiment["experiment_name"],
+                "status": experiment["experiment_status"],
+                "start_date": experiment["start_date"],
+                "sessions": len(experiment["sessions"]),
+                "signals": sum(len(session["signals"]) for session in experiment["sessions"]),
+            }
+            for experiment in experiments
+        ],
+        "sessions": {
+            "count": len(sessions),
+            "total_minutes": sum(minutes),
+            "mean_minutes": round(sum(minutes) / len(minutes), 1) if minutes else None,
+        },
+        "signals": {
+            "count": len(signals),
+            "by_type": dict(Counter(signal["signal_type"] for signal in signals)),
+            "by_device": dict(Counter(signal["device_name"] for signal in signals)),
+            "processing_status": dict(Counter(signal["processing_status"] for signal in signals)),
+            "sampling_rates_hz": sorted({s["sampling_rate"] for s in signals if s["sampling_rate"] is not None}),
+            "quality": _stats(signal["quality_score"] for signal in signals),
+            "low_quality_count": len(low_quality),
+            "low_quality": [
+                {key: signal[key] for key in ("signal_id", "signal_type", "quality_score", "processing_status")}
+                for signal in low_quality[:MAX_LOW_QUALITY_SIGNALS]
+            ],
+        },
+        "analyses": {
+            "count": len(analyses),
+            "by_type": dict(Counter(analysis["analysis_type"] for analysis in analyses)),
+            "confidence": _stats(analysis["confidence_score"] for analysis in analyses),
+            "unanalyzed_signals": sum(1 for signal in signals if not signal["analyses"]),
+            "recent_findings": [
+                {key: analysis[key] for key in ("analysis_type", "findings", "confidence_score", "analyzed_at")}
+                for analysis in recent[:MAX_RECENT_FINDINGS]
+            ],
+        },
+    }
+
+
+def build_signal_digest(tree: dict) -> dict:
+    """
+    Builds the digest from a get_researcher_signal_tree() result.
+
+    Returns:
+        dict: {"researchers": [per-researcher digest], "not_found": [...],
+        "truncated": bool}
+    """
+    return {
+        "researchers": [digest_researcher(researcher) for researcher in tree["researchers"]],
+        "not_found": tree["not_found"],
+        "truncated": tree["truncated"],
+    }
+
+
+def _request_text(ctx: InvocationContext) -> str:
+    content = ctx.user_content
+    if not content or not content.parts:
+        return ""
+    return " ".join(part.text for part in content.parts if part.text)
+
+
+class SignalDigestStage(BaseAgent):
+    """Fetches and aggregates the signal data for the request into session state."""
+
+    async def _run_async_impl(self, ctx: InvocationContext) -> AsyncGenerator[Event, None]:
+        names = await researchers_in_request(_request_text(ctx))
+        scope = "requested researchers"
+        if not names:
+            # No researcher named in the request: cover everyone
+            names = await all_researcher_names()
+            scope = "all researchers"
+        tree = await get_researcher_signal_tree(names)
+
+        if tree is None:
+            digest = {"error": "Signal data could not be fetched from the database."}
+        else:
+            digest = build_signal_digest(tree)
+            digest["scope"] = scope
+
+        yield Event(
+            author=self.name,
+            actions=EventActions(state_delta={DIGEST_STATE_KEY: json.dumps(digest, default=str)}),
+        )
@@ -3,26 +3,21 @@ NeuroHub Signal Processing Tools
 Tools for accessing and analyzing biosignal data from the Spanner Graph Database
 """
 
-import os
-from datetime import datetime
-from google.cloud import spanner
 from google.cloud.spanner_v1 import param_types
-from typing import Optional, Dict, List
-
-# Database configuration
-PROJECT_ID = os.environ.get("GOOGLE_CLOUD_PROJECT")
-INSTANCE_ID = os.environ.get("SPANNER_INSTANCE_ID", "neurohub-graph-instance")
-DATABASE_ID = os.environ.get("SPANNER_DATABASE_ID", "neurohub-db")
-
-# Initialize Spanner client
-db_instance = None
-try:
-    spanner_client = spanner.Client(project=PROJECT_ID)
-    instance = spanner_client.instance(INSTANCE_ID)
-    db_instance = instance.database(DATABASE_ID)
-    print(f"Connected to NeuroHub database: {DATABASE_ID}")
-except Exception as e:
-    print(f"Error connecting to database: {e}")
+from typing import Any, Dict, List, Optional
+
+from neurohub_common.pagination import keyset_filter, paginate
+from neurohub_common.rows import build_row_decoder
+from signal_processor.researcher_index import ResearcherNameIndex, normalize_name
+from signal_processor.spanner_utils import get_database
+
+# Shared, pooled database connection (see spanner_utils.py)
+db_instance = get_database()
+
+# Name -> researcher_id lookups are served from memory (see researcher_index.py)
+researcher_index = ResearcherNameIndex(db_instance)
+if db_instance:
+    researcher_index.warm_in_background()
 
 def run_query(sql: str, params: dict = None, param_types: dict = None, expected_fields: list = None) -> list:
     """Execute a query against the Spanner database."""
@@ -33,16 +28,14 @@ def run_query(sql: str, params: dict = None, param_types: dict = None, expected_
         with db_instance.snapshot() as snapshot:
             results = snapshot.execute_sql(sql, params=params, param_types=param_types)
             
-            field_names = expected_fields
-            if not field_names:
-                try:
-                    field_names = [field.name for field in results.fields]
-                except AttributeError:
-                    raise ValueError("Could not determine field names for query results.")
-            
+            # Built on the first row, when the result metadata is known;
+            # TIMESTAMP columns come out as ISO strings
+            decode_row = None
             result_list = []
             for row in results:
-                result_list.append(dict(zip(field_names, row)))
+                if decode_row is None:
+                    decode_row = build_row_decoder(results.fields, field_names=expected_fields)
+                result_list.append(decode_row(row))
             
             return result_list
     except Exception as e:
@@ -54,51 +47,106 @@ def run_graph_query(graph_sql: str, params: dict = None, param_types: dict = Non
     return run_query(graph_sql, params, param_types, expected_fields)
 
 # Tool functions for the Signal Processing Agent
+#
+# List tools return one page: {"items": [...], "next_cursor": ...}. Pass
+# next_cursor back as cursor to read the next page; it is None on the last one.
 
-def get_researcher_id_by_name(name: str) -> str:
+DEFAULT_PAGE_SIZE = 50
+
+def _page_size(limit: Optional[int]) -> int:
+    return max(1, min(limit or DEFAULT_PAGE_SIZE, 500))
+
+RESEARCHER_IDS_SQL = r"""
+    SELECT name, researcher_id
+    FROM Researcher
+    WHERE LOWER(REGEXP_REPLACE(TRIM(name), r'\s+', ' ')) IN UNNEST(@names)
+    ORDER BY create_time, researcher_id
+"""
+
+def _query_researcher_ids(names: List[str]) -> Dict[str, Any]:
+    """Resolves names with one UNNEST query; used while the name index is not loaded."""
+    wanted = list({normalize_name(name) for name in names})
+    params = {"names": wanted}
+    param_types_map = {"names": param_types.Array(param_types.STRING)}
+    fields = ["name", "researcher_id"]
+
+    results = run_query(RESEARCHER_IDS_SQL, params=params, param_types=param_types_map, expected_fields=fields)
+    if results is None:
+        return None
+
+    ids = {}
+    for row in results:
+        ids.setdefault(normalize_name(row["name"]), row["researcher_id"])
+    return {name: ids.get(normalize_name(name)) for name in names}
+
+def get_researcher_ids_by_names(names: List[str]) -> Dict[str, Any]:
     """
-    Fetches the researcher_id for a given name.
+    Fetches the researcher_id of several researchers at once.
+    Case and extra spaces in the names are ignored.
     
     Args:
-        name (str): The name of the researcher to search for.
+        names (list[str]): The names of the researchers to search for.
     
     Returns:
-        str or None: The researcher_id if found, otherwise None.
+        dict or None: Each name mapped to its researcher_id, or to None if not found.
     """
     if not db_instance:
         return None
     
-    sql = """
-        SELECT researcher_id
-        FROM Researcher
-        WHERE name = @name
-        LIMIT 1
+    names = list(dict.fromkeys(name for name in names if name))
+    if not names:
+        return {}
+    
+    if _ensure_index_loaded():
+        return researcher_index.lookup(names)
+    return _query_researcher_ids(names)
+
+def _ensure_index_loaded() -> bool:
+    return researcher_index.loaded or researcher_index.refresh(full=True)
+
+def researchers_in_request(text: str) -> List[str]:
+    """Returns the names of known researchers mentioned in a request text."""
+    return researcher_index.find_in_text(text) if _ensure_index_loaded() else []
+
+def all_researcher_names() -> List[str]:
+    """Returns the names of all known researchers."""
+    return researcher_index.all_names() if _ensure_index_loaded() else []
+
+def get_researcher_id_by_name(name: str) -> str:
     """
-    params = {"name": name}
-    param_types_map = {"name": param_types.STRING}
-    fields = ["researcher_id"]
+    Fetches the researcher_id for a given name.
+    To look up several researchers, use get_researcher_ids_by_names instead.
     
-    results = run_query(sql, params=params, param_types=param_types_map, expected_fields=fields)
+    Args:
+        name (str): The name of the researcher to search for.
     
-    if results:
-        return results[0].get('researcher_id')
-    else:
-        return None
+    Returns:
+        str or None: The researcher_id if found, otherwise None.
+    """
+    ids = get_researcher_ids_by_names([name])
+    return ids.get(name) if ids else None
 
-def get_researcher_experiments(researcher_id: str) -> List[Dict]:
+def get_researcher_experiments(researcher_id: str, limit: Optional[int] = None,
+                               cursor: Optional[str] = None) -> Dict[str, Any]:
     """
-    Fetches all experiments where the researcher is the principal investigator.
+    Fetches the experiments where the researcher is the principal investigator, newest first.
     
     Args:
         researcher_id (str): The ID of the researcher.
+        limit (int, optional): Page size (default 50).
+        cursor (str, optional): next_cursor from the previous page.
     
     Returns:
-        list[dict] or None: List of experiment dictionaries.
+        dict or None: {"items": list of experiment dictionaries, "next_cursor": str or None}.
     """
     if not db_instance:
         return None
     
-    sql = """
+    limit = _page_size(limit)
+    keyset, params, param_types_map = keyset_filter(
+        "e.start_date", "e.experiment_id", cursor, descending=True, sort_type=param_types.TIMESTAMP
+    )
+    sql = f"""
         SELECT 
             e.experiment_id, 
             e.name, 
@@ -108,39 +156,38 @@ def get_researcher_experiments(researcher_id: str) -> List[Dict]:
             e.end_date,
             e.hypothesis
         FROM Experiment e
-        WHERE e.principal_investigator_id = @researcher_id
-        ORDER BY e.start_date DESC
+        WHERE e.principal_investigator_id = @researcher_id AND {keyset}
+        ORDER BY e.start_date DESC, e.experiment_id DESC
+        LIMIT @limit
     """
-    params = {"researcher_id": researcher_id}
-    param_types_map = {"researcher_id": param_types.STRING}
+    params.update({"researcher_id": researcher_id, "limit": limit + 1})
+    param_types_map.update({"researcher_id": param_types.STRING, "limit": param_types.INT64})
     fields = ["experiment_id", "name", "description", "status", "start_date", "end_date", "hypothesis"]
     
-    results = run_query(sql, params=params, param_types=param_types_map, expected_fields=fields)
-    
-    # Convert datetime objects to ISO format strings
-    if results:
-        for exp in results:
-            if isinstance(exp.get('start_date'), datetime):
-                exp['start_date'] = exp['start_date'].isoformat()
-            if isinstance(exp.get('end_date'), datetime):
-                exp['end_date'] = exp['end_date'].isoformat()
-    
-    return results
+    return paginate(run_query(sql, params=params, param_types=param_types_map, expected_fields=fields),
+                    limit, "start_date", "experiment_id")
 
-def get_experiment_sessions(experiment_id: str) -> List[Dict]:
+def get_experiment_sessions(experiment_id: str, limit: Optional[int] = None,
+                            cursor: Optional[str] = None) -> Dict[str, Any]:
     """
-    Fetches all sessions for a specific experiment.
+    Fetches the sessions of a specific experiment, newest first.
     
     Args:
         experiment_id (str): The ID of the experiment.
+        limit (int, optional): Page size (default 50).
+        cursor (str, optional): next_cursor from the previous page.
     
     Returns:
-        list[dict] or None: List of session dictionaries.
+        dict or None: {"items": list of session dictionaries, "next_cursor": str or None}.
     """
     if not db_instance:
         return None
     
-    sql = """
+    limit = _page_size(limit)
+    keyset, params, param_types_map = keyset_filter(
+        "s.session_date", "s.session_id", cursor, descending=True, sort_type=param_types.TIMESTAMP
+    )
+    sql = f"""
         SELECT 
             s.session_id,
             s.session_date,
@@ -149,36 +196,38 @@ def get_experiment_sessions(experiment_id: str) -> List[Dict]:
             r.name as researcher_name
         FROM Session s
         JOIN Researcher r ON s.researcher_id = r.researcher_id
-        WHERE s.experiment_id = @experiment_id
-        ORDER BY s.session_date DESC
+        WHERE s.experiment_id = @experiment_id AND {keyset}
+        ORDER BY s.session_date DESC, s.session_id DESC
+        LIMIT @limit
     """
-    params = {"experiment_id": experiment_id}
-    param_types_map = {"experiment_id": param_types.STRING}
+    params.update({"experiment_id": experiment_id, "limit": limit + 1})
+    param_types_map.update({"experiment_id": param_types.STRING, "limit": param_types.INT64})
     fields = ["session_id", "session_date", "duration_minutes", "notes", "researcher_name"]
     
-    results = run_query(sql, params=params, param_types=param_types_map, expected_fields=fields)
-    
-    if results:
-        for session in results:
-            if isinstance(session.get('session_date'), datetime):
-                session['session_date'] = session['session_date'].isoformat()
-    
-    return results
+    return paginate(run_query(sql, params=params, param_types=param_types_map, expected_fields=fields),
+                    limit, "session_date", "session_id")
 
-def get_session_signals(session_id: str) -> List[Dict]:
+def get_session_signals(session_id: str, limit: Optional[int] = None,
+                        cursor: Optional[str] = None) -> Dict[str, Any]:
     """
-    Fetches all recorded signals for a specific session.
+    Fetches the recorded signals of a specific session, newest first.
     
     Args:
         session_id (str): The ID of the session.
+        limit (int, optional): Page size (default 50).
+        cursor (str, optional): next_cursor from the previous page.
     
     Returns:
-        list[dict] or None: List of signal dictionaries.
+        dict or None: {"items": list of signal dictionaries, "next_cursor": str or None}.
     """
     if not db_instance:
         return None
     
-    sql = """
+    limit = _page_size(limit)
+    keyset, params, param_types_map = keyset_filter(
+        "s.recorded_at", "s.signal_id", cursor, descending=True, sort_type=param_types.TIMESTAMP
+    )
+    sql = f"""
         SELECT 
             s.signal_id,
             s.signal_type,
@@ -190,34 +239,44 @@ def get_session_signals(session_id: str) -> List[Dict]:
             s.file_path,
             s.notes,
             d.name as device_name,
-            d.device_type
+            d.device_type,
+            s.recorded_at
         FROM SignalData s
         JOIN Device d ON s.device_id = d.device_id
-        WHERE s.session_id = @session_id
-        ORDER BY s.recorded_at DESC
+        WHERE s.session_id = @session_id AND {keyset}
+        ORDER BY s.recorded_at DESC, s.signal_id DESC
+        LIMIT @limit
     """
-    params = {"session_id": session_id}
-    param_types_map = {"session_id": param_types.STRING}
+    params.update({"session_id": session_id, "limit": limit + 1})
+    param_types_map.update({"session_id": param_types.STRING, "limit": param_types.INT64})
     fields = ["signal_id", "signal_type", "duration_seconds", "sampling_rate", 
               "channels", "quality_score", "processing_status", "file_path", 
-              "notes", "device_name", "device_type"]
+              "notes", "device_name", "device_type", "recorded_at"]
     
-    return run_query(sql, params=params, param_types=param_types_map, expected_fields=fields)
+    return paginate(run_query(sql, params=params, param_types=param_types_map, expected_fields=fields),
+                    limit, "recorded_at", "signal_id")
 
-def get_signal_analyses(signal_id: str) -> List[Dict]:
+def get_signal_analyses(signal_id: str, limit: Optional[int] = None,
+                        cursor: Optional[str] = None) -> Dict[str, Any]:
     """
-    Fetches all analyses performed on a specific signal.
+    Fetches the analyses performed on a specific signal, newest first.
     
     Args:
         signal_id (str): The ID of the signal.
+        limit (int, optional): Page size (default 50).
+        cursor (str, optional): next_cursor from the previous page.
     
     Returns:
-        list[dict] or None: List of analysis dictionaries.
+        dict or None: {"items": list of analysis dictionaries, "next_cursor": str or None}.
     """
     if not db_instance:
         return None
     
-    sql = """
+    limit = _page_size(limit)
+    keyset, params, param_types_map = keyset_filter(
+        "a.analyzed_at", "a.analysis_id", cursor, descending=True, sort_type=param_types.TIMESTAMP
+    )
+    sql = f"""
         SELECT 
             a.analysis_id,
             a.analysis_type,
@@ -227,24 +286,19 @@ def get_signal_analyses(signal_id: str) -> List[Dict]:
             r.name as analyst_name
         FROM Analysis a
         JOIN Researcher r ON a.researcher_id = r.researcher_id
-        WHERE a.signal_id = @signal_id
-        ORDER BY a.analyzed_at DESC
+        WHERE a.signal_id = @signal_id AND {keyset}
+        ORDER BY a.analyzed_at DESC, a.analysis_id DESC
+        LIMIT @limit
     """
-    params = {"signal_id": signal_id}
-    param_types_map = {"signal_id": param_types.STRING}
+    params.update({"signal_id": signal_id, "limit": limit + 1})
+    param_types_map.update({"signal_id": param_types.STRING, "limit": param_types.INT64})
     fields = ["analysis_id", "analysis_type", "findings", "confidence_score", 
               "analyzed_at", "analyst_name"]
     
-    results = run_query(sql, params=params, param_types=param_types_map, expected_fields=fields)
-    
-    if results:
-        for analysis in results:
-            if isinstance(analysis.get('analyzed_at'), datetime):
-                analysis['analyzed_at'] = analysis['analyzed_at'].isoformat()
-    
-    return results
+    return paginate(run_query(sql, params=params, param_types=param_types_map, expected_fields=fields),
+                    limit, "analyzed_at", "analysis_id")
 
-def get_device_specifications(device_id: str) -> Dict:
+def get_device_specifications(device_id: str) -> Dict[str, Any]:
     """
     Fetches specifications for a specific device.
     
@@ -280,54 +334,202 @@ def get_device_specifications(device_id: str) -> Dict:
     
     return results[0] if results else None
 
+# Bulk tools: one query instead of one tool call per hop
+
+SIGNAL_TREE_MAX_ROWS = 5000
+
+SIGNAL_TREE_SQL = """
+    SELECT
+        r.researcher_id,
+        r.name AS researcher_name,
+        e.experiment_id,
+        e.name AS experiment_name,
+        e.status AS experiment_status,
+        e.start_date,
+        s.session_id,
+        s.session_date,
+        s.duration_minutes,
+        sig.signal_id,
+        sig.signal_type,
+        sig.duration_seconds,
+        sig.sampling_rate,
+        sig.channels,
+        sig.quality_score,
+        sig.processing_status,
+        d.name AS device_name,
+        a.analysis_id,
+        a.analysis_type,
+        a.findings,
+        a.confidence_score,
+        a.analyzed_at
+    FROM Researcher r
+    LEFT JOIN Experiment e ON e.principal_investigator_id = r.researcher_id
+    LEFT JOIN Session s ON s.experiment_id = e.experiment_id
+    LEFT JOIN SignalData sig ON sig.session_id = s.session_id
+    LEFT JOIN Device d ON d.device_id = sig.device_id
+    LEFT JOIN Analysis a ON a.signal_id = sig.signal_id
+    WHERE r.researcher_id IN UNNEST(@researcher_ids)
+    ORDER BY r.name, r.researcher_id, e.start_date DESC, e.experiment_id,
+             s.session_date DESC, s.session_id, sig.signal_id, a.analyzed_at DESC
+    LIMIT @max_rows
+"""
+
+_EXPERIMENT_FIELDS = ("experiment_id", "experiment_name", "experiment_status", "start_date")
+_SESSION_FIELDS = ("session_id", "session_date", "duration_minutes")
+_SIGNAL_FIELDS = ("signal_id", "signal_type", "duration_seconds", "sampling_rate", "channels",
+                  "quality_score", "processing_status", "device_name")
+_ANALYSIS_FIELDS = ("analysis_id", "analysis_type", "findings", "confidence_score", "analyzed_at")
+
+
+def _tree_node(nodes: dict, row: dict, fields: tuple, siblings: list, children: str = None) -> dict:
+    """Returns the node for row[fields[0]], appending it to siblings on first sight."""
+    node = nodes.get(row[fields[0]])
+    if node is None:
+        node = {field: row[field] for field in fields}
+        if children:
+            node[children] = []
+        nodes[row[fields[0]]] = node
+        siblings.append(node)
+    return node
+
+
+def build_signal_tree(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Folds the flat LEFT JOIN rows of SIGNAL_TREE_SQL into
+    researcher -> experiments -> sessions -> signals -> analyses.
+
+    A NULL id means the parent has no children at that level (LEFT JOIN).
+    Row order is kept at every level.
+    """
+    researchers = []
+    researcher_nodes, experiment_nodes, session_nodes, signal_nodes, analysis_nodes = {}, {}, {}, {}, {}
+    for row in rows:
+        researcher = _tree_node(researcher_nodes, row, ("researcher_id", "researcher_name"),
+                                researchers, "experiments")
+        if row["experiment_id"] is None:
+            continue
+        experiment = _tree_node(experiment_nodes, row, _EXPERIMENT_FIELDS, researcher["experiments"], "sessions")
+        if row["session_id"] is None:
+            continue
+        session = _tree_node(session_nodes, row, _SESSION_FIELDS, experiment["sessions"], "signals")
+        if row["signal_id"] is None:
+            continue
+        signal = _tree_node(signal_nodes, row, _SIGNAL_FIELDS, session["signals"], "analyses")
+        if row["analysis_id"] is not None:
+            _tree_node(analysis_nodes, row, _ANALYSIS_FIELDS, signal["analyses"])
+    return researchers
+
+
+def get_researcher_signal_tree(researcher_names: List[str]) -> Dict[str, Any]:
+    """
+    Fetches everything recorded for several researchers in one call:
+    researcher -> experiments -> sessions -> signals (with device) -> analyses.
+
+    Use this instead of calling get_researcher_experiments,
+    get_experiment_sessions, get_session_signals and get_signal_analyses
+    one level at a time.
+    
+    Args:
+        researcher_names (list[str]): Researcher names; case and extra spaces are ignored.
+    
+    Returns:
+        dict or None: {"researchers": [...tree...], "not_found": names with no
+        match, "truncated": True if the row limit cut the result short}.
+    """
+    if not db_instance:
+        return None
+
+    ids = get_researcher_ids_by_names(researcher_names)
+    if ids is None:
+        return None
+    researcher_ids = list(dict.fromkeys(i for i in ids.values() if i))
+    not_found = [name for name, researcher_id in ids.items() if researcher_id is None]
+    if not researcher_ids:
+        return {"researchers": [], "not_found": not_found, "truncated": False}
+
+    params = {"researcher_ids": researcher_ids, "max_rows": SIGNAL_TREE_MAX_ROWS + 1}
+    param_types_map = {"researcher_ids": param_types.Array(param_types.STRING), "max_rows": param_types.INT64}
+
+    rows = run_query(SIGNAL_TREE_SQL, params=params, param_types=param_types_map)
+    if rows is None:
+        return None
+
+    return {
+        "researchers": build_signal_tree(rows[:SIGNAL_TREE_MAX_ROWS]),
+        "not_found": not_found,
+        "truncated": len(rows) > SIGNAL_TREE_MAX_ROWS,
+    }
+
 # Graph-based queries for relationship analysis
 
-def get_researcher_collaborations(researcher_id: str) -> List[Dict]:
+def get_researcher_collaborations(researcher_id: str, limit: Optional[int] = None,
+                                  cursor: Optional[str] = None) -> Dict[str, Any]:
     """
     Fetches collaboration network for a researcher using Graph Query.
     
     Args:
         researcher_id (str): The ID of the researcher.
+        limit (int, optional): Page size (default 50).
+        cursor (str, optional): next_cursor from the previous page.
     
     Returns:
-        list[dict] or None: List of collaboration relationships.
+        dict or None: {"items": list of collaboration relationships, "next_cursor": str or None}.
     """
     if not db_instance:
         return None
     
-    graph_sql = """
+    limit = _page_size(limit)
+    # A researcher can have several collaborations with one collaborator, in
+    # both directions, so ties are broken by the edge key
+    keyset, params, param_types_map = keyset_filter(
+        "collaborator.name", ("c.researcher_id_a", "c.researcher_id_b"), cursor
+    )
+    graph_sql = f"""
         Graph NeuroResearchGraph
-        MATCH (r:Researcher {researcher_id: @researcher_id})-[c:Collaboration]-(collaborator:Researcher)
+        MATCH (r:Researcher {{researcher_id: @researcher_id}})-[c:Collaboration]-(collaborator:Researcher)
+        WHERE {keyset}
         RETURN DISTINCT 
             collaborator.researcher_id, 
             collaborator.name,
             c.project_name,
-            c.collaboration_type
-        ORDER BY collaborator.name
+            c.collaboration_type,
+            c.researcher_id_a,
+            c.researcher_id_b
+        ORDER BY collaborator.name, c.researcher_id_a, c.researcher_id_b
+        LIMIT @limit
     """
-    params = {"researcher_id": researcher_id}
-    param_types_map = {"researcher_id": param_types.STRING}
-    fields = ["researcher_id", "name", "project_name", "collaboration_type"]
+    params.update({"researcher_id": researcher_id, "limit": limit + 1})
+    param_types_map.update({"researcher_id": param_types.STRING, "limit": param_types.INT64})
+    fields = ["researcher_id", "name", "project_name", "collaboration_type", "researcher_id_a", "researcher_id_b"]
     
-    return run_graph_query(graph_sql, params=params, param_types=param_types_map, expected_fields=fields)
+    return paginate(run_graph_query(graph_sql, params=params, param_types=param_types_map, expected_fields=fields),
+                    limit, "name", ("researcher_id_a", "researcher_id_b"))
 
-def get_experiment_data_lineage(experiment_id: str) -> List[Dict]:
+def get_experiment_data_lineage(experiment_id: str, limit: Optional[int] = None,
+                                cursor: Optional[str] = None) -> Dict[str, Any]:
     """
     Traces the complete data lineage for an experiment using Graph Query.
     Shows: Experiment -> Sessions -> Signals -> Analyses
     
     Args:
         experiment_id (str): The ID of the experiment.
+        limit (int, optional): Page size (default 50).
+        cursor (str, optional): next_cursor from the previous page.
     
     Returns:
-        list[dict] or None: Data lineage information.
+        dict or None: {"items": data lineage rows, one per analysis, "next_cursor": str or None}.
     """
     if not db_instance:
         return None
     
-    graph_sql = """
+    limit = _page_size(limit)
+    keyset, params, param_types_map = keyset_filter(
+        "s.session_date", "a.analysis_id", cursor, sort_type=param_types.TIMESTAMP
+    )
+    graph_sql = f"""
         Graph NeuroResearchGraph
-        MATCH path = (e:Experiment {experiment_id: @experiment_id})<-[:PartOf]-(s:Session)<-[:RecordedIn]-(sig:SignalData)<-[:Analyzes]-(a:Analysis)
+        MATCH path = (e:Experiment {{experiment_id: @experiment_id}})<-[:PartOf]-(s:Session)<-[:RecordedIn]-(sig:SignalData)<-[:Analyzes]-(a:Analysis)
+        WHERE {keyset}
         RETURN 
             e.name as experiment_name,
             s.session_id,
@@ -335,20 +537,16 @@ def get_experiment_data_lineage(experiment_id: str) -> List[Dict]:
             sig.signal_id,
             sig.signal_type,
             sig.quality_score,
+            a.analysis_id,
             a.analysis_type,
             a.confidence_score
-        ORDER BY s.session_date, sig.signal_type
+        ORDER BY s.session_date, a.analysis_id
+        LIMIT @limit
     """
-    params = {"experiment_id": experiment_id}
-    param_types_map = {"experiment_id": param_types.STRING}
+    params.update({"experiment_id": experiment_id, "limit": limit + 1})
+    param_types_map.update({"experiment_id": param_types.STRING, "limit": param_types.INT64})
     fields = ["experiment_name", "session_id", "session_date", "signal_id", 
-              "signal_type", "quality_score", "analysis_type", "confidence_score"]
-    
-    results = run_graph_query(graph_sql, params=params, param_types=param_types_map, expected_fields=fields)
-    
-    if results:
-        for item in results:
-            if isinstance(item.get('session_date'), datetime):
-                item['session_date'] = item['session_date'].isoformat()
+              "signal_type", "quality_score", "analysis_id", "analysis_type", "confidence_score"]
     
-    return results
+    return paginate(run_graph_query(graph_sql, params=params, param_types=param_types_map, expected_fields=fields),
+                    limit, "session_date", "analysis_id")
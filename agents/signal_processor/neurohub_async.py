@@ -0,0 +1,68 @@
+"""
+Async NeuroHub Signal Processing Tools
+Non-blocking versions of the tools in neurohub.py for the ADK event loop.
+
+The Spanner client is synchronous, so each call runs on a worker thread while
+the event loop keeps serving other agent sessions. The pool is sized to the
+Spanner session pool (SPANNER_POOL_SIZE): more threads would only queue on
+session checkout.
+"""
+
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List
+
+from signal_processor import neurohub, quality_stats
+from signal_processor.spanner_utils import POOL_SIZE
+
+TOOL_THREADS = int(os.environ.get("NEUROHUB_TOOL_THREADS", str(POOL_SIZE)))
+
+_executor = ThreadPoolExecutor(max_workers=TOOL_THREADS, thread_name_prefix="neurohub-tool")
+
+
+def _to_async(func: Callable) -> Callable:
+    """
+    Wraps a blocking tool as a coroutine that runs on the tool thread pool.
+
+    functools.wraps keeps the name, docstring and signature, so ADK builds
+    the same function declaration for the model as for the sync tool.
+    """
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs))
+
+    return wrapper
+
+
+async def gather_calls(tool: Callable, calls: Iterable[Dict[str, Any]]) -> List[Any]:
+    """
+    Runs one async tool for many argument sets concurrently.
+
+    Args:
+        tool: One of the async tools in this module.
+        calls: Keyword-argument dicts, e.g. [{"experiment_id": "..."}, ...].
+
+    Returns:
+        list: Results in the order of calls.
+    """
+    return await asyncio.gather(*(tool(**kwargs) for kwargs in calls))
+
+
+get_researcher_id_by_name = _to_async(neurohub.get_researcher_id_by_name)
+get_researcher_ids_by_names = _to_async(neurohub.get_researcher_ids_by_names)
+get_researcher_experiments = _to_async(neurohub.get_researcher_experiments)
+get_experiment_sessions = _to_async(neurohub.get_experiment_sessions)
+get_session_signals = _to_async(neurohub.get_session_signals)
+get_signal_analyses = _to_async(neurohub.get_signal_analyses)
+get_device_specifications = _to_async(neurohub.get_device_specifications)
+get_researcher_signal_tree = _to_async(neurohub.get_researcher_signal_tree)
+get_experiment_quality_stats = _to_async(quality_stats.get_experiment_quality_stats)
+get_researcher_collaborations = _to_async(neurohub.get_researcher_collaborations)
+get_experiment_data_lineage = _to_async(neurohub.get_experiment_data_lineage)
+
+# Used by the digest stage (digest.py), not exposed to the model
+researchers_in_request = _to_async(neurohub.researchers_in_request)
+all_researcher_names = _to_async(neurohub.all_researcher_names)
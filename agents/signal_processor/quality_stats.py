@@ -0,0 +1,267 @@
+"""
+NeuroHub Signal Quality Statistics
+Aggregate tools over SignalData and Analysis, computed in Spanner.
+
+The model gets histograms, counts, quantiles and a short outlier list for an
+experiment instead of every signal row, so the tool result stays a few
+kilobytes however many signals were recorded. Results are cached per
+experiment for NEUROHUB_STATS_CACHE_TTL seconds.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict
+
+from google.cloud.spanner_v1 import param_types
+
+from neurohub_common.rows import build_row_decoder
+from signal_processor.neurohub import db_instance
+
+STATS_CACHE_TTL = float(os.environ.get("NEUROHUB_STATS_CACHE_TTL", "300"))
+STATS_CACHE_MAX_ENTRIES = 256
+
+# quality_score is on a 0-1 scale; the histogram uses equal-width bins, and
+# scores outside that range are counted in the first or last bin
+QUALITY_BINS = 10
+LOW_QUALITY_THRESHOLD = 0.8
+MAX_OUTLIERS = 20
+
+# Spanner has no quantile aggregate: scores are collected per group with
+# ARRAY_AGG and only the quantiles are returned to the model
+QUANTILES = (0.1, 0.25, 0.5, 0.75, 0.9)
+
+QUALITY_BY_GROUP_SQL = """
+    SELECT
+        s.signal_type,
+        d.name AS device_name,
+        COUNT(*) AS signals,
+        COUNT(s.quality_score) AS scored,
+        AVG(s.quality_score) AS mean,
+        STDDEV(s.quality_score) AS stddev,
+        MIN(s.quality_score) AS min,
+        MAX(s.quality_score) AS max,
+        COUNTIF(s.quality_score < @low_quality) AS low_quality
+    FROM SignalData s
+    JOIN Device d ON d.device_id = s.device_id
+    WHERE s.experiment_id = @experiment_id
+    GROUP BY s.signal_type, d.name
+    ORDER BY s.signal_type, d.name
+"""
+
+QUALITY_HISTOGRAM_SQL = """
+    SELECT
+        s.signal_type,
+        d.name AS device_name,
+        GREATEST(LEAST(CAST(FLOOR(s.quality_score * @bins) AS INT64), @bins - 1), 0) AS bin,
+        COUNT(*) AS signals
+    FROM SignalData s
+    JOIN Device d ON d.device_id = s.device_id
+    WHERE s.experiment_id = @experiment_id AND s.quality_score IS NOT NULL
+    GROUP BY s.signal_type, d.name, bin
+"""
+
+PROCESSING_STATUS_SQL = """
+    SELECT s.signal_type, s.processing_status, COUNT(*) AS signals
+    FROM SignalData s
+    WHERE s.experiment_id = @experiment_id
+    GROUP BY s.signal_type, s.processing_status
+    ORDER BY s.signal_type, s.processing_status
+"""
+
+CONFIDENCE_SQL = """
+    SELECT
+        a.analysis_type,
+        COUNT(*) AS analyses,
+        AVG(a.confidence_score) AS mean,
+        ARRAY_AGG(a.confidence_score IGNORE NULLS) AS scores
+    FROM SignalData s
+    JOIN Analysis a ON a.signal_id = s.signal_id
+    WHERE s.experiment_id = @experiment_id
+    GROUP BY a.analysis_type
+    ORDER BY a.analysis_type
+"""
+
+OUTLIERS_SQL = """
+    WITH stats AS (
+        SELECT AVG(quality_score) AS mean, STDDEV(quality_score) AS stddev
+        FROM SignalData
+        WHERE experiment_id = @experiment_id
+    )
+    SELECT
+        s.signal_id,
+        s.session_id,
+        s.signal_type,
+        d.name AS device_name,
+        s.quality_score,
+        s.processing_status
+    FROM SignalData s
+    JOIN Device d ON d.device_id = s.device_id
+    CROSS JOIN stats
+    WHERE s.experiment_id = @experiment_id
+      AND (s.quality_score < @low_quality
+           OR s.quality_score < stats.mean - 2 * stats.stddev)
+    ORDER BY s.quality_score, s.signal_id
+    LIMIT @max_outliers
+"""
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _cache_get(key):
+    with _cache_lock:
+        entry = _cache.get(key)
+        if entry is None or entry[0] <= time.monotonic():
+            return None
+        _cache.move_to_end(key)
+        return entry[1]
+
+
+def _cache_set(key, value):
+    with _cache_lock:
+        _cache[key] = (time.monotonic() + STATS_CACHE_TTL, value)
+        _cache.move_to_end(key)
+        while len(_cache) > STATS_CACHE_MAX_ENTRIES:
+            _cache.popitem(last=False)
+
+
+def clear_stats_cache():
+    with _cache_lock:
+        _cache.clear()
+
+
+def _round(value, digits=3):
+    return round(value, digits) if value is not None else None
+
+
+def quantiles(values, points=QUANTILES):
+    """Linear-interpolation quantiles of a list of numbers (None if empty)."""
+    values = sorted(values)
+    if not values:
+        return None
+    result = {}
+    for point in points:
+        position = point * (len(values) - 1)
+        lower = int(position)
+        upper = min(lower + 1, len(values) - 1)
+        value = values[lower] + (values[upper] - values[lower]) * (position - lower)
+        result[f"p{round(point * 100)}"] = round(value, 3)
+    return result
+
+
+def _run_all(statements, params, types):
+    """Runs the statements in one read-only snapshot so they see the same data."""
+    results = []
+    with db_instance.snapshot(multi_use=True) as snapshot:
+        for sql in statements:
+            # Pass each statement only the parameters it references
+            names = [name for name in params if f"@{name}" in sql]
+            rows = snapshot.execute_sql(sql, params={n: params[n] for n in names},
+                                        param_types={n: types[n] for n in names})
+            decode_row = None
+            decoded = []
+            for row in rows:
+                if decode_row is None:
+                    decode_row = build_row_decoder(rows.fields)
+                decoded.append(decode_row(row))
+            results.append(decoded)
+    return results
+
+
+def build_quality_stats(groups, histogram, statuses, confidence, outliers) -> Dict[str, Any]:
+    """Shapes the aggregate query results into the tool result."""
+    bins = {}
+    for row in histogram:
+        counts = bins.setdefault((row["signal_type"], row["device_name"]), [0] * QUALITY_BINS)
+        # Scores outside 0-1 count in the end bins; a negative bin must not
+        # index the list from the end
+        counts[min(max(row["bin"], 0), QUALITY_BINS - 1)] += row["signals"]
+
+    by_status = {}
+    for row in statuses:
+        by_status.setdefault(row["signal_type"], {})[row["processing_status"]] = row["signals"]
+
+    return {
+        "signals": sum(row["signals"] for row in groups),
+        "low_quality_threshold": LOW_QUALITY_THRESHOLD,
+        "quality_bins": [round(i / QUALITY_BINS, 2) for i in range(QUALITY_BINS + 1)],
+        "quality_by_group": [
+            {
+                "signal_type": row["signal_type"],
+                "device_name": row["device_name"],
+                "signals": row["signals"],
+                "scored": row["scored"],
+                "mean": _round(row["mean"]),
+                "stddev": _round(row["stddev"]),
+                "min": _round(row["min"]),
+                "max": _round(row["max"]),
+                "low_quality": row["low_quality"],
+                "histogram": bins.get((row["signal_type"], row["device_name"]), [0] * QUALITY_BINS),
+            }
+            for row in groups
+        ],
+        "processing_status": by_status,
+        "confidence_by_analysis_type": [
+            {
+                "analysis_type": row["analysis_type"],
+                "analyses": row["analyses"],
+                "mean": _round(row["mean"]),
+                "quantiles": quantiles(row["scores"] or []),
+            }
+            for row in confidence
+        ],
+        "outliers": outliers,
+    }
+
+
+def get_experiment_quality_stats(experiment_id: str) -> Dict[str, Any]:
+    """
+    Fetches aggregate signal quality statistics for an experiment, computed in
+    the database. Prefer this over reading signals one by one.
+
+    Args:
+        experiment_id (str): The ID of the experiment.
+
+    Returns:
+        dict or None: {"signals": total count,
+        "quality_by_group": per signal type and device: count, mean, stddev,
+        min, max, low_quality count and a histogram over "quality_bins",
+        "processing_status": counts per signal type and status,
+        "confidence_by_analysis_type": count, mean and quantiles (p10-p90),
+        "outliers": up to 20 signals scoring below the threshold or more than
+        two standard deviations under the experiment mean}.
+    """
+    if not db_instance:
+        return None
+
+    cached = _cache_get(experiment_id)
+    if cached is not None:
+        return cached
+
+    params = {
+        "experiment_id": experiment_id,
+        "low_quality": LOW_QUALITY_THRESHOLD,
+        "bins": QUALITY_BINS,
+        "max_outliers": MAX_OUTLIERS,
+    }
+    types = {
+        "experiment_id": param_types.STRING,
+        "low_quality": param_types.FLOAT64,
+        "bins": param_types.INT64,
+        "max_outliers": param_types.INT64,
+    }
+
+    try:
+        results = _run_all(
+            [QUALITY_BY_GROUP_SQL, QUALITY_HISTOGRAM_SQL, PROCESSING_STATUS_SQL, CONFIDENCE_SQL, OUTLIERS_SQL],
+            params, types,
+        )
+    except Exception as e:
+        print(f"Query error: {e}")
+        return None
+
+    stats = build_quality_stats(*results)
+    _cache_set(experiment_id, stats)
+    return stats
@@ -0,0 +1,167 @@
+"""
+In-process researcher name -> researcher_id index.
+
+Name resolution is the first hop of every orchestrated request, so the tools
+answer it from memory instead of a Spanner query per name. The index is
+loaded once, then kept current by reading only researchers whose
+create_time is past the newest one already indexed. A periodic full reload
+picks up renames and deletes, which create_time does not track.
+
+Lookups ignore case and surrounding/repeated whitespace.
+"""
+
+import os
+import re
+import threading
+import time
+
+from google.cloud.spanner_v1 import param_types
+
+# Seconds between incremental refreshes (new researchers)
+REFRESH_SECONDS = float(os.environ.get("NEUROHUB_NAME_INDEX_REFRESH", "30"))
+# Seconds between full reloads (renames and deletes)
+RELOAD_SECONDS = float(os.environ.get("NEUROHUB_NAME_INDEX_RELOAD", "600"))
+# Minimum seconds between refreshes triggered by unknown names
+MISS_REFRESH_SECONDS = 1.0
+
+_LOAD_SQL = """
+    SELECT researcher_id, name, create_time
+    FROM Researcher
+    WHERE create_time > @since
+    ORDER BY create_time, researcher_id
+"""
+
+_EPOCH = "1970-01-01T00:00:00Z"
+
+# Requests often drop the title: "Sarah Chen" for "Dr. Sarah Chen"
+_TITLE = re.compile(r"^(dr|prof|professor)\.?\s+")
+
+
+def normalize_name(name):
+    """Case- and whitespace-insensitive form of a researcher name."""
+    # lower() rather than casefold() to match Spanner's LOWER() in SQL lookups
+    return " ".join(name.split()).lower() if name else ""
+
+
+class ResearcherNameIndex:
+    """Thread-safe name -> researcher_id map over the Researcher table."""
+
+    def __init__(self, database, refresh_seconds=REFRESH_SECONDS, reload_seconds=RELOAD_SECONDS):
+        self._database = database
+        self._refresh_seconds = refresh_seconds
+        self._reload_seconds = reload_seconds
+        self._lock = threading.Lock()
+        self._ids = {}
+        self._names = {}
+        self._watermark = None
+        self._refreshed_at = float("-inf")
+        self._reloaded_at = float("-inf")
+
+    def _read_since(self, since):
+        with self._database.snapshot() as snapshot:
+            return list(snapshot.execute_sql(
+                _LOAD_SQL,
+                params={"since": since},
+                param_types={"since": param_types.TIMESTAMP},
+            ))
+
+    def _refresh_locked(self, full):
+        now = time.monotonic()
+        since = _EPOCH if full or self._watermark is None else self._watermark
+        rows = self._read_since(since)
+
+        ids, names = ({}, {}) if since == _EPOCH else (self._ids, self._names)
+        for researcher_id, name, create_time in rows:
+            # Duplicate names resolve to the earliest-created researcher
+            key = normalize_name(name)
+            if key and key not in ids:
+                ids[key] = researcher_id
+                names[key] = name
+            self._watermark = create_time
+        self._ids, self._names = ids, names
+        self._refreshed_at = now
+        if since == _EPOCH:
+            self._reloaded_at = now
+
+    def refresh(self, full=False):
+        """
+        Brings the index up to date: new researchers only, or everything when
+        full is set or nothing has been loaded yet.
+
+        Returns:
+            bool: False if the database could not be read; the previous
+            entries are kept in that case.
+        """
+        if not self._database:
+            return False
+        requested_at = time.monotonic()
+        with self._lock:
+            # Another thread refreshed while this one waited for the lock
+            if (self._reloaded_at if full else self._refreshed_at) >= requested_at:
+                return True
+            try:
+                self._refresh_locked(full)
+                return True
+            except Exception as e:
+                print(f"Researcher name index refresh failed: {e}")
+                return False
+
+    @property
+    def loaded(self):
+        """Whether a full load has succeeded."""
+        return self._reloaded_at > float("-inf")
+
+    def warm_in_background(self):
+        """Starts the initial load on a daemon thread so startup does not wait for it."""
+        threading.Thread(target=self.refresh, name="researcher-name-index", daemon=True).start()
+
+    def _refresh_if_stale(self):
+        now = time.monotonic()
+        if now - self._reloaded_at >= self._reload_seconds:
+            self.refresh(full=True)
+        elif now - self._refreshed_at >= self._refresh_seconds:
+            self.refresh()
+
+    def lookup(self, names):
+        """
+        Resolves researcher names to ids.
+
+        A name not in the index triggers one incremental refresh, so a
+        researcher added since the last refresh is still found.
+
+        Returns:
+            dict: Each input name -> researcher_id, or None if unknown.
+        """
+        self._refresh_if_stale()
+        ids = self._ids
+        if any(normalize_name(name) not in ids for name in names):
+            if time.monotonic() - self._refreshed_at >= MISS_REFRESH_SECONDS:
+                self.refresh()
+            ids = self._ids
+        return {name: ids.get(normalize_name(name)) for name in names}
+
+    def find_in_text(self, text):
+        """
+        Returns the names of indexed researchers mentioned in free text,
+        e.g. a user request, in order of first mention.
+        """
+        self._refresh_if_stale()
+        text = normalize_name(text)
+        matches = []
+        for key, name in list(self._names.items()):
+            untitled = _TITLE.sub("", key)
+            match = re.search(rf"(?<!\w)(?:{re.escape(key)}|{re.escape(untitled)})(?!\w)", text)
+            if match:
+                matches.append((match.start(), match.end(), name))
+
+        # Longest match wins where names overlap: "raj patel" is not also "Dr. Raj"
+        found = []
+        for start, end, name in sorted(matches, key=lambda m: m[0] - m[1]):
+            if all(end <= other_start or start >= other_end for other_start, other_end, _ in found):
+                found.append((start, end, name))
+        return [name for _, _, name in sorted(found)]
+
+    def all_names(self):
+        """Returns the names of all indexed researchers."""
+        self._refresh_if_stale()
+        return sorted(self._names.values())
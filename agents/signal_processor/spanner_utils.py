@@ -3,47 +3,29 @@
 import os
 from dotenv import load_dotenv
 import traceback
-from datetime import datetime, timezone
 import json # For example usage printing
 
-from google.cloud import spanner
 from google.cloud.spanner_v1 import param_types
 from google.api_core import exceptions
 
 load_dotenv()
-# --- Spanner Configuration ---
-INSTANCE_ID = os.environ.get("SPANNER_INSTANCE_ID", "neurohub-graph-instance")
-DATABASE_ID = os.environ.get("SPANNER_DATABASE_ID", "neurohub-db")
-PROJECT_ID = os.environ.get("GOOGLE_CLOUD_PROJECT")
+# The pool is read from the environment on import, after .env is loaded.
+# The web app uses the same module, so both images share one pool
+# implementation and one set of SPANNER_POOL_* settings.
+from neurohub_common.spanner_pool import (  # noqa: E402
+    DATABASE_ID, INSTANCE_ID, POOL_SIZE, PROJECT_ID, get_database
+)
+# Rows and cursors are built by the same code as in the web app, so a cursor
+# from either service means the same position.
+from neurohub_common.rows import build_row_decoder  # noqa: E402
 
 if not PROJECT_ID:
     print("Warning: GOOGLE_CLOUD_PROJECT environment variable not set.")
 
+
 # --- Spanner Client Initialization ---
-db_instance = None
-spanner_client = None
-try:
-    if PROJECT_ID:
-        spanner_client = spanner.Client(project=PROJECT_ID)
-        instance = spanner_client.instance(INSTANCE_ID)
-        database = instance.database(DATABASE_ID)
-        print(f"Attempting to connect to Spanner: {instance.name}/databases/{database.name}")
-
-        if not database.exists():
-             print(f"Error: Database '{database.name}' does not exist in instance '{instance.name}'.")
-             db_instance = None
-        else:
-            print("Spanner database connection check successful.")
-            db_instance = database
-    else:
-        print("Skipping Spanner client initialization due to missing GOOGLE_CLOUD_PROJECT.")
-
-except exceptions.NotFound:
-    print(f"Error: Spanner instance '{INSTANCE_ID}' not found in project '{PROJECT_ID}'.")
-    db_instance = None
-except Exception as e:
-    print(f"An unexpected error occurred during Spanner initialization: {e}")
-    db_instance = None
+db_instance = get_database()
+
 
 def run_sql_query(sql, params=None, param_types=None, expected_fields=None):
     """
@@ -71,11 +53,14 @@ def run_sql_query(sql, params=None, param_types=None, expected_fields=None):
                  print("Error: expected_fields must be provided to run_sql_query.")
                  return None
 
+            decode_row = None
             for row in results:
                 if len(field_names) != len(row):
                      print(f"Warning: Mismatch between field names ({len(field_names)}) and row values ({len(row)}). Skipping row: {row}")
                      continue
-                results_list.append(dict(zip(field_names, row)))
+                if decode_row is None:
+                    decode_row = build_row_decoder(results.fields, field_names=field_names)
+                results_list.append(decode_row(row))
 
     except (exceptions.NotFound, exceptions.PermissionDenied, exceptions.InvalidArgument) as spanner_err:
         print(f"Spanner SQL Query Error ({type(spanner_err).__name__}): {spanner_err}")
@@ -114,11 +99,14 @@ def run_graph_query( graph_sql, params=None, param_types=None, expected_fields=N
                  print("Error: expected_fields must be provided to run_graph_query.")
                  return None
 
+            decode_row = None
             for row in results:
                 if len(field_names) != len(row):
                      print(f"Warning: Mismatch between field names ({len(field_names)}) and row values ({len(row)}). Skipping row: {row}")
                      continue
-                results_list.append(dict(zip(field_names, row)))
+                if decode_row is None:
+                    decode_row = build_row_decoder(results.fields, field_names=field_names)
+                results_list.append(decode_row(row))
 
     except (exceptions.NotFound, exceptions.PermissionDenied, exceptions.InvalidArgument) as spanner_err:
         print(f"Spanner Graph Query Error ({type(spanner_err).__name__}): {spanner_err}")
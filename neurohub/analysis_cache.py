@@ -0,0 +1,261 @@
+# analysis_cache.py - Content-addressed cache of signal analysis results
+#
+# An analysis is a pure function of the recording's bytes and the analysis
+# parameters, so its results are stored under
+#
+#   sha256(signal_id, file checksum, analysis_type, engine version,
+#          canonicalized parameters)
+#
+# Parameters are canonicalized before hashing: defaults are filled in,
+# numbers become floats and keys are sorted, so {"low_hz": 1} and
+# {"high_hz": 45.0, "low_hz": 1.0} share an entry. A changed recording gets a
+# new checksum and therefore new keys; nothing needs invalidating.
+#
+# Entries are JSON files under NEUROHUB_ANALYSIS_CACHE_DIR. Reads refresh an
+# entry's mtime and the least recently used entries are deleted once the
+# directory exceeds NEUROHUB_ANALYSIS_CACHE_MAX_BYTES. Writes are atomic
+# renames, so the batch runner's worker processes can share the directory.
+#
+# The key is also stored in Analysis.parameters ("cache_key"), so a node
+# whose disk cache misses can still find the results in Spanner
+# (db_neurohub.get_analysis_results_by_cache_key).
+#
+# File checksums are memoized by (path, size, mtime), so only the first
+# analysis of a recording reads it in full for hashing.
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+from signal_analysis import (
+    ANALYSIS_TYPE, ANALYSIS_VERSION, CHUNK_SECONDS, DEFAULT_HIGH_HZ, DEFAULT_LOW_HZ, analyze_file
+)
+from signal_io import resolve_signal_path
+
+CACHE_DIR = os.environ.get("NEUROHUB_ANALYSIS_CACHE_DIR",
+                           os.path.join(tempfile.gettempdir(), "neurohub-analysis-cache"))
+CACHE_MAX_BYTES = int(os.environ.get("NEUROHUB_ANALYSIS_CACHE_MAX_BYTES", str(1024 ** 3)))
+# Eviction deletes down to this fraction of the limit, so it does not run on every write
+EVICT_TO_FRACTION = 0.9
+CHECKSUM_BLOCK_BYTES = 8 * 1024 * 1024
+
+# Parameters of signal_analysis.iter_analysis() and their defaults
+ANALYSIS_DEFAULTS = {
+    "low_hz": DEFAULT_LOW_HZ,
+    "high_hz": DEFAULT_HIGH_HZ,
+    "channels": None,
+    "chunk_seconds": CHUNK_SECONDS,
+    "artifact_threshold": None,
+}
+
+_checksums = {}
+_checksums_lock = threading.Lock()
+
+
+def _hash(value):
+    return hashlib.sha256(value.encode("utf-8")).hexdigest()
+
+
+def _canonical(value):
+    if isinstance(value, bool) or value is None or isinstance(value, str):
+        return value
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, dict):
+        return {str(key): _canonical(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(item) for item in value]
+    return str(value)
+
+
+def canonical_parameters(options, sampling_rate=None):
+    """
+    The full, normalized parameter set of an analysis.
+
+    sampling_rate is the SignalData value used when the recording does not
+    declare its own; it changes the results, so it is part of the key.
+    """
+    parameters = dict(ANALYSIS_DEFAULTS, **options)
+    parameters["sampling_rate"] = sampling_rate
+    return _canonical(parameters)
+
+
+def cache_key(signal_id, checksum, parameters, analysis_type=ANALYSIS_TYPE):
+    """Hex key of an analysis result."""
+    return _hash(json.dumps(
+        [signal_id, checksum, analysis_type, ANALYSIS_VERSION, parameters],
+        sort_keys=True, separators=(",", ":"),
+    ))
+
+
+def file_checksum(path, directory=None):
+    """
+    "sha256:<hex>" of a file, memoized in memory and on disk by (path, size, mtime).
+    """
+    stat = os.stat(path)
+    stamp = (os.path.realpath(path), stat.st_size, stat.st_mtime_ns)
+    with _checksums_lock:
+        checksum = _checksums.get(stamp)
+    if checksum:
+        return checksum
+
+    memo_path = os.path.join(directory or CACHE_DIR, "checksums", _hash(json.dumps(stamp)) + ".txt")
+    try:
+        with open(memo_path, "r", encoding="utf-8") as f:
+            checksum = f.read().strip()
+    except OSError:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(CHECKSUM_BLOCK_BYTES), b""):
+                digest.update(block)
+        checksum = f"sha256:{digest.hexdigest()}"
+        _write_atomic(memo_path, checksum)
+
+    with _checksums_lock:
+        _checksums[stamp] = checksum
+    return checksum
+
+
+def _write_atomic(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+
+class AnalysisCache:
+    """Size-bounded directory of JSON results, least recently used first out."""
+
+    def __init__(self, directory=None, max_bytes=None):
+        self.directory = directory or CACHE_DIR
+        self.max_bytes = CACHE_MAX_BYTES if max_bytes is None else max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._size = None
+
+    def _path(self, key):
+        return os.path.join(self.directory, "results", key[:2], key + ".json")
+
+    def get(self, key):
+        """Returns the cached results for a key, or None."""
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                results = json.load(f)
+            os.utime(path)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return results
+
+    def put(self, key, results):
+        """Stores results, evicting old entries if the cache grew past its limit."""
+        text = json.dumps(results, sort_keys=True)
+        _write_atomic(self._path(key), text)
+        with self._lock:
+            if self._size is None:
+                self._size = sum(size for _, _, size in self._entries())
+            else:
+                self._size += len(text)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _entries(self):
+        root = os.path.join(self.directory, "results")
+        if not os.path.isdir(root):
+            return
+        for shard in os.scandir(root):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue  # Evicted by another process
+                yield stat.st_mtime, entry.path, stat.st_size
+
+    def _evict(self):
+        # Other processes write here too: recount from disk rather than trust _size
+        entries = sorted(self._entries())
+        size = sum(entry[2] for entry in entries)
+        target = self.max_bytes * EVICT_TO_FRACTION
+        for _, path, entry_size in entries:
+            if size <= target:
+                break
+            try:
+                os.remove(path)
+                self.evictions += 1
+            except OSError:
+                pass
+            size -= entry_size
+        self._size = size
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "max_bytes": self.max_bytes, "directory": self.directory}
+
+
+_default_cache = None
+
+
+def get_cache():
+    """Returns the process-wide cache over CACHE_DIR."""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = AnalysisCache()
+    return _default_cache
+
+
+def analysis_key(signal_id, file_path, sampling_rate=None, analysis_type=ANALYSIS_TYPE, **options):
+    """
+    Computes the cache key of an analysis of a recording.
+
+    Returns:
+        dict: {"cache_key", "file_checksum", "parameters"}
+    """
+    checksum = file_checksum(resolve_signal_path(file_path))
+    parameters = canonical_parameters(options, sampling_rate)
+    return {
+        "cache_key": cache_key(signal_id, checksum, parameters, analysis_type),
+        "file_checksum": checksum,
+        "parameters": parameters,
+    }
+
+
+def analyze_file_cached(signal_id, file_path, sampling_rate=None, known_keys=(), cache=None, **options):
+    """
+    signal_analysis.analyze_file() through the cache.
+
+    Args:
+        known_keys: Cache keys already stored in Spanner for this signal; a
+            match returns without results so the caller does not store the
+            same analysis twice.
+
+    Returns:
+        dict: analysis_key() plus "results" (None when the key is in
+        known_keys) and "cached" (True if nothing was computed).
+    """
+    cache = cache or get_cache()
+    entry = analysis_key(signal_id, file_path, sampling_rate, **options)
+    if entry["cache_key"] in known_keys:
+        return dict(entry, results=None, cached=True)
+
+    results = cache.get(entry["cache_key"])
+    cached = results is not None
+    if not cached:
+        results = analyze_file(file_path, sampling_rate, **options)
+        cache.put(entry["cache_key"], results)
+    return dict(entry, results=results, cached=cached)
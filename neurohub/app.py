@@ -1,23 +1,39 @@
 import os
+from contextlib import ExitStack
 from datetime import datetime, timezone
 from dotenv import load_dotenv
-from flask import Flask, render_template, abort, flash, request, jsonify, Response, stream_with_context
+from flask import Flask, render_template, abort, flash, request, jsonify, Response, stream_with_context, g, redirect, url_for
 from google.cloud import spanner
 from google.cloud.spanner_v1 import param_types
 from google.api_core import exceptions
 import humanize 
+import numpy as np
 import uuid
 import traceback
 from actual_ai_integration import stream_ai_response_sync
 from dateutil import parser 
 from neurohub_routes import ally_bp
+from neurohub_common.pagination import InvalidCursor
+from record_writes import WriteError, create_analyses, create_experiments, create_sessions
+from batch_analysis import batch_options, get_batch_job, start_batch_job
+from bulk_import import DEFAULT_WORKERS, IMPORT_FORMATS, IMPORT_TABLES, import_request_stream
+from experiment_export import EXPORT_FORMATS, EXPORT_TABLES, ExportUnavailable, iter_export
+from signal_ingest import RECORDING_STATUS, IngestBusy, IngestError, ingest_frames, start_signal
+from signal_io import SignalFormatError, open_signal
+from signal_pyramid import read_window
 from db_neurohub import (
     db,
+    READ_STALENESS_SECONDS,
+    TIMESTAMP_FORMATS,
+    read_snapshot,
+    shared_read_timestamp,
     get_all_researchers,
     get_experiments_by_researcher,
+    get_researcher_stats,
     get_experiment_details,
     get_recent_analyses,
     get_researcher_collaborations,
+    get_signal_data,
     get_signal_data_by_experiment
 )
 try:
@@ -40,6 +56,8 @@ APP_HOST = os.environ.get("APP_HOST", "0.0.0.0")
 APP_PORT = os.environ.get("APP_PORT", "8080")
 GOOGLE_MAPS_API_KEY = os.environ.get("GOOGLE_MAPS_API_KEY")
 GOOGLE_MAPS_MAP_KEY = os.environ.get('GOOGLE_MAPS_MAP_ID')
+RESEARCHERS_PAGE_SIZE = 100
+API_MAX_PAGE_SIZE = 100
 
 if not PROJECT_ID:
     print("Warning: GOOGLE_CLOUD_PROJECT environment variable not set.")
@@ -59,6 +77,32 @@ def humanize_datetime(dt):
         dt = dt.replace(tzinfo=timezone.utc)
     return humanize.naturaltime(dt)
 
+# --- Request-scoped Read Snapshot ---
+def request_snapshot():
+    """
+    Returns a multi-use read-only snapshot shared by every read in this request.
+
+    The snapshot is opened on first use at shared_read_timestamp() (at least
+    NEUROHUB_READ_STALENESS_SECONDS old, rounded so that nearby requests can
+    share cached results) and released when the request ends.
+    """
+    if 'read_snapshot' not in g:
+        stack = ExitStack()
+        read_timestamp = shared_read_timestamp()
+        g.read_snapshot = stack.enter_context(
+            read_snapshot(db, read_timestamp=read_timestamp) if read_timestamp
+            else read_snapshot(db, exact_staleness=READ_STALENESS_SECONDS)
+        )
+        g.read_snapshot_stack = stack
+    return g.read_snapshot
+
+@app.teardown_request
+def close_request_snapshot(exc):
+    stack = g.pop('read_snapshot_stack', None)
+    g.pop('read_snapshot', None)
+    if stack is not None:
+        stack.close()
+
 # --- Routes ---
 @app.route('/')
 def home():
@@ -84,13 +128,14 @@ def experiment_detail(experiment_id):
         abort(503)
     
     try:
-        # Get experiment details
-        experiment = get_experiment_details(db, experiment_id)
+        # Get experiment details, devices, sessions and signal data in one query
+        experiment = get_experiment_details(
+            db, experiment_id, include_signals=True, snapshot=request_snapshot()
+        )
         if not experiment:
             abort(404)
         
-        # Get signal data for this experiment
-        signal_data = get_signal_data_by_experiment(db, experiment_id)
+        signal_data = experiment.get('signal_data')
         
         return render_template(
             'experiment.html',
@@ -111,8 +156,17 @@ def researchers():
     
     try:
         # Try enhanced version first for better stats
-        researchers_list = get_all_researchers_with_stats(db, limit=100)
-        return render_template('researchers.html', researchers=researchers_list or [])
+        researchers_page = get_all_researchers_with_stats(
+            db, limit=RESEARCHERS_PAGE_SIZE, cursor=request.args.get('cursor'), snapshot=request_snapshot()
+        )
+        return render_template(
+            'researchers.html',
+            researchers=researchers_page or [],
+            next_cursor=getattr(researchers_page, 'next_cursor', None)
+        )
+    except InvalidCursor:
+        flash("Invalid page link; showing the first page of researchers.", "warning")
+        return redirect(url_for('researchers'))
     except Exception as e:
         flash(f"Failed to load researchers: {e}", "danger")
         return render_template('researchers.html', researchers=[])
@@ -136,14 +190,18 @@ def researcher_profile(researcher_id):
             'bio': 'Leading researcher in neurotechnology'
         }
         
+        # Both reads share one snapshot, so the page is read-consistent
+        snapshot = request_snapshot()
+        
         # Get researcher's experiments
-        experiments = get_experiments_by_researcher(db, researcher_id)
+        experiments = get_experiments_by_researcher(db, researcher_id, snapshot=snapshot)
         
         # Get collaborations
-        collaborators = get_researcher_collaborations(db, researcher_id)
+        collaborators = get_researcher_collaborations(db, researcher_id, snapshot=snapshot)
         
-        # Calculate stats
-        total_sessions = 0  # TODO: Add function to calculate this
+        # Materialized counters: a single primary-key read
+        stats = get_researcher_stats(db, researcher_id, snapshot=snapshot) or {}
+        total_sessions = stats.get('total_sessions', 0)
         publications = []  # TODO: Add publications table/function
         recent_activity = []  # TODO: Add activity tracking function
         
@@ -175,53 +233,308 @@ def devices():
     return render_template('devices.html')
 
 # --- API Routes for NeuroHub ---
-@app.route('/api/experiments', methods=['POST'])
-def create_experiment():
+def _api_page_size(default):
+    """Reads ?limit= for list APIs, clamped to 1..API_MAX_PAGE_SIZE."""
+    limit = request.args.get('limit', default, type=int)
+    return max(1, min(limit, API_MAX_PAGE_SIZE))
+
+def _api_page(fetch, *args, default_limit=50, has_timestamps=True):
     """
-    API endpoint to create a new experiment.
-    Expects JSON body with experiment details.
+    Runs a paginated fetcher with ?limit= and ?cursor= from the request.
+
+    ?timestamps=epoch_ms returns TIMESTAMP columns as milliseconds since the
+    epoch instead of ISO strings; the conversion happens while rows are decoded.
+
+    Returns a JSON response {"items": [...], "next_cursor": ...}; clients pass
+    next_cursor back as ?cursor= until it is null.
     """
     if not db:
         return jsonify({"error": "Database connection not available"}), 503
-    
-    data = request.get_json()
+
+    options = {}
+    if has_timestamps:
+        timestamp_format = request.args.get('timestamps', 'iso')
+        if timestamp_format not in TIMESTAMP_FORMATS:
+            return jsonify({"error": f"timestamps must be one of {', '.join(TIMESTAMP_FORMATS)}"}), 400
+        options['timestamp_format'] = timestamp_format
+    try:
+        page = fetch(db, *args, limit=_api_page_size(default_limit),
+                     cursor=request.args.get('cursor'), snapshot=request_snapshot(), **options)
+    except InvalidCursor as e:
+        return jsonify({"error": str(e)}), 400
+    if page is None:
+        return jsonify({"error": "Failed to load data"}), 500
+    return jsonify(page.to_dict())
+
+@app.route('/api/researchers', methods=['GET'])
+def list_researchers():
+    """API endpoint listing researchers with their statistics, one page at a time."""
+    return _api_page(get_all_researchers_with_stats, has_timestamps=False)
+
+@app.route('/api/analyses', methods=['GET'])
+def list_analyses():
+    """API endpoint listing analyses, newest first, one page at a time."""
+    return _api_page(get_recent_analyses, default_limit=20)
+
+@app.route('/api/experiments/<experiment_id>/signals', methods=['GET'])
+def list_experiment_signals(experiment_id):
+    """API endpoint listing an experiment's signal data, newest first, one page at a time."""
+    return _api_page(get_signal_data_by_experiment, experiment_id)
+
+@app.route('/api/experiments/<experiment_id>/export', methods=['GET'])
+def export_experiment(experiment_id):
+    """
+    API endpoint streaming one table of an experiment as Arrow, Parquet or NDJSON.
+
+    Query parameters: table (signals, sessions, analyses), format (arrow,
+    parquet, ndjson), include_raw_data (adds recording file paths) and
+    workers (reads partitions in parallel; rows are then unordered).
+    """
+    if not db:
+        return jsonify({"error": "Database connection not available"}), 503
+
+    table = request.args.get('table', 'signals')
+    export_format = request.args.get('format', 'parquet')
+    if table not in EXPORT_TABLES:
+        return jsonify({"error": f"table must be one of {', '.join(EXPORT_TABLES)}"}), 400
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({"error": f"format must be one of {', '.join(EXPORT_FORMATS)}"}), 400
+    include_raw_data = request.args.get('include_raw_data', 'false').lower() in ('1', 'true', 'yes')
+
+    try:
+        chunks = iter_export(db, experiment_id, table, export_format, include_raw_data=include_raw_data,
+                             workers=max(1, min(request.args.get('workers', 1, type=int), 32)))
+    except ExportUnavailable as e:
+        return jsonify({"error": str(e)}), 501
+
+    mimetype, extension = EXPORT_FORMATS[export_format]
+    return Response(stream_with_context(chunks), mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename="{experiment_id}_{table}.{extension}"',
+        'X-Accel-Buffering': 'no',
+    })
+
+@app.route('/api/import/<table>', methods=['POST'])
+def bulk_import_rows(table):
+    """
+    API endpoint for bulk imports of historical rows (see bulk_import.py).
+
+    The body is NDJSON (default) or CSV with a header row (?format=csv) and
+    is imported as it is read. Optional query parameters: workers and
+    reconcile=0 to skip the ResearcherStats reconcile. Returns the import
+    summary, including rows_per_second.
+    """
+    if not db:
+        return jsonify({"error": "Database connection not available"}), 503
+    if table not in IMPORT_TABLES:
+        return jsonify({"error": f"Unknown table {table}; expected one of {', '.join(IMPORT_TABLES)}"}), 400
+    input_format = request.args.get('format', 'ndjson')
+    if input_format not in IMPORT_FORMATS:
+        return jsonify({"error": f"Unknown format {input_format}; expected one of {', '.join(IMPORT_FORMATS)}"}), 400
+
+    try:
+        summary = import_request_stream(
+            db, table, request.stream, input_format,
+            workers=max(1, min(request.args.get('workers', DEFAULT_WORKERS, type=int), 32)),
+            reconcile_stats=request.args.get('reconcile', '1') not in ('0', 'false', 'no'),
+        )
+    except UnicodeDecodeError as e:
+        return jsonify({"error": f"Body is not UTF-8: {e}"}), 400
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({"error": f"Import failed: {e}"}), 500
+    return jsonify(summary)
+
+@app.route('/api/signals/ingest', methods=['POST'])
+def start_signal_ingest():
+    """
+    API endpoint opening a live recording (see signal_ingest.py).
+
+    Expects JSON with session_id, device_id, signal_type, sampling_rate and
+    channels; optional dtype, channel_names, scale, units, experiment_id
+    (rejected unless it is the session's experiment) and clip_limits ([low,
+    high] converter range in raw sample units, which enables the clipping
+    flag for float samples).
+    """
+    if not db:
+        return jsonify({"error": "Database connection not available"}), 503
+
+    data = request.get_json(silent=True)
     if not data:
         return jsonify({"error": "Invalid JSON payload"}), 400
-    
-    # TODO: Implement experiment creation
-    return jsonify({"message": "Experiment creation endpoint - to be implemented"}), 501
+    missing = [key for key in ('session_id', 'device_id', 'signal_type', 'sampling_rate', 'channels') if key not in data]
+    if missing:
+        return jsonify({"error": f"Missing fields: {', '.join(missing)}"}), 400
+
+    options = {key: data[key] for key in ('dtype', 'channel_names', 'scale', 'units', 'experiment_id', 'clip_limits')
+               if key in data}
+    try:
+        signal = start_signal(db, data['session_id'], data['device_id'], data['signal_type'],
+                              data['sampling_rate'], data['channels'], **options)
+    except (IngestError, TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({"error": f"Failed to start signal: {e}"}), 500
+    signal['frames_url'] = url_for('ingest_signal_frames', signal_id=signal['signal_id'])
+    return jsonify(signal), 201
+
+@app.route('/api/signals/<signal_id>/frames', methods=['POST'])
+def ingest_signal_frames(signal_id):
+    """
+    API endpoint appending binary sample frames to a live recording.
+
+    The body is read frame by frame as it arrives, so it can be a chunked
+    upload lasting the whole session. ?close=1 ends the recording after the
+    body (which may be empty).
+    """
+    if not db:
+        return jsonify({"error": "Database connection not available"}), 503
+
+    close = request.args.get('close', 'false').lower() in ('1', 'true', 'yes')
+    try:
+        result = ingest_frames(db, signal_id, request.stream, close=close)
+    except KeyError:
+        return jsonify({"error": f"Signal {signal_id} not found"}), 404
+    except IngestBusy:
+        return jsonify({"error": f"Signal {signal_id} is already receiving frames"}), 409
+    except IngestError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(result)
+
+@app.route('/api/signals/<signal_id>/plot', methods=['GET'])
+def plot_signal(signal_id):
+    """
+    API endpoint returning plot data for a time window of a recording.
+
+    Query parameters: start and end (seconds), width (pixels), channels
+    (comma-separated names) and format ("json" or "f32"). Points come from
+    the recording's min/max pyramid level matching width (see
+    signal_pyramid.py), or from the raw samples while the pyramid is being
+    built; "f32" returns the raw little-endian float32 array (channels x
+    points x [min, max]) with the metadata in X-Plot-* headers.
+    """
+    if not db:
+        return jsonify({"error": "Database connection not available"}), 503
+
+    signal_row = get_signal_data(db, signal_id, snapshot=request_snapshot())
+    if not signal_row:
+        return jsonify({"error": f"Signal {signal_id} not found"}), 404
+
+    channels = request.args.get('channels')
+    try:
+        with open_signal(signal_row['file_path'], sampling_rate=signal_row.get('sampling_rate')) as recording:
+            window = read_window(
+                recording,
+                start_seconds=request.args.get('start', 0.0, type=float),
+                end_seconds=request.args.get('end', None, type=float),
+                width=request.args.get('width', 1000, type=int),
+                channels=channels.split(',') if channels else None,
+                # A recording still being written changes with every frame
+                build=signal_row.get('processing_status') != RECORDING_STATUS,
+            )
+    except FileNotFoundError as e:
+        return jsonify({"error": str(e)}), 404
+    except (SignalFormatError, KeyError, IndexError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    except OSError as e:
+        print(f"Error reading signal {signal_id}: {e}")
+        return jsonify({"error": f"Signal storage unavailable: {e}"}), 503
+
+    if request.args.get('format') == 'f32':
+        data = np.stack([window['min'], window['max']], axis=-1).astype('<f4')
+        return Response(data.tobytes(), mimetype='application/octet-stream', headers={
+            'X-Plot-Level': str(window['level']),
+            'X-Plot-Start-Seconds': repr(window['start_seconds']),
+            'X-Plot-Bucket-Seconds': repr(window['bucket_seconds']),
+            'X-Plot-Shape': ','.join(str(n) for n in data.shape),
+            'X-Plot-Channels': ','.join(window['channels']),
+            'X-Plot-Approximate': '1' if window['approximate'] else '0',
+        })
+    window['min'] = window['min'].tolist()
+    window['max'] = window['max'].tolist()
+    return jsonify(window)
+
+@app.route('/api/experiments/<experiment_id>/analyze', methods=['POST'])
+def analyze_experiment_signals(experiment_id):
+    """
+    API endpoint starting a batch analysis of an experiment's signals.
+
+    Optional JSON body: statuses (list), researcher_id, limit, workers,
+    low_hz, high_hz; see batch_analysis.batch_options (400 when invalid).
+    Returns 202 with the job; poll /api/analysis-jobs/<job_id>.
+    """
+    if not db:
+        return jsonify({"error": "Database connection not available"}), 503
+
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict):
+        return jsonify({"error": "Invalid JSON payload"}), 400
+    try:
+        options = batch_options(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    job = start_batch_job(db, experiment_id, **options)
+    if job is None:
+        return jsonify({"error": f"A batch analysis of experiment {experiment_id} is already running"}), 409
+    return jsonify(job), 202
+
+@app.route('/api/analysis-jobs/<job_id>', methods=['GET'])
+def get_analysis_job(job_id):
+    """API endpoint reporting the progress and summary of a batch analysis job."""
+    job = get_batch_job(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
+
+def _create_records(create, payload, id_field):
+    """Runs a record_writes creator and shapes its response (one record or an array)."""
+    if not payload:
+        return jsonify({"error": "Invalid JSON payload"}), 400
+    try:
+        created = create(db, payload)
+    except WriteError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({"error": f"Failed to create records: {e}"}), 500
+
+    if isinstance(payload, list):
+        return jsonify({"created": len(created), f"{id_field}s": created}), 201
+    record = created[0] if isinstance(created[0], dict) else {id_field: created[0]}
+    return jsonify(record), 201
+
+@app.route('/api/experiments', methods=['POST'])
+def create_experiment():
+    """
+    API endpoint to create experiments.
+    Expects a JSON object, or an array of them, with experiment_name and
+    principal_investigator_name (or _id); see record_writes.create_experiments.
+    """
+    if not db:
+        return jsonify({"error": "Database connection not available"}), 503
+    return _create_records(create_experiments, request.get_json(silent=True), "experiment_id")
 
 @app.route('/api/analyses', methods=['POST'])
 def create_analysis():
     """
-    API endpoint to create a new analysis report.
-    Expects JSON body with analysis details.
+    API endpoint to create analysis reports.
+    Expects a JSON object, or an array of them, with signal_id, analysis_type
+    and researcher_name (or _id); see record_writes.create_analyses.
     """
     if not db:
         return jsonify({"error": "Database connection not available"}), 503
-    
-    data = request.get_json()
-    if not data:
-        return jsonify({"error": "Invalid JSON payload"}), 400
-    
-    # TODO: Implement analysis creation
-    return jsonify({"message": "Analysis creation endpoint - to be implemented"}), 501
+    return _create_records(create_analyses, request.get_json(silent=True), "analysis_id")
 
 @app.route('/api/sessions', methods=['POST'])
 def create_session():
     """
-    API endpoint to create a new experimental session.
-    Expects JSON body with session details.
+    API endpoint to create experimental sessions and their recorded signals.
+    Expects a JSON object, or an array of them, with experiment_id and
+    researcher_name (or _id); see record_writes.create_sessions.
     """
     if not db:
         return jsonify({"error": "Database connection not available"}), 503
-    
-    data = request.get_json()
-    if not data:
-        return jsonify({"error": "Invalid JSON payload"}), 400
-    
-    # TODO: Implement session creation
-    return jsonify({"message": "Session creation endpoint - to be implemented"}), 501
+    return _create_records(create_sessions, request.get_json(silent=True), "session")
 
 # --- Error Handlers ---
 @app.errorhandler(404)
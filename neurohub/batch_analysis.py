@@ -0,0 +1,381 @@
+#!/usr/bin/env python3
+"""
+Batch signal analysis: runs signal_analysis over many SignalData rows.
+
+Signals are selected by experiment and processing_status, analyzed in a
+process pool (one worker per core by default) and written back as Analysis
+rows. Each write batch also sets the analyzed signals' processing_status to
+"analyzed", in the same mutation group, so a signal is never marked analyzed
+without its Analysis row. Signals that fail to open or analyze are reported
+and keep their status, so the next run retries them.
+
+Results go through analysis_cache.py: a signal whose recording and
+parameters were analyzed before is not recomputed, and when its Analysis row
+already exists (same cache_key) only the status is updated.
+
+Workers are spawned through batch_worker.process_executor(). Their tasks
+need only analysis_cache, signal_io and signal_analysis, and this module
+does not import db_neurohub (which connects on import) at module level, so
+workers never open a Spanner session.
+
+Usage:
+    python batch_analysis.py EXPERIMENT_ID                   # raw, filtered and processed signals
+    python batch_analysis.py EXPERIMENT_ID --status analyzed # reanalyze
+    python batch_analysis.py EXPERIMENT_ID --workers 4 --dry-run
+"""
+
+import argparse
+import json
+import math
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import as_completed
+from datetime import datetime, timezone
+
+from google.cloud import spanner
+from google.cloud.spanner_v1 import param_types
+
+from analysis_cache import analyze_file_cached
+from batch_worker import process_executor
+from query_cache import invalidate_tables
+from signal_analysis import ANALYSIS_TYPE, DEFAULT_HIGH_HZ, DEFAULT_LOW_HZ
+
+ANALYZED_STATUS = "analyzed"
+DEFAULT_STATUSES = ("raw", "filtered", "processed")
+WRITE_BATCH_ROWS = 200
+ANALYSIS_COLUMNS = ("analysis_id", "signal_id", "researcher_id", "analysis_type", "parameters", "results",
+                    "findings", "confidence_score", "analyzed_at", "create_time")
+
+# SNR (dB) at which the confidence score stops increasing
+CONFIDENT_SNR_DB = 20.0
+
+SELECT_SIGNALS_SQL = """
+    SELECT
+        s.signal_id,
+        s.file_path,
+        s.sampling_rate,
+        e.principal_investigator_id,
+        ARRAY(
+            SELECT JSON_VALUE(a.parameters, '$.cache_key')
+            FROM Analysis a
+            WHERE a.signal_id = s.signal_id AND JSON_VALUE(a.parameters, '$.cache_key') IS NOT NULL
+        ) AS cache_keys
+    FROM SignalData s
+    JOIN Experiment e ON e.experiment_id = s.experiment_id
+    WHERE s.experiment_id = @experiment_id
+      AND s.processing_status IN UNNEST(@statuses)
+    ORDER BY s.signal_id
+"""
+
+
+def select_signals(db_instance, experiment_id, statuses=DEFAULT_STATUSES, limit=None):
+    """
+    Lists the experiment's signals in the given processing statuses.
+
+    Returns:
+        list[dict]: signal_id, file_path, sampling_rate,
+        principal_investigator_id and the cache_keys of the signal's stored
+        analyses.
+    """
+    sql = SELECT_SIGNALS_SQL
+    params = {"experiment_id": experiment_id, "statuses": list(statuses)}
+    types = {"experiment_id": param_types.STRING, "statuses": param_types.Array(param_types.STRING)}
+    if limit is not None:
+        sql += "LIMIT @limit"
+        params["limit"] = limit
+        types["limit"] = param_types.INT64
+
+    columns = ("signal_id", "file_path", "sampling_rate", "principal_investigator_id", "cache_keys")
+    with db_instance.snapshot() as snapshot:
+        return [dict(zip(columns, row)) for row in snapshot.execute_sql(sql, params=params, param_types=types)]
+
+
+def confidence_score(results):
+    """
+    0-1 confidence of an analysis: the share of artifact-free epochs, scaled
+    down for SNR below CONFIDENT_SNR_DB.
+    """
+    snr = results.get("snr")
+    snr_factor = min(max(snr / CONFIDENT_SNR_DB, 0.0), 1.0) if snr is not None else 0.0
+    return round(snr_factor * (1.0 - (results.get("artifact_fraction") or 0.0)), 3)
+
+
+def analysis_row(signal, analysis, researcher_id=None):
+    """
+    Builds the Analysis row values (in ANALYSIS_COLUMNS order) from an
+    analysis_cache.analyze_file_cached() result.
+    """
+    results = analysis["results"]
+    parameters = dict(analysis["parameters"], filter=results.get("filter"), engine="signal_analysis",
+                      cache_key=analysis["cache_key"], file_checksum=analysis["file_checksum"])
+    findings = ". ".join([results["summary"]] + results.get("recommendations", [])) + "."
+    return (
+        str(uuid.uuid4()),
+        signal["signal_id"],
+        researcher_id or signal["principal_investigator_id"],
+        ANALYSIS_TYPE,
+        json.dumps(parameters),
+        json.dumps(results),
+        findings,
+        confidence_score(results),
+        datetime.now(timezone.utc),
+        spanner.COMMIT_TIMESTAMP,
+    )
+
+
+def write_analyses(db_instance, rows, signal_ids):
+    """Inserts Analysis rows and marks signals analyzed in one batch."""
+    with db_instance.batch() as batch:
+        if rows:
+            batch.insert(table="Analysis", columns=ANALYSIS_COLUMNS, values=rows)
+        if signal_ids:
+            batch.update(
+                table="SignalData",
+                columns=("signal_id", "processing_status"),
+                values=[(signal_id, ANALYZED_STATUS) for signal_id in signal_ids],
+            )
+
+
+def record_analysis(db_instance, signal, analysis, researcher_id=None):
+    """
+    Stores one analysis computed outside run_batch() (the streaming analysis
+    route) as an Analysis row carrying its cache_key, so other nodes find it
+    in Spanner instead of recomputing it.
+
+    Args:
+        signal (dict): The SignalData row (signal_id, experiment_id,
+            processing_status).
+        analysis (dict): analysis_cache.analysis_key() plus "results".
+        researcher_id (str, optional): Defaults to the experiment's
+            principal investigator.
+    """
+    if researcher_id is None:
+        with db_instance.snapshot() as snapshot:
+            rows = list(snapshot.execute_sql(
+                "SELECT principal_investigator_id FROM Experiment WHERE experiment_id = @experiment_id",
+                params={"experiment_id": signal["experiment_id"]},
+                param_types={"experiment_id": param_types.STRING},
+            ))
+        if not rows:
+            raise ValueError(f"Experiment {signal['experiment_id']} not found")
+        researcher_id = rows[0][0]
+
+    # Only statuses a batch would select move to "analyzed"; a recording
+    # still being written keeps its status
+    signal_ids = [signal["signal_id"]] if signal.get("processing_status") in DEFAULT_STATUSES else []
+    write_analyses(db_instance, [analysis_row(signal, analysis, researcher_id)], signal_ids)
+    invalidate_tables("Analysis", "SignalData")
+
+
+def run_batch(db_instance, experiment_id, statuses=DEFAULT_STATUSES, workers=None, researcher_id=None,
+              limit=None, dry_run=False, progress=None, **options):
+    """
+    Analyzes an experiment's signals in a process pool and stores the results.
+
+    Args:
+        db_instance: The Spanner database object.
+        experiment_id (str): Experiment whose signals are analyzed.
+        statuses (iterable): processing_status values to select.
+        workers (int, optional): Worker processes; defaults to the CPU count.
+        researcher_id (str, optional): Recorded on the Analysis rows; defaults
+            to each experiment's principal investigator.
+        limit (int, optional): Analyze at most this many signals.
+        dry_run (bool): Analyze but write nothing.
+        progress (callable, optional): Called with the summary dict after
+            each signal completes.
+        **options: Passed to signal_analysis.analyze_recording (low_hz,
+            high_hz, chunk_seconds, artifact_threshold).
+
+    Returns:
+        dict: {"experiment_id", "selected", "analyzed", "cached" (analyses
+        served from the cache or already stored), "written" (Analysis rows
+        written, or that would be on a dry run), "failed", "errors":
+        [{"signal_id", "error"}], "seconds"}
+    """
+    start_time = time.time()
+    options = {"low_hz": DEFAULT_LOW_HZ, "high_hz": DEFAULT_HIGH_HZ, **options}
+    signals = select_signals(db_instance, experiment_id, statuses, limit)
+    summary = {"experiment_id": experiment_id, "selected": len(signals), "analyzed": 0, "cached": 0,
+               "written": 0, "failed": 0, "errors": [], "seconds": 0.0}
+    if not signals:
+        return summary
+
+    pending = []
+    pending_ids = []
+
+    def flush():
+        if pending_ids and not dry_run:
+            write_analyses(db_instance, pending, pending_ids)
+        summary["written"] += len(pending)
+        pending.clear()
+        pending_ids.clear()
+
+    workers = min(workers or os.cpu_count() or 1, len(signals))
+    # Fresh interpreters; see the module docstring
+    with process_executor(workers) as executor:
+        futures = {
+            executor.submit(analyze_file_cached, signal["signal_id"], signal["file_path"], signal["sampling_rate"],
+                            known_keys=tuple(signal["cache_keys"] or ()), **options): signal
+            for signal in signals
+        }
+        try:
+            for future in as_completed(futures):
+                signal = futures[future]
+                try:
+                    analysis = future.result()
+                except Exception as e:
+                    summary["failed"] += 1
+                    summary["errors"].append({"signal_id": signal["signal_id"], "error": str(e)})
+                else:
+                    summary["analyzed"] += 1
+                    summary["cached"] += analysis["cached"]
+                    # No results: this exact analysis is already stored for the signal
+                    if analysis["results"] is not None:
+                        pending.append(analysis_row(signal, analysis, researcher_id))
+                    pending_ids.append(signal["signal_id"])
+                    if len(pending_ids) >= WRITE_BATCH_ROWS:
+                        flush()
+                if progress:
+                    progress(summary)
+            flush()
+        except BaseException:
+            # Drop queued analyses; batches written before the failure are kept
+            executor.shutdown(cancel_futures=True)
+            raise
+        finally:
+            if summary["analyzed"] and not dry_run:
+                invalidate_tables("Analysis", "SignalData")
+
+    summary["seconds"] = round(time.time() - start_time, 2)
+    return summary
+
+
+# --- Background Jobs (API) ---
+
+_jobs = {}
+_jobs_lock = threading.Lock()
+
+
+def _positive_int(data, key):
+    value = data.get(key)
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, int) or value < 1:
+        raise ValueError(f"{key} must be a positive integer")
+    return value
+
+
+def _cutoff_hz(data, key, default):
+    value = data.get(key)
+    if value is None:
+        return default
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value) or value <= 0:
+        raise ValueError(f"{key} must be a positive number")
+    return float(value)
+
+
+def batch_options(data):
+    """
+    Checks the options of a batch job request (a decoded JSON body).
+
+    Accepts statuses (list of strings), researcher_id (string), limit and
+    workers (positive integers; workers is capped at the CPU count, since
+    each is a spawned process) and low_hz/high_hz (positive numbers, low <
+    high). Missing options get run_batch()'s defaults.
+
+    Returns:
+        dict: Keyword arguments for start_batch_job().
+
+    Raises:
+        ValueError: If an option has the wrong type or is out of range.
+    """
+    statuses = data.get("statuses")
+    if statuses is None:
+        statuses = DEFAULT_STATUSES
+    elif (not isinstance(statuses, list) or not statuses
+          or not all(isinstance(status, str) and status for status in statuses)):
+        raise ValueError("statuses must be a non-empty list of strings")
+
+    researcher_id = data.get("researcher_id")
+    if researcher_id is not None and not isinstance(researcher_id, str):
+        raise ValueError("researcher_id must be a string")
+
+    workers = _positive_int(data, "workers")
+    if workers is not None:
+        workers = min(workers, os.cpu_count() or 1)
+
+    low_hz = _cutoff_hz(data, "low_hz", DEFAULT_LOW_HZ)
+    high_hz = _cutoff_hz(data, "high_hz", DEFAULT_HIGH_HZ)
+    if low_hz >= high_hz:
+        raise ValueError("low_hz must be below high_hz")
+
+    return {"statuses": tuple(statuses), "researcher_id": researcher_id, "limit": _positive_int(data, "limit"),
+            "workers": workers, "low_hz": low_hz, "high_hz": high_hz}
+
+
+def start_batch_job(db_instance, experiment_id, **kwargs):
+    """
+    Runs run_batch() on a background thread.
+
+    Returns:
+        dict or None: The new job, or None if a job for the experiment is
+        already running.
+    """
+    with _jobs_lock:
+        if any(job["experiment_id"] == experiment_id and job["status"] == "running" for job in _jobs.values()):
+            return None
+        job = {"job_id": str(uuid.uuid4()), "experiment_id": experiment_id, "status": "running",
+               "started_at": datetime.now(timezone.utc).isoformat(), "summary": None, "error": None}
+        _jobs[job["job_id"]] = job
+
+    def progress(summary):
+        job["summary"] = dict(summary, errors=list(summary["errors"]))
+
+    def run():
+        try:
+            job["summary"] = run_batch(db_instance, experiment_id, progress=progress, **kwargs)
+            job["status"] = "completed"
+        except Exception as e:
+            print(f"Batch analysis of experiment {experiment_id} failed: {e}")
+            job["error"] = str(e)
+            job["status"] = "failed"
+
+    threading.Thread(target=run, name=f"batch-analysis-{experiment_id}", daemon=True).start()
+    return dict(job)
+
+
+def get_batch_job(job_id):
+    """Returns a copy of a job started by start_batch_job(), or None."""
+    job = _jobs.get(job_id)
+    return dict(job) if job else None
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Analyze an experiment's signals and write Analysis rows.")
+    arg_parser.add_argument("experiment_id", help="Experiment whose signals are analyzed")
+    arg_parser.add_argument("--status", action="append", dest="statuses",
+                            help=f"processing_status to select (repeatable; default: {', '.join(DEFAULT_STATUSES)})")
+    arg_parser.add_argument("--workers", type=int, help="Worker processes (default: CPU count)")
+    arg_parser.add_argument("--researcher-id", help="Researcher recorded on the analyses (default: the experiment PI)")
+    arg_parser.add_argument("--limit", type=int, help="Analyze at most this many signals")
+    arg_parser.add_argument("--low-hz", type=float, default=DEFAULT_LOW_HZ, help="Bandpass low cutoff")
+    arg_parser.add_argument("--high-hz", type=float, default=DEFAULT_HIGH_HZ, help="Bandpass high cutoff")
+    arg_parser.add_argument("--dry-run", action="store_true", help="Analyze without writing")
+    args = arg_parser.parse_args()
+
+    from db_neurohub import db
+
+    if not db:
+        print("Cannot run batch analysis: Spanner database connection not established.")
+        exit(1)
+
+    result = run_batch(db, args.experiment_id, statuses=args.statuses or DEFAULT_STATUSES, workers=args.workers,
+                       researcher_id=args.researcher_id, limit=args.limit, dry_run=args.dry_run,
+                       low_hz=args.low_hz, high_hz=args.high_hz)
+    action = "would be written" if args.dry_run else "written"
+    print(f"Analyzed {result['analyzed']} of {result['selected']} signals ({result['cached']} cached), "
+          f"{result['written']} analyses {action}, {result['failed']} failed ({result['seconds']:.2f}s).")
+    for error in result["errors"]:
+        print(f"  {error['signal_id']}: {error['error']}")
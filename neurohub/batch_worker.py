@@ -0,0 +1,38 @@
+# batch_worker.py - Process pools for CPU-bound NeuroHub work
+#
+# process_executor() spawns its workers, never forks them: a fork of a
+# process holding gRPC channels is unsafe. Spawned workers unpickle their
+# tasks by module name, so task functions must live in importable modules
+# (batch_analysis, partitioned_query), and the optional environment is set
+# by _set_environ, defined here for the same reason.
+#
+# A spawned worker also re-imports the parent's __main__ module. Under
+# gunicorn that is gunicorn's runner; with the development server
+# (python app.py) it is app.py, which imports db_neurohub. db_neurohub
+# therefore skips its import-time connection in worker processes; tasks that
+# need Spanner call neurohub_common.spanner_pool.get_database() themselves,
+# after the worker's environment is set.
+
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+
+def _set_environ(environ):
+    os.environ.update(environ)
+
+
+def process_executor(max_workers, environ=None):
+    """
+    A ProcessPoolExecutor with spawned workers.
+
+    Args:
+        max_workers (int): Worker processes.
+        environ (dict, optional): Environment variables set in each worker
+            before it runs its first task.
+    """
+    context = multiprocessing.get_context("spawn")
+    if environ:
+        return ProcessPoolExecutor(max_workers=max_workers, mp_context=context,
+                                   initializer=_set_environ, initargs=(environ,))
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=context)
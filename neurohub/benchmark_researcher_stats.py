@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Benchmark: correlated-subquery vs set-based researcher statistics.
+
+Loads a synthetic dataset (10,000 researchers by default) into a scratch
+database and times the old per-row correlated-subquery shape of
+get_all_researchers_with_stats against the set-based version in
+db_neurohub_enhanced.py. Both queries are run in PROFILE mode so Spanner's
+own CPU/elapsed times are reported next to the wall-clock time.
+
+Usage:
+    python benchmark_researcher_stats.py                    # load + benchmark
+    python benchmark_researcher_stats.py --skip-load        # reuse loaded data
+    python benchmark_researcher_stats.py --researchers 2000 --runs 3
+
+Runs against the Spanner emulator when SPANNER_EMULATOR_HOST is set.
+Never point --database at the workshop database: the scratch tables are
+filled with synthetic rows.
+"""
+
+import argparse
+import random
+import statistics
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from google.cloud import spanner
+from google.cloud.spanner_v1 import param_types, RequestOptions
+from google.cloud.spanner_v1.types import ExecuteSqlRequest
+
+from neurohub_common.spanner_pool import INSTANCE_ID, PROJECT_ID
+from setup import setup_base_schema_and_indexes
+from db_neurohub_enhanced import RESEARCHER_STATS_SQL
+
+# The shape get_all_researchers_with_stats used before the set-based rewrite.
+# The collaborator count is written as a single scalar subquery here; the
+# original UNION of two COUNTs returned two rows and failed at runtime.
+CORRELATED_SQL = """
+    SELECT
+        r.researcher_id,
+        r.name,
+        r.email,
+        r.institution,
+        r.expertise,
+        r.years_experience,
+        (SELECT COUNT(*)
+         FROM Experiment e
+         WHERE e.principal_investigator_id = r.researcher_id) as projects,
+        (SELECT COUNT(*)
+         FROM Publication p
+         JOIN Experiment e ON p.experiment_id = e.experiment_id
+         WHERE e.principal_investigator_id = r.researcher_id) as publications,
+        (SELECT COUNT(DISTINCT x.collaborator_id)
+         FROM (SELECT c.researcher_id_b AS collaborator_id
+               FROM Collaboration c WHERE c.researcher_id_a = r.researcher_id
+               UNION ALL
+               SELECT c.researcher_id_a AS collaborator_id
+               FROM Collaboration c WHERE c.researcher_id_b = r.researcher_id) x) as collaborators
+    FROM Researcher r
+    ORDER BY r.name
+    LIMIT @limit
+"""
+
+BATCH_ROWS = 2000
+
+
+def generate_uuid():
+    return str(uuid.uuid4())
+
+
+def insert_in_batches(database, table, columns, rows):
+    """Inserts rows in commits small enough for Spanner's mutation limit."""
+    for start in range(0, len(rows), BATCH_ROWS):
+        with database.batch() as batch:
+            batch.insert(table=table, columns=columns, values=rows[start:start + BATCH_ROWS])
+    print(f"  -> {len(rows)} rows into {table}")
+
+
+def load_synthetic_data(database, researcher_count, seed=42):
+    """Generates researchers with experiments, publications and collaborations."""
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc)
+
+    researcher_ids = [generate_uuid() for _ in range(researcher_count)]
+    researchers = [
+        (rid, f"Researcher {i:06d}", f"r{i}@bench.neurohub.org", rng.choice(["Brown University", "Ben-Gurion University"]),
+         "EEG, Signal Processing", rng.randint(1, 30), spanner.COMMIT_TIMESTAMP)
+        for i, rid in enumerate(researcher_ids)
+    ]
+
+    experiments = []
+    publications = []
+    for rid in researcher_ids:
+        for _ in range(rng.randint(0, 5)):
+            experiment_id = generate_uuid()
+            experiments.append((experiment_id, f"Experiment {experiment_id[:8]}", "active",
+                                now - timedelta(days=rng.randint(0, 365)), rid, spanner.COMMIT_TIMESTAMP))
+            for _ in range(rng.randint(0, 2)):
+                publications.append((generate_uuid(), experiment_id, "Synthetic publication",
+                                     spanner.COMMIT_TIMESTAMP))
+
+    collaborations = {}
+    for rid in researcher_ids:
+        for other in rng.sample(researcher_ids, 4):
+            if other != rid:
+                collaborations[tuple(sorted((rid, other)))] = rng.choice(["co-author", "advisor", "team_member"])
+    collaboration_rows = [(a, b, "Synthetic project", kind, now, spanner.COMMIT_TIMESTAMP)
+                          for (a, b), kind in collaborations.items()]
+
+    print(f"Loading {len(researchers)} researchers, {len(experiments)} experiments, "
+          f"{len(publications)} publications, {len(collaboration_rows)} collaborations...")
+    insert_in_batches(database, "Researcher",
+                      ["researcher_id", "name", "email", "institution", "expertise", "years_experience", "create_time"],
+                      researchers)
+    insert_in_batches(database, "Experiment",
+                      ["experiment_id", "name", "status", "start_date", "principal_investigator_id", "create_time"],
+                      experiments)
+    insert_in_batches(database, "Publication",
+                      ["publication_id", "experiment_id", "title", "create_time"],
+                      publications)
+    insert_in_batches(database, "Collaboration",
+                      ["researcher_id_a", "researcher_id_b", "project_name", "collaboration_type", "start_date", "create_time"],
+                      collaboration_rows)
+
+
+def time_query(database, sql, limit, runs):
+    """Runs a query `runs` times; returns wall times, Spanner stats and the last rows."""
+    wall_times = []
+    last_stats = {}
+    rows = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        with database.snapshot() as snapshot:
+            results = snapshot.execute_sql(
+                sql,
+                params={"limit": limit},
+                param_types={"limit": param_types.INT64},
+                query_mode=ExecuteSqlRequest.QueryMode.PROFILE,
+                request_options=RequestOptions(request_tag="benchmark_researcher_stats"),
+            )
+            rows = [tuple(row) for row in results]
+            if results.stats is not None:
+                last_stats = dict(results.stats.query_stats)
+        wall_times.append(time.perf_counter() - started)
+    return wall_times, last_stats, rows
+
+
+def report(label, wall_times, query_stats):
+    print(f"\n{label}")
+    print(f"  wall median: {statistics.median(wall_times) * 1000:.1f} ms "
+          f"(min {min(wall_times) * 1000:.1f} ms, max {max(wall_times) * 1000:.1f} ms)")
+    for key in ("elapsed_time", "cpu_time", "rows_scanned"):
+        if key in query_stats:
+            print(f"  spanner {key}: {query_stats[key]}")
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--database", default="neurohub-bench", help="Scratch database ID")
+    arg_parser.add_argument("--researchers", type=int, default=10000, help="Synthetic researcher count")
+    arg_parser.add_argument("--limit", type=int, default=None, help="Page size (default: all researchers)")
+    arg_parser.add_argument("--runs", type=int, default=5, help="Timed runs per query")
+    arg_parser.add_argument("--skip-load", action="store_true", help="Benchmark the data already loaded")
+    args = arg_parser.parse_args()
+
+    client = spanner.Client(project=PROJECT_ID)
+    instance = client.instance(INSTANCE_ID)
+    database = instance.database(args.database)
+    if not database.exists():
+        print(f"Creating scratch database '{args.database}'...")
+        database.create().result(360)
+    if not setup_base_schema_and_indexes(database):
+        print("Could not create the benchmark schema. Aborting.")
+        exit(1)
+
+    if not args.skip_load:
+        load_synthetic_data(database, args.researchers)
+
+    limit = args.limit or args.researchers
+    correlated_times, correlated_stats, correlated_rows = time_query(database, CORRELATED_SQL, limit, args.runs)
+    set_times, set_stats, set_rows = time_query(database, RESEARCHER_STATS_SQL.format(keyset="TRUE"),
+                                                limit, args.runs)
+
+    report("Correlated subqueries (old)", correlated_times, correlated_stats)
+    report("Set-based aggregation (current)", set_times, set_stats)
+
+    same = sorted(correlated_rows) == sorted(set_rows)
+    print(f"\nResults identical: {same} ({len(set_rows)} rows)")
+    speedup = statistics.median(correlated_times) / statistics.median(set_times)
+    print(f"Speedup: {speedup:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
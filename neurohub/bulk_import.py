@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+"""
+Bulk import of historical rows from NDJSON or CSV.
+
+Rows are read from the input one at a time and grouped into commits of at
+most MUTATIONS_PER_COMMIT mutations (column values plus index entries, well
+under Spanner's per-commit limit), so memory holds a few batches whatever
+the input size. Batches are committed by a pool of worker threads, with at
+most two batches per worker waiting, and a batch that aborts is retried
+with backoff.
+
+Retrying a batch or re-running an interrupted import is safe: each batch
+reads which of its keys exist, inserts the new rows and updates the others
+(keeping their create_time). A row without an ID gets one derived from the
+table and the row's content (uuid5), so a re-run gives it the same ID;
+identical rows in the input are therefore imported once.
+
+Rows that fail to parse are skipped and reported with their line number.
+ResearcherStats is not maintained per row: an import of experiments or
+sessions ends with researcher_stats.reconcile().
+
+Usage:
+    python bulk_import.py sessions sessions.ndjson
+    python bulk_import.py analyses analyses.csv --workers 16
+    gunzip -c old_sessions.ndjson.gz | python bulk_import.py sessions - --format ndjson
+"""
+
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timezone
+
+from dateutil import parser as dateutil_parser
+from google.api_core import exceptions
+from google.cloud import spanner
+
+from query_cache import invalidate_tables
+from researcher_stats import reconcile
+from signal_io import SignalFormatError, resolve_signal_path
+
+# Spanner's limit is 80,000; smaller commits keep latency and retries cheap
+MUTATIONS_PER_COMMIT = int(os.environ.get("NEUROHUB_IMPORT_MUTATIONS_PER_COMMIT", "20000"))
+DEFAULT_WORKERS = 8
+MAX_ATTEMPTS = 6
+RETRY_BASE_SECONDS = 0.5
+PROGRESS_INTERVAL_SECONDS = 5.0
+MAX_REPORTED_ERRORS = 20
+IMPORT_FORMATS = ("ndjson", "csv")
+# Namespace of the uuid5 IDs of rows imported without one
+IMPORT_ID_NAMESPACE = uuid.UUID("6f1d1c52-3c1e-4a8e-9a57-2f0e5b8d7c41")
+
+# name -> (table, [(column, type)], secondary index count); the first column
+# is the key. Types are "string", "int64", "float64", "timestamp", "json"
+# (a JSON string column that also accepts objects) or "signal_path" (a
+# recording path that must stay under the signal root).
+IMPORT_TABLES = {
+    "experiments": ("Experiment", [
+        ("experiment_id", "string"), ("name", "string"), ("description", "string"), ("protocol", "string"),
+        ("hypothesis", "string"), ("start_date", "timestamp"), ("end_date", "timestamp"), ("status", "string"),
+        ("principal_investigator_id", "string"),
+    ], 2),
+    "sessions": ("Session", [
+        ("session_id", "string"), ("experiment_id", "string"), ("participant_id", "string"),
+        ("researcher_id", "string"), ("session_date", "timestamp"), ("duration_minutes", "int64"),
+        ("notes", "string"),
+    ], 1),
+    "signals": ("SignalData", [
+        ("signal_id", "string"), ("experiment_id", "string"), ("session_id", "string"), ("device_id", "string"),
+        ("signal_type", "string"), ("duration_seconds", "float64"), ("sampling_rate", "int64"),
+        ("channels", "int64"), ("file_path", "signal_path"), ("quality_score", "float64"),
+        ("processing_status", "string"), ("recorded_at", "timestamp"), ("notes", "string"),
+    ], 2),
+    "analyses": ("Analysis", [
+        ("analysis_id", "string"), ("signal_id", "string"), ("researcher_id", "string"),
+        ("analysis_type", "string"), ("parameters", "json"), ("results", "json"), ("findings", "string"),
+        ("confidence_score", "float64"), ("analyzed_at", "timestamp"),
+    ], 2),
+}
+
+# Imports into these tables change the ResearcherStats counters
+STATS_TABLES = ("experiments", "sessions")
+
+RETRYABLE_ERRORS = (exceptions.Aborted, exceptions.ServiceUnavailable, exceptions.DeadlineExceeded)
+
+
+def _convert(value, kind):
+    if value is None or value == "":
+        return None
+    if kind == "int64":
+        return int(value)
+    if kind == "float64":
+        return float(value)
+    if kind == "timestamp":
+        parsed = dateutil_parser.isoparse(value)
+        return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+    if kind == "json":
+        return value if isinstance(value, str) else json.dumps(value)
+    if kind == "signal_path":
+        if os.path.isabs(str(value)):
+            raise ValueError("must be relative to the signal root")
+        try:
+            resolve_signal_path(str(value))
+        except SignalFormatError as e:
+            raise ValueError(str(e)) from None
+    return str(value)
+
+
+def row_id(table, record):
+    """Deterministic ID of a record imported without one: the same on every run."""
+    content = json.dumps(record, sort_keys=True, default=str)
+    return str(uuid.uuid5(IMPORT_ID_NAMESPACE, f"{table}\n{content}"))
+
+
+def parse_row(record, columns, table):
+    """
+    Converts an input record to row values in column order, plus the
+    create_time commit timestamp.
+
+    Raises:
+        ValueError: If a value does not convert to its column's type.
+    """
+    values = []
+    for name, kind in columns:
+        try:
+            values.append(_convert(record.get(name), kind))
+        except (TypeError, ValueError, OverflowError) as e:
+            raise ValueError(f"{name}: {e}") from None
+    if values[0] is None:
+        values[0] = row_id(table, record)
+    values.append(spanner.COMMIT_TIMESTAMP)
+    return tuple(values)
+
+
+def iter_records(stream, input_format):
+    """
+    Yields (line number, record dict) from a text stream; NDJSON lines that
+    are not JSON objects yield (line number, ValueError).
+    """
+    if input_format == "csv":
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record
+        return
+    for line_number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield line_number, ValueError(f"Invalid JSON: {e}")
+            continue
+        if not isinstance(record, dict):
+            yield line_number, ValueError("Expected a JSON object")
+            continue
+        yield line_number, record
+
+
+def rows_per_commit(table_name):
+    """Rows per commit that keep a batch within MUTATIONS_PER_COMMIT."""
+    _, columns, indexes = IMPORT_TABLES[table_name]
+    # One mutation per column value (create_time included) and per index entry
+    return max(1, MUTATIONS_PER_COMMIT // (len(columns) + 1 + indexes))
+
+
+def _write_batch(transaction, table, columns, rows):
+    # A key repeated within the batch: its last row wins
+    rows = list({row[0]: row for row in rows}.values())
+    keys = spanner.KeySet(keys=[[row[0]] for row in rows])
+    existing = {row[0] for row in transaction.read(table, columns[:1], keys)}
+    new_rows = [row for row in rows if row[0] not in existing]
+    if new_rows:
+        transaction.insert(table=table, columns=columns, values=new_rows)
+    if existing:
+        # Without the trailing create_time: a re-import keeps the original
+        transaction.update(table=table, columns=columns[:-1],
+                           values=[row[:-1] for row in rows if row[0] in existing])
+
+
+def commit_batch(db_instance, table, columns, rows, sleep=time.sleep):
+    """
+    Writes one batch in a read-write transaction, retrying aborted commits.
+
+    Rows whose key exists are updated, except for create_time (the last
+    column); the others are inserted.
+
+    Returns:
+        int: The number of retries it took.
+    """
+    for attempt in range(MAX_ATTEMPTS):
+        try:
+            db_instance.run_in_transaction(_write_batch, table, columns, rows)
+            return attempt
+        except RETRYABLE_ERRORS:
+            if attempt == MAX_ATTEMPTS - 1:
+                raise
+            sleep(RETRY_BASE_SECONDS * 2 ** attempt)
+
+
+def run_import(db_instance, table_name, stream, input_format="ndjson", workers=DEFAULT_WORKERS,
+               batch_rows=None, reconcile_stats=True, progress=None):
+    """
+    Imports records from a text stream into one table.
+
+    Args:
+        db_instance: Spanner database.
+        table_name (str): A key of IMPORT_TABLES.
+        stream: Text stream of NDJSON lines or CSV with a header row.
+        input_format (str): "ndjson" or "csv".
+        workers (int): Threads committing batches in parallel.
+        batch_rows (int, optional): Rows per commit (default: rows_per_commit()).
+        reconcile_stats (bool): Run researcher_stats.reconcile() after an
+            import of experiments or sessions.
+        progress (callable, optional): Called with the summary dict every
+            PROGRESS_INTERVAL_SECONDS.
+
+    Returns:
+        dict: {"table", "read", "written", "rejected" (rows that did not
+        parse), "failed" (rows in batches that could not be committed),
+        "batches", "retries", "errors": [{"lines", "error"}], "seconds",
+        "rows_per_second"}
+    """
+    table, columns, _ = IMPORT_TABLES[table_name]
+    if input_format not in IMPORT_FORMATS:
+        raise KeyError(input_format)
+    column_names = tuple(name for name, _ in columns) + ("create_time",)
+    batch_rows = batch_rows or rows_per_commit(table_name)
+
+    start_time = time.time()
+    summary = {"table": table, "read": 0, "written": 0, "rejected": 0, "failed": 0, "batches": 0, "retries": 0,
+               "errors": [], "seconds": 0.0, "rows_per_second": 0.0}
+    lock = threading.Lock()
+    # Bounds the batches held in memory: committing plus waiting
+    slots = threading.BoundedSemaphore(workers * 2)
+
+    def report_error(lines, error):
+        if len(summary["errors"]) < MAX_REPORTED_ERRORS:
+            summary["errors"].append({"lines": lines, "error": error})
+
+    def update_rate():
+        summary["seconds"] = round(time.time() - start_time, 2)
+        summary["rows_per_second"] = round(summary["written"] / summary["seconds"], 1) if summary["seconds"] else 0.0
+
+    def commit(rows, lines):
+        try:
+            retries = commit_batch(db_instance, table, column_names, rows)
+        except Exception as e:
+            with lock:
+                summary["failed"] += len(rows)
+                report_error(lines, f"{type(e).__name__}: {e}")
+        else:
+            with lock:
+                summary["written"] += len(rows)
+                summary["batches"] += 1
+                summary["retries"] += retries
+        finally:
+            slots.release()
+
+    def submit(executor, rows, first_line, last_line):
+        slots.acquire()
+        executor.submit(commit, rows, f"{first_line}-{last_line}")
+
+    last_progress = time.monotonic()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"import-{table_name}") as executor:
+        rows = []
+        first_line = None
+        for line_number, record in iter_records(stream, input_format):
+            summary["read"] += 1
+            try:
+                if isinstance(record, Exception):
+                    raise record
+                rows.append(parse_row(record, columns, table))
+            except ValueError as e:
+                with lock:
+                    summary["rejected"] += 1
+                    report_error(str(line_number), str(e))
+                continue
+            first_line = first_line or line_number
+            if len(rows) >= batch_rows:
+                submit(executor, rows, first_line, line_number)
+                rows, first_line = [], None
+            if progress and time.monotonic() - last_progress >= PROGRESS_INTERVAL_SECONDS:
+                with lock:
+                    update_rate()
+                    progress(dict(summary, errors=list(summary["errors"])))
+                last_progress = time.monotonic()
+        if rows:
+            submit(executor, rows, first_line, line_number)
+
+    if summary["written"]:
+        invalidate_tables(table)
+        if reconcile_stats and table_name in STATS_TABLES:
+            reconcile(db_instance)
+    update_rate()
+    return summary
+
+
+def import_request_stream(db_instance, table_name, binary_stream, input_format="ndjson", **kwargs):
+    """run_import() over a binary stream such as a request body (decoded as UTF-8)."""
+    text = io.TextIOWrapper(binary_stream, encoding="utf-8", newline="")
+    try:
+        return run_import(db_instance, table_name, text, input_format, **kwargs)
+    finally:
+        text.detach()
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Bulk import NDJSON or CSV rows into a NeuroHub table.")
+    arg_parser.add_argument("table", choices=sorted(IMPORT_TABLES), help="Table to import into")
+    arg_parser.add_argument("path", help="Input file, or - for standard input")
+    arg_parser.add_argument("--format", choices=IMPORT_FORMATS,
+                            help="Input format (default: from the file extension, else ndjson)")
+    arg_parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Parallel commit threads")
+    arg_parser.add_argument("--batch-rows", type=int, help="Rows per commit (default: sized to the mutation limit)")
+    arg_parser.add_argument("--no-reconcile", action="store_true", help="Skip the ResearcherStats reconcile")
+    args = arg_parser.parse_args()
+
+    input_format = args.format or ("csv" if args.path.lower().endswith(".csv") else "ndjson")
+
+    from db_neurohub import db
+
+    if not db:
+        print("Cannot import: Spanner database connection not established.")
+        exit(1)
+
+    def print_progress(summary):
+        print(f"  {summary['written']} rows written, {summary['rows_per_second']:.0f} rows/s "
+              f"({summary['read']} read, {summary['rejected']} rejected, {summary['failed']} failed)")
+
+    source = sys.stdin if args.path == "-" else open(args.path, "r", encoding="utf-8", newline="")
+    with source:
+        result = run_import(db, args.table, source, input_format, workers=args.workers,
+                            batch_rows=args.batch_rows, reconcile_stats=not args.no_reconcile,
+                            progress=print_progress)
+    print(f"Imported {result['written']} of {result['read']} rows into {result['table']} in "
+          f"{result['batches']} commits ({result['retries']} retried) in {result['seconds']:.2f}s, "
+          f"{result['rows_per_second']:.0f} rows/s; {result['rejected']} rejected, {result['failed']} failed.")
+    for error in result["errors"]:
+        print(f"  line {error['lines']}: {error['error']}")
+    exit(1 if result["failed"] else 0)
@@ -2,8 +2,8 @@
 Script to check and display researchers in the database.
 """
 
-from db_neurohub import db, run_sql_query
-from google.cloud.spanner_v1 import param_types
+from db_neurohub import db
+from partitioned_query import run_partitioned_query
 
 def check_researchers():
     """Check what researchers are actually in the database."""
@@ -11,24 +11,19 @@ def check_researchers():
         print("Database connection not available.")
         return
     
-    # First, count total researchers
-    count_sql = "SELECT COUNT(*) as total FROM Researcher"
-    count_result = run_sql_query(db, count_sql)
-    if count_result:
-        print(f"Total researchers in database: {count_result[0]['total']}")
-    
-    # Get all researchers
+    # Full-table scan, read in parallel partitions; partitioned queries
+    # cannot ORDER BY, so the rows are sorted here
     sql = """
         SELECT researcher_id, name, email, institution, expertise, years_experience
         FROM Researcher
-        ORDER BY name
     """
     
-    researchers = run_sql_query(db, sql)
+    researchers = run_partitioned_query(db, sql)
     
     if not researchers:
         print("No researchers found in database.")
         return
+    researchers.sort(key=lambda r: (r.get('name') or '', r['researcher_id']))
     
     print(f"\nFound {len(researchers)} researchers:")
     print("-" * 80)
@@ -1,51 +1,172 @@
 # db_neurohub.py - SQL-based data fetchers for NeuroHub
 
+import multiprocessing
 import os
+import time
 import traceback
-from datetime import datetime
+from contextlib import closing, contextmanager
+from datetime import datetime, timedelta, timezone
 import json
 
 from google.cloud import spanner
 from google.cloud.spanner_v1 import param_types
-from google.api_core import exceptions
 
-# --- Spanner Configuration ---
-INSTANCE_ID = os.environ.get("SPANNER_INSTANCE_ID", "neurohub-graph-instance")
-DATABASE_ID = os.environ.get("SPANNER_DATABASE_ID", "neurohub-db")
-PROJECT_ID = os.environ.get("GOOGLE_CLOUD_PROJECT")
+from neurohub_common.spanner_pool import INSTANCE_ID, DATABASE_ID, PROJECT_ID, get_database
+from query_cache import cached_query
+from neurohub_common.pagination import Page, encode_cursor, keyset_filter, limit_clause
+from neurohub_common.rows import TIMESTAMP_FORMATS, build_row_decoder
 
 if not PROJECT_ID:
     print("Warning: GOOGLE_CLOUD_PROJECT environment variable not set.")
 
 # --- Spanner Client Initialization ---
-db = None
-spanner_client = None
-try:
-    if PROJECT_ID:
-        spanner_client = spanner.Client(project=PROJECT_ID)
-        instance = spanner_client.instance(INSTANCE_ID)
-        database = instance.database(DATABASE_ID)
-        print(f"Attempting to connect to Spanner: {instance.name}/databases/{database.database_id}")
-
-        if not database.exists():
-            print(f"Error: Database '{database.database_id}' does not exist in instance '{instance.name}'.")
-            db = None
-        else:
-            print("Spanner database connection check successful.")
-            db = database
-    else:
-        print("Skipping Spanner client initialization due to missing GOOGLE_CLOUD_PROJECT.")
+# The client and session pool are shared process-wide; see neurohub_common/spanner_pool.py.
+# Spawned worker processes re-import the parent's __main__ (app.py under the
+# development server) and connect on demand instead; see batch_worker.py.
+db = get_database() if multiprocessing.parent_process() is None else None
+
+# Staleness (seconds) for dashboard reads through read_snapshot(); 0 = strong reads
+READ_STALENESS_SECONDS = float(os.environ.get("NEUROHUB_READ_STALENESS_SECONDS", "15"))
+# shared_read_timestamp() rounds read timestamps down to this many seconds, so
+# requests close in time read at the same timestamp and share cached results
+READ_TIMESTAMP_STEP_SECONDS = float(os.environ.get("NEUROHUB_READ_TIMESTAMP_STEP_SECONDS", "5"))
+
+# --- Snapshot Helpers ---
+
+def _as_timedelta(seconds_or_delta):
+    if seconds_or_delta is None or isinstance(seconds_or_delta, timedelta):
+        return seconds_or_delta
+    return timedelta(seconds=seconds_or_delta)
+
+
+def shared_read_timestamp(staleness=READ_STALENESS_SECONDS, step=READ_TIMESTAMP_STEP_SECONDS):
+    """
+    A read timestamp at least `staleness` seconds old, rounded down to `step`.
+
+    Snapshots opened at it within the same step read the same data, so
+    query_cache can share fetcher results between them.
+
+    Returns:
+        datetime or None: None for strong reads (staleness 0) or when
+        rounding is disabled (step 0).
+    """
+    if not staleness or not step:
+        return None
+    read_at = time.time() - staleness
+    return datetime.fromtimestamp(read_at - read_at % step, timezone.utc)
+
+
+@contextmanager
+def read_snapshot(db_instance, exact_staleness=None, read_timestamp=None):
+    """
+    Opens a multi-use read-only snapshot to share across several fetchers.
+
+    Every fetcher accepts snapshot=..., so a page that calls several of them
+    reads from one transaction and sees a consistent view of the database:
+
+        with read_snapshot(db, exact_staleness=15) as snapshot:
+            experiments = get_experiments_by_researcher(db, rid, snapshot=snapshot)
+            collaborators = get_researcher_collaborations(db, rid, snapshot=snapshot)
+
+    Args:
+        db_instance: The Spanner database object.
+        exact_staleness (float | timedelta, optional): Read data this old.
+            Stale reads avoid waiting on in-flight writes and are cheaper to serve.
+        read_timestamp (datetime, optional): Read at this exact timestamp.
+
+    Results of one query must be consumed before the next is issued on the
+    same snapshot. Bounded staleness (max_staleness) is only allowed for
+    single-use snapshots; pass it to run_sql_query instead.
+
+    Yields:
+        Snapshot or None: The snapshot, or None without a database connection.
+    """
+    if not db_instance:
+        yield None
+        return
+
+    options = {"multi_use": True}
+    if exact_staleness:
+        options["exact_staleness"] = _as_timedelta(exact_staleness)
+    elif read_timestamp is not None:
+        options["read_timestamp"] = read_timestamp
+
+    with db_instance.snapshot(**options) as snapshot:
+        yield snapshot
+
+
+@contextmanager
+def _snapshot_scope(db_instance, snapshot=None, max_staleness=None):
+    """Yields the caller's snapshot, or opens (and closes) a single-use one."""
+    if snapshot is not None:
+        yield snapshot
+        return
+
+    options = {}
+    if max_staleness:
+        options["max_staleness"] = _as_timedelta(max_staleness)
+    with db_instance.snapshot(**options) as single_use:
+        yield single_use
 
-except exceptions.NotFound:
-    print(f"Error: Spanner instance '{INSTANCE_ID}' not found in project '{PROJECT_ID}'.")
-    db = None
-except Exception as e:
-    print(f"An unexpected error occurred during Spanner initialization: {e}")
-    db = None
 
 # --- Utility Function for SQL Queries ---
 
-def run_sql_query(db_instance, sql, params=None, param_types=None):
+def _stream_rows(db_instance, sql, params=None, param_types=None, snapshot=None, max_staleness=None):
+    """
+    Yields (fields, row) pairs with the client's raw row values.
+
+    Rows are pulled from the Spanner StreamedResultSet as the caller iterates,
+    so only the current row is held in memory. fields is the result metadata,
+    which arrives with the first partial result set.
+    """
+    with _snapshot_scope(db_instance, snapshot, max_staleness) as active_snapshot:
+        results = active_snapshot.execute_sql(
+            sql,
+            params=params,
+            param_types=param_types
+        )
+        for row in results:
+            yield results.fields, row
+
+
+def stream_sql_query(db_instance, sql, params=None, param_types=None, snapshot=None,
+                     max_staleness=None, timestamp_format="iso"):
+    """
+    Executes a SQL query on Spanner and yields rows lazily.
+
+    Rows are pulled from the Spanner StreamedResultSet as the caller iterates,
+    so only the current row is held in memory. The snapshot stays open until
+    the generator is exhausted or closed.
+
+    Args:
+        db_instance: The Spanner database object.
+        sql (str): The SQL query string.
+        params (dict, optional): Dictionary of query parameters.
+        param_types (dict, optional): Dictionary mapping param names to Spanner types.
+        snapshot (optional): A snapshot from read_snapshot() to read from.
+        max_staleness (float | timedelta, optional): Bounded staleness for the
+            single-use snapshot opened when no snapshot is given.
+        timestamp_format (str, optional): "iso", "epoch_ms" or None; see
+            build_row_decoder.
+
+    Yields:
+        dict: One dictionary per row, keyed by column name.
+    """
+    if not db_instance:
+        print("Error: Database connection is not available.")
+        return
+
+    # The row decoder is built once, from the metadata of the first row.
+    decode_row = None
+    with closing(_stream_rows(db_instance, sql, params, param_types, snapshot, max_staleness)) as rows:
+        for fields, row in rows:
+            if decode_row is None:
+                decode_row = build_row_decoder(fields, timestamp_format)
+            yield decode_row(row)
+
+
+def run_sql_query(db_instance, sql, params=None, param_types=None, stream=False,
+                  snapshot=None, max_staleness=None, timestamp_format="iso"):
     """
     Executes a SQL query on Spanner.
 
@@ -54,6 +175,14 @@ def run_sql_query(db_instance, sql, params=None, param_types=None):
         sql (str): The SQL query string.
         params (dict, optional): Dictionary of query parameters.
         param_types (dict, optional): Dictionary mapping param names to Spanner types.
+        stream (bool, optional): If True, return a generator from
+            stream_sql_query instead of a list. Errors are then raised to
+            the consumer while iterating rather than returned as None.
+        snapshot (optional): A snapshot from read_snapshot() to read from.
+        max_staleness (float | timedelta, optional): Bounded staleness for a
+            single-use read when no snapshot is given.
+        timestamp_format (str, optional): "iso" (default), "epoch_ms" or None
+            for datetime objects; applied while each row is decoded.
 
     Returns:
         list[dict]: A list of dictionaries representing the rows, or None on error.
@@ -62,31 +191,17 @@ def run_sql_query(db_instance, sql, params=None, param_types=None):
         print("Error: Database connection is not available.")
         return None
 
-    results_list = []
     print(f"--- Executing SQL Query ---")
 
-    try:
-        with db_instance.snapshot() as snapshot:
-            results = snapshot.execute_sql(
-                sql,
-                params=params,
-                param_types=param_types
-            )
-
-            # First consume the result to get metadata
-            rows = list(results)
-            
-            # Get column names from the result set metadata
-            if results.metadata and results.metadata.row_type and results.metadata.row_type.fields:
-                field_names = [field.name for field in results.metadata.row_type.fields]
-                
-                # Convert rows to dictionaries
-                for row in rows:
-                    results_list.append(dict(zip(field_names, row)))
-            else:
-                # No metadata means no results
-                return results_list
+    if stream:
+        return stream_sql_query(db_instance, sql, params=params, param_types=param_types,
+                                snapshot=snapshot, max_staleness=max_staleness,
+                                timestamp_format=timestamp_format)
 
+    try:
+        results_list = list(stream_sql_query(db_instance, sql, params=params, param_types=param_types,
+                                             snapshot=snapshot, max_staleness=max_staleness,
+                                             timestamp_format=timestamp_format))
     except Exception as e:
         print(f"An error occurred during SQL query execution: {e}")
         traceback.print_exc()
@@ -95,65 +210,209 @@ def run_sql_query(db_instance, sql, params=None, param_types=None):
     return results_list
 
 
+def run_page_query(db_instance, sql, params, param_types, limit, sort_field, id_field,
+                   snapshot=None, timestamp_format="iso"):
+    """
+    Executes a keyset page query (see neurohub_common/pagination.py) and returns a Page.
+
+    id_field is the tie-breaker column name, or a tuple of names for a
+    composite key, matching the id_column given to keyset_filter.
+    The query reads limit + 1 rows (pagination.limit_clause). The cursor is
+    taken from the raw values of the last kept row, before timestamps are
+    converted, so it stays exact whatever timestamp_format the caller wants.
+
+    Returns:
+        Page: The rows with next_cursor set when more remain, or None on error.
+    """
+    if not db_instance:
+        print("Error: Database connection is not available.")
+        return None
+
+    print(f"--- Executing SQL Query ---")
+
+    page = Page()
+    decode_row = None
+    try:
+        with closing(_stream_rows(db_instance, sql, params, param_types, snapshot)) as rows:
+            for fields, row in rows:
+                if decode_row is None:
+                    decode_row = build_row_decoder(fields, timestamp_format)
+                    field_names = [field.name for field in fields]
+                    if limit is not None:
+                        id_fields = id_field if isinstance(id_field, tuple) else (id_field,)
+                        key_indexes = [field_names.index(name) for name in (sort_field,) + id_fields]
+                if limit is not None:
+                    if len(page) == limit:
+                        # The look-ahead row: another page starts after the last kept row
+                        page.next_cursor = encode_cursor(*last_key)
+                        break
+                    last_key = [row[index] for index in key_indexes]
+                page.append(decode_row(row))
+    except Exception as e:
+        print(f"An error occurred during SQL query execution: {e}")
+        traceback.print_exc()
+        return None
+
+    return page
+
+
 # --- Data Fetching Functions for NeuroHub ---
 
-def get_all_researchers(db_instance, limit=50):
+@cached_query("Researcher")
+def get_all_researchers(db_instance, limit=50, cursor=None, snapshot=None):
     """
-    Fetches all researchers with their expertise.
+    Fetches all researchers with their expertise, one page at a time.
+
+    Pages are ordered by (name, researcher_id); pass the returned page's
+    next_cursor as cursor to read the following page.
+
+    Returns:
+        Page: The researchers, with next_cursor set when more remain.
     """
     if not db_instance: return None
 
-    sql = """
+    keyset, params, param_types_map = keyset_filter("name", "researcher_id", cursor)
+    limit_sql = limit_clause(limit, params, param_types_map)
+    sql = f"""
         SELECT researcher_id, name, email, institution, expertise, years_experience
         FROM Researcher
-        ORDER BY name
-        LIMIT @limit
+        WHERE {keyset}
+        ORDER BY name, researcher_id
+        {limit_sql}
     """
-    params = {"limit": limit}
-    param_types_map = {"limit": param_types.INT64}
 
-    return run_sql_query(db_instance, sql, params=params, param_types=param_types_map)
+    return run_page_query(db_instance, sql, params, param_types_map, limit, "name", "researcher_id",
+                          snapshot=snapshot)
 
 
-def get_experiments_by_researcher(db_instance, researcher_id):
+# Names change rarely and writes invalidate Researcher, so lookups can live longer
+@cached_query("Researcher", ttl=300)
+def get_researcher_ids_by_name(db_instance, name, snapshot=None):
     """
-    Fetches all experiments led by a specific researcher.
+    Resolves a researcher's name through the ResearcherByName index.
+
+    Returns:
+        list: The researcher_ids with that name (empty if none; names are not
+        unique), or None on error.
     """
     if not db_instance: return None
 
-    sql = """
+    rows = run_sql_query(db_instance, "SELECT researcher_id FROM Researcher WHERE name = @name ORDER BY researcher_id",
+                         params={"name": name}, param_types={"name": param_types.STRING}, snapshot=snapshot)
+    if rows is None:
+        return None
+    return [row["researcher_id"] for row in rows]
+
+
+@cached_query("ResearcherStats")
+def get_researcher_stats(db_instance, researcher_id, snapshot=None):
+    """
+    Fetches a researcher's materialized counters with a primary-key read.
+
+    Returns:
+        dict: projects, publications, collaborators and total_sessions (zeros
+        when the researcher has no ResearcherStats row yet), or None on error.
+    """
+    if not db_instance: return None
+
+    columns = ("projects", "publications", "collaborators", "total_sessions")
+    try:
+        with _snapshot_scope(db_instance, snapshot) as active_snapshot:
+            rows = list(active_snapshot.read(
+                table="ResearcherStats",
+                columns=columns,
+                keyset=spanner.KeySet(keys=[[researcher_id]]),
+            ))
+    except Exception as e:
+        print(f"An error occurred while reading researcher stats: {e}")
+        traceback.print_exc()
+        return None
+
+    if not rows:
+        return dict.fromkeys(columns, 0)
+    return dict(zip(columns, rows[0]))
+
+
+@cached_query("Experiment", "Researcher")
+def get_experiments_by_researcher(db_instance, researcher_id, limit=None, cursor=None,
+                                  timestamp_format="iso", snapshot=None):
+    """
+    Fetches the experiments led by a specific researcher, newest first.
+
+    Pages are ordered by (start_date, experiment_id) descending; without a
+    limit every experiment after the cursor is returned.
+    """
+    if not db_instance: return None
+
+    keyset, params, param_types_map = keyset_filter(
+        "e.start_date", "e.experiment_id", cursor, descending=True, sort_type=param_types.TIMESTAMP
+    )
+    limit_sql = limit_clause(limit, params, param_types_map)
+    sql = f"""
         SELECT e.experiment_id, e.name, e.description, e.status, 
                e.start_date, e.end_date, r.name as pi_name
         FROM Experiment e
         JOIN Researcher r ON e.principal_investigator_id = r.researcher_id
-        WHERE e.principal_investigator_id = @researcher_id
-        ORDER BY e.start_date DESC
+        WHERE e.principal_investigator_id = @researcher_id AND {keyset}
+        ORDER BY e.start_date DESC, e.experiment_id DESC
+        {limit_sql}
     """
-    params = {"researcher_id": researcher_id}
-    param_types_map = {"researcher_id": param_types.STRING}
+    params["researcher_id"] = researcher_id
+    param_types_map["researcher_id"] = param_types.STRING
 
-    results = run_sql_query(db_instance, sql, params=params, param_types=param_types_map)
-    
-    # Convert datetime objects to ISO format strings
-    if results:
-        for exp in results:
-            if isinstance(exp.get('start_date'), datetime):
-                exp['start_date'] = exp['start_date'].isoformat()
-            if isinstance(exp.get('end_date'), datetime):
-                exp['end_date'] = exp['end_date'].isoformat()
-    
-    return results
+    return run_page_query(db_instance, sql, params, param_types_map, limit, "start_date", "experiment_id",
+                          snapshot=snapshot, timestamp_format=timestamp_format)
 
 
-def get_experiment_details(db_instance, experiment_id):
+@cached_query("Experiment", "Researcher", "Device", "ExperimentDevice", "Session", "SignalData")
+def get_experiment_details(db_instance, experiment_id, include_signals=False, timestamp_format="iso",
+                           snapshot=None):
     """
     Fetches detailed information about an experiment including devices and sessions.
+
+    Devices, sessions and (with include_signals=True) the experiment's signal
+    data are gathered with ARRAY subqueries, so the whole experiment page is
+    read in a single round trip. The signals are returned under 'signal_data'.
     """
     if not db_instance: return None
 
-    # Get experiment info
-    exp_sql = """
-        SELECT e.*, r.name as pi_name
+    signals_column = """,
+            ARRAY(
+                SELECT AS STRUCT
+                    s.signal_id,
+                    s.signal_type,
+                    s.duration_seconds,
+                    s.sampling_rate,
+                    s.channels,
+                    s.quality_score,
+                    s.processing_status,
+                    s.recorded_at,
+                    d.name as device_name,
+                    sess.session_date
+                FROM SignalData s
+                JOIN Device d ON s.device_id = d.device_id
+                JOIN Session sess ON s.session_id = sess.session_id
+                WHERE s.experiment_id = e.experiment_id
+                ORDER BY s.recorded_at DESC
+            ) as signal_data""" if include_signals else ""
+
+    sql = f"""
+        SELECT
+            e.*,
+            r.name as pi_name,
+            ARRAY(
+                SELECT AS STRUCT d.device_id, d.name, d.device_type, d.manufacturer, d.model
+                FROM Device d
+                JOIN ExperimentDevice ed ON d.device_id = ed.device_id
+                WHERE ed.experiment_id = e.experiment_id
+            ) as devices,
+            ARRAY(
+                SELECT AS STRUCT s.session_id, s.session_date, s.duration_minutes, sr.name as researcher_name
+                FROM Session s
+                JOIN Researcher sr ON s.researcher_id = sr.researcher_id
+                WHERE s.experiment_id = e.experiment_id
+                ORDER BY s.session_date DESC
+            ) as sessions{signals_column}
         FROM Experiment e
         JOIN Researcher r ON e.principal_investigator_id = r.researcher_id
         WHERE e.experiment_id = @experiment_id
@@ -161,52 +420,29 @@ def get_experiment_details(db_instance, experiment_id):
     params = {"experiment_id": experiment_id}
     param_types_map = {"experiment_id": param_types.STRING}
     
-    experiments = run_sql_query(db_instance, exp_sql, params=params, param_types=param_types_map)
+    experiments = run_sql_query(db_instance, sql, params=params, param_types=param_types_map, snapshot=snapshot,
+                                timestamp_format=timestamp_format)
     if not experiments:
         return None
     
-    experiment = experiments[0]
-    
-    # Get devices used
-    devices_sql = """
-        SELECT d.device_id, d.name, d.device_type, d.manufacturer, d.model
-        FROM Device d
-        JOIN ExperimentDevice ed ON d.device_id = ed.device_id
-        WHERE ed.experiment_id = @experiment_id
-    """
-    experiment['devices'] = run_sql_query(db_instance, devices_sql, params=params, param_types=param_types_map)
-    
-    # Get sessions
-    sessions_sql = """
-        SELECT s.session_id, s.session_date, s.duration_minutes, r.name as researcher_name
-        FROM Session s
-        JOIN Researcher r ON s.researcher_id = r.researcher_id
-        WHERE s.experiment_id = @experiment_id
-        ORDER BY s.session_date DESC
-    """
-    experiment['sessions'] = run_sql_query(db_instance, sessions_sql, params=params, param_types=param_types_map)
-    
-    # Convert datetime objects
-    if isinstance(experiment.get('start_date'), datetime):
-        experiment['start_date'] = experiment['start_date'].isoformat()
-    if isinstance(experiment.get('end_date'), datetime):
-        experiment['end_date'] = experiment['end_date'].isoformat()
-    
-    if experiment.get('sessions'):
-        for session in experiment['sessions']:
-            if isinstance(session.get('session_date'), datetime):
-                session['session_date'] = session['session_date'].isoformat()
-    
-    return experiment
+    return experiments[0]
 
 
-def get_recent_analyses(db_instance, limit=20):
+@cached_query("Analysis", "Researcher", "SignalData", "Session", "Experiment")
+def get_recent_analyses(db_instance, limit=20, cursor=None, timestamp_format="iso", snapshot=None):
     """
     Fetches recent analyses with researcher and signal information.
+
+    Pages are ordered by (analyzed_at, analysis_id) descending and seek
+    straight to the cursor, so deep pages cost the same as the first one.
     """
     if not db_instance: return None
 
-    sql = """
+    keyset, params, param_types_map = keyset_filter(
+        "a.analyzed_at", "a.analysis_id", cursor, descending=True, sort_type=param_types.TIMESTAMP
+    )
+    limit_sql = limit_clause(limit, params, param_types_map)
+    sql = f"""
         SELECT 
             a.analysis_id, 
             a.analysis_type, 
@@ -222,34 +458,38 @@ def get_recent_analyses(db_instance, limit=20):
         JOIN SignalData s ON a.signal_id = s.signal_id
         JOIN Session sess ON s.session_id = sess.session_id
         JOIN Experiment e ON sess.experiment_id = e.experiment_id
-        ORDER BY a.analyzed_at DESC
-        LIMIT @limit
+        WHERE {keyset}
+        ORDER BY a.analyzed_at DESC, a.analysis_id DESC
+        {limit_sql}
     """
-    params = {"limit": limit}
-    param_types_map = {"limit": param_types.INT64}
 
-    results = run_sql_query(db_instance, sql, params=params, param_types=param_types_map)
-    
-    # Convert datetime objects
-    if results:
-        for analysis in results:
-            if isinstance(analysis.get('analyzed_at'), datetime):
-                analysis['analyzed_at'] = analysis['analyzed_at'].isoformat()
-    
-    return results
+    return run_page_query(db_instance, sql, params, param_types_map, limit, "analyzed_at", "analysis_id",
+                          snapshot=snapshot, timestamp_format=timestamp_format)
 
 
-def get_researcher_collaborations(db_instance, researcher_id):
+@cached_query("Collaboration", "Researcher")
+def get_researcher_collaborations(db_instance, researcher_id, limit=None, cursor=None,
+                                  timestamp_format="iso", snapshot=None):
     """
-    Fetches all collaborations for a specific researcher.
+    Fetches the collaborations of a specific researcher, most recent first.
+
+    Pages are ordered by start_date descending, ties broken by the
+    Collaboration key (researcher_id_a, researcher_id_b): a researcher can
+    have several collaborations with one collaborator, in both directions.
+    Without a limit every collaboration after the cursor is returned.
     """
     if not db_instance: return None
 
-    sql = """
+    keyset, params, param_types_map = keyset_filter(
+        "c.start_date", ("c.researcher_id_a", "c.researcher_id_b"), cursor,
+        descending=True, sort_type=param_types.TIMESTAMP
+    )
+    limit_sql = limit_clause(limit, params, param_types_map)
+    sql = f"""
         SELECT 
             CASE 
-                WHEN c.researcher_id_a = @researcher_id THEN r2.researcher_id
-                ELSE r1.researcher_id
+                WHEN c.researcher_id_a = @researcher_id THEN c.researcher_id_b
+                ELSE c.researcher_id_a
             END as collaborator_id,
             CASE 
                 WHEN c.researcher_id_a = @researcher_id THEN r2.name
@@ -257,34 +497,44 @@ def get_researcher_collaborations(db_instance, researcher_id):
             END as collaborator_name,
             c.project_name,
             c.collaboration_type,
-            c.start_date
+            c.start_date,
+            c.researcher_id_a,
+            c.researcher_id_b
         FROM Collaboration c
         JOIN Researcher r1 ON c.researcher_id_a = r1.researcher_id
         JOIN Researcher r2 ON c.researcher_id_b = r2.researcher_id
-        WHERE c.researcher_id_a = @researcher_id OR c.researcher_id_b = @researcher_id
-        ORDER BY c.start_date DESC
+        WHERE (c.researcher_id_a = @researcher_id OR c.researcher_id_b = @researcher_id)
+          AND {keyset}
+        ORDER BY c.start_date DESC, c.researcher_id_a DESC, c.researcher_id_b DESC
+        {limit_sql}
     """
-    params = {"researcher_id": researcher_id}
-    param_types_map = {"researcher_id": param_types.STRING}
+    params["researcher_id"] = researcher_id
+    param_types_map["researcher_id"] = param_types.STRING
 
-    results = run_sql_query(db_instance, sql, params=params, param_types=param_types_map)
-    
-    # Convert datetime objects
-    if results:
-        for collab in results:
-            if isinstance(collab.get('start_date'), datetime):
-                collab['start_date'] = collab['start_date'].isoformat()
-    
-    return results
+    return run_page_query(db_instance, sql, params, param_types_map, limit,
+                          "start_date", ("researcher_id_a", "researcher_id_b"),
+                          snapshot=snapshot, timestamp_format=timestamp_format)
 
 
-def get_signal_data_by_experiment(db_instance, experiment_id):
+@cached_query("SignalData", "Device", "Session")
+def get_signal_data_by_experiment(db_instance, experiment_id, stream=False, limit=None, cursor=None,
+                                  timestamp_format="iso", snapshot=None):
     """
-    Fetches all signal data recorded for an experiment.
+    Fetches the signal data recorded for an experiment, newest first.
+
+    Pages are ordered by (recorded_at, signal_id) descending; without a limit
+    every signal after the cursor is returned. With stream=True a generator
+    is returned that yields one signal at a time, for routes and exporters
+    that must not hold the whole listing in memory; a stream reads at most
+    limit rows and has no next_cursor.
     """
     if not db_instance: return None
 
-    sql = """
+    keyset, params, param_types_map = keyset_filter(
+        "s.recorded_at", "s.signal_id", cursor, descending=True, sort_type=param_types.TIMESTAMP
+    )
+    limit_sql = limit_clause(limit, params, param_types_map)
+    sql = f"""
         SELECT 
             s.signal_id,
             s.signal_type,
@@ -299,23 +549,70 @@ def get_signal_data_by_experiment(db_instance, experiment_id):
         FROM SignalData s
         JOIN Device d ON s.device_id = d.device_id
         JOIN Session sess ON s.session_id = sess.session_id
-        WHERE s.experiment_id = @experiment_id
-        ORDER BY s.recorded_at DESC
+        WHERE s.experiment_id = @experiment_id AND {keyset}
+        ORDER BY s.recorded_at DESC, s.signal_id DESC
+        {limit_sql}
     """
-    params = {"experiment_id": experiment_id}
-    param_types_map = {"experiment_id": param_types.STRING}
+    params["experiment_id"] = experiment_id
+    param_types_map["experiment_id"] = param_types.STRING
 
-    results = run_sql_query(db_instance, sql, params=params, param_types=param_types_map)
-    
-    # Convert datetime objects
-    if results:
-        for signal in results:
-            if isinstance(signal.get('recorded_at'), datetime):
-                signal['recorded_at'] = signal['recorded_at'].isoformat()
-            if isinstance(signal.get('session_date'), datetime):
-                signal['session_date'] = signal['session_date'].isoformat()
-    
-    return results
+    if stream:
+        if limit is not None:
+            params["limit"] = limit  # No look-ahead row: a stream has no next_cursor
+        return run_sql_query(db_instance, sql, params=params, param_types=param_types_map, stream=True,
+                             snapshot=snapshot, timestamp_format=timestamp_format)
+
+    return run_page_query(db_instance, sql, params, param_types_map, limit, "recorded_at", "signal_id",
+                          snapshot=snapshot, timestamp_format=timestamp_format)
+
+
+@cached_query("SignalData")
+def get_signal_data(db_instance, signal_id, snapshot=None):
+    """
+    Fetches one SignalData row, including the file_path of its recording.
+
+    Returns:
+        dict: The signal, or None if it does not exist or on error.
+    """
+    if not db_instance: return None
+
+    sql = """
+        SELECT signal_id, experiment_id, session_id, device_id, signal_type, duration_seconds,
+               sampling_rate, channels, quality_score, channel_flags, processing_status, file_path, recorded_at
+        FROM SignalData
+        WHERE signal_id = @signal_id
+    """
+    rows = run_sql_query(db_instance, sql, params={"signal_id": signal_id},
+                         param_types={"signal_id": param_types.STRING}, snapshot=snapshot)
+    return rows[0] if rows else None
+
+
+def get_analysis_results_by_cache_key(db_instance, signal_id, cache_key, snapshot=None):
+    """
+    Fetches the results of a stored analysis by its analysis_cache key
+    (recorded in Analysis.parameters as "cache_key").
+
+    Returns:
+        dict: The parsed results, or None if no such analysis is stored or on error.
+    """
+    if not db_instance: return None
+
+    sql = """
+        SELECT results
+        FROM Analysis
+        WHERE signal_id = @signal_id AND JSON_VALUE(parameters, '$.cache_key') = @cache_key
+        ORDER BY analyzed_at DESC
+        LIMIT 1
+    """
+    rows = run_sql_query(db_instance, sql, params={"signal_id": signal_id, "cache_key": cache_key},
+                         param_types={"signal_id": param_types.STRING, "cache_key": param_types.STRING},
+                         snapshot=snapshot)
+    if not rows or not rows[0]["results"]:
+        return None
+    try:
+        return json.loads(rows[0]["results"])
+    except ValueError:
+        return None
 
 
 # --- Example Usage (if run directly) ---
@@ -2,52 +2,148 @@
 Enhanced database functions for NeuroHub with researcher statistics.
 """
 
-from .db_neurohub import run_sql_query
+from db_neurohub import run_page_query, run_sql_query
+from query_cache import cached_query
+from neurohub_common.pagination import keyset_filter
 from google.cloud import spanner
 from google.cloud.spanner_v1 import param_types
 
 
-def get_all_researchers_with_stats(db_instance, limit=50):
+# Both queries read one keyset page: {keyset} is the cursor condition from
+# neurohub_common.pagination.keyset_filter() ("TRUE" for the first page).
+
+# Researcher page with counts read from the materialized ResearcherStats table
+MATERIALIZED_STATS_SQL = """
+    SELECT
+        r.researcher_id,
+        r.name,
+        r.email,
+        r.institution,
+        r.expertise,
+        r.years_experience,
+        COALESCE(s.projects, 0) AS projects,
+        COALESCE(s.publications, 0) AS publications,
+        COALESCE(s.collaborators, 0) AS collaborators,
+        COALESCE(s.total_sessions, 0) AS total_sessions
+    FROM Researcher r
+    LEFT JOIN ResearcherStats s ON s.researcher_id = r.researcher_id
+    WHERE {keyset}
+    ORDER BY r.name, r.researcher_id
+    LIMIT @limit
+"""
+
+# Researcher page with per-researcher counts, pre-aggregated with GROUP BY
+RESEARCHER_STATS_SQL = """
+    WITH page AS (
+        SELECT researcher_id, name, email, institution, expertise, years_experience
+        FROM Researcher r
+        WHERE {keyset}
+        ORDER BY name, researcher_id
+        LIMIT @limit
+    ),
+    -- Projects where researcher is PI
+    project_counts AS (
+        SELECT e.principal_investigator_id AS researcher_id, COUNT(*) AS projects
+        FROM Experiment e
+        WHERE e.principal_investigator_id IN (SELECT researcher_id FROM page)
+        GROUP BY e.principal_investigator_id
+    ),
+    -- Publications of the researcher's experiments
+    publication_counts AS (
+        SELECT e.principal_investigator_id AS researcher_id, COUNT(*) AS publications
+        FROM Publication p
+        JOIN Experiment e ON p.experiment_id = e.experiment_id
+        WHERE e.principal_investigator_id IN (SELECT researcher_id FROM page)
+        GROUP BY e.principal_investigator_id
+    ),
+    -- Unique collaborators, from both directions of Collaboration
+    collaborator_counts AS (
+        SELECT edges.researcher_id, COUNT(DISTINCT edges.collaborator_id) AS collaborators
+        FROM (
+            SELECT c.researcher_id_a AS researcher_id, c.researcher_id_b AS collaborator_id
+            FROM Collaboration c
+            WHERE c.researcher_id_a IN (SELECT researcher_id FROM page)
+            UNION ALL
+            SELECT c.researcher_id_b AS researcher_id, c.researcher_id_a AS collaborator_id
+            FROM Collaboration c
+            WHERE c.researcher_id_b IN (SELECT researcher_id FROM page)
+        ) AS edges
+        GROUP BY edges.researcher_id
+    )
+    SELECT 
+        r.researcher_id, 
+        r.name, 
+        r.email, 
+        r.institution, 
+        r.expertise, 
+        r.years_experience,
+        COALESCE(pc.projects, 0) AS projects,
+        COALESCE(pub.publications, 0) AS publications,
+        COALESCE(cc.collaborators, 0) AS collaborators
+    FROM page r
+    LEFT JOIN project_counts pc ON pc.researcher_id = r.researcher_id
+    LEFT JOIN publication_counts pub ON pub.researcher_id = r.researcher_id
+    LEFT JOIN collaborator_counts cc ON cc.researcher_id = r.researcher_id
+    ORDER BY r.name, r.researcher_id
+"""
+
+STATS_TABLE_SQL = """
+    SELECT table_name
+    FROM INFORMATION_SCHEMA.TABLES
+    WHERE table_schema = '' AND table_name = 'ResearcherStats'
+"""
+
+# database -> whether ResearcherStats exists; looked up once per database, so
+# a table created by a later migration is used after the next restart
+_stats_table_present = {}
+
+
+def has_researcher_stats(db_instance):
+    """
+    Whether the database has the ResearcherStats table.
+
+    Returns:
+        bool, or None when the lookup failed (not remembered).
+    """
+    if db_instance not in _stats_table_present:
+        rows = run_sql_query(db_instance, STATS_TABLE_SQL)
+        if rows is None:
+            return None
+        _stats_table_present[db_instance] = bool(rows)
+        if not rows:
+            print("ResearcherStats table not found; researcher counts use the aggregation query")
+    return _stats_table_present[db_instance]
+
+
+@cached_query("Researcher", "ResearcherStats", "Experiment", "Publication", "Collaboration")
+def get_all_researchers_with_stats(db_instance, limit=50, cursor=None, snapshot=None):
     """
     Fetches all researchers with their expertise and statistics.
+
+    Project, publication and collaborator counts are pre-aggregated with
+    GROUP BY over the page of researchers and LEFT JOINed back, instead of
+    being computed by correlated subqueries once per researcher row.
+
+    The counters are read from ResearcherStats when that table exists; the
+    aggregation query is used instead for databases not yet migrated. Errors
+    of the chosen query are not retried with the other one.
+
+    Pages are ordered by (name, researcher_id); pass the returned page's
+    next_cursor as cursor to read the following page.
     """
     if not db_instance: 
         return None
     
-    sql = """
-        SELECT 
-            r.researcher_id, 
-            r.name, 
-            r.email, 
-            r.institution, 
-            r.expertise, 
-            r.years_experience,
-            -- Count projects where researcher is PI
-            (SELECT COUNT(*) 
-             FROM Experiment e 
-             WHERE e.principal_investigator_id = r.researcher_id) as projects,
-            -- Count publications
-            (SELECT COUNT(*) 
-             FROM Publication p 
-             JOIN Experiment e ON p.experiment_id = e.experiment_id
-             WHERE e.principal_investigator_id = r.researcher_id) as publications,
-            -- Count unique collaborators
-            (SELECT COUNT(DISTINCT c.researcher_id_b) 
-             FROM Collaboration c 
-             WHERE c.researcher_id_a = r.researcher_id
-             UNION 
-             SELECT COUNT(DISTINCT c.researcher_id_a) 
-             FROM Collaboration c 
-             WHERE c.researcher_id_b = r.researcher_id) as collaborators
-        FROM Researcher r
-        ORDER BY r.name
-        LIMIT @limit
-    """
-    
-    params = {"limit": limit}
-    param_types_map = {"limit": param_types.INT64}
+    keyset, params, param_types_map = keyset_filter("r.name", "r.researcher_id", cursor)
+    params["limit"] = limit + 1
+    param_types_map["limit"] = param_types.INT64
     
-    researchers = run_sql_query(db_instance, sql, params=params, param_types=param_types_map)
+    materialized = has_researcher_stats(db_instance)
+    if materialized is None:
+        return None
+    sql = MATERIALIZED_STATS_SQL if materialized else RESEARCHER_STATS_SQL
+    researchers = run_page_query(db_instance, sql.format(keyset=keyset), params,
+                                 param_types_map, limit, "name", "researcher_id", snapshot=snapshot)
     
     # Add default bio based on expertise
     if researchers:
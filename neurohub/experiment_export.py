@@ -0,0 +1,285 @@
+# experiment_export.py - Streaming columnar export of an experiment's data
+#
+# GET /api/experiments/<id>/export?table=signals&format=parquet streams one
+# table (signals, sessions or analyses) of an experiment as:
+#   arrow    Apache Arrow IPC stream (pyarrow.ipc.open_stream reads it)
+#   parquet  Parquet file, one row group per batch
+#   ndjson   one JSON object per line
+#
+# Rows come from stream_sql_query() and are converted to Arrow record
+# batches of EXPORT_BATCH_ROWS rows as they arrive; each batch is written and
+# its bytes sent before the next is read, so memory stays at one batch
+# whatever the size of the experiment.
+#
+# With workers > 1 the query is read through partitioned_query.py, one
+# stream per partition, so large exports scale with the worker count; rows
+# then come out unordered. Spanner only partitions a query on one table, so
+# the partitioned reads (PARTITIONED_SQL) scan the base table alone: signals
+# get their device names from a lookup joined client-side, and analyses are
+# selected by the experiment's signal IDs. Queries Spanner still cannot
+# partition are read as one ordered stream as before.
+#
+# Arrow and Parquet need pyarrow (in requirements.txt); without it those
+# formats answer ExportUnavailable and NDJSON still works.
+
+import io
+import itertools
+import json
+import os
+
+from google.api_core import exceptions
+from google.cloud.spanner_v1 import param_types
+
+from db_neurohub import stream_sql_query
+from partitioned_query import iter_partitioned_query
+
+EXPORT_BATCH_ROWS = int(os.environ.get("NEUROHUB_EXPORT_BATCH_ROWS", "50000"))
+
+EXPORT_FORMATS = {
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+}
+
+# table -> (SQL, ORDER BY of a single-stream export, [(column, type)]); types
+# are "string", "int64", "float64" or "timestamp" (exported as UTC milliseconds)
+EXPORT_TABLES = {
+    "signals": ("""
+        SELECT s.signal_id, s.session_id, s.device_id, d.name AS device_name, s.signal_type,
+               s.duration_seconds, s.sampling_rate, s.channels, s.quality_score, s.processing_status,
+               s.recorded_at, s.file_path
+        FROM SignalData s
+        JOIN Device d ON d.device_id = s.device_id
+        WHERE s.experiment_id = @experiment_id
+    """, "s.recorded_at, s.signal_id", [
+        ("signal_id", "string"), ("session_id", "string"), ("device_id", "string"), ("device_name", "string"),
+        ("signal_type", "string"), ("duration_seconds", "float64"), ("sampling_rate", "int64"),
+        ("channels", "int64"), ("quality_score", "float64"), ("processing_status", "string"),
+        ("recorded_at", "timestamp"), ("file_path", "string"),
+    ]),
+    "sessions": ("""
+        SELECT session_id, participant_id, researcher_id, session_date, duration_minutes, notes
+        FROM Session
+        WHERE experiment_id = @experiment_id
+    """, "session_date, session_id", [
+        ("session_id", "string"), ("participant_id", "string"), ("researcher_id", "string"),
+        ("session_date", "timestamp"), ("duration_minutes", "int64"), ("notes", "string"),
+    ]),
+    "analyses": ("""
+        SELECT a.analysis_id, a.signal_id, a.researcher_id, a.analysis_type, a.parameters, a.results,
+               a.findings, a.confidence_score, a.analyzed_at
+        FROM SignalData s
+        JOIN Analysis a ON a.signal_id = s.signal_id
+        WHERE s.experiment_id = @experiment_id
+    """, "a.analyzed_at, a.analysis_id", [
+        ("analysis_id", "string"), ("signal_id", "string"), ("researcher_id", "string"),
+        ("analysis_type", "string"), ("parameters", "string"), ("results", "string"), ("findings", "string"),
+        ("confidence_score", "float64"), ("analyzed_at", "timestamp"),
+    ]),
+}
+
+# table -> SQL of the partitioned read: the base table only, so the plan is
+# root-partitionable. Analyses are filtered on the experiment's signal IDs
+# (EXPERIMENT_SIGNALS_SQL); signals lack device_name until DEVICE_NAMES_SQL
+# fills it in.
+PARTITIONED_SQL = {
+    "signals": """
+        SELECT signal_id, session_id, device_id, signal_type, duration_seconds, sampling_rate, channels,
+               quality_score, processing_status, recorded_at, file_path
+        FROM SignalData
+        WHERE experiment_id = @experiment_id
+    """,
+    "sessions": EXPORT_TABLES["sessions"][0],
+    "analyses": """
+        SELECT analysis_id, signal_id, researcher_id, analysis_type, parameters, results,
+               findings, confidence_score, analyzed_at
+        FROM Analysis
+        WHERE signal_id IN UNNEST(@signal_ids)
+    """,
+}
+
+DEVICE_NAMES_SQL = """
+    SELECT DISTINCT d.device_id, d.name
+    FROM SignalData s
+    JOIN Device d ON d.device_id = s.device_id
+    WHERE s.experiment_id = @experiment_id
+"""
+
+EXPERIMENT_SIGNALS_SQL = "SELECT signal_id FROM SignalData WHERE experiment_id = @experiment_id"
+
+# Columns only exported with include_raw_data
+RAW_DATA_COLUMNS = ("file_path",)
+
+
+class ExportUnavailable(Exception):
+    """Raised when the requested format needs a package that is not installed."""
+
+
+def export_columns(table, include_raw_data=False):
+    """The (column, type) pairs exported for a table."""
+    _, _, columns = EXPORT_TABLES[table]
+    return [(name, kind) for name, kind in columns if include_raw_data or name not in RAW_DATA_COLUMNS]
+
+
+def _pyarrow():
+    try:
+        import pyarrow  # Only needed for arrow and parquet
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise ExportUnavailable("Arrow and Parquet exports need the pyarrow package") from None
+    return pyarrow
+
+
+def arrow_schema(columns):
+    pa = _pyarrow()
+    types = {"string": pa.string(), "int64": pa.int64(), "float64": pa.float64(),
+             "timestamp": pa.timestamp("ms", tz="UTC")}
+    return pa.schema([(name, types[kind]) for name, kind in columns])
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that buffers bytes until drain() hands them to the response."""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _batches(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _iter_columnar(rows, columns, export_format, batch_rows):
+    pa = _pyarrow()
+    schema = arrow_schema(columns)
+    sink = _ChunkSink()
+    if export_format == "parquet":
+        writer = pa.parquet.ParquetWriter(sink, schema)
+    else:
+        writer = pa.ipc.new_stream(sink, schema)
+
+    with writer:
+        # The schema goes out before the first row is read
+        yield sink.drain()
+        for batch in _batches(rows, batch_rows):
+            arrays = {name: [row[name] for row in batch] for name, _ in columns}
+            writer.write_batch(pa.RecordBatch.from_pydict(arrays, schema=schema))
+            data = sink.drain()
+            if data:
+                yield data
+    yield sink.drain()
+
+
+def _iter_ndjson(rows, columns, batch_rows):
+    for batch in _batches(rows, batch_rows):
+        yield "".join(
+            json.dumps({name: row[name] for name, _ in columns}, default=str) + "\n" for row in batch
+        ).encode("utf-8")
+
+
+def _partitioned_rows(db_instance, table, params, types, timestamp_format, workers):
+    if table == "analyses":
+        signal_ids = [row["signal_id"] for row in
+                      stream_sql_query(db_instance, EXPERIMENT_SIGNALS_SQL, params=params, param_types=types)]
+        if not signal_ids:
+            return iter(())
+        params = {"signal_ids": signal_ids}
+        types = {"signal_ids": param_types.Array(param_types.STRING)}
+
+    rows = iter_partitioned_query(db_instance, PARTITIONED_SQL[table], params=params, param_types=types,
+                                  workers=workers, timestamp_format=timestamp_format)
+    if table == "signals":
+        rows = _with_device_names(db_instance, rows, params, types)
+    return rows
+
+
+def _with_device_names(db_instance, rows, params, types):
+    # Looked up once the partitioned read has started, so a query Spanner
+    # cannot partition fails before the extra read
+    first = next(rows, None)
+    if first is None:
+        return
+    device_names = {row["device_id"]: row["name"] for row in
+                    stream_sql_query(db_instance, DEVICE_NAMES_SQL, params=params, param_types=types)}
+    # Signals without a Device row are left out, as by the inner join
+    for row in itertools.chain([first], rows):
+        if row["device_id"] in device_names:
+            yield dict(row, device_name=device_names[row["device_id"]])
+
+
+def _export_rows(db_instance, table, params, types, timestamp_format, workers):
+    sql, order_by, _ = EXPORT_TABLES[table]
+    if workers > 1:
+        try:
+            rows = _partitioned_rows(db_instance, table, params, types, timestamp_format, workers)
+            first = next(rows, None)
+        except exceptions.InvalidArgument as e:
+            print(f"Partitioned export unavailable, using a single stream: {e}")
+        else:
+            return itertools.chain([] if first is None else [first], rows)
+    return stream_sql_query(db_instance, f"{sql} ORDER BY {order_by}", params=params, param_types=types,
+                            timestamp_format=timestamp_format)
+
+
+def iter_export(db_instance, experiment_id, table, export_format, include_raw_data=False,
+                batch_rows=EXPORT_BATCH_ROWS, workers=1):
+    """
+    Streams one table of an experiment in an export format.
+
+    Raises KeyError for an unknown table or format and ExportUnavailable if
+    pyarrow is missing, before anything is read; call it outside the
+    response generator to turn those into error responses.
+
+    With workers > 1 the rows are read through partitioned_query, one stream
+    per partition, and come out unordered; otherwise they are ordered by
+    time.
+
+    Returns:
+        generator of bytes
+    """
+    if table not in EXPORT_TABLES:
+        raise KeyError(table)
+    if export_format not in EXPORT_FORMATS:
+        raise KeyError(export_format)
+    if export_format != "ndjson":
+        _pyarrow()
+    columns = export_columns(table, include_raw_data)
+
+    def generate():
+        rows = _export_rows(
+            db_instance, table,
+            {"experiment_id": experiment_id}, {"experiment_id": param_types.STRING},
+            "iso" if export_format == "ndjson" else "epoch_ms", workers,
+        )
+        if export_format == "ndjson":
+            yield from _iter_ndjson(rows, columns, batch_rows)
+        else:
+            yield from _iter_columnar(rows, columns, export_format, batch_rows)
+
+    return generate()
@@ -1,7 +1,11 @@
 from flask import Blueprint, render_template, request, jsonify, flash, Response, stream_with_context
 import json 
 import traceback
-from db_neurohub import db, get_all_researchers
+from analysis_cache import analysis_key, get_cache
+from batch_analysis import record_analysis
+from db_neurohub import db, get_all_researchers, get_analysis_results_by_cache_key, get_signal_data
+from signal_analysis import iter_analysis
+from signal_io import SignalFormatError, open_signal
 from actual_ai_integration import stream_ai_response_sync
 
 # Blueprint for NeuroHub Ally routes
@@ -162,46 +166,62 @@ def stream_neurohub_ally():
 @ally_bp.route('/api/neurohub-ally/stream-analysis-status', methods=['POST'])
 def stream_analysis_status():
     """Stream signal analysis progress updates."""
+    # Read the request before streaming: the generator runs after the view returns
+    data = request.get_json(silent=True) or {}
+
     def generate():
         try:
-            # Get request data
-            data = request.get_json()
             signal_data_id = data.get('signal_data_id', '')
-            
-            # TODO: Implement actual analysis streaming
-            # For now, yield mock analysis steps
-            steps = [
-                {"step": "Loading signal data...", "progress": 10},
-                {"step": "Applying bandpass filter (0.5-45 Hz)...", "progress": 20},
-                {"step": "Detecting and removing artifacts...", "progress": 40},
-                {"step": "Extracting features...", "progress": 60},
-                {"step": "Running statistical analysis...", "progress": 80},
-                {"step": "Generating visualization...", "progress": 90},
-                {"step": "Analysis complete!", "progress": 100}
-            ]
-            
-            for step_info in steps:
-                yield f"data: {json.dumps({'type': 'progress', 'step': step_info['step'], 'progress': step_info['progress']})}\n\n"
-            
-            # Final results
-            results = {
-                "type": "results",
-                "content": {
-                    "summary": "Signal quality: Good",
-                    "artifacts_removed": 12,
-                    "snr": 15.3,
-                    "dominant_frequency": 10.2,
-                    "recommendations": [
-                        "Signal quality is suitable for analysis",
-                        "Alpha band activity is prominent",
-                        "Consider additional preprocessing for channels F3, F4"
-                    ]
-                }
-            }
-            
-            yield f"data: {json.dumps(results)}\n\n"
-            
+            if not signal_data_id:
+                yield f"data: {json.dumps({'type': 'error', 'message': 'signal_data_id is required'})}\n\n"
+                return
+
+            yield f"data: {json.dumps({'type': 'progress', 'step': 'Loading signal data...', 'progress': 1})}\n\n"
+            signal_row = get_signal_data(db, signal_data_id)
+            if not signal_row:
+                yield f"data: {json.dumps({'type': 'error', 'message': f'Signal {signal_data_id} not found'})}\n\n"
+                return
+
+            options = {key: float(data[key]) for key in ('low_hz', 'high_hz') if data.get(key) is not None}
+
+            # The key hashes the recording, which takes a while the first time
+            yield f"data: {json.dumps({'type': 'progress', 'step': 'Checking for stored results...', 'progress': 2})}\n\n"
+            # Same recording and parameters analyzed before: serve the stored results
+            key = analysis_key(signal_data_id, signal_row['file_path'], signal_row.get('sampling_rate'), **options)
+            cache = get_cache()
+            results = cache.get(key['cache_key'])
+            if results is None:
+                results = get_analysis_results_by_cache_key(db, signal_data_id, key['cache_key'])
+                if results is not None:
+                    cache.put(key['cache_key'], results)
+            if results is not None:
+                results.update(signal_id=signal_data_id, cached=True)
+                yield f"data: {json.dumps({'type': 'results', 'content': results})}\n\n"
+                return
+
+            results = None
+            with open_signal(signal_row['file_path'], sampling_rate=signal_row.get('sampling_rate')) as recording:
+                # Progress events are emitted as each block of the recording is processed
+                for event in iter_analysis(recording, **options):
+                    if event['type'] == 'results':
+                        results = event['content']
+                        cache.put(key['cache_key'], results)
+                        event = dict(event, content=dict(results, signal_id=signal_data_id, cached=False))
+                    yield f"data: {json.dumps(event)}\n\n"
+
+            # Record the analysis in Spanner under its cache key, as the batch
+            # runner does, so other workers and hosts serve it instead of recomputing
+            if results is not None and db:
+                try:
+                    record_analysis(db, dict(signal_row, signal_id=signal_data_id), dict(key, results=results))
+                except Exception as e:
+                    print(f"Failed to record analysis of signal {signal_data_id}: {e}")
+                    traceback.print_exc()
+
+        except (FileNotFoundError, SignalFormatError, ValueError) as e:
+            yield f"data: {json.dumps({'type': 'error', 'message': str(e)})}\n\n"
         except Exception as e:
+            traceback.print_exc()
             yield f"data: {json.dumps({'type': 'error', 'message': str(e)})}\n\n"
     
     return Response(
@@ -0,0 +1,209 @@
+# partitioned_query.py - Parallel reads of large result sets through Spanner partitions
+#
+# stream_sql_query() reads a result through one stream, so a full-table scan
+# is bound by what one server and one connection deliver. A root-partitionable
+# query (a scan of one table, or of interleaved tables, without ORDER BY,
+# LIMIT or a root aggregate) can instead be split by
+# BatchSnapshot.generate_query_batches() into partitions that Spanner serves
+# independently, all at the same read timestamp:
+#
+#   iter_partitioned_query()  reads the partitions on a thread pool and
+#                             merges their rows into one iterator, in no
+#                             particular order; a bounded queue of row chunks
+#                             keeps memory flat when the consumer is slower
+#   run_partitioned_query()   the same, as a list (None on error)
+#   map_partitions()          applies a function to each partition's rows on
+#                             a thread or process pool and returns the
+#                             per-partition results, for aggregations
+#
+# Spanner rejects queries that are not root-partitionable with InvalidArgument
+# when the partitions are generated; callers that accept any query can catch
+# it and fall back to stream_sql_query().
+#
+# Settings (environment variables):
+#   NEUROHUB_PARTITION_WORKERS  threads or processes per query (default 8)
+#   NEUROHUB_DATA_BOOST         1 to serve partitions from Data Boost compute,
+#                               isolating exports from serving traffic
+
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from google.cloud.spanner_v1.database import BatchSnapshot
+
+from batch_worker import process_executor
+from neurohub_common.rows import build_row_decoder
+
+PARTITION_WORKERS = int(os.environ.get("NEUROHUB_PARTITION_WORKERS", "8"))
+DATA_BOOST = os.environ.get("NEUROHUB_DATA_BOOST", "0") == "1"
+# Rows handed from a partition reader to the consumer at a time
+CHUNK_ROWS = 500
+# Chunks buffered per worker before readers wait for the consumer
+QUEUE_CHUNKS_PER_WORKER = 4
+# A worker process reads a few partitions and exits: it needs no warm pool
+WORKER_ENVIRON = {"SPANNER_POOL_TYPE": "bursty", "SPANNER_POOL_KEEPALIVE": "0"}
+
+_DONE = object()
+
+
+def partition_query(db_instance, sql, params=None, param_types=None, max_partitions=None,
+                    data_boost=DATA_BOOST, exact_staleness=None):
+    """
+    Splits a query into partitions at one read timestamp.
+
+    Returns:
+        tuple: (BatchSnapshot, list of partition dicts). Close the snapshot
+        when the partitions are read.
+
+    Raises:
+        google.api_core.exceptions.InvalidArgument: If the query is not root-partitionable.
+    """
+    batch_snapshot = db_instance.batch_snapshot(exact_staleness=exact_staleness)
+    try:
+        batches = list(batch_snapshot.generate_query_batches(
+            sql, params=params, param_types=param_types, max_partitions=max_partitions,
+            data_boost_enabled=data_boost,
+        ))
+    except BaseException:
+        batch_snapshot.close()
+        raise
+    return batch_snapshot, batches
+
+
+def _partition_rows(batch_snapshot, batch, timestamp_format):
+    results = batch_snapshot.process_query_batch(batch)
+    decode_row = None
+    for row in results:
+        if decode_row is None:
+            decode_row = build_row_decoder(results.fields, timestamp_format)
+        yield decode_row(row)
+
+
+def iter_partitioned_query(db_instance, sql, params=None, param_types=None, workers=PARTITION_WORKERS,
+                           timestamp_format="iso", **partition_options):
+    """
+    Reads a root-partitionable query with one stream per partition.
+
+    Rows arrive in no particular order; add the ordering client-side if it
+    matters. Partitions are generated before the first row is returned, so
+    InvalidArgument for a non-partitionable query is raised by the first
+    next(). Closing the generator early stops the readers.
+
+    Args:
+        workers (int): Partitions read concurrently.
+        timestamp_format (str): As for db_neurohub.stream_sql_query.
+        **partition_options: max_partitions, data_boost, exact_staleness.
+
+    Yields:
+        dict: One dictionary per row, keyed by column name.
+    """
+    batch_snapshot, batches = partition_query(db_instance, sql, params, param_types, **partition_options)
+    workers = max(1, min(workers, len(batches)))
+    chunks = queue.Queue(maxsize=workers * QUEUE_CHUNKS_PER_WORKER)
+    stop = threading.Event()
+
+    def put(item):
+        # Wait for the consumer, but give up once it has gone away
+        while not stop.is_set():
+            try:
+                chunks.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def read(batch):
+        try:
+            chunk = []
+            for row in _partition_rows(batch_snapshot, batch, timestamp_format):
+                chunk.append(row)
+                if len(chunk) >= CHUNK_ROWS:
+                    put(chunk)
+                    chunk = []
+                    if stop.is_set():
+                        return
+            if chunk:
+                put(chunk)
+        except Exception as e:
+            put(e)
+        finally:
+            put(_DONE)
+
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="partition")
+    try:
+        for batch in batches:
+            executor.submit(read, batch)
+        remaining = len(batches)
+        while remaining:
+            item = chunks.get()
+            if item is _DONE:
+                remaining -= 1
+            elif isinstance(item, Exception):
+                raise item
+            else:
+                yield from item
+    finally:
+        stop.set()
+        executor.shutdown(wait=True, cancel_futures=True)
+        batch_snapshot.close()
+
+
+def run_partitioned_query(db_instance, sql, params=None, param_types=None, workers=PARTITION_WORKERS,
+                          timestamp_format="iso", **partition_options):
+    """
+    iter_partitioned_query() collected into a list.
+
+    Returns:
+        list: The rows, or None without a database connection or on error.
+    """
+    if not db_instance:
+        print("Error: Database connection is not available.")
+        return None
+    try:
+        return list(iter_partitioned_query(db_instance, sql, params, param_types, workers, timestamp_format,
+                                           **partition_options))
+    except Exception as e:
+        print(f"Error executing partitioned query: {e}")
+        import traceback
+        traceback.print_exc()
+        return None
+
+
+def _map_partition_in_process(snapshot_state, batch, func, timestamp_format):
+    # Runs in a spawned worker: connect with this process's own client
+    from neurohub_common.spanner_pool import get_database
+
+    batch_snapshot = BatchSnapshot.from_dict(get_database(), snapshot_state)
+    return func(_partition_rows(batch_snapshot, batch, timestamp_format))
+
+
+def map_partitions(db_instance, sql, func, params=None, param_types=None, workers=PARTITION_WORKERS,
+                   processes=False, timestamp_format="iso", **partition_options):
+    """
+    Applies func to the rows of each partition of a query in parallel.
+
+    func receives an iterator of row dicts and returns that partition's
+    result (a count, a Counter, a file path...); merge the results to get
+    the answer for the whole query. With processes=True, partitions are read
+    in spawned worker processes (func must be a picklable, module-level
+    function), so CPU-bound work scales past one core; each worker opens its
+    own Spanner client (a small on-demand pool, no keep-alive) and joins the
+    same read-only transaction.
+
+    Returns:
+        list: func's result for each partition, in partition order.
+    """
+    batch_snapshot, batches = partition_query(db_instance, sql, params, param_types, **partition_options)
+    workers = max(1, min(workers, len(batches) or 1))
+    try:
+        if processes:
+            state = batch_snapshot.to_dict()
+            # Spawned workers connect for themselves: see batch_worker.py
+            with process_executor(workers, environ=WORKER_ENVIRON) as executor:
+                return list(executor.map(_map_partition_in_process, [state] * len(batches), batches,
+                                         [func] * len(batches), [timestamp_format] * len(batches)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="partition") as executor:
+            return list(executor.map(lambda batch: func(_partition_rows(batch_snapshot, batch, timestamp_format)),
+                                     batches))
+    finally:
+        batch_snapshot.close()
@@ -0,0 +1,275 @@
+# query_cache.py - TTL + LRU result cache for NeuroHub data fetchers
+#
+# Fetchers are wrapped with @cached_query(<tables they read>). Results are
+# keyed on (function, parameters) and each key embeds a generation number per
+# table, so invalidate_tables("Experiment") after a write makes every cached
+# result that read Experiment unreachable; stale entries then age out.
+#
+# A fetcher called with snapshot=... must answer as of that snapshot's read
+# timestamp. Its result is cached under that timestamp when the snapshot was
+# opened at a fixed read_timestamp (see db_neurohub.shared_read_timestamp),
+# and not cached at all for strong or staleness-relative snapshots, whose
+# read time the cache cannot match.
+#
+# Generations live in the backend. With redis every worker and instance
+# shares them, so a write anywhere invalidates everywhere. The in-process
+# memory backend keeps them per process: it is only exact with a single
+# worker process (neurohub.Dockerfile runs gunicorn with --workers 1 and
+# threads). With several, a write in one worker leaves the others serving
+# stale results until their entries expire, so it uses the short
+# NEUROHUB_MEMORY_CACHE_TTL instead of NEUROHUB_CACHE_TTL.
+#
+# Cache settings (environment variables):
+#   NEUROHUB_CACHE_BACKEND      redis, memory or none; default redis when
+#                               REDIS_URL is set, otherwise memory
+#   NEUROHUB_CACHE_TTL          seconds a result stays fresh in redis (default 30)
+#   NEUROHUB_MEMORY_CACHE_TTL   seconds a result stays fresh in memory (default 5)
+#   NEUROHUB_CACHE_MAX_ENTRIES  LRU size of the in-process backend (default 512)
+#   REDIS_URL                   shared backend location (default redis://localhost:6379/0)
+
+import functools
+import hashlib
+import inspect
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+CACHE_BACKEND = os.environ.get("NEUROHUB_CACHE_BACKEND",
+                               "redis" if os.environ.get("REDIS_URL") else "memory").lower()
+CACHE_TTL_SECONDS = float(os.environ.get("NEUROHUB_CACHE_TTL", "30"))
+MEMORY_CACHE_TTL_SECONDS = float(os.environ.get("NEUROHUB_MEMORY_CACHE_TTL", "5"))
+CACHE_MAX_ENTRIES = int(os.environ.get("NEUROHUB_CACHE_MAX_ENTRIES", "512"))
+REDIS_URL = os.environ.get("REDIS_URL", "redis://localhost:6379/0")
+
+
+def snapshot_read_timestamp(snapshot):
+    """The fixed read timestamp a Spanner snapshot was opened at, or None."""
+    # Set by Database.snapshot(read_timestamp=...); None for strong and
+    # exact_staleness snapshots
+    return getattr(snapshot, "_read_timestamp", None)
+
+
+class InMemoryBackend:
+    """
+    In-process backend: an OrderedDict kept in LRU order with per-entry expiry.
+
+    Table generations are per process, so invalidation only reaches this
+    worker's entries; see the module comment.
+    """
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Returns (found, value)."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return False, None
+            self._entries.move_to_end(key)
+            return True, value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def generations(self, names):
+        with self._lock:
+            return [self._generations.get(name, 0) for name in names]
+
+    def bump(self, name):
+        with self._lock:
+            self._generations[name] = self._generations.get(name, 0) + 1
+
+    def size(self):
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class RedisBackend:
+    """
+    Shared backend for several workers or instances.
+
+    Entries expire through Redis TTLs; size is bounded by the server's
+    maxmemory / allkeys-lru policy rather than by this process.
+    """
+
+    def __init__(self, url=REDIS_URL, prefix="neurohub:cache"):
+        import redis  # Optional dependency, only needed for this backend
+
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self.evictions = 0
+
+    def get(self, key):
+        raw = self.client.get(f"{self.prefix}:{key}")
+        if raw is None:
+            return False, None
+        return True, pickle.loads(raw)
+
+    def set(self, key, value, ttl):
+        self.client.set(f"{self.prefix}:{key}", pickle.dumps(value), ex=max(1, int(ttl)))
+
+    def generations(self, names):
+        values = self.client.mget([f"{self.prefix}:gen:{name}" for name in names])
+        return [int(v) if v is not None else 0 for v in values]
+
+    def bump(self, name):
+        self.client.incr(f"{self.prefix}:gen:{name}")
+
+    def size(self):
+        return None
+
+    def clear(self):
+        for key in self.client.scan_iter(f"{self.prefix}:*"):
+            self.client.delete(key)
+
+
+class QueryCache:
+    """Caches fetcher results keyed on (function, params) with table-based invalidation."""
+
+    def __init__(self, backend=None, ttl=CACHE_TTL_SECONDS):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    @classmethod
+    def from_env(cls):
+        """
+        Builds the cache selected by NEUROHUB_CACHE_BACKEND.
+
+        The in-process backend, chosen or fallen back to, gets
+        MEMORY_CACHE_TTL_SECONDS, since other workers' writes do not
+        invalidate it.
+        """
+        if CACHE_BACKEND == "none":
+            return cls(backend=None)
+        if CACHE_BACKEND == "redis":
+            try:
+                return cls(backend=RedisBackend(), ttl=CACHE_TTL_SECONDS)
+            except Exception as e:
+                print(f"Warning: Redis cache unavailable ({e}); using in-process cache "
+                      f"({MEMORY_CACHE_TTL_SECONDS:g}s TTL, not invalidated by other workers).")
+        return cls(backend=InMemoryBackend(), ttl=MEMORY_CACHE_TTL_SECONDS)
+
+    @property
+    def enabled(self):
+        return self.backend is not None
+
+    def make_key(self, func_name, tables, args, kwargs):
+        params = repr((args, sorted(kwargs.items())))
+        generations = self.backend.generations(tables)
+        digest = hashlib.sha1(params.encode("utf-8")).hexdigest()
+        return f"{func_name}:{'.'.join(map(str, generations))}:{digest}"
+
+    def cached(self, *tables, ttl=None):
+        """
+        Decorator for fetchers with the signature f(db_instance, *params, **options).
+
+        Arguments are bound to the signature before the key is built, so
+        positional and keyword calls share entries; the first argument (the
+        database) is not part of the key, a snapshot only through its read
+        timestamp (see the module comment). Streaming calls, snapshots without
+        a fixed read timestamp and failed fetches (None) are not cached.
+        Cached values are shared between callers and must not be mutated.
+        """
+        def decorator(func):
+            signature = inspect.signature(func)
+
+            @functools.wraps(func)
+            def wrapper(db_instance, *args, **kwargs):
+                if not self.enabled or not db_instance:
+                    return func(db_instance, *args, **kwargs)
+                try:
+                    bound = signature.bind(db_instance, *args, **kwargs)
+                except TypeError:
+                    # Let the fetcher raise its own error
+                    return func(db_instance, *args, **kwargs)
+                params = dict(list(bound.arguments.items())[1:])
+                if params.get("stream"):
+                    return func(db_instance, *args, **kwargs)
+                snapshot = params.pop("snapshot", None)
+                if snapshot is not None:
+                    read_timestamp = snapshot_read_timestamp(snapshot)
+                    if read_timestamp is None:
+                        return func(db_instance, *args, **kwargs)
+                    params["@read_timestamp"] = read_timestamp.isoformat()
+
+                try:
+                    key = self.make_key(func.__qualname__, tables, (), params)
+                    found, value = self.backend.get(key)
+                except Exception as e:
+                    self.errors += 1
+                    print(f"Query cache lookup failed for {func.__name__}: {e}")
+                    return func(db_instance, *args, **kwargs)
+
+                if found:
+                    self.hits += 1
+                    return value
+
+                self.misses += 1
+                value = func(db_instance, *args, **kwargs)
+                if value is not None:
+                    try:
+                        self.backend.set(key, value, ttl or self.ttl)
+                    except Exception as e:
+                        self.errors += 1
+                        print(f"Query cache store failed for {func.__name__}: {e}")
+                return value
+
+            wrapper.uncached = func
+            return wrapper
+        return decorator
+
+    def invalidate(self, *tables):
+        """Drops every cached result that read any of the given tables."""
+        if not self.enabled:
+            return
+        for table in tables:
+            try:
+                self.backend.bump(table)
+            except Exception as e:
+                self.errors += 1
+                print(f"Query cache invalidation failed for {table}: {e}")
+
+    def clear(self):
+        if self.enabled:
+            self.backend.clear()
+
+    def stats(self):
+        """Returns hit/miss counters for monitoring."""
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__ if self.backend else None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": getattr(self.backend, "evictions", 0),
+            "size": self.backend.size() if self.backend else 0,
+        }
+
+
+# --- Process-wide cache used by the db_neurohub fetchers ---
+query_cache = QueryCache.from_env()
+cached_query = query_cache.cached
+invalidate_tables = query_cache.invalidate
@@ -0,0 +1,323 @@
+# record_writes.py - Batched inserts behind the POST /api/experiments,
+# /api/analyses and /api/sessions endpoints
+#
+# Each endpoint takes one record (a JSON object) or many (a JSON array). All
+# records of a request are validated first, then inserted with one mutation
+# per table in a single read-write transaction, together with the
+# ResearcherStats increments they cause (researcher_stats.py) and a batched
+# key read checking the rows they reference exist. A request is therefore
+# all-or-nothing and costs one commit however many records it carries.
+#
+# IDs are generated here; researcher names are resolved to IDs through
+# db_neurohub.get_researcher_ids_by_name, which is cached, so a run of
+# reports by the same researcher looks the name up once.
+
+import json
+import os
+import uuid
+from datetime import datetime, timezone
+
+from dateutil import parser as dateutil_parser
+from google.cloud import spanner
+
+from db_neurohub import get_researcher_ids_by_name
+from query_cache import invalidate_tables
+from researcher_stats import apply_stats_deltas, stats_deltas
+from signal_io import SignalFormatError, resolve_signal_path
+
+# Spanner allows 80,000 mutations (inserted column values, index entries
+# included) per commit; requests are held well under that
+MAX_REQUEST_MUTATIONS = 40000
+
+EXPERIMENT_STATUSES = ("planning", "active", "completed", "archived")
+DEFAULT_SIGNAL_STATUS = "raw"
+
+EXPERIMENT_COLUMNS = ("experiment_id", "name", "description", "protocol", "hypothesis", "start_date",
+                      "end_date", "status", "principal_investigator_id", "create_time")
+SESSION_COLUMNS = ("session_id", "experiment_id", "participant_id", "researcher_id", "session_date",
+                   "duration_minutes", "notes", "create_time")
+SIGNAL_COLUMNS = ("signal_id", "experiment_id", "session_id", "device_id", "signal_type", "duration_seconds",
+                  "sampling_rate", "channels", "file_path", "quality_score", "processing_status", "recorded_at",
+                  "notes", "create_time")
+ANALYSIS_COLUMNS = ("analysis_id", "signal_id", "researcher_id", "analysis_type", "parameters", "results",
+                    "findings", "confidence_score", "analyzed_at", "create_time")
+
+
+class WriteError(ValueError):
+    """Raised for records that are invalid or reference rows that do not exist."""
+
+
+# --- Field Parsing ---
+
+def _records(payload):
+    records = payload if isinstance(payload, list) else [payload]
+    if not records:
+        raise WriteError("No records in request")
+    for index, record in enumerate(records):
+        if not isinstance(record, dict):
+            raise WriteError(f"Record {index}: expected a JSON object")
+    return records
+
+
+def _required(record, index, *fields):
+    """Checks that the fields (IDs and names) are present and are strings."""
+    missing = [field for field in fields if record.get(field) in (None, "")]
+    if missing:
+        raise WriteError(f"Record {index}: missing {', '.join(missing)}")
+    for field in fields:
+        if not isinstance(record[field], str):
+            raise WriteError(f"Record {index}: {field} must be a string")
+
+
+def _timestamp(value, index, field, default=None):
+    if value in (None, ""):
+        return default
+    try:
+        parsed = dateutil_parser.isoparse(value) if isinstance(value, str) else None
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise WriteError(f"Record {index}: {field} must be an ISO 8601 timestamp")
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def _number(value, index, field, kind=float, low=None, high=None):
+    if value in (None, ""):
+        return None
+    try:
+        number = kind(value)
+    except (TypeError, ValueError):
+        raise WriteError(f"Record {index}: {field} must be a number") from None
+    if (low is not None and number < low) or (high is not None and number > high):
+        raise WriteError(f"Record {index}: {field} must be between {low} and {high}")
+    return number
+
+
+def _json_text(value):
+    """Analysis parameters and results arrive as JSON strings or as objects."""
+    if value is None or isinstance(value, str):
+        return value
+    return json.dumps(value)
+
+
+def _researcher_id(db_instance, record, index, id_field, name_field, resolved):
+    if record.get(id_field):
+        _required(record, index, id_field)
+        return record[id_field]
+    name = record.get(name_field)
+    if not name:
+        raise WriteError(f"Record {index}: missing {id_field} or {name_field}")
+    _required(record, index, name_field)
+    if name not in resolved:
+        # Memoized per request too, for when the query cache is disabled
+        resolved[name] = get_researcher_ids_by_name(db_instance, name)
+    researcher_ids = resolved[name]
+    if researcher_ids is None:
+        raise RuntimeError(f"Could not look up researcher {name!r}")
+    if len(researcher_ids) != 1:
+        problem = "not found" if not researcher_ids else "is ambiguous; pass the researcher ID instead"
+        raise WriteError(f"Record {index}: researcher {name!r} {problem}")
+    return researcher_ids[0]
+
+
+def _signal_file_path(value, index):
+    """A signal's file_path must be relative (or gs://) and stay under the signal root."""
+    if value in (None, ""):
+        return None
+    if not isinstance(value, str) or os.path.isabs(value):
+        raise WriteError(f"Record {index}: file_path must be a path relative to the signal root")
+    try:
+        resolve_signal_path(value)
+    except SignalFormatError as e:
+        raise WriteError(f"Record {index}: {e}") from None
+    return value
+
+
+def _mutation_count(*tables):
+    count = sum(len(columns) * len(rows) for columns, rows in tables)
+    if count > MAX_REQUEST_MUTATIONS:
+        raise WriteError(f"Request needs {count} mutations, over the {MAX_REQUEST_MUTATIONS} allowed per "
+                         f"request; split it")
+    return count
+
+
+# --- Transactions ---
+
+def _require_keys(transaction, table, key_column, keys, label):
+    """Raises WriteError unless every key exists, checked with one batched read."""
+    keys = sorted(set(keys))
+    if not keys:
+        return
+    found = {row[0] for row in transaction.read(table, (key_column,), spanner.KeySet(keys=[[key] for key in keys]))}
+    missing = [key for key in keys if key not in found]
+    if missing:
+        raise WriteError(f"Unknown {label}: {', '.join(missing[:10])}")
+
+
+def _commit(db_instance, inserts, requires=(), deltas=None):
+    """
+    Inserts rows in one read-write transaction.
+
+    Args:
+        inserts: (table, columns, rows) per table, in foreign-key order.
+        requires: (table, key column, keys, label) of referenced rows.
+        deltas: stats_deltas() to apply in the same transaction.
+    """
+    def insert_txn(transaction):
+        for table, key_column, keys, label in requires:
+            _require_keys(transaction, table, key_column, keys, label)
+        for table, columns, rows in inserts:
+            if rows:
+                transaction.insert(table=table, columns=columns, values=rows)
+        if deltas:
+            apply_stats_deltas(transaction, deltas)
+
+    db_instance.run_in_transaction(insert_txn)
+
+
+def create_experiments(db_instance, payload):
+    """
+    Inserts experiments and counts them in their PI's ResearcherStats.
+
+    Each record needs experiment_name (or name) and principal_investigator_id
+    or principal_investigator_name; description, protocol, hypothesis,
+    start_date, end_date and status (default "planning") are optional.
+
+    Returns:
+        list: The new experiment_ids, in record order.
+    """
+    resolved = {}
+    rows = []
+    for index, record in enumerate(_records(payload)):
+        name = record.get("experiment_name") or record.get("name")
+        if not name:
+            raise WriteError(f"Record {index}: missing experiment_name")
+        if not isinstance(name, str):
+            raise WriteError(f"Record {index}: experiment_name must be a string")
+        status = record.get("status") or "planning"
+        if status not in EXPERIMENT_STATUSES:
+            raise WriteError(f"Record {index}: status must be one of {', '.join(EXPERIMENT_STATUSES)}")
+        rows.append((
+            str(uuid.uuid4()), name, record.get("description"), record.get("protocol"), record.get("hypothesis"),
+            _timestamp(record.get("start_date"), index, "start_date"),
+            _timestamp(record.get("end_date"), index, "end_date"),
+            status,
+            _researcher_id(db_instance, record, index, "principal_investigator_id", "principal_investigator_name",
+                           resolved),
+            spanner.COMMIT_TIMESTAMP,
+        ))
+    _mutation_count((EXPERIMENT_COLUMNS, rows))
+
+    pis = [row[EXPERIMENT_COLUMNS.index("principal_investigator_id")] for row in rows]
+    _commit(
+        db_instance,
+        [("Experiment", EXPERIMENT_COLUMNS, rows)],
+        requires=[("Researcher", "researcher_id", pis, "researcher_id")],
+        deltas=stats_deltas(experiments=[{"principal_investigator_id": pi} for pi in pis]),
+    )
+    invalidate_tables("Experiment", "ResearcherStats")
+    return [row[0] for row in rows]
+
+
+def create_analyses(db_instance, payload):
+    """
+    Inserts analysis reports.
+
+    Each record needs signal_id, analysis_type and researcher_id or
+    researcher_name; parameters and results (JSON strings or objects),
+    findings, confidence_score (0-1) and analyzed_at (default now) are
+    optional.
+
+    Returns:
+        list: The new analysis_ids, in record order.
+    """
+    resolved = {}
+    now = datetime.now(timezone.utc)
+    rows = []
+    for index, record in enumerate(_records(payload)):
+        _required(record, index, "signal_id", "analysis_type")
+        rows.append((
+            str(uuid.uuid4()), record["signal_id"],
+            _researcher_id(db_instance, record, index, "researcher_id", "researcher_name", resolved),
+            record["analysis_type"], _json_text(record.get("parameters")), _json_text(record.get("results")),
+            record.get("findings"),
+            _number(record.get("confidence_score"), index, "confidence_score", low=0.0, high=1.0),
+            _timestamp(record.get("analyzed_at"), index, "analyzed_at", default=now),
+            spanner.COMMIT_TIMESTAMP,
+        ))
+    _mutation_count((ANALYSIS_COLUMNS, rows))
+
+    _commit(
+        db_instance,
+        [("Analysis", ANALYSIS_COLUMNS, rows)],
+        requires=[("SignalData", "signal_id", [row[1] for row in rows], "signal_id"),
+                  ("Researcher", "researcher_id", [row[2] for row in rows], "researcher_id")],
+    )
+    invalidate_tables("Analysis")
+    return [row[0] for row in rows]
+
+
+def create_sessions(db_instance, payload):
+    """
+    Inserts sessions, the signals recorded in them and their researchers'
+    session counts.
+
+    Each record needs experiment_id and researcher_id or researcher_name;
+    participant_id, session_date, duration_minutes, notes and signals are
+    optional. Each entry of signals needs device_id and signal_type and may
+    give duration_seconds, sampling_rate, channels, file_path (relative to
+    the signal root, or gs://), quality_score, processing_status (default
+    "raw"), recorded_at (default the session date) and notes.
+
+    Returns:
+        list: {"session_id", "signal_ids"} per record, in record order.
+    """
+    resolved = {}
+    sessions = []
+    signals = []
+    created = []
+    for index, record in enumerate(_records(payload)):
+        _required(record, index, "experiment_id")
+        session_id = str(uuid.uuid4())
+        session_date = _timestamp(record.get("session_date") or record.get("date"), index, "session_date")
+        sessions.append((
+            session_id, record["experiment_id"], record.get("participant_id"),
+            _researcher_id(db_instance, record, index, "researcher_id", "researcher_name", resolved),
+            session_date,
+            _number(record.get("duration_minutes"), index, "duration_minutes", kind=int, low=0),
+            record.get("notes"),
+            spanner.COMMIT_TIMESTAMP,
+        ))
+
+        signal_ids = []
+        for signal in record.get("signals") or []:
+            if not isinstance(signal, dict):
+                raise WriteError(f"Record {index}: signals must be JSON objects")
+            _required(signal, index, "device_id", "signal_type")
+            signal_ids.append(str(uuid.uuid4()))
+            signals.append((
+                signal_ids[-1], record["experiment_id"], session_id, signal["device_id"], signal["signal_type"],
+                _number(signal.get("duration_seconds"), index, "duration_seconds", low=0.0),
+                _number(signal.get("sampling_rate"), index, "sampling_rate", kind=int, low=1),
+                _number(signal.get("channels"), index, "channels", kind=int, low=1),
+                _signal_file_path(signal.get("file_path"), index),
+                _number(signal.get("quality_score"), index, "quality_score", low=0.0, high=1.0),
+                signal.get("processing_status") or DEFAULT_SIGNAL_STATUS,
+                _timestamp(signal.get("recorded_at"), index, "recorded_at", default=session_date),
+                signal.get("notes"),
+                spanner.COMMIT_TIMESTAMP,
+            ))
+        created.append({"session_id": session_id, "signal_ids": signal_ids})
+    _mutation_count((SESSION_COLUMNS, sessions), (SIGNAL_COLUMNS, signals))
+
+    researcher_ids = [row[3] for row in sessions]
+    _commit(
+        db_instance,
+        [("Session", SESSION_COLUMNS, sessions), ("SignalData", SIGNAL_COLUMNS, signals)],
+        requires=[("Experiment", "experiment_id", [row[1] for row in sessions], "experiment_id"),
+                  ("Researcher", "researcher_id", researcher_ids, "researcher_id"),
+                  ("Device", "device_id", [row[3] for row in signals], "device_id")],
+        deltas=stats_deltas(sessions=[{"researcher_id": rid} for rid in researcher_ids]),
+    )
+    invalidate_tables("Session", "SignalData", "ResearcherStats")
+    return created
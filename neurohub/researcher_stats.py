@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Materialized per-researcher counters (ResearcherStats table).
+
+Writers that insert Experiments, Sessions, Publications or Collaborations
+build deltas with stats_deltas() and apply them with apply_stats_deltas()
+inside the same read-write transaction, so the counters commit atomically
+with the rows they count. Collaborators are counted once per distinct pair,
+in either order, as RECOMPUTE_STATS_SQL does: writers pass their rows
+through new_collaborations() first. Readers then need a single primary-key lookup
+(db_neurohub.get_researcher_stats).
+
+Run this module to backfill the table or repair drift:
+    python researcher_stats.py              # backfill / reconcile
+    python researcher_stats.py --dry-run    # only report differences
+"""
+
+import argparse
+import time
+from collections import Counter, defaultdict
+
+from google.cloud import spanner
+
+from db_neurohub import db, stream_sql_query
+from query_cache import invalidate_tables
+
+STATS_TABLE = "ResearcherStats"
+STATS_COLUMNS = ("projects", "publications", "collaborators", "total_sessions")
+WRITE_BATCH_ROWS = 1000
+
+# Counters for every researcher, recomputed from the base tables
+RECOMPUTE_STATS_SQL = """
+    WITH project_counts AS (
+        SELECT principal_investigator_id AS researcher_id, COUNT(*) AS projects
+        FROM Experiment
+        GROUP BY principal_investigator_id
+    ),
+    publication_counts AS (
+        SELECT e.principal_investigator_id AS researcher_id, COUNT(*) AS publications
+        FROM Publication p
+        JOIN Experiment e ON p.experiment_id = e.experiment_id
+        GROUP BY e.principal_investigator_id
+    ),
+    collaborator_counts AS (
+        SELECT edges.researcher_id, COUNT(DISTINCT edges.collaborator_id) AS collaborators
+        FROM (
+            SELECT researcher_id_a AS researcher_id, researcher_id_b AS collaborator_id FROM Collaboration
+            UNION ALL
+            SELECT researcher_id_b AS researcher_id, researcher_id_a AS collaborator_id FROM Collaboration
+        ) AS edges
+        GROUP BY edges.researcher_id
+    ),
+    session_counts AS (
+        SELECT researcher_id, COUNT(*) AS total_sessions
+        FROM Session
+        GROUP BY researcher_id
+    )
+    SELECT
+        r.researcher_id,
+        COALESCE(pc.projects, 0) AS projects,
+        COALESCE(pub.publications, 0) AS publications,
+        COALESCE(cc.collaborators, 0) AS collaborators,
+        COALESCE(sc.total_sessions, 0) AS total_sessions
+    FROM Researcher r
+    LEFT JOIN project_counts pc ON pc.researcher_id = r.researcher_id
+    LEFT JOIN publication_counts pub ON pub.researcher_id = r.researcher_id
+    LEFT JOIN collaborator_counts cc ON cc.researcher_id = r.researcher_id
+    LEFT JOIN session_counts sc ON sc.researcher_id = r.researcher_id
+"""
+
+
+# --- Incremental Maintenance ---
+
+def _pair(collaboration):
+    return frozenset((collaboration["researcher_id_a"], collaboration["researcher_id_b"]))
+
+
+def new_collaborations(transaction, collaborations):
+    """
+    The collaborations linking researchers who were not collaborators yet.
+
+    Reads, within the caller's read-write transaction, the Collaboration keys
+    of each pair in both orders; a pair already stored either way, or
+    repeated in collaborations, adds no collaborator. Mutations buffered in
+    the same transaction are not visible to the read, so call it before or
+    after inserting the rows.
+
+    Returns:
+        list: The collaborations that add a collaborator to each side.
+    """
+    pairs = {_pair(collaboration) for collaboration in collaborations}
+    if not pairs:
+        return []
+    keys = []
+    for pair in pairs:
+        low, high = min(pair), max(pair)
+        keys.append([low, high])
+        if low != high:
+            keys.append([high, low])
+    existing = {frozenset(row) for row in transaction.read(
+        "Collaboration", ("researcher_id_a", "researcher_id_b"), spanner.KeySet(keys=keys))}
+
+    added = []
+    for collaboration in collaborations:
+        pair = _pair(collaboration)
+        if pair not in existing:
+            existing.add(pair)
+            added.append(collaboration)
+    return added
+
+
+def stats_deltas(experiments=(), sessions=(), publication_pis=(), collaborations=()):
+    """
+    Builds counter increments for newly inserted rows.
+
+    Args:
+        experiments: Experiment row dicts (uses principal_investigator_id).
+        sessions: Session row dicts (uses researcher_id).
+        publication_pis: The PI researcher_id of each new publication's experiment.
+        collaborations: Collaboration row dicts (uses researcher_id_a/_b), from
+            new_collaborations(). Each distinct pair adds one collaborator
+            per side (one in all for a researcher paired with themselves).
+
+    Returns:
+        dict[str, Counter]: researcher_id -> {column: increment}
+    """
+    deltas = defaultdict(Counter)
+    for experiment in experiments:
+        deltas[experiment["principal_investigator_id"]]["projects"] += 1
+    for session in sessions:
+        deltas[session["researcher_id"]]["total_sessions"] += 1
+    for researcher_id in publication_pis:
+        if researcher_id:
+            deltas[researcher_id]["publications"] += 1
+    for pair in {_pair(collaboration) for collaboration in collaborations}:
+        for researcher_id in pair:
+            deltas[researcher_id]["collaborators"] += 1
+    return deltas
+
+
+def apply_stats_deltas(transaction, deltas):
+    """
+    Adds counter increments to ResearcherStats within a read-write transaction.
+
+    The current counters are read with one batched key read, then written back
+    with insert_or_update, so the rows lock together with the caller's inserts.
+    """
+    researcher_ids = [rid for rid, delta in deltas.items() if rid and any(delta.values())]
+    if not researcher_ids:
+        return 0
+
+    keyset = spanner.KeySet(keys=[[rid] for rid in researcher_ids])
+    current = {
+        row[0]: dict(zip(STATS_COLUMNS, row[1:]))
+        for row in transaction.read(STATS_TABLE, ("researcher_id",) + STATS_COLUMNS, keyset)
+    }
+
+    values = []
+    for researcher_id in researcher_ids:
+        counters = current.get(researcher_id, dict.fromkeys(STATS_COLUMNS, 0))
+        values.append(
+            (researcher_id,)
+            + tuple((counters[column] or 0) + deltas[researcher_id][column] for column in STATS_COLUMNS)
+            + (spanner.COMMIT_TIMESTAMP,)
+        )
+
+    transaction.insert_or_update(
+        table=STATS_TABLE,
+        columns=("researcher_id",) + STATS_COLUMNS + ("update_time",),
+        values=values,
+    )
+    return len(values)
+
+
+# --- Backfill / Reconcile ---
+
+def reconcile(db_instance, dry_run=False):
+    """
+    Recomputes every researcher's counters and rewrites rows that drifted.
+
+    On an empty ResearcherStats table this is the backfill. Both sides are
+    streamed; only the stored counters are held in memory.
+
+    Returns:
+        dict: Counts of researchers checked, rows missing and rows changed.
+    """
+    stored = {
+        row["researcher_id"]: tuple(row[column] for column in STATS_COLUMNS)
+        for row in stream_sql_query(db_instance, f"SELECT researcher_id, {', '.join(STATS_COLUMNS)} FROM {STATS_TABLE}")
+    }
+
+    summary = {"checked": 0, "missing": 0, "changed": 0}
+    pending = []
+
+    def flush():
+        if pending and not dry_run:
+            with db_instance.batch() as batch:
+                batch.insert_or_update(
+                    table=STATS_TABLE,
+                    columns=("researcher_id",) + STATS_COLUMNS + ("update_time",),
+                    values=[row + (spanner.COMMIT_TIMESTAMP,) for row in pending],
+                )
+        pending.clear()
+
+    for row in stream_sql_query(db_instance, RECOMPUTE_STATS_SQL):
+        summary["checked"] += 1
+        counters = tuple(row[column] for column in STATS_COLUMNS)
+        existing = stored.get(row["researcher_id"])
+        if existing == counters:
+            continue
+        summary["missing" if existing is None else "changed"] += 1
+        pending.append((row["researcher_id"],) + counters)
+        if len(pending) >= WRITE_BATCH_ROWS:
+            flush()
+    flush()
+
+    if not dry_run and (summary["missing"] or summary["changed"]):
+        invalidate_tables(STATS_TABLE)
+    return summary
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Backfill or reconcile the ResearcherStats table.")
+    arg_parser.add_argument("--dry-run", action="store_true", help="Report differences without writing")
+    args = arg_parser.parse_args()
+
+    if not db:
+        print("Cannot reconcile: Spanner database connection not established.")
+        exit(1)
+
+    start_time = time.time()
+    result = reconcile(db, dry_run=args.dry_run)
+    action = "would be written" if args.dry_run else "written"
+    print(f"Checked {result['checked']} researchers: {result['missing']} missing and "
+          f"{result['changed']} drifted rows {action} ({time.time() - start_time:.2f}s).")
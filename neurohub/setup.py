@@ -8,29 +8,13 @@ import random
 from google.cloud import spanner
 from google.api_core import exceptions
 
-# --- Configuration ---
-INSTANCE_ID = os.environ.get("SPANNER_INSTANCE_ID", "neurohub-graph-instance")
-DATABASE_ID = os.environ.get("SPANNER_DATABASE_ID", "neurohub-db")
-
-PROJECT_ID = os.environ.get("GOOGLE_CLOUD_PROJECT")
+from neurohub_common.spanner_pool import INSTANCE_ID, DATABASE_ID, PROJECT_ID, get_database
+from researcher_stats import new_collaborations, stats_deltas, apply_stats_deltas
 
 # --- Spanner Client Initialization ---
-try:
-    spanner_client = spanner.Client(project=PROJECT_ID)
-    instance = spanner_client.instance(INSTANCE_ID)
-    database = instance.database(DATABASE_ID)
-    print(f"Targeting Spanner: {instance.name}/databases/{database.name}")
-    if not database.exists():
-        print(f"Error: Database '{DATABASE_ID}' does not exist. Please create it first.")
-        database = None
-    else:
-        print("Database connection successful.")
-except exceptions.NotFound:
-    print(f"Error: Spanner instance '{INSTANCE_ID}' not found or missing permissions.")
-    spanner_client = None; instance = None; database = None
-except Exception as e:
-    print(f"Error initializing Spanner client: {e}")
-    spanner_client = None; instance = None; database = None
+database = get_database()
+if not database:
+    print(f"Error: Database '{DATABASE_ID}' is not available. Please create it first.")
 
 def run_ddl_statements(db_instance, ddl_list, operation_description):
     """Helper function to run DDL statements and handle potential errors."""
@@ -121,7 +105,8 @@ def setup_base_schema_and_indexes(db_instance):
             channels INT64,
             file_path STRING(MAX),  -- Cloud Storage path
             quality_score FLOAT64,  -- 0-1 signal quality metric
-            processing_status STRING(50),  -- raw, filtered, processed, analyzed
+            channel_flags STRING(MAX),  -- JSON {channel: [flag, ...]} from live quality scoring
+            processing_status STRING(50),  -- recording, raw, filtered, processed, analyzed
             recorded_at TIMESTAMP,
             notes STRING(MAX),
             create_time TIMESTAMP NOT NULL OPTIONS(allow_commit_timestamp=true)
@@ -186,6 +171,20 @@ def setup_base_schema_and_indexes(db_instance):
             create_time TIMESTAMP NOT NULL OPTIONS(allow_commit_timestamp=true)
         ) PRIMARY KEY (publication_id)
         """,
+        # Materialized per-researcher counters, maintained by researcher_stats.py
+        """
+        CREATE TABLE IF NOT EXISTS ResearcherStats (
+            researcher_id STRING(36) NOT NULL,
+            projects INT64 NOT NULL,
+            publications INT64 NOT NULL,
+            collaborators INT64 NOT NULL,
+            total_sessions INT64 NOT NULL,
+            update_time TIMESTAMP NOT NULL OPTIONS(allow_commit_timestamp=true)
+        ) PRIMARY KEY (researcher_id),
+          INTERLEAVE IN PARENT Researcher ON DELETE CASCADE
+        """,
+        # Added after the first release; brings existing databases up to date
+        "ALTER TABLE SignalData ADD COLUMN IF NOT EXISTS channel_flags STRING(MAX)",
         # --- 2. Indexes ---
         "CREATE INDEX IF NOT EXISTS ResearcherByName ON Researcher(name)",
         "CREATE INDEX IF NOT EXISTS ResearcherByInstitution ON Researcher(institution)",
@@ -196,6 +195,7 @@ def setup_base_schema_and_indexes(db_instance):
         "CREATE INDEX IF NOT EXISTS SignalByDevice ON SignalData(device_id, recorded_at DESC)",
         "CREATE INDEX IF NOT EXISTS SessionByExperiment ON Session(experiment_id, session_date DESC)",
         "CREATE INDEX IF NOT EXISTS AnalysisBySignal ON Analysis(signal_id, analyzed_at DESC)",
+        "CREATE INDEX IF NOT EXISTS AnalysisByTime ON Analysis(analyzed_at DESC, analysis_id DESC)",
         "CREATE INDEX IF NOT EXISTS CollaborationByResearcherB ON Collaboration(researcher_id_b, researcher_id_a)",
     ]
     return run_ddl_statements(db_instance, ddl_statements, "Create Base Tables and Indexes")
@@ -615,6 +615,16 @@ def insert_neurohub_data(db_instance):
             else:
                 inserted_counts[table_name] = 0
         print(f"Transaction attempting to insert {total_rows_attempted} rows across all tables.")
+        
+        # Keep ResearcherStats in step with the rows inserted above
+        experiment_pis = {e["experiment_id"]: e["principal_investigator_id"] for e in experiments_rows}
+        deltas = stats_deltas(
+            experiments=experiments_rows,
+            sessions=sessions_rows,
+            publication_pis=[experiment_pis.get(p["experiment_id"]) for p in publications_rows],
+            collaborations=new_collaborations(transaction, collaborations_rows),
+        )
+        inserted_counts["ResearcherStats"] = apply_stats_deltas(transaction, deltas)
     
     # Execute the transaction
     try:
@@ -0,0 +1,296 @@
+# signal_analysis.py - Block-wise DSP analysis of recordings (see signal_io.py)
+#
+# A recording is processed in fixed-size blocks so memory stays bounded
+# whatever its length. Every step works on whole (channels x samples)
+# arrays; there are no per-sample Python loops.
+#
+# Per block:
+#   1. Zero-phase Butterworth bandpass (scipy.signal.sosfiltfilt). Blocks are
+#      read with extra samples on both sides so the filter settles before
+#      the part that is kept; the result matches filtering the whole signal.
+#   2. Welch PSD of the raw and filtered block, accumulated over blocks.
+#   3. Peak-to-peak amplitude of each 1 s epoch, for artifact detection.
+#
+# After the last block: band powers, SNR, dominant frequency and artifact
+# epochs are computed from the accumulated spectra and epoch statistics.
+#
+# iter_analysis() yields progress events as blocks complete, then the
+# results; it backs the stream-analysis-status SSE route.
+
+import math
+
+import numpy as np
+from scipy import signal
+from scipy.integrate import trapezoid
+
+from signal_io import open_signal
+
+# Analysis.analysis_type of these results; bump ANALYSIS_VERSION whenever a
+# change alters results, so analysis_cache.py does not serve old ones
+ANALYSIS_TYPE = "spectral"
+ANALYSIS_VERSION = 1
+
+DEFAULT_LOW_HZ = 0.5
+DEFAULT_HIGH_HZ = 45.0
+FILTER_ORDER = 4
+CHUNK_SECONDS = 60.0
+EPOCH_SECONDS = 1.0
+WELCH_SECONDS = 2.0
+# Cycles of the low cutoff read on each side of a block for the filter to settle
+SETTLE_CYCLES = 5
+
+# An epoch is an artifact when its peak-to-peak amplitude exceeds this many
+# times the channel's median epoch amplitude (or an absolute threshold), or
+# when the channel is flat for the whole epoch
+ARTIFACT_FACTOR = 5.0
+NOISY_CHANNEL_FRACTION = 0.2
+
+BANDS = (
+    ("delta", 0.5, 4.0),
+    ("theta", 4.0, 8.0),
+    ("alpha", 8.0, 13.0),
+    ("beta", 13.0, 30.0),
+    ("gamma", 30.0, 45.0),
+)
+
+
+def design_bandpass(sampling_rate, low_hz=DEFAULT_LOW_HZ, high_hz=DEFAULT_HIGH_HZ, order=FILTER_ORDER):
+    """
+    Returns (sos, low_hz, high_hz) for a Butterworth bandpass.
+
+    high_hz is lowered to 95% of Nyquist when the sampling rate requires it.
+    """
+    high_hz = min(high_hz, 0.95 * sampling_rate / 2)
+    if not 0 < low_hz < high_hz:
+        raise ValueError(f"Invalid passband {low_hz}-{high_hz} Hz at {sampling_rate} Hz")
+    sos = signal.butter(order, [low_hz, high_hz], btype="bandpass", fs=sampling_rate, output="sos")
+    return sos, low_hz, high_hz
+
+
+def iter_filtered_blocks(recording, sos, low_hz, block_samples, channels=None):
+    """
+    Yields (start, stop, raw, filtered) for consecutive blocks of a recording.
+
+    Each block is read with settle samples on both sides and filtered with
+    sosfiltfilt; only [start, stop) is returned.
+    """
+    pad = int(math.ceil(SETTLE_CYCLES * recording.sampling_rate / low_hz))
+    indexes = recording.channel_indexes(channels)
+    n_samples = recording.n_samples
+    default_padlen = 3 * (2 * len(sos) + 1)
+
+    for start in range(0, n_samples, block_samples):
+        stop = min(start + block_samples, n_samples)
+        first, last = max(0, start - pad), min(n_samples, stop + pad)
+        raw = recording.read(indexes, first, last)
+        filtered = signal.sosfiltfilt(sos, raw, axis=-1, padlen=min(default_padlen, raw.shape[1] - 1))
+        keep = slice(start - first, stop - first)
+        yield start, stop, raw[:, keep], filtered[:, keep]
+
+
+class WelchAccumulator:
+    """
+    Welch PSD (Hann window, 50% overlap, mean detrend, density scaling)
+    averaged over blocks; matches scipy.signal.welch on the concatenated
+    segments.
+
+    All segments of a block are windowed and transformed in one rfft call.
+    """
+
+    def __init__(self, sampling_rate, nperseg):
+        self.sampling_rate = sampling_rate
+        self.nperseg = nperseg
+        self.step = nperseg - nperseg // 2
+        self.window = signal.get_window("hann", nperseg)
+        self._window_spectrum = np.fft.rfft(self.window)
+        self.freqs = np.fft.rfftfreq(nperseg, d=1.0 / sampling_rate)
+        self._sum = None
+        self.segments = 0
+
+    def add(self, block):
+        if block.shape[1] < self.nperseg:
+            return
+        segments = np.lib.stride_tricks.sliding_window_view(block, self.nperseg, axis=-1)[:, ::self.step]
+        # Mean detrend by linearity, without a detrended copy of the segments:
+        # rfft((x - mean) * w) = rfft(x * w) - mean * rfft(w)
+        spectrum = np.fft.rfft(segments * self.window, axis=-1)
+        spectrum -= segments.mean(axis=-1, keepdims=True) * self._window_spectrum
+        power = (spectrum.real ** 2 + spectrum.imag ** 2).sum(axis=1)
+        if self._sum is None:
+            self._sum = power
+        else:
+            self._sum += power
+        self.segments += segments.shape[1]
+
+    def psd(self):
+        """Returns (freqs, psd) with psd shaped (channels, freqs)."""
+        psd = self._sum / (self.segments * self.sampling_rate * (self.window ** 2).sum())
+        # One-sided spectrum: fold negative frequencies into all bins but DC (and Nyquist)
+        psd[:, 1:-1 if self.nperseg % 2 == 0 else None] *= 2
+        return self.freqs, psd
+
+
+def _band_power(freqs, psd, low_hz, high_hz):
+    mask = (freqs >= low_hz) & (freqs <= high_hz)
+    if mask.sum() < 2:
+        return np.zeros(psd.shape[0])
+    return trapezoid(psd[:, mask], freqs[mask], axis=-1)
+
+
+def _epoch_amplitudes(block, epoch_samples):
+    """Peak-to-peak amplitude per (channel, complete epoch) of a block."""
+    n_epochs = block.shape[1] // epoch_samples
+    epochs = block[:, :n_epochs * epoch_samples].reshape(block.shape[0], n_epochs, epoch_samples)
+    return np.ptp(epochs, axis=-1)
+
+
+def detect_artifacts(amplitudes, factor=ARTIFACT_FACTOR, threshold=None):
+    """
+    Flags artifact epochs from peak-to-peak amplitudes shaped (channels, epochs).
+
+    Returns:
+        numpy.ndarray: Boolean mask of the same shape.
+    """
+    median = np.median(amplitudes, axis=1, keepdims=True)
+    mask = (amplitudes > factor * median) | (amplitudes == 0)
+    if threshold is not None:
+        mask |= amplitudes > threshold
+    return mask
+
+
+def _round(value, digits=2):
+    value = float(value)
+    return round(value, digits) if math.isfinite(value) else None
+
+
+def summarize(channel_names, freqs, raw_psd, filtered_psd, artifacts, low_hz, high_hz):
+    """Turns accumulated spectra and artifact flags into the results payload."""
+    in_band = _band_power(freqs, filtered_psd, low_hz, high_hz)
+    # Noise: raw power outside the passband, excluding the DC bin
+    total = _band_power(freqs, raw_psd, freqs[1], freqs[-1])
+    noise = np.maximum(total - _band_power(freqs, raw_psd, low_hz, high_hz), np.finfo(float).tiny)
+    with np.errstate(divide="ignore"):
+        channel_snr = 10 * np.log10(in_band / noise)
+
+    band_mask = (freqs >= low_hz) & (freqs <= high_hz)
+    mean_psd = filtered_psd.mean(axis=0)
+    dominant = freqs[band_mask][np.argmax(mean_psd[band_mask])] if band_mask.any() else float("nan")
+
+    powers = {name: _band_power(freqs, filtered_psd, lo, min(hi, high_hz)) for name, lo, hi in BANDS if lo < high_hz}
+    total_band = np.maximum(sum(powers.values()), np.finfo(float).tiny)
+    band_powers = {
+        name: {"absolute": _round(power.mean(), 4), "relative": _round((power / total_band).mean(), 3)}
+        for name, power in powers.items()
+    }
+
+    n_epochs = artifacts.shape[1]
+    artifact_epochs = int(artifacts.any(axis=0).sum()) if n_epochs else 0
+    artifact_fraction = artifact_epochs / n_epochs if n_epochs else 0.0
+    channel_artifacts = artifacts.mean(axis=1) if n_epochs else np.zeros(len(channel_names))
+    noisy = [name for name, fraction in zip(channel_names, channel_artifacts) if fraction > NOISY_CHANNEL_FRACTION]
+
+    snr = float(np.median(channel_snr))
+    if snr >= 10 and artifact_fraction < 0.05:
+        quality = "Good"
+    elif snr < 3 or artifact_fraction > NOISY_CHANNEL_FRACTION:
+        quality = "Poor"
+    else:
+        quality = "Fair"
+
+    recommendations = []
+    if quality == "Good":
+        recommendations.append("Signal quality is suitable for analysis")
+    if band_powers:
+        strongest = max(band_powers, key=lambda name: band_powers[name]["relative"] or 0)
+        recommendations.append(f"{strongest.capitalize()} band activity is prominent")
+    if artifact_fraction >= 0.05:
+        recommendations.append(f"{artifact_fraction:.0%} of epochs contain artifacts; consider artifact rejection")
+    if noisy:
+        recommendations.append(f"Consider additional preprocessing for channels {', '.join(noisy)}")
+
+    return {
+        "summary": f"Signal quality: {quality}",
+        "snr": _round(snr, 1),
+        "dominant_frequency": _round(dominant),
+        "band_powers": band_powers,
+        "artifacts_detected": artifact_epochs,
+        "epochs": n_epochs,
+        "artifact_fraction": _round(artifact_fraction, 3),
+        "channel_snr": {name: _round(value, 1) for name, value in zip(channel_names, channel_snr)},
+        "noisy_channels": noisy,
+        "recommendations": recommendations,
+    }
+
+
+def iter_analysis(recording, low_hz=DEFAULT_LOW_HZ, high_hz=DEFAULT_HIGH_HZ, channels=None,
+                  chunk_seconds=CHUNK_SECONDS, artifact_threshold=None):
+    """
+    Analyzes a recording block by block.
+
+    Yields:
+        dict: {"type": "progress", "step": str, "progress": 0-100} after each
+        block, then {"type": "results", "content": {...}}.
+    """
+    fs = recording.sampling_rate
+    indexes = recording.channel_indexes(channels)
+    names = [recording.channel_names[i] for i in indexes]
+    sos, low_hz, high_hz = design_bandpass(fs, low_hz, high_hz)
+
+    epoch_samples = max(1, int(round(EPOCH_SECONDS * fs)))
+    # Whole epochs per block, so epochs never straddle two blocks
+    block_samples = max(1, int(round(chunk_seconds / EPOCH_SECONDS))) * epoch_samples
+    nperseg = max(2, min(int(round(WELCH_SECONDS * fs)), recording.n_samples))
+    raw_welch = WelchAccumulator(fs, nperseg)
+    filtered_welch = WelchAccumulator(fs, nperseg)
+    amplitudes = []
+
+    yield {"type": "progress", "step": f"Loaded {len(names)} channels, {recording.duration_seconds:.0f} s "
+                                       f"at {fs:g} Hz", "progress": 5}
+
+    for start, stop, raw, filtered in iter_filtered_blocks(recording, sos, low_hz, block_samples, indexes):
+        raw_welch.add(raw)
+        filtered_welch.add(filtered)
+        amplitudes.append(_epoch_amplitudes(filtered, epoch_samples))
+        yield {
+            "type": "progress",
+            "step": f"Bandpass filtered ({low_hz:g}-{high_hz:g} Hz) and scanned "
+                    f"{stop / fs:.0f}/{recording.duration_seconds:.0f} s for artifacts",
+            "progress": 5 + int(85 * stop / recording.n_samples),
+        }
+
+    if not filtered_welch.segments:
+        raise ValueError("Recording is too short to analyze")
+
+    yield {"type": "progress", "step": "Computing band powers and SNR...", "progress": 95}
+    freqs, raw_psd = raw_welch.psd()
+    _, filtered_psd = filtered_welch.psd()
+    amplitudes = np.concatenate(amplitudes, axis=1)
+    artifacts = detect_artifacts(amplitudes, threshold=artifact_threshold)
+
+    content = summarize(names, freqs, raw_psd, filtered_psd, artifacts, low_hz, high_hz)
+    content.update({
+        "sampling_rate": fs,
+        "channels": len(names),
+        "duration_seconds": _round(recording.duration_seconds),
+        "filter": {"type": "butterworth", "order": FILTER_ORDER, "low_hz": low_hz, "high_hz": _round(high_hz),
+                   "zero_phase": True},
+    })
+    yield {"type": "results", "content": content}
+
+
+def analyze_recording(recording, **options):
+    """Runs iter_analysis() to completion and returns the results content."""
+    for event in iter_analysis(recording, **options):
+        if event["type"] == "results":
+            return event["content"]
+
+
+def analyze_file(file_path, sampling_rate=None, **options):
+    """
+    Opens a SignalData.file_path and analyzes it (see analyze_recording).
+
+    Depends only on signal_io, so batch_analysis.py can run it in worker
+    processes that never import the Spanner client.
+    """
+    with open_signal(file_path, sampling_rate=sampling_rate) as recording:
+        return analyze_recording(recording, **options)
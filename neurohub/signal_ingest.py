@@ -0,0 +1,455 @@
+# signal_ingest.py - Live recording of device sample frames into SignalData files
+#
+# A device (or the gateway it is attached to) records a signal in two steps:
+#
+#   POST /api/signals/ingest              JSON: session_id, device_id, signal_type,
+#                                         sampling_rate, channels, dtype, ...
+#       -> creates the SignalData row (processing_status "recording") and an
+#          empty recording file; returns the signal_id
+#   POST /api/signals/<id>/frames         body: binary frames, any number,
+#                                         usually sent with chunked transfer
+#                                         encoding; repeat after a reconnect;
+#                                         ?close=1 finishes the recording
+#
+# Frame layout (little-endian): a FRAME_HEADER of
+#   magic b"NHF1", channel count (uint16), dtype code (uint8), pad byte,
+#   sample count (uint32), timestamp of the first sample (int64 us since the
+#   epoch) and device_id (36 bytes, UTF-8, NUL padded)
+# followed by sample count x channel count samples, interleaved (all
+# channels of sample 0, then of sample 1, ...). encode_frame() builds one.
+#
+# Frames are read from the request body one at a time into a reused buffer
+# and written straight to the file, so a connection holds one frame in
+# memory however long the session runs. The file is a headerless .bin with
+# a JSON sidecar (see signal_io.py), grown PREALLOCATE_SECONDS at a time;
+# the sidecar's "samples" says how much of it holds data, so the recording
+# can be read and plotted while it is still being written. A forward jump in
+# timestamps leaves the skipped samples as zeros; a jump over
+# MAX_GAP_SECONDS is rejected instead, so one bad timestamp cannot reserve
+# an arbitrarily large file. Closing truncates the preallocated tail and
+# queues the build of the recording's plotting pyramid (signal_pyramid.py).
+#
+# duration_seconds is written back to SignalData every
+# PROGRESS_INTERVAL_SECONDS while frames arrive, together with the rolling
+# quality_score and channel_flags of signal_quality.OnlineQualityEstimator;
+# a change in the flagged channels is written within
+# QUALITY_INTERVAL_SECONDS instead, so a bad electrode shows up in SignalData
+# seconds into the session. The estimator starts afresh with each upload.
+# Float samples have no rails of their own: the start request's clip_limits
+# (the converter's [low, high] range in raw sample units) are kept in the
+# sidecar and enable the clipping flag for them.
+# Each signal accepts one upload at a time; different signals (devices)
+# record concurrently.
+
+import json
+import os
+import struct
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+import numpy as np
+from google.cloud import spanner
+from google.cloud.spanner_v1 import param_types
+
+from db_neurohub import get_signal_data, run_sql_query
+from query_cache import invalidate_tables
+from signal_io import resolve_signal_path
+from signal_pyramid import schedule_build
+from signal_quality import OnlineQualityEstimator
+
+FRAME_MAGIC = b"NHF1"
+FRAME_HEADER = struct.Struct("<4sHBxIq36s")
+FRAME_DTYPES = {1: "<i2", 2: "<i4", 3: "<f4", 4: "<f8"}
+DTYPE_CODES = {np.dtype(dtype): code for code, dtype in FRAME_DTYPES.items()}
+
+# Recordings are written under this directory of NEUROHUB_SIGNAL_ROOT
+INGEST_DIR = os.environ.get("NEUROHUB_INGEST_DIR", "ingest")
+PREALLOCATE_SECONDS = 60
+PROGRESS_INTERVAL_SECONDS = float(os.environ.get("NEUROHUB_INGEST_PROGRESS_SECONDS", "5"))
+# Minimum time between writes caused by a change in channel_flags
+QUALITY_INTERVAL_SECONDS = 1.0
+# Frames over this size are rejected rather than buffered
+MAX_FRAME_BYTES = 16 * 1024 * 1024
+# Timestamp differences under this many sample periods are clock jitter, not gaps
+GAP_TOLERANCE_SAMPLES = 1.5
+# Longer forward jumps are rejected rather than zero-filled
+MAX_GAP_SECONDS = float(os.environ.get("NEUROHUB_INGEST_MAX_GAP_SECONDS", "5"))
+
+RECORDING_STATUS = "recording"
+RECORDED_STATUS = "raw"
+
+_upload_locks = {}
+_upload_locks_lock = threading.Lock()
+
+
+class IngestError(ValueError):
+    """Raised for malformed frames or frames that do not match the signal."""
+
+
+class IngestBusy(Exception):
+    """Raised when another upload to the same signal is in progress."""
+
+
+def encode_frame(device_id, samples, timestamp_us):
+    """
+    Builds one frame from a (samples, channels) array; its dtype selects the
+    frame dtype (int16, int32, float32 or float64).
+    """
+    samples = np.ascontiguousarray(samples)
+    code = DTYPE_CODES.get(samples.dtype.newbyteorder("<"))
+    if code is None or samples.ndim != 2:
+        raise IngestError(f"Frames carry 2-D int16/int32/float32/float64 samples, not {samples.dtype}")
+    header = FRAME_HEADER.pack(FRAME_MAGIC, samples.shape[1], code, samples.shape[0], int(timestamp_us),
+                               device_id.encode("utf-8"))
+    return header + samples.astype(FRAME_DTYPES[code], copy=False).tobytes()
+
+
+def _read_exact(stream, view):
+    """Fills a memoryview from the stream; returns the bytes read (short only at end of stream)."""
+    filled = 0
+    while filled < len(view):
+        count = stream.readinto(view[filled:]) if hasattr(stream, "readinto") else None
+        if count is None:
+            chunk = stream.read(len(view) - filled)
+            count = len(chunk)
+            view[filled:filled + count] = chunk
+        if not count:
+            break
+        filled += count
+    return filled
+
+
+def read_frames(stream):
+    """
+    Yields (header dict, payload memoryview) for each frame in a byte stream.
+
+    The payload view is only valid until the next frame is read.
+
+    Raises:
+        IngestError: On a bad magic number, oversized frame or truncated stream.
+    """
+    header_buffer = bytearray(FRAME_HEADER.size)
+    payload_buffer = bytearray(0)
+    while True:
+        count = _read_exact(stream, memoryview(header_buffer))
+        if count == 0:
+            return
+        if count < FRAME_HEADER.size:
+            raise IngestError("Stream ended inside a frame header")
+        magic, channels, code, samples, timestamp_us, device_id = FRAME_HEADER.unpack(header_buffer)
+        if magic != FRAME_MAGIC:
+            raise IngestError("Bad frame magic; expected NHF1")
+        if code not in FRAME_DTYPES:
+            raise IngestError(f"Unknown frame dtype code {code}")
+        size = samples * channels * np.dtype(FRAME_DTYPES[code]).itemsize
+        if size > MAX_FRAME_BYTES:
+            raise IngestError(f"Frame of {size} bytes exceeds {MAX_FRAME_BYTES}")
+        if len(payload_buffer) < size:
+            payload_buffer = bytearray(size)
+        payload = memoryview(payload_buffer)[:size]
+        if _read_exact(stream, payload) < size:
+            raise IngestError("Stream ended inside a frame payload")
+        yield {
+            "channels": channels,
+            "dtype": FRAME_DTYPES[code],
+            "samples": samples,
+            "timestamp_us": timestamp_us,
+            "device_id": device_id.rstrip(b"\0").decode("utf-8", errors="replace"),
+        }, payload
+
+
+class SignalWriter:
+    """Appends interleaved samples to a preallocated .bin file with a JSON sidecar."""
+
+    def __init__(self, path, sidecar):
+        self.path = path
+        self.sidecar = sidecar
+        self.dtype = np.dtype(sidecar["dtype"])
+        self.channels = int(sidecar["channels"])
+        self.sampling_rate = float(sidecar["sampling_rate"])
+        self.frame_bytes = self.dtype.itemsize * self.channels
+        self.gaps = 0
+        self.overlaps = 0
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        self._allocated = os.fstat(self._fd).st_size
+
+    @classmethod
+    def create(cls, path, sampling_rate, channels, dtype, device_id, channel_names=None, scale=1.0, units=None,
+               clip_limits=None):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if isinstance(units, str):
+            units = [units] * int(channels)
+        sidecar = {
+            "sampling_rate": float(sampling_rate),
+            "channels": int(channels),
+            "channel_names": channel_names or [f"ch{i + 1}" for i in range(int(channels))],
+            "dtype": np.dtype(dtype).newbyteorder("<").str,
+            "layout": "interleaved",
+            "scale": scale,
+            "units": units,
+            "clip_limits": clip_limits,
+            "device_id": device_id,
+            "samples": 0,
+            "start_time_us": None,
+        }
+        _write_sidecar(path, sidecar)
+        return cls(path, sidecar)
+
+    @classmethod
+    def open(cls, path):
+        with open(path + ".json", "r", encoding="utf-8") as f:
+            return cls(path, json.load(f))
+
+    @property
+    def samples(self):
+        return self.sidecar["samples"]
+
+    @property
+    def duration_seconds(self):
+        return self.samples / self.sampling_rate
+
+    def _reserve(self, end):
+        if end <= self._allocated:
+            return
+        step = int(PREALLOCATE_SECONDS * self.sampling_rate) * self.frame_bytes
+        size = max(end, self._allocated + step)
+        if hasattr(os, "posix_fallocate"):
+            os.posix_fallocate(self._fd, self._allocated, size - self._allocated)
+        else:
+            os.truncate(self._fd, size)
+        self._allocated = size
+
+    def append(self, header, payload):
+        """
+        Writes one frame. Returns the sample offset the frame was written at.
+
+        Raises:
+            IngestError: If the frame's device, channel count or dtype differ
+            from the signal's, or its timestamp is over MAX_GAP_SECONDS
+            ahead of the recording.
+        """
+        if header["device_id"] != self.sidecar["device_id"]:
+            raise IngestError(f"Frame from device {header['device_id']}, signal records {self.sidecar['device_id']}")
+        if header["channels"] != self.channels or np.dtype(header["dtype"]) != self.dtype:
+            raise IngestError(f"Frame has {header['channels']} x {header['dtype']} samples, signal records "
+                              f"{self.channels} x {self.dtype.str}")
+
+        start = self.samples
+        start_time_us = self.sidecar["start_time_us"]
+        if start_time_us is None:
+            self.sidecar["start_time_us"] = header["timestamp_us"]
+        else:
+            expected_us = start_time_us + start * 1e6 / self.sampling_rate
+            drift = (header["timestamp_us"] - expected_us) * self.sampling_rate / 1e6
+            if drift > MAX_GAP_SECONDS * self.sampling_rate:
+                raise IngestError(f"Frame timestamp jumps {drift / self.sampling_rate:.1f}s ahead of the "
+                                  f"recording, over the {MAX_GAP_SECONDS:g}s allowed gap")
+            if drift > GAP_TOLERANCE_SAMPLES:
+                # Samples lost upstream: keep the timeline, the skipped range stays zero
+                start += int(round(drift))
+                self.gaps += 1
+            elif drift < -GAP_TOLERANCE_SAMPLES:
+                self.overlaps += 1
+
+        offset = start * self.frame_bytes
+        self._reserve(offset + len(payload))
+        os.pwrite(self._fd, payload, offset)
+        self.sidecar["samples"] = start + header["samples"]
+        return start
+
+    def sync(self):
+        """Publishes the sample count to readers (after the samples themselves are on disk)."""
+        if hasattr(os, "fdatasync"):
+            os.fdatasync(self._fd)
+        else:
+            os.fsync(self._fd)
+        _write_sidecar(self.path, self.sidecar)
+
+    def close(self, finish=False):
+        """Releases the file; with finish, trims the preallocated tail first."""
+        try:
+            if finish:
+                os.ftruncate(self._fd, self.samples * self.frame_bytes)
+            self.sync()
+        finally:
+            os.close(self._fd)
+
+
+def _write_sidecar(path, sidecar):
+    tmp = f"{path}.json.tmp-{os.getpid()}-{threading.get_ident()}"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(sidecar, f)
+    os.replace(tmp, path + ".json")
+
+
+def _signal_lock(signal_id):
+    with _upload_locks_lock:
+        return _upload_locks.setdefault(signal_id, threading.Lock())
+
+
+def _update_signal(db_instance, signal_id, writer, status, recorded_at=None, quality=None):
+    columns = ["signal_id", "duration_seconds", "processing_status"]
+    values = [signal_id, round(writer.duration_seconds, 3), status]
+    if recorded_at is not None:
+        columns.append("recorded_at")
+        values.append(recorded_at)
+    if quality and quality["quality_score"] is not None:
+        columns.extend(["quality_score", "channel_flags"])
+        values.extend([quality["quality_score"], json.dumps(quality["channel_flags"], sort_keys=True)])
+    with db_instance.batch() as batch:
+        batch.update(table="SignalData", columns=columns, values=[values])
+    invalidate_tables("SignalData")
+
+
+def start_signal(db_instance, session_id, device_id, signal_type, sampling_rate, channels, dtype="<f4",
+                 channel_names=None, scale=1.0, units=None, experiment_id=None, clip_limits=None):
+    """
+    Creates a SignalData row in "recording" status and its empty recording file.
+
+    clip_limits is the device's [low, high] converter range in raw sample
+    units; samples on it count as clipped (see signal_quality.py).
+
+    Returns:
+        dict: {"signal_id", "file_path", "experiment_id"}
+
+    experiment_id, when given, must be the session's experiment; the file is
+    always placed under the session's experiment.
+
+    Raises:
+        IngestError: If the session does not exist, does not belong to
+            experiment_id, or the layout is invalid.
+    """
+    for name, value in (("session_id", session_id), ("device_id", device_id), ("signal_type", signal_type)):
+        if not isinstance(value, str) or not value:
+            raise IngestError(f"{name} must be a non-empty string")
+    if experiment_id is not None and not isinstance(experiment_id, str):
+        raise IngestError("experiment_id must be a string")
+    try:
+        dtype = np.dtype(dtype).newbyteorder("<")
+    except TypeError as e:
+        raise IngestError(f"Unknown dtype: {e}") from None
+    if dtype not in DTYPE_CODES:
+        raise IngestError(f"dtype must be one of {', '.join(FRAME_DTYPES.values())}")
+    if int(channels) < 1 or float(sampling_rate) <= 0:
+        raise IngestError("channels and sampling_rate must be positive")
+    if channel_names is not None and len(channel_names) != int(channels):
+        raise IngestError("channel_names must name every channel")
+    if clip_limits is not None:
+        try:
+            low, high = (float(limit) for limit in clip_limits)
+        except (TypeError, ValueError):
+            raise IngestError("clip_limits must be [low, high] raw sample values") from None
+        if not low < high:
+            raise IngestError("clip_limits must be [low, high] with low < high")
+        clip_limits = [low, high]
+
+    rows = run_sql_query(db_instance, "SELECT experiment_id FROM Session WHERE session_id = @session_id",
+                         params={"session_id": session_id},
+                         param_types={"session_id": param_types.STRING})
+    if not rows:
+        raise IngestError(f"Session {session_id} not found")
+    if experiment_id is not None and experiment_id != rows[0]["experiment_id"]:
+        raise IngestError(f"Session {session_id} does not belong to experiment {experiment_id}")
+    experiment_id = rows[0]["experiment_id"]
+
+    signal_id = str(uuid.uuid4())
+    file_path = f"{INGEST_DIR}/{experiment_id}/{signal_id}.bin"
+    SignalWriter.create(resolve_signal_path(file_path), sampling_rate, channels, dtype, device_id,
+                        channel_names=channel_names, scale=scale, units=units, clip_limits=clip_limits).close()
+
+    with db_instance.batch() as batch:
+        batch.insert(
+            table="SignalData",
+            columns=("signal_id", "experiment_id", "session_id", "device_id", "signal_type", "duration_seconds",
+                     "sampling_rate", "channels", "file_path", "processing_status", "recorded_at", "create_time"),
+            values=[(signal_id, experiment_id, session_id, device_id, signal_type, 0.0, int(round(sampling_rate)),
+                     int(channels), file_path, RECORDING_STATUS, datetime.now(timezone.utc),
+                     spanner.COMMIT_TIMESTAMP)],
+        )
+    invalidate_tables("SignalData")
+    return {"signal_id": signal_id, "file_path": file_path, "experiment_id": experiment_id}
+
+
+def ingest_frames(db_instance, signal_id, stream, close=False):
+    """
+    Appends the frames in a request body to a recording signal.
+
+    Frames written before an error are kept and counted in SignalData.
+
+    Returns:
+        dict: {"signal_id", "frames", "samples", "duration_seconds", "gaps",
+        "overlaps", "processing_status", "quality_score", "channel_flags"}
+
+    Raises:
+        KeyError: If the signal does not exist.
+        IngestError: If the signal is not recording or a frame is malformed.
+        IngestBusy: If another upload to the signal is in progress.
+    """
+    signal = get_signal_data(db_instance, signal_id)
+    if not signal:
+        raise KeyError(signal_id)
+    if signal["processing_status"] != RECORDING_STATUS:
+        raise IngestError(f"Signal {signal_id} is {signal['processing_status']}, not recording")
+
+    lock = _signal_lock(signal_id)
+    if not lock.acquire(blocking=False):
+        raise IngestBusy(signal_id)
+    try:
+        writer = SignalWriter.open(resolve_signal_path(signal["file_path"]))
+        estimator = OnlineQualityEstimator(writer.sampling_rate, writer.sidecar["channel_names"], writer.dtype,
+                                           clip_limits=writer.sidecar.get("clip_limits"))
+        first_frame = writer.sidecar["start_time_us"] is None
+        frames = 0
+        status = RECORDING_STATUS
+        written_flags = None
+        last_update = last_check = time.monotonic()
+        try:
+            for header, payload in read_frames(stream):
+                writer.append(header, payload)
+                estimator.update(np.frombuffer(payload, dtype=writer.dtype).reshape(-1, writer.channels))
+                frames += 1
+                now = time.monotonic()
+                if not first_frame and now - last_check < QUALITY_INTERVAL_SECONDS:
+                    continue
+                last_check = now
+                quality = estimator.quality()
+                if first_frame:
+                    # recorded_at is when the device took the first sample
+                    writer.sync()
+                    _update_signal(db_instance, signal_id, writer, status, quality=quality,
+                                   recorded_at=datetime.fromtimestamp(header["timestamp_us"] / 1e6, timezone.utc))
+                    first_frame = False
+                elif now - last_update >= PROGRESS_INTERVAL_SECONDS or (
+                        quality["quality_score"] is not None and quality["channel_flags"] != written_flags):
+                    writer.sync()
+                    _update_signal(db_instance, signal_id, writer, status, quality=quality)
+                else:
+                    continue
+                if quality["quality_score"] is not None:
+                    written_flags = quality["channel_flags"]
+                last_update = time.monotonic()
+            if close:
+                status = RECORDED_STATUS
+        finally:
+            writer.close(finish=status == RECORDED_STATUS)
+            quality = estimator.quality()
+            _update_signal(db_instance, signal_id, writer, status, quality=quality)
+        if status == RECORDED_STATUS and writer.samples:
+            # The file no longer changes: build its plotting pyramid now
+            schedule_build(writer.path)
+    finally:
+        lock.release()
+
+    return {
+        "signal_id": signal_id,
+        "frames": frames,
+        "samples": writer.samples,
+        "duration_seconds": round(writer.duration_seconds, 3),
+        "gaps": writer.gaps,
+        "overlaps": writer.overlaps,
+        "processing_status": status,
+        "quality_score": quality["quality_score"],
+        "channel_flags": quality["channel_flags"],
+    }
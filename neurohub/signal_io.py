@@ -0,0 +1,398 @@
+# signal_io.py - Memory-mapped access to the recordings behind SignalData.file_path
+#
+# Recordings are multi-GB, so nothing here reads a whole file: each format is
+# opened with numpy.memmap and read() copies only the requested channels and
+# sample range. iter_chunks() walks a recording in fixed-size blocks for
+# analyses that must see every sample.
+#
+# Supported formats:
+#   .edf / .bdf     European Data Format (16-bit) and BioSemi (24-bit)
+#   .npy            NumPy array, channels x samples, plus an optional JSON sidecar
+#   .bin/.raw/.dat  Headerless samples described by a required JSON sidecar
+#
+# The sidecar is <file>.json (e.g. rec.npy.json) or the file with its
+# extension replaced (rec.json), holding e.g.:
+#   {"sampling_rate": 256, "channel_names": ["Fp1", ...], "dtype": "<i2",
+#    "channels": 32, "layout": "interleaved", "offset": 0, "scale": 0.1, "units": "uV"}
+# "layout" is "interleaved" (samples x channels, the default for raw files) or
+# "planar" (channels x samples, the default for .npy); "offset" is a header
+# size in bytes and physical value = raw * scale + offset_value. A raw file
+# being recorded (signal_ingest.py) is preallocated past its last sample;
+# "samples" in its sidecar gives the number written so far.
+#
+# file_path values are resolved against NEUROHUB_SIGNAL_ROOT: gs://bucket/key
+# maps to <root>/bucket/key, which matches a Cloud Storage FUSE mount of the
+# buckets (any GCS-compatible store mounted the same way works); relative
+# paths are taken under the root. Absolute paths must also lie under the
+# root; anything that resolves outside it is rejected.
+#
+# Example:
+#     with open_signal(row["file_path"], sampling_rate=row["sampling_rate"]) as rec:
+#         block = rec.read_seconds(10.0, 12.0, channels=["Cz", "Pz"])
+
+import json
+import os
+
+import numpy as np
+
+SIGNAL_ROOT = os.environ.get("NEUROHUB_SIGNAL_ROOT", "/mnt/neurohub-signals")
+
+RAW_EXTENSIONS = (".bin", ".raw", ".dat")
+ANNOTATION_LABELS = ("EDF Annotations", "BDF Annotations")
+
+
+class SignalFormatError(ValueError):
+    """Raised when a recording or its sidecar cannot be interpreted."""
+
+
+def resolve_signal_path(file_path, root=None):
+    """
+    Maps a SignalData.file_path to a local path.
+
+    Raises:
+        SignalFormatError: If the path is empty or escapes the signal root.
+    """
+    if not file_path:
+        raise SignalFormatError("Signal has no file_path")
+    root = os.path.realpath(root or SIGNAL_ROOT)
+
+    if file_path.startswith("gs://"):
+        relative = file_path[len("gs://"):]
+    else:
+        # Absolute paths are accepted only when they already lie under the root
+        relative = file_path
+
+    path = os.path.realpath(os.path.join(root, relative))
+    if os.path.commonpath([root, path]) != root:
+        raise SignalFormatError(f"Signal path escapes the signal root: {file_path}")
+    return path
+
+
+def _read_sidecar(path, required=False):
+    stem, _ = os.path.splitext(path)
+    for candidate in (path + ".json", stem + ".json"):
+        if os.path.exists(candidate):
+            try:
+                with open(candidate, "r", encoding="utf-8") as f:
+                    return json.load(f)
+            except (OSError, ValueError) as e:
+                raise SignalFormatError(f"Unreadable sidecar {candidate}: {e}") from None
+    if required:
+        raise SignalFormatError(f"{path} needs a JSON sidecar describing its layout")
+    return {}
+
+
+class SignalRecording:
+    """
+    A multichannel recording backed by a memory map.
+
+    Attributes:
+        path (str): Local file path.
+        sampling_rate (float): Samples per second of every channel.
+        channel_names (list): One name per channel.
+        n_samples (int): Samples per channel.
+        units (list): Physical unit per channel ("" if unknown).
+    """
+
+    def __init__(self, path, sampling_rate, channel_names, n_samples, units=None):
+        if not sampling_rate or sampling_rate <= 0:
+            raise SignalFormatError(f"{path}: unknown sampling rate")
+        self.path = path
+        self.sampling_rate = float(sampling_rate)
+        self.channel_names = list(channel_names)
+        self.n_samples = int(n_samples)
+        self.units = list(units) if units else [""] * len(self.channel_names)
+
+    @property
+    def n_channels(self):
+        return len(self.channel_names)
+
+    @property
+    def duration_seconds(self):
+        return self.n_samples / self.sampling_rate
+
+    def channel_indexes(self, channels=None):
+        """Turns channel names and/or indexes into a list of indexes (all channels for None)."""
+        if channels is None:
+            return list(range(self.n_channels))
+        indexes = []
+        for channel in channels:
+            if isinstance(channel, str):
+                if channel not in self.channel_names:
+                    raise KeyError(f"Unknown channel {channel!r} in {self.path}")
+                indexes.append(self.channel_names.index(channel))
+            else:
+                index = int(channel)
+                if not -self.n_channels <= index < self.n_channels:
+                    raise IndexError(f"Channel index {index} out of range in {self.path}")
+                indexes.append(index % self.n_channels)
+        return indexes
+
+    def _bounds(self, start, stop):
+        start = max(0, int(start))
+        stop = self.n_samples if stop is None else min(int(stop), self.n_samples)
+        return start, max(start, stop)
+
+    def read(self, channels=None, start=0, stop=None, dtype=np.float64):
+        """
+        Reads samples [start, stop) of the selected channels in physical units.
+
+        Only the requested part of the file is paged in.
+
+        Returns:
+            numpy.ndarray: Shape (len(channels), stop - start).
+        """
+        indexes = self.channel_indexes(channels)
+        start, stop = self._bounds(start, stop)
+        return self._read(indexes, start, stop, dtype)
+
+    def read_seconds(self, start_seconds=0.0, stop_seconds=None, channels=None, dtype=np.float64):
+        """Like read(), with the range given in seconds."""
+        start = int(round(start_seconds * self.sampling_rate))
+        stop = None if stop_seconds is None else int(round(stop_seconds * self.sampling_rate))
+        return self.read(channels, start, stop, dtype)
+
+    def iter_chunks(self, chunk_samples, channels=None, overlap=0, dtype=np.float64):
+        """
+        Yields (start_sample, block) over the whole recording.
+
+        Consecutive blocks share `overlap` samples, which filters use to
+        hide edge effects at chunk boundaries.
+        """
+        if chunk_samples <= overlap:
+            raise ValueError("chunk_samples must be larger than overlap")
+        indexes = self.channel_indexes(channels)
+        start = 0
+        while start < self.n_samples:
+            stop = min(start + chunk_samples, self.n_samples)
+            yield start, self._read(indexes, start, stop, dtype)
+            if stop == self.n_samples:
+                break
+            start = stop - overlap
+
+    def info(self):
+        """Returns JSON-ready recording metadata."""
+        return {
+            "path": self.path,
+            "sampling_rate": self.sampling_rate,
+            "channels": self.n_channels,
+            "channel_names": self.channel_names,
+            "units": self.units,
+            "n_samples": self.n_samples,
+            "duration_seconds": self.duration_seconds,
+        }
+
+    def _read(self, indexes, start, stop, dtype):
+        raise NotImplementedError
+
+    def close(self):
+        """Releases the memory map."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ArrayRecording(SignalRecording):
+    """A 2-D memory-mapped array (.npy or headerless binary) with a linear scale."""
+
+    def __init__(self, path, array, sampling_rate, channel_names=None, channels_first=True,
+                 scale=1.0, offset=0.0, units=None):
+        if array.ndim != 2:
+            raise SignalFormatError(f"{path}: expected a 2-D array, got shape {array.shape}")
+        self._array = array if channels_first else array.T
+        n_channels, n_samples = self._array.shape
+        names = channel_names or [f"ch{i + 1}" for i in range(n_channels)]
+        if len(names) != n_channels:
+            raise SignalFormatError(f"{path}: {len(names)} channel names for {n_channels} channels")
+        if isinstance(units, str):
+            units = [units] * n_channels
+        super().__init__(path, sampling_rate, names, n_samples, units)
+        self._scale = scale
+        self._offset = offset
+
+    def _read(self, indexes, start, stop, dtype):
+        # Fancy indexing on the channel axis copies only the selected rows/columns
+        block = np.asarray(self._array[indexes, start:stop], dtype=dtype)
+        if self._scale != 1.0 or self._offset != 0.0:
+            block *= self._scale
+            block += self._offset
+        return block
+
+    def close(self):
+        # The mapping is unmapped once the last reference is gone
+        self._array = None
+
+
+class EDFRecording(SignalRecording):
+    """
+    EDF (16-bit) or BDF (24-bit) file.
+
+    Data records hold each signal's block of samples in turn; the file is
+    mapped as (records, bytes per record) and a read touches only the
+    records covering the requested range.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            fixed = f.read(256)
+            if len(fixed) < 256:
+                raise SignalFormatError(f"{path}: truncated EDF header")
+            try:
+                header_bytes = int(fixed[184:192])
+                n_records = int(fixed[236:244])
+                record_seconds = float(fixed[244:252])
+                n_signals = int(fixed[252:256])
+            except ValueError:
+                raise SignalFormatError(f"{path}: malformed EDF header") from None
+            signal_header = f.read(n_signals * 256)
+        if len(signal_header) < n_signals * 256 or header_bytes != 256 * (n_signals + 1):
+            raise SignalFormatError(f"{path}: truncated EDF signal header")
+
+        self._sample_bytes = 3 if fixed[:1] == b"\xff" else 2
+
+        def fields(offset, width):
+            base = offset * n_signals
+            return [signal_header[base + i * width: base + (i + 1) * width].decode("latin-1").strip()
+                    for i in range(n_signals)]
+
+        labels = fields(0, 16)
+        units = fields(96, 8)
+        try:
+            physical_min = [float(v) for v in fields(104, 8)]
+            physical_max = [float(v) for v in fields(112, 8)]
+            digital_min = [float(v) for v in fields(120, 8)]
+            digital_max = [float(v) for v in fields(128, 8)]
+            samples_per_record = [int(v) for v in fields(216, 8)]
+        except ValueError:
+            raise SignalFormatError(f"{path}: malformed EDF signal header") from None
+
+        record_bytes = sum(samples_per_record) * self._sample_bytes
+        data_bytes = os.path.getsize(path) - header_bytes
+        if n_records < 0:
+            # -1 while a recording is still being written
+            n_records = data_bytes // record_bytes if record_bytes else 0
+        n_records = min(n_records, data_bytes // record_bytes) if record_bytes else 0
+
+        data = [i for i, label in enumerate(labels) if label not in ANNOTATION_LABELS]
+        if not data:
+            raise SignalFormatError(f"{path}: no data signals")
+        per_record = {samples_per_record[i] for i in data}
+        if len(per_record) > 1:
+            raise SignalFormatError(f"{path}: channels with different sampling rates are not supported")
+        self._record_samples = per_record.pop()
+        if record_seconds <= 0:
+            raise SignalFormatError(f"{path}: invalid data record duration")
+
+        # Start of each data signal's block within a record, in bytes
+        starts = np.cumsum([0] + samples_per_record[:-1]) * self._sample_bytes
+        self._byte_offsets = [int(starts[i]) for i in data]
+        self._gain = np.array(
+            [(physical_max[i] - physical_min[i]) / ((digital_max[i] - digital_min[i]) or 1) for i in data]
+        )
+        self._offset = np.array([physical_min[i] for i in data]) - self._gain * np.array([digital_min[i] for i in data])
+
+        self._records = np.memmap(path, dtype=np.uint8, mode="r", offset=header_bytes,
+                                  shape=(n_records, record_bytes)) if n_records else None
+        super().__init__(path, self._record_samples / record_seconds, [labels[i] for i in data],
+                         n_records * self._record_samples, [units[i] for i in data])
+
+    def _decode(self, raw):
+        if self._sample_bytes == 2:
+            return raw.view("<i2")
+        # BDF: little-endian 24-bit two's complement
+        raw = raw.reshape(raw.shape[:-1] + (-1, 3)).astype(np.int32)
+        values = raw[..., 0] | (raw[..., 1] << 8) | (raw[..., 2] << 16)
+        return np.where(values & 0x800000, values - 0x1000000, values)
+
+    def _read(self, indexes, start, stop, dtype):
+        out = np.empty((len(indexes), stop - start), dtype=dtype)
+        if stop == start:
+            return out
+        first = start // self._record_samples
+        last = (stop - 1) // self._record_samples + 1
+        skip = start - first * self._record_samples
+        width = self._record_samples * self._sample_bytes
+        for row, index in enumerate(indexes):
+            offset = self._byte_offsets[index]
+            raw = np.ascontiguousarray(self._records[first:last, offset:offset + width])
+            samples = self._decode(raw).reshape(-1)[skip:skip + stop - start]
+            out[row] = samples * self._gain[index] + self._offset[index]
+        return out
+
+    def close(self):
+        self._records = None
+
+
+def open_signal(file_path, sampling_rate=None, channel_names=None, root=None):
+    """
+    Opens a recording for slicing.
+
+    Args:
+        file_path (str): SignalData.file_path (gs://..., relative, or absolute
+            under the signal root).
+        sampling_rate (float, optional): Used for .npy files when the sidecar
+            does not give one (e.g. SignalData.sampling_rate).
+        channel_names (list, optional): Same, for channel names.
+        root (str, optional): Overrides NEUROHUB_SIGNAL_ROOT.
+
+    Returns:
+        SignalRecording
+
+    Raises:
+        FileNotFoundError: If the file does not exist.
+        SignalFormatError: If the format is unsupported or malformed.
+    """
+    path = resolve_signal_path(file_path, root)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Signal file not found: {path}")
+    extension = os.path.splitext(path)[1].lower()
+
+    if extension in (".edf", ".bdf"):
+        return EDFRecording(path)
+
+    if extension == ".npy":
+        sidecar = _read_sidecar(path)
+        try:
+            array = np.load(path, mmap_mode="r")
+        except ValueError as e:
+            raise SignalFormatError(f"{path}: {e}") from None
+        return ArrayRecording(
+            path, array,
+            sampling_rate=sidecar.get("sampling_rate", sampling_rate),
+            channel_names=sidecar.get("channel_names", channel_names),
+            # .npy files are channels x samples unless the sidecar says "interleaved"
+            channels_first=sidecar.get("layout", "planar") == "planar",
+            scale=sidecar.get("scale", 1.0),
+            offset=sidecar.get("offset_value", 0.0),
+            units=sidecar.get("units"),
+        )
+
+    if extension in RAW_EXTENSIONS:
+        sidecar = _read_sidecar(path, required=True)
+        try:
+            dtype = np.dtype(sidecar["dtype"])
+            n_channels = int(sidecar["channels"])
+        except (KeyError, TypeError) as e:
+            raise SignalFormatError(f"{path}: sidecar needs dtype and channels ({e})") from None
+        header = int(sidecar.get("offset", 0))
+        n_samples = (os.path.getsize(path) - header) // (dtype.itemsize * n_channels)
+        if sidecar.get("samples") is not None:
+            n_samples = min(n_samples, int(sidecar["samples"]))
+        # interleaved: one frame of all channels per sample; planar: one channel after another
+        interleaved = sidecar.get("layout", "interleaved") == "interleaved"
+        shape = (n_samples, n_channels) if interleaved else (n_channels, n_samples)
+        array = np.memmap(path, dtype=dtype, mode="r", offset=header, shape=shape)
+        return ArrayRecording(
+            path, array,
+            sampling_rate=sidecar.get("sampling_rate", sampling_rate),
+            channel_names=sidecar.get("channel_names", channel_names),
+            channels_first=not interleaved,
+            scale=sidecar.get("scale", 1.0),
+            offset=sidecar.get("offset_value", 0.0),
+            units=sidecar.get("units"),
+        )
+
+    raise SignalFormatError(f"Unsupported signal format: {extension or path}")
@@ -0,0 +1,420 @@
+# signal_pyramid.py - Min/max decimation pyramids for plotting recordings
+#
+# A browser cannot plot hours of multi-kHz EEG, and a plot never needs more
+# than a couple of points per pixel. A pyramid stores, per channel, the
+# minimum and maximum of every bucket of samples at several zoom levels:
+#
+#   level 0: buckets of BASE_BUCKET_SAMPLES samples
+#   level k: buckets of BASE_BUCKET_SAMPLES * LEVEL_FACTOR**k samples
+#
+# up to the first level with at most TOP_LEVEL_BUCKETS buckets. Drawing the
+# min/max envelope of each bucket keeps spikes visible at any zoom, which
+# plain subsampling does not.
+#
+# The pyramid of <recording> lives in the directory <recording>.pyramid (or
+# under NEUROHUB_PYRAMID_ROOT when the signal mount is read-only): one .npy
+# per level, float32 shaped (channels, buckets, 2), plus meta.json. Levels
+# are memory-mapped, so read_window() touches only the buckets of the
+# requested window at the coarsest level that still gives one bucket per
+# pixel; a zoomed-out view of a day-long recording reads a few kilobytes.
+# Windows narrower than one level-0 bucket per pixel are served from the raw
+# samples.
+#
+# Plot requests never build a pyramid themselves. A missing or out-of-date
+# pyramid is queued for schedule_build()'s single background thread (not
+# for recordings still being written, whose file changes with every frame;
+# signal_ingest.py queues those when the recording is closed), and until it
+# is ready the window is bucketed from the raw samples, RAW_READ_BLOCK_SAMPLES
+# (over all requested channels) per read. When the window holds more than
+# RAW_WINDOW_MAX_SAMPLES samples over all requested channels, each bucket is
+# summarized from its first samples only, so the request stays cheap and the
+# response says "approximate".
+#
+# Build pyramids ahead of time:
+#     python signal_pyramid.py gs://bucket/rec.edf ...
+#     python signal_pyramid.py --experiment EXPERIMENT_ID
+
+import argparse
+import json
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from numpy.lib.format import open_memmap
+
+from signal_io import SIGNAL_ROOT, open_signal
+
+PYRAMID_ROOT = os.environ.get("NEUROHUB_PYRAMID_ROOT")
+PYRAMID_VERSION = 1
+
+BASE_BUCKET_SAMPLES = 32
+LEVEL_FACTOR = 4
+TOP_LEVEL_BUCKETS = 2048
+# Level-0 buckets computed per read while building (bounds build memory)
+BUILD_BLOCK_BUCKETS = 2048
+MAX_WIDTH = 10000
+# Samples, summed over the requested channels, a plot request reads from a
+# recording without a pyramid, and at most per read
+RAW_WINDOW_MAX_SAMPLES = int(os.environ.get("NEUROHUB_PLOT_RAW_MAX_SAMPLES", str(4 * 1024 * 1024)))
+RAW_READ_BLOCK_SAMPLES = 256 * 1024
+
+_build_locks = {}
+_build_locks_lock = threading.Lock()
+_builder = None
+# recording path -> source stamp of a queued or failed background build
+_scheduled = {}
+
+
+def pyramid_dir(recording_path):
+    """Directory holding the pyramid of a local recording path."""
+    if not PYRAMID_ROOT:
+        return recording_path + ".pyramid"
+    relative = os.path.relpath(os.path.realpath(recording_path), os.path.realpath(SIGNAL_ROOT))
+    if relative.startswith(os.pardir):
+        relative = os.path.realpath(recording_path).lstrip(os.sep)
+    return os.path.join(PYRAMID_ROOT, relative + ".pyramid")
+
+
+def _source_stamp(recording_path):
+    stat = os.stat(recording_path)
+    return {"source_size": stat.st_size, "source_mtime": stat.st_mtime}
+
+
+def _bucket_min_max(block, bucket):
+    """(channels, n) samples or (channels, n, 2) buckets -> (channels, ceil(n / bucket), 2)."""
+    lows, highs = (block[..., 0], block[..., 1]) if block.ndim == 3 else (block, block)
+    channels, n = lows.shape
+    full = n - n % bucket
+    result = np.empty((channels, -(-n // bucket), 2), dtype=block.dtype)
+    result[:, :full // bucket, 0] = lows[:, :full].reshape(channels, -1, bucket).min(axis=2)
+    result[:, :full // bucket, 1] = highs[:, :full].reshape(channels, -1, bucket).max(axis=2)
+    if full < n:
+        result[:, -1, 0] = lows[:, full:].min(axis=1)
+        result[:, -1, 1] = highs[:, full:].max(axis=1)
+    return result
+
+
+def level_count(n_samples):
+    """Number of levels for a recording of n_samples samples."""
+    levels = 1
+    buckets = -(-n_samples // BASE_BUCKET_SAMPLES)
+    while buckets > TOP_LEVEL_BUCKETS:
+        buckets = -(-buckets // LEVEL_FACTOR)
+        levels += 1
+    return levels
+
+
+def _plot_level(window_samples, width, levels):
+    """Coarsest of `levels` levels with at least `width` buckets in the window, or None for raw samples."""
+    samples_per_pixel = window_samples / max(1, width)
+    chosen = None
+    for level in range(levels):
+        if BASE_BUCKET_SAMPLES * LEVEL_FACTOR ** level > samples_per_pixel:
+            break
+        chosen = level
+    return chosen
+
+
+def build_pyramid(recording):
+    """
+    Builds (or rebuilds) the pyramid of an open recording.
+
+    Level 0 is computed block by block from the recording; each further
+    level from the one below it. The pyramid is written to a temporary
+    directory and renamed into place, so readers never see a partial one.
+
+    Returns:
+        str: The pyramid directory.
+    """
+    target = pyramid_dir(recording.path)
+    tmp = f"{target}.tmp-{os.getpid()}-{threading.get_ident()}"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+
+    try:
+        n_buckets = -(-recording.n_samples // BASE_BUCKET_SAMPLES)
+        level = open_memmap(os.path.join(tmp, "level0.npy"), mode="w+", dtype=np.float32,
+                            shape=(recording.n_channels, n_buckets, 2))
+        block_samples = BUILD_BLOCK_BUCKETS * BASE_BUCKET_SAMPLES
+        for start, block in recording.iter_chunks(block_samples, dtype=np.float32):
+            first = start // BASE_BUCKET_SAMPLES
+            buckets = _bucket_min_max(block, BASE_BUCKET_SAMPLES)
+            level[:, first:first + buckets.shape[1]] = buckets
+        level.flush()
+
+        levels = level_count(recording.n_samples)
+        for k in range(1, levels):
+            n_buckets = -(-level.shape[1] // LEVEL_FACTOR)
+            upper = open_memmap(os.path.join(tmp, f"level{k}.npy"), mode="w+", dtype=np.float32,
+                                shape=(recording.n_channels, n_buckets, 2))
+            step = BUILD_BLOCK_BUCKETS * LEVEL_FACTOR
+            for first in range(0, level.shape[1], step):
+                buckets = _bucket_min_max(np.asarray(level[:, first:first + step]), LEVEL_FACTOR)
+                upper[:, first // LEVEL_FACTOR:first // LEVEL_FACTOR + buckets.shape[1]] = buckets
+            upper.flush()
+            del level
+            level = upper
+        del level
+
+        meta = {
+            "version": PYRAMID_VERSION,
+            "sampling_rate": recording.sampling_rate,
+            "n_samples": recording.n_samples,
+            "channel_names": recording.channel_names,
+            "units": recording.units,
+            "base_bucket_samples": BASE_BUCKET_SAMPLES,
+            "level_factor": LEVEL_FACTOR,
+            "levels": levels,
+            **_source_stamp(recording.path),
+        }
+        with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+
+        shutil.rmtree(target, ignore_errors=True)
+        os.replace(tmp, target)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    return target
+
+
+class SignalPyramid:
+    """A built pyramid, its levels memory-mapped read-only."""
+
+    def __init__(self, directory, meta):
+        self.directory = directory
+        self.meta = meta
+        self.sampling_rate = meta["sampling_rate"]
+        self.n_samples = meta["n_samples"]
+        self.channel_names = meta["channel_names"]
+        self.levels = [np.load(os.path.join(directory, f"level{k}.npy"), mmap_mode="r")
+                       for k in range(meta["levels"])]
+
+    def bucket_samples(self, level):
+        return self.meta["base_bucket_samples"] * self.meta["level_factor"] ** level
+
+    def level_for(self, window_samples, width):
+        """Coarsest level with at least `width` buckets in the window, or None for raw samples."""
+        samples_per_pixel = window_samples / max(1, width)
+        chosen = None
+        for level in range(len(self.levels)):
+            if self.bucket_samples(level) > samples_per_pixel:
+                break
+            chosen = level
+        return chosen
+
+
+def load_pyramid(recording_path):
+    """Opens the pyramid of a recording, or returns None if it is missing or out of date."""
+    directory = pyramid_dir(recording_path)
+    try:
+        with open(os.path.join(directory, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        current = _source_stamp(recording_path)
+    except (OSError, ValueError):
+        return None
+    if meta.get("version") != PYRAMID_VERSION or any(meta.get(key) != value for key, value in current.items()):
+        return None
+    try:
+        return SignalPyramid(directory, meta)
+    except (OSError, ValueError):
+        return None
+
+
+def ensure_pyramid(recording):
+    """Returns the recording's pyramid, building it first if needed."""
+    pyramid = load_pyramid(recording.path)
+    if pyramid is not None:
+        return pyramid
+    with _build_locks_lock:
+        lock = _build_locks.setdefault(recording.path, threading.Lock())
+    with lock:
+        # Another thread may have built it while this one waited
+        pyramid = load_pyramid(recording.path)
+        if pyramid is None:
+            build_pyramid(recording)
+            pyramid = load_pyramid(recording.path)
+    return pyramid
+
+
+def _build_in_background(recording_path, sampling_rate, channel_names):
+    try:
+        with open_signal(recording_path, sampling_rate=sampling_rate, channel_names=channel_names) as recording:
+            ensure_pyramid(recording)
+    except Exception as e:
+        # Left in _scheduled, so the same file is not retried until it changes
+        print(f"Failed to build pyramid for {recording_path}: {e}")
+        return
+    with _build_locks_lock:
+        _scheduled.pop(recording_path, None)
+
+
+def schedule_build(recording_path, sampling_rate=None, channel_names=None):
+    """
+    Queues a background build of a local recording's pyramid.
+
+    Builds run one at a time on a single thread. A recording whose build is
+    queued, or failed for the file as it is now, is not queued again.
+
+    Args:
+        sampling_rate, channel_names: As for signal_io.open_signal.
+
+    Returns:
+        Future or None: The queued build, or None if it was not queued.
+    """
+    global _builder
+
+    try:
+        stamp = _source_stamp(recording_path)
+    except OSError:
+        return None
+    with _build_locks_lock:
+        if _scheduled.get(recording_path) == stamp:
+            return None
+        _scheduled[recording_path] = stamp
+        if _builder is None:
+            _builder = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pyramid-build")
+        return _builder.submit(_build_in_background, recording_path, sampling_rate, channel_names)
+
+
+def _raw_buckets(recording, indexes, start, stop, bucket):
+    """
+    Min/max buckets of [start, stop) computed from the raw samples.
+
+    Each read holds at most RAW_READ_BLOCK_SAMPLES samples over all
+    channels. A window of more than RAW_WINDOW_MAX_SAMPLES samples over all
+    channels is not read in full: each bucket is summarized from its first
+    samples only.
+
+    Returns:
+        tuple: ((channels, buckets, 2) float32 array, approximate flag)
+    """
+    first, last = start // bucket, -(-stop // bucket)
+    end = min(last * bucket, recording.n_samples)
+    buckets = np.empty((len(indexes), last - first, 2), dtype=np.float32)
+    step = max(1, RAW_READ_BLOCK_SAMPLES // len(indexes))
+
+    if (last - first) * bucket * len(indexes) > RAW_WINDOW_MAX_SAMPLES:
+        taken = max(1, min(step, RAW_WINDOW_MAX_SAMPLES // ((last - first) * len(indexes))))
+        for i in range(last - first):
+            samples = recording.read(indexes, (first + i) * bucket, (first + i) * bucket + taken, dtype=np.float32)
+            buckets[:, i, 0] = samples.min(axis=1)
+            buckets[:, i, 1] = samples.max(axis=1)
+        return buckets, True
+
+    if step >= bucket:
+        # Whole buckets per read
+        step -= step % bucket
+        for block_start in range(first * bucket, end, step):
+            samples = recording.read(indexes, block_start, min(block_start + step, end), dtype=np.float32)
+            i = block_start // bucket - first
+            block = _bucket_min_max(samples, bucket)
+            buckets[:, i:i + block.shape[1]] = block
+        return buckets, False
+
+    # A bucket spans several reads: fold each read into the running min/max
+    buckets[..., 0] = np.inf
+    buckets[..., 1] = -np.inf
+    for i in range(last - first):
+        bucket_end = min((first + i + 1) * bucket, end)
+        for block_start in range((first + i) * bucket, bucket_end, step):
+            samples = recording.read(indexes, block_start, min(block_start + step, bucket_end), dtype=np.float32)
+            np.minimum(buckets[:, i, 0], samples.min(axis=1), out=buckets[:, i, 0])
+            np.maximum(buckets[:, i, 1], samples.max(axis=1), out=buckets[:, i, 1])
+    return buckets, False
+
+
+def read_window(recording, start_seconds=0.0, end_seconds=None, width=1000, channels=None, build=True):
+    """
+    Returns plot data for a time window, sized for `width` pixels.
+
+    Never builds the pyramid in the calling thread: without an up-to-date
+    pyramid the points are computed from the raw samples and, with build,
+    a background build is queued (see schedule_build()). Pass build=False
+    for a recording that is still being written.
+
+    Returns:
+        dict: {"level": pyramid level (-1 for raw samples), "start_seconds":
+        time of the first point, "bucket_seconds": time between points,
+        "channels": names, "units": units, "min": (channels, points) float32
+        array, "max": same (equal to "min" for raw samples), "approximate":
+        whether the buckets were summarized from a subset of the samples}.
+        There are between width and LEVEL_FACTOR * width points, or fewer
+        when the window holds fewer samples.
+    """
+    width = max(1, min(int(width), MAX_WIDTH))
+    fs = recording.sampling_rate
+    start = max(0, int(start_seconds * fs))
+    stop = recording.n_samples if end_seconds is None else min(int(np.ceil(end_seconds * fs)), recording.n_samples)
+    stop = max(start, stop)
+    indexes = recording.channel_indexes(channels)
+    result = {
+        "channels": [recording.channel_names[i] for i in indexes],
+        "units": [recording.units[i] for i in indexes],
+    }
+
+    # The levels a pyramid of the recording has, whether or not it is built yet
+    level = _plot_level(stop - start, width, level_count(recording.n_samples))
+    if level is None:
+        samples = recording.read(indexes, start, stop, dtype=np.float32)
+        result.update(level=-1, start_seconds=start / fs, bucket_seconds=1 / fs, min=samples, max=samples,
+                      approximate=False)
+        return result
+
+    bucket = BASE_BUCKET_SAMPLES * LEVEL_FACTOR ** level
+    first, last = start // bucket, -(-stop // bucket)
+    pyramid = load_pyramid(recording.path)
+    if pyramid is not None:
+        buckets = np.asarray(pyramid.levels[level][indexes, first:last])
+        approximate = False
+    else:
+        if build:
+            schedule_build(recording.path, recording.sampling_rate, recording.channel_names)
+        buckets, approximate = _raw_buckets(recording, indexes, start, stop, bucket)
+    result.update(level=level, start_seconds=first * bucket / fs, bucket_seconds=bucket / fs,
+                  min=buckets[..., 0], max=buckets[..., 1], approximate=approximate)
+    return result
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Build min/max plotting pyramids for recordings.")
+    arg_parser.add_argument("file_paths", nargs="*", help="SignalData.file_path values (gs://... or local)")
+    arg_parser.add_argument("--experiment", help="Build pyramids for every signal of this experiment")
+    arg_parser.add_argument("--force", action="store_true", help="Rebuild pyramids that are up to date")
+    args = arg_parser.parse_args()
+
+    signals = [{"signal_id": None, "file_path": path, "sampling_rate": None} for path in args.file_paths]
+    if args.experiment:
+        # Imported here: db_neurohub connects to Spanner on import
+        from db_neurohub import db, run_sql_query
+        from google.cloud.spanner_v1 import param_types
+
+        if not db:
+            print("Cannot list signals: Spanner database connection not established.")
+            exit(1)
+        signals += run_sql_query(
+            db,
+            "SELECT signal_id, file_path, sampling_rate FROM SignalData WHERE experiment_id = @experiment_id",
+            params={"experiment_id": args.experiment},
+            param_types={"experiment_id": param_types.STRING},
+        ) or []
+    if not signals:
+        arg_parser.error("give file paths or --experiment")
+
+    built = failed = 0
+    for signal in signals:
+        file_path = signal.get("file_path")
+        start_time = time.time()
+        try:
+            with open_signal(file_path, sampling_rate=signal.get("sampling_rate")) as recording:
+                if args.force or load_pyramid(recording.path) is None:
+                    build_pyramid(recording)
+                    built += 1
+                    print(f"Built {pyramid_dir(recording.path)} ({time.time() - start_time:.2f}s)")
+        except Exception as e:
+            failed += 1
+            print(f"Failed to build pyramid for {signal.get('signal_id') or file_path}: {e}")
+    print(f"Built {built} pyramids, {failed} failed.")
@@ -0,0 +1,218 @@
+# signal_quality.py - Online signal quality scoring for live recordings
+#
+# OnlineQualityEstimator is fed each chunk of samples as it arrives (see
+# signal_ingest.py) and keeps a fixed amount of state per channel, however
+# long the recording runs. Every statistic is an exponentially weighted sum
+# updated once per chunk, so recent seconds dominate and the score follows
+# the electrodes as they settle, come loose or start picking up noise:
+#
+#   flat        the channel has not changed for FLATLINE_SECONDS
+#               (disconnected electrode, dead amplifier input)
+#   clipping    over CLIP_FRACTION of recent samples sit on the converter's
+#               rails (integer dtypes, or explicit clip_limits, e.g.
+#               from the ingest start request)
+#   line_noise  over LINE_NOISE_RATIO of recent variance is 50 or 60 Hz
+#               mains, measured with an exponentially weighted single-bin
+#               DFT (a leaky Goertzel filter) at each mains frequency
+#   noisy       variance over NOISY_FACTOR^2 times the median channel's
+#               (needs at least three channels)
+#
+# Flags are reported once WARMUP_SECONDS of samples have been seen, so a bad
+# electrode shows up within seconds of the session starting rather than
+# after a batch analysis. The score of a channel is 0 when it is flat or
+# clipping, and otherwise shrinks with its line-noise share and when it is
+# noisy; quality_score is the mean over channels.
+#
+# Statistics are computed on the raw sample values; flags and the score do
+# not depend on the recording's scale.
+
+import numpy as np
+
+# Time constant of the variance and clipping statistics
+WINDOW_SECONDS = 2.0
+# Time constant of the mains bins: short enough that the bin (about
+# 1 / (2 pi LINE_WINDOW_SECONDS) Hz wide) tolerates device clock error
+LINE_WINDOW_SECONDS = 0.2
+LINE_FREQUENCIES_HZ = (50.0, 60.0)
+WARMUP_SECONDS = 1.0
+
+FLATLINE_SECONDS = 1.0
+CLIP_FRACTION = 0.01
+LINE_NOISE_RATIO = 0.5
+NOISY_FACTOR = 5.0
+# Score multiplier of a noisy channel
+NOISY_PENALTY = 0.5
+
+
+class OnlineQualityEstimator:
+    """Incremental per-channel quality statistics of one recording."""
+
+    def __init__(self, sampling_rate, channel_names, dtype=None, clip_limits=None, flat_tolerance=0.0):
+        """
+        Args:
+            sampling_rate (float): Samples per second.
+            channel_names (list): One name per channel, used in the flags.
+            dtype: Sample dtype; for integer dtypes its range is the clipping rail.
+            clip_limits (tuple): (low, high) raw values that count as clipped,
+                overriding the dtype's range.
+            flat_tolerance (float): Peak-to-peak change (raw units) a flat
+                channel may still show.
+        """
+        self.sampling_rate = float(sampling_rate)
+        self.channel_names = list(channel_names)
+        self.flat_tolerance = flat_tolerance
+        if clip_limits is None and dtype is not None and np.dtype(dtype).kind in "iu":
+            info = np.iinfo(np.dtype(dtype))
+            clip_limits = (info.min, info.max)
+        self.clip_limits = clip_limits
+
+        n = len(self.channel_names)
+        self.samples = 0
+        self._lambda = np.exp(-1.0 / (WINDOW_SECONDS * self.sampling_rate))
+        self._line_lambda = np.exp(-1.0 / (LINE_WINDOW_SECONDS * self.sampling_rate))
+        # Mains frequencies the sampling rate can represent, in radians per sample
+        self._omegas = np.array([2 * np.pi * f / self.sampling_rate for f in LINE_FREQUENCIES_HZ
+                                 if f < self.sampling_rate / 2])
+        self._phases = np.zeros(len(self._omegas))
+
+        self._weight = 0.0
+        self._sum = np.zeros(n)
+        self._sum_squares = np.zeros(n)
+        self._clipped = np.zeros(n)
+        self._line_weight = 0.0
+        self._line_power = np.zeros(n)
+        self._line_bins = np.zeros((len(self._omegas), n), dtype=complex)
+        self._flat_run = np.zeros(n, dtype=np.int64)
+        self._last = None
+        self._weights = {}
+
+    def _decay_weights(self, decay, count):
+        key = (decay, count)
+        weights = self._weights.get(key)
+        if weights is None:
+            # Frames usually have a fixed size, so this is computed once per rate
+            weights = decay ** np.arange(count - 1, -1, -1, dtype=np.float64)
+            if len(self._weights) > 16:
+                self._weights.clear()
+            self._weights[key] = weights
+        return weights
+
+    def update(self, samples):
+        """
+        Adds a (samples, channels) chunk of raw values, oldest sample first.
+        """
+        x = np.asarray(samples, dtype=np.float64)
+        count = x.shape[0]
+        if count == 0:
+            return
+        if x.shape[1] != len(self.channel_names):
+            raise ValueError(f"Expected {len(self.channel_names)} channels, got {x.shape[1]}")
+
+        # Flatline: consecutive samples within flat_tolerance of each other
+        low, high = x.min(axis=0), x.max(axis=0)
+        if self._last is not None:
+            low, high = np.minimum(low, self._last), np.maximum(high, self._last)
+        flat = (high - low) <= self.flat_tolerance
+        self._flat_run = np.where(flat, self._flat_run + count, 0)
+        self._last = x[-1].copy()
+
+        # Variance and clipping over WINDOW_SECONDS
+        weights = self._decay_weights(self._lambda, count)
+        decay = self._lambda ** count
+        self._weight = decay * self._weight + weights.sum()
+        self._sum = decay * self._sum + weights @ x
+        self._sum_squares = decay * self._sum_squares + weights @ (x * x)
+        if self.clip_limits is not None:
+            rails = (x <= self.clip_limits[0]) | (x >= self.clip_limits[1])
+            self._clipped = decay * self._clipped + weights @ rails
+
+        # Mains power over LINE_WINDOW_SECONDS, around the running mean
+        if len(self._omegas):
+            centered = x - self._sum / self._weight
+            weights = self._decay_weights(self._line_lambda, count)
+            decay = self._line_lambda ** count
+            self._line_weight = decay * self._line_weight + weights.sum()
+            self._line_power = decay * self._line_power + weights @ (centered * centered)
+            steps = np.arange(count)
+            for i, omega in enumerate(self._omegas):
+                rotation = weights * np.exp(-1j * (self._phases[i] + omega * steps))
+                self._line_bins[i] = decay * self._line_bins[i] + rotation @ centered
+                self._phases[i] = (self._phases[i] + omega * count) % (2 * np.pi)
+
+        self.samples += count
+
+    def channel_stats(self):
+        """
+        Current statistics of each channel.
+
+        Returns:
+            list: One dict per channel: {"name", "std", "clipped_fraction",
+            "line_noise_ratio", "flat_seconds"}
+        """
+        if self._weight == 0:
+            return []
+        mean = self._sum / self._weight
+        variance = np.maximum(self._sum_squares / self._weight - mean * mean, 0.0)
+        clipped = self._clipped / self._weight
+        line_ratio = np.zeros(len(self.channel_names))
+        if len(self._omegas):
+            # A pure sinusoid gives |bin|^2 = weight * power / 2, i.e. a ratio of 1
+            power = self._line_weight * self._line_power
+            with np.errstate(divide="ignore", invalid="ignore"):
+                ratios = 2 * np.abs(self._line_bins) ** 2 / power
+            line_ratio = np.clip(np.nan_to_num(ratios.max(axis=0)), 0.0, 1.0)
+
+        return [
+            {
+                "name": name,
+                "std": float(np.sqrt(variance[i])),
+                "clipped_fraction": float(clipped[i]),
+                "line_noise_ratio": float(line_ratio[i]),
+                "flat_seconds": float(self._flat_run[i] / self.sampling_rate),
+            }
+            for i, name in enumerate(self.channel_names)
+        ]
+
+    def quality(self):
+        """
+        The rolling quality of the recording.
+
+        Returns:
+            dict: {"quality_score" (0-1, None during warm-up), "channel_flags"
+            ({channel name: [flag, ...]} for flagged channels only),
+            "channels" (channel_stats() plus each channel's "score")}
+        """
+        if self.samples < WARMUP_SECONDS * self.sampling_rate:
+            return {"quality_score": None, "channel_flags": {}, "channels": []}
+
+        channels = self.channel_stats()
+        live = [c["std"] for c in channels if c["flat_seconds"] < FLATLINE_SECONDS]
+        median_std = float(np.median(live)) if len(live) >= 3 else None
+
+        flags = {}
+        for channel in channels:
+            channel_flags = []
+            if channel["flat_seconds"] >= FLATLINE_SECONDS:
+                channel_flags.append("flat")
+            if channel["clipped_fraction"] > CLIP_FRACTION:
+                channel_flags.append("clipping")
+            if channel["line_noise_ratio"] > LINE_NOISE_RATIO:
+                channel_flags.append("line_noise")
+            if median_std and channel["std"] > NOISY_FACTOR * median_std:
+                channel_flags.append("noisy")
+
+            if "flat" in channel_flags or "clipping" in channel_flags:
+                score = 0.0
+            else:
+                score = 1.0 - channel["line_noise_ratio"]
+                if "noisy" in channel_flags:
+                    score *= NOISY_PENALTY
+            channel["score"] = round(score, 3)
+            if channel_flags:
+                flags[channel["name"]] = channel_flags
+
+        return {
+            "quality_score": round(sum(c["score"] for c in channels) / len(channels), 3),
+            "channel_flags": flags,
+            "channels": channels,
+        }
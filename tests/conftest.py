@@ -0,0 +1,10 @@
+"""
+Shared pytest setup.
+"""
+
+import sys
+import os
+
+# The web app and agents import the shared neurohub_common package; the images
+# install it (see agents/neurohub_common/pyproject.toml), a checkout reads it in place
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'agents', 'neurohub_common')))
@@ -0,0 +1,114 @@
+"""
+Tests for the content-addressed analysis results cache.
+"""
+
+import json
+import numpy as np
+import pytest
+import sys
+import os
+import time
+
+# Add the neurohub app directory to path; its modules use flat imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'neurohub')))
+
+import analysis_cache
+from analysis_cache import AnalysisCache, analyze_file_cached, cache_key, canonical_parameters, file_checksum
+import signal_io
+
+FS = 128
+
+
+@pytest.fixture(autouse=True)
+def signal_root(tmp_path, monkeypatch):
+    # Recordings are written under tmp_path, which stands in for the signal root
+    monkeypatch.setattr(signal_io, "SIGNAL_ROOT", str(tmp_path))
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(analysis_cache, "CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(analysis_cache, "_default_cache", None)
+    monkeypatch.setattr(analysis_cache, "_checksums", {})
+
+
+@pytest.fixture
+def recording_path(tmp_path):
+    t = np.arange(20 * FS) / FS
+    path = tmp_path / "rec.npy"
+    np.save(path, np.vstack([np.sin(2 * np.pi * 10 * t), np.cos(2 * np.pi * 6 * t)]))
+    (tmp_path / "rec.json").write_text(json.dumps({"sampling_rate": FS}))
+    return str(path)
+
+
+class TestCacheKey:
+    """Test that keys depend on content and parameters, not their spelling."""
+
+    def test_parameters_are_canonicalized(self):
+        assert canonical_parameters({"low_hz": 1}) == canonical_parameters({"high_hz": 45, "low_hz": 1.0})
+        assert canonical_parameters({"low_hz": 1}) != canonical_parameters({"low_hz": 2})
+        assert canonical_parameters({}, sampling_rate=256) != canonical_parameters({})
+
+    def test_key_changes_with_each_component(self):
+        parameters = canonical_parameters({})
+        key = cache_key("s1", "sha256:a", parameters)
+        assert key == cache_key("s1", "sha256:a", canonical_parameters({}))
+        assert key != cache_key("s2", "sha256:a", parameters)
+        assert key != cache_key("s1", "sha256:b", parameters)
+        assert key != cache_key("s1", "sha256:a", parameters, analysis_type="temporal")
+
+    def test_checksum_tracks_file_contents(self, tmp_path):
+        path = tmp_path / "data.bin"
+        path.write_bytes(b"a" * 100)
+        first = file_checksum(str(path))
+        assert first == file_checksum(str(path))
+        assert os.listdir(tmp_path / "cache" / "checksums")
+
+        path.write_bytes(b"b" * 100)
+        os.utime(path, (time.time() + 10, time.time() + 10))
+        assert file_checksum(str(path)) != first
+
+
+class TestAnalysisCache:
+    """Test the on-disk store and its size bound."""
+
+    def test_get_put(self, tmp_path):
+        cache = AnalysisCache(str(tmp_path / "c"))
+        assert cache.get("ab12") is None
+        cache.put("ab12", {"snr": 12.5})
+        assert cache.get("ab12") == {"snr": 12.5}
+        assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+    def test_evicts_least_recently_used(self, tmp_path):
+        cache = AnalysisCache(str(tmp_path / "c"), max_bytes=2500)
+        payload = {"data": "x" * 1000}
+        cache.put("aa01", payload)
+        os.utime(cache._path("aa01"), (1, 1))
+        cache.put("bb02", payload)
+        os.utime(cache._path("bb02"), (2, 2))
+        cache.get("aa01")  # Refreshes aa01, so bb02 is now the oldest
+        cache.put("cc03", payload)
+
+        assert cache.get("bb02") is None
+        assert cache.get("aa01") == payload and cache.get("cc03") == payload
+        assert cache.evictions == 1
+
+
+class TestAnalyzeFileCached:
+    """Test that repeated analyses are served from the cache."""
+
+    def test_second_call_is_cached(self, recording_path, monkeypatch):
+        first = analyze_file_cached("s1", recording_path, low_hz=1.0)
+        monkeypatch.setattr(analysis_cache, "analyze_file", lambda *args, **kwargs: pytest.fail("recomputed"))
+        second = analyze_file_cached("s1", recording_path, low_hz=1)
+
+        assert first["cached"] is False and second["cached"] is True
+        assert second["results"] == first["results"]
+        assert second["cache_key"] == first["cache_key"]
+        assert first["file_checksum"].startswith("sha256:")
+
+    def test_known_key_skips_analysis(self, recording_path, monkeypatch):
+        key = analysis_cache.analysis_key("s1", recording_path)["cache_key"]
+        monkeypatch.setattr(analysis_cache, "analyze_file", lambda *args, **kwargs: pytest.fail("recomputed"))
+        result = analyze_file_cached("s1", recording_path, known_keys=(key,))
+        assert result["results"] is None and result["cached"] is True
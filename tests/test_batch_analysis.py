@@ -0,0 +1,236 @@
+"""
+Tests for the process-pool batch analysis runner.
+"""
+
+import json
+import numpy as np
+import pytest
+import sys
+import os
+import subprocess
+from contextlib import contextmanager
+
+# Add the neurohub app directory to path; its modules use flat imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'neurohub')))
+
+from google.cloud import spanner
+import analysis_cache
+import batch_analysis
+from batch_analysis import (ANALYSIS_COLUMNS, DEFAULT_STATUSES, analysis_row, batch_options, confidence_score,
+                            record_analysis, run_batch)
+import signal_io
+
+FS = 128
+
+
+@pytest.fixture(autouse=True)
+def signal_root(tmp_path, monkeypatch):
+    # Recordings are written under tmp_path, which stands in for the signal root;
+    # spawned workers read the environment, this process reads the module
+    monkeypatch.setenv("NEUROHUB_SIGNAL_ROOT", str(tmp_path))
+    monkeypatch.setattr(signal_io, "SIGNAL_ROOT", str(tmp_path))
+
+
+class FakeBatch:
+    def __init__(self):
+        self.mutations = []
+
+    def insert(self, table, columns, values):
+        self.mutations.append(("insert", table, columns, list(values)))
+
+    def update(self, table, columns, values):
+        self.mutations.append(("update", table, columns, list(values)))
+
+
+class FakeDatabase:
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = []
+        self.batches = []
+
+    @contextmanager
+    def snapshot(self):
+        outer = self
+
+        class Snapshot:
+            def execute_sql(self, sql, params=None, param_types=None):
+                outer.queries.append((sql, params))
+                return list(outer.rows)
+
+        yield Snapshot()
+
+    @contextmanager
+    def batch(self):
+        batch = FakeBatch()
+        yield batch
+        self.batches.append(batch)
+
+
+@pytest.fixture
+def signal_rows(tmp_path):
+    rng = np.random.default_rng(0)
+    t = np.arange(30 * FS) / FS
+    rows = []
+    for i in range(3):
+        path = tmp_path / f"sig{i}.npy"
+        np.save(path, 20 * np.sin(2 * np.pi * 10 * t) + rng.normal(0, 2, size=(2, t.size)))
+        rows.append((f"s{i}", str(path), float(FS), "pi-1", []))
+    rows.append(("s-missing", str(tmp_path / "missing.npy"), float(FS), "pi-1", []))
+    return rows
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    # Spawned workers read the environment; this process reads the module
+    monkeypatch.setenv("NEUROHUB_ANALYSIS_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(analysis_cache, "CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(analysis_cache, "_default_cache", None)
+
+
+class TestRunBatch:
+    """Test selecting, analyzing and writing a batch end to end."""
+
+    def test_writes_analyses_and_updates_status(self, signal_rows, monkeypatch):
+        invalidated = []
+        monkeypatch.setattr(batch_analysis, "invalidate_tables", lambda *tables: invalidated.extend(tables))
+        db = FakeDatabase(signal_rows)
+
+        summary = run_batch(db, "exp-1", workers=2)
+
+        assert summary["selected"] == 4
+        assert summary["analyzed"] == 3 and summary["written"] == 3
+        assert summary["failed"] == 1 and summary["errors"][0]["signal_id"] == "s-missing"
+        assert db.queries[0][1] == {"experiment_id": "exp-1", "statuses": ["raw", "filtered", "processed"]}
+
+        (insert, update), = [batch.mutations for batch in db.batches]
+        assert insert[:3] == ("insert", "Analysis", ANALYSIS_COLUMNS)
+        assert sorted(row[1] for row in insert[3]) == ["s0", "s1", "s2"]
+        assert all(row[2] == "pi-1" and row[-1] is spanner.COMMIT_TIMESTAMP for row in insert[3])
+        assert update[1] == "SignalData"
+        assert sorted(update[3]) == [("s0", "analyzed"), ("s1", "analyzed"), ("s2", "analyzed")]
+        assert set(invalidated) == {"Analysis", "SignalData"}
+
+    def test_dry_run_writes_nothing(self, signal_rows):
+        db = FakeDatabase(signal_rows[:1])
+        summary = run_batch(db, "exp-1", workers=1, dry_run=True)
+        assert summary["analyzed"] == 1 and summary["written"] == 1
+        assert db.batches == []
+
+    def test_rerun_uses_cache_and_skips_stored_analyses(self, signal_rows):
+        first = FakeDatabase(signal_rows[:2])
+        run_batch(first, "exp-1", workers=1)
+        stored_key = json.loads(first.batches[0].mutations[0][3][0][4])["cache_key"]
+        stored_signal = first.batches[0].mutations[0][3][0][1]
+
+        rows = [row[:4] + ([stored_key] if row[0] == stored_signal else [],) for row in signal_rows[:2]]
+        second = FakeDatabase(rows)
+        summary = run_batch(second, "exp-1", workers=1)
+
+        assert summary["analyzed"] == 2 and summary["cached"] == 2
+        assert summary["written"] == 1
+        (insert, update), = [batch.mutations for batch in second.batches]
+        assert [row[1] for row in insert[3]] == [s for s in ("s0", "s1") if s != stored_signal]
+        assert len(update[3]) == 2
+
+    def test_no_signals(self):
+        summary = run_batch(FakeDatabase([]), "exp-1")
+        assert summary["selected"] == 0 and summary["analyzed"] == 0
+
+
+class TestAnalysisRow:
+    """Test turning analysis results into Analysis row values."""
+
+    def test_row_contents(self):
+        results = {"summary": "Signal quality: Good", "recommendations": ["Alpha band activity is prominent"],
+                   "snr": 30.0, "artifact_fraction": 0.1, "filter": {"low_hz": 1.0}}
+        signal = {"signal_id": "s1", "principal_investigator_id": "pi-1"}
+        analysis = {"results": results, "parameters": {"low_hz": 1.0}, "cache_key": "k1", "file_checksum": "sha256:0"}
+        row = dict(zip(ANALYSIS_COLUMNS, analysis_row(signal, analysis, researcher_id="r9")))
+
+        assert row["researcher_id"] == "r9"
+        assert row["analysis_type"] == "spectral"
+        assert row["findings"] == "Signal quality: Good. Alpha band activity is prominent."
+        parameters = json.loads(row["parameters"])
+        assert parameters["filter"] == {"low_hz": 1.0}
+        assert parameters["cache_key"] == "k1" and parameters["file_checksum"] == "sha256:0"
+        assert json.loads(row["results"]) == results
+        assert row["confidence_score"] == 0.9
+
+    @pytest.mark.parametrize("status, marked", [("raw", True), ("recording", False)])
+    def test_record_single_analysis(self, monkeypatch, status, marked):
+        invalidated = []
+        monkeypatch.setattr(batch_analysis, "invalidate_tables", lambda *tables: invalidated.extend(tables))
+        db = FakeDatabase([("pi-1",)])
+        signal = {"signal_id": "s1", "experiment_id": "exp-1", "processing_status": status}
+        analysis = {"results": {"summary": "Signal quality: Good", "snr": 30.0}, "parameters": {},
+                    "cache_key": "k1", "file_checksum": "sha256:0"}
+
+        record_analysis(db, signal, analysis)
+
+        mutations = db.batches[0].mutations
+        row = dict(zip(ANALYSIS_COLUMNS, mutations[0][3][0]))
+        assert row["researcher_id"] == "pi-1"
+        assert json.loads(row["parameters"])["cache_key"] == "k1"
+        assert (len(mutations) == 2) == marked
+        assert set(invalidated) == {"Analysis", "SignalData"}
+
+    def test_confidence_scales_with_snr(self):
+        assert confidence_score({"snr": 10.0, "artifact_fraction": 0.0}) == 0.5
+        assert confidence_score({"snr": -3.0, "artifact_fraction": 0.0}) == 0.0
+        assert confidence_score({"snr": None}) == 0.0
+
+
+class TestBatchOptions:
+    """Test the checks on a batch job request."""
+
+    def test_defaults(self):
+        options = batch_options({})
+        assert options["statuses"] == DEFAULT_STATUSES
+        assert options["workers"] is None and options["limit"] is None
+
+    def test_workers_capped_at_cpu_count(self, monkeypatch):
+        monkeypatch.setattr(os, "cpu_count", lambda: 4)
+        assert batch_options({"workers": 1000, "statuses": ["raw"]})["workers"] == 4
+        assert batch_options({"workers": 2})["workers"] == 2
+
+    @pytest.mark.parametrize("data", [
+        {"statuses": "raw"}, {"statuses": []}, {"statuses": ["raw", 1]},
+        {"workers": 0}, {"workers": "8"}, {"workers": True}, {"limit": 2.5},
+        {"low_hz": "1"}, {"high_hz": -5}, {"low_hz": 40, "high_hz": 30}, {"researcher_id": 7},
+    ])
+    def test_rejected(self, data):
+        with pytest.raises(ValueError):
+            batch_options(data)
+
+
+class TestWorkerProcesses:
+    """Test the spawned worker processes."""
+
+    def test_environ_and_no_import_time_connection(self, tmp_path):
+        # probe.connected stands in for a task importing db_neurohub, with
+        # get_database() replaced so no real client is created
+        (tmp_path / "probe.py").write_text(
+            "def connected(_):\n"
+            "    import neurohub_common.spanner_pool as spanner_pool\n"
+            "    spanner_pool.get_database = lambda: 'connected'\n"
+            "    import db_neurohub\n"
+            "    return db_neurohub.db\n"
+        )
+        main = tmp_path / "server.py"
+        main.write_text(
+            "import os, sys\n"
+            f"sys.path[:0] = [{str(tmp_path)!r}, {os.path.dirname(batch_analysis.__file__)!r}, "
+            f"{os.path.join(os.path.dirname(batch_analysis.__file__), '..', 'agents', 'neurohub_common')!r}]\n"
+            "from batch_worker import process_executor\n"
+            "import probe\n"
+            "if __name__ == '__main__':\n"
+            "    with process_executor(2, environ={'NEUROHUB_TEST': '1'}) as executor:\n"
+            "        print(sorted(executor.map(os.getenv, ['NEUROHUB_TEST'] * 4)))\n"
+            "        print(list(executor.map(probe.connected, [0])), probe.connected(0))\n"
+        )
+        result = subprocess.run([sys.executable, str(main)], capture_output=True, text=True, timeout=60)
+
+        assert result.returncode == 0, result.stderr
+        # Other lines are db_neurohub's configuration warnings
+        lines = [line for line in result.stdout.splitlines() if line.startswith("[")]
+        assert lines == ["['1', '1', '1', '1']", "[None] connected"]
@@ -0,0 +1,156 @@
+"""
+Tests for bulk NDJSON / CSV imports.
+"""
+
+import io
+import json
+import pytest
+import sys
+import os
+import threading
+from contextlib import contextmanager
+
+# Add the neurohub app directory to path; its modules use flat imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'neurohub')))
+
+from google.api_core import exceptions
+from google.cloud import spanner
+
+import bulk_import
+from bulk_import import import_request_stream, rows_per_commit, run_import
+
+
+class FakeTransaction:
+    def __init__(self, db):
+        self.db = db
+        self.mutations = []
+
+    def read(self, table, columns, keyset):
+        return [[key[0]] for key in keyset.keys if key[0] in self.db.stored]
+
+    def insert(self, table, columns, values):
+        self.mutations.append(("insert", table, columns, list(values)))
+
+    def update(self, table, columns, values):
+        self.mutations.append(("update", table, columns, list(values)))
+
+
+class FakeDatabase:
+    """Commits transactions; the first abort_first commits raise Aborted."""
+
+    def __init__(self, abort_first=0):
+        self.abort_first = abort_first
+        self.attempts = 0
+        self.committed = []
+        self.stored = {}
+        self._lock = threading.Lock()
+
+    def run_in_transaction(self, func, *args):
+        with self._lock:
+            self.attempts += 1
+            attempt = self.attempts
+            transaction = FakeTransaction(self)
+            func(transaction, *args)
+            if attempt <= self.abort_first:
+                raise exceptions.Aborted("Transaction was aborted")
+            self.committed.extend(transaction.mutations)
+            for _, _, columns, values in transaction.mutations:
+                for row in values:
+                    self.stored.setdefault(row[0], {}).update(zip(columns, row))
+
+    def rows(self):
+        return [dict(zip(columns, row)) for _, _, columns, values in self.committed for row in values]
+
+
+@pytest.fixture(autouse=True)
+def no_side_effects(monkeypatch):
+    reconciled = []
+    monkeypatch.setattr(bulk_import, "reconcile", lambda db_instance: reconciled.append(db_instance))
+    monkeypatch.setattr(bulk_import, "invalidate_tables", lambda *tables: None)
+    monkeypatch.setattr(bulk_import, "RETRY_BASE_SECONDS", 0)
+    return reconciled
+
+
+def session_lines(count):
+    return "".join(
+        json.dumps({"session_id": f"sess-{i}", "experiment_id": "e1", "researcher_id": "r1",
+                    "session_date": "2019-05-01T10:00:00Z", "duration_minutes": 30 + i}) + "\n"
+        for i in range(count)
+    )
+
+
+class TestRunImport:
+    """Test batching, parallel commits and error reporting."""
+
+    def test_ndjson_in_batches(self, no_side_effects):
+        db = FakeDatabase()
+        summary = run_import(db, "sessions", io.StringIO(session_lines(1000)), batch_rows=64, workers=4)
+
+        assert summary["read"] == summary["written"] == 1000
+        assert summary["batches"] == 16 and summary["failed"] == summary["rejected"] == 0
+        rows = db.rows()
+        assert sorted(row["session_id"] for row in rows) == sorted(f"sess-{i}" for i in range(1000))
+        assert rows[0]["session_date"].isoformat() == "2019-05-01T10:00:00+00:00"
+        assert all(row["create_time"] is spanner.COMMIT_TIMESTAMP for row in rows)
+        assert summary["rows_per_second"] > 0
+        # Sessions change ResearcherStats, which is reconciled once at the end
+        assert no_side_effects == [db]
+
+    def test_csv_with_generated_ids(self, no_side_effects):
+        db = FakeDatabase()
+        text = ("signal_id,researcher_id,analysis_type,confidence_score,analyzed_at,parameters\n"
+                's1,r1,spectral,0.9,2020-01-01T00:00:00Z,"{""low_hz"": 1}"\n'
+                "s2,r1,temporal,,,\n")
+        summary = run_import(db, "analyses", io.StringIO(text), input_format="csv")
+
+        assert summary["written"] == 2
+        first, second = sorted(db.rows(), key=lambda row: row["signal_id"])
+        assert len(first["analysis_id"]) == 36 and first["analysis_id"] != second["analysis_id"]
+        assert first["parameters"] == '{"low_hz": 1}' and first["confidence_score"] == 0.9
+        assert second["confidence_score"] is None and second["analyzed_at"] is None
+        assert no_side_effects == []
+
+    def test_reimport_is_idempotent(self):
+        db = FakeDatabase()
+        text = ("signal_id,researcher_id,analysis_type\n"
+                "s1,r1,spectral\n"
+                "s2,r1,temporal\n")
+        run_import(db, "analyses", io.StringIO(text), input_format="csv")
+        first_ids = set(db.stored)
+        summary = run_import(db, "analyses", io.StringIO(text), input_format="csv")
+
+        assert summary["written"] == 2
+        assert set(db.stored) == first_ids and len(first_ids) == 2
+        (kind, _, columns, _), = db.committed[1:]
+        # Rows that already exist are updated without touching create_time
+        assert kind == "update" and "create_time" not in columns
+
+    def test_bad_rows_are_rejected_with_line_numbers(self):
+        db = FakeDatabase()
+        text = session_lines(2) + "not json\n" + '{"session_id": "x", "duration_minutes": "long"}\n' + session_lines(1)
+        summary = run_import(db, "sessions", io.StringIO(text))
+
+        assert summary["written"] == 3 and summary["rejected"] == 2
+        assert [error["lines"] for error in summary["errors"]] == ["3", "4"]
+        assert "duration_minutes" in summary["errors"][1]["error"]
+
+    def test_aborted_commits_are_retried(self):
+        db = FakeDatabase(abort_first=2)
+        summary = run_import(db, "sessions", io.StringIO(session_lines(10)), batch_rows=5, workers=1)
+        assert summary["written"] == 10 and summary["retries"] == 2 and summary["failed"] == 0
+
+    def test_batch_failing_every_attempt(self, monkeypatch):
+        monkeypatch.setattr(bulk_import, "MAX_ATTEMPTS", 2)
+        db = FakeDatabase(abort_first=2)
+        summary = run_import(db, "sessions", io.StringIO(session_lines(10)), batch_rows=5, workers=1)
+        assert summary["failed"] == 5 and summary["written"] == 5
+        assert summary["errors"][0]["lines"] == "1-5" and "Aborted" in summary["errors"][0]["error"]
+
+    def test_batches_sized_under_the_mutation_limit(self):
+        # 9 columns + create_time + 2 index entries per Analysis row
+        assert rows_per_commit("analyses") == bulk_import.MUTATIONS_PER_COMMIT // 12
+
+    def test_binary_request_stream(self):
+        db = FakeDatabase()
+        summary = import_request_stream(db, "sessions", io.BytesIO(session_lines(3).encode("utf-8")))
+        assert summary["written"] == 3
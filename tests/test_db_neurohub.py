@@ -0,0 +1,356 @@
+"""
+Tests for the NeuroHub Spanner data fetchers, using an in-memory fake database.
+"""
+
+import pytest
+from datetime import datetime, timedelta, timezone
+import sys
+import os
+
+# Add the neurohub app directory to path; its modules use flat imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'neurohub')))
+
+import db_neurohub
+import db_neurohub_enhanced
+from neurohub_common.pagination import InvalidCursor, decode_cursor, encode_cursor
+from neurohub_common.rows import build_row_decoder
+from query_cache import query_cache
+from google.cloud.spanner_v1 import StructType, Type, TypeCode
+
+
+def field(name, code=TypeCode.STRING):
+    """Builds a result-set field descriptor; code may be a TypeCode or a Type."""
+    field_type = code if isinstance(code, Type) else Type(code=code)
+    return StructType.Field(name=name, type_=field_type)
+
+
+def struct_array(*fields):
+    return Type(code=TypeCode.ARRAY,
+                array_element_type=Type(code=TypeCode.STRUCT,
+                                        struct_type=StructType(fields=list(fields))))
+
+
+@pytest.fixture(autouse=True)
+def empty_query_cache():
+    """Fetchers are cached process-wide; start every test cold."""
+    query_cache.clear()
+    yield
+    query_cache.clear()
+
+
+class FakeResultSet:
+    """Mimics a StreamedResultSet: fields are only known once iteration starts."""
+
+    def __init__(self, columns, rows):
+        self._columns = [field(c) if isinstance(c, str) else c for c in columns]
+        self._rows = rows
+        self.fields = None
+        self.rows_pulled = 0
+
+    def __iter__(self):
+        self.fields = self._columns
+        for row in self._rows:
+            self.rows_pulled += 1
+            yield list(row)
+
+
+class FakeSnapshot:
+    def __init__(self, database):
+        self._database = database
+
+    def __enter__(self):
+        self._database.open_snapshots += 1
+        return self
+
+    def __exit__(self, *exc):
+        self._database.open_snapshots -= 1
+        return False
+
+    def execute_sql(self, sql, params=None, param_types=None):
+        self._database.executed.append((sql, params))
+        self._database.last_result = FakeResultSet(*self._database.responses.pop(0))
+        return self._database.last_result
+
+
+class FakeDatabase:
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.executed = []
+        self.open_snapshots = 0
+        self.snapshot_options = []
+        self.last_result = None
+
+    def snapshot(self, **kwargs):
+        self.snapshot_options.append(kwargs)
+        return FakeSnapshot(self)
+
+
+class TestRunSqlQuery:
+    """Test list and streaming query execution."""
+
+    def test_returns_list_of_dicts(self):
+        db = FakeDatabase((["a", "b"], [(1, "x"), (2, "y")]))
+        rows = db_neurohub.run_sql_query(db, "SELECT a, b FROM T")
+        assert rows == [{"a": 1, "b": "x"}, {"a": 2, "b": "y"}]
+        assert db.open_snapshots == 0
+
+    def test_empty_result(self):
+        db = FakeDatabase((["a"], []))
+        assert db_neurohub.run_sql_query(db, "SELECT a FROM T") == []
+
+    def test_no_database(self):
+        assert db_neurohub.run_sql_query(None, "SELECT 1") is None
+
+    def test_stream_is_lazy(self):
+        db = FakeDatabase((["a"], [(1,), (2,), (3,)]))
+        rows = db_neurohub.run_sql_query(db, "SELECT a FROM T", stream=True)
+        assert db.executed == []
+
+        assert next(rows) == {"a": 1}
+        assert db.last_result.rows_pulled == 1
+        assert db.open_snapshots == 1
+
+        assert list(rows) == [{"a": 2}, {"a": 3}]
+        assert db.open_snapshots == 0
+
+    def test_stream_close_releases_snapshot(self):
+        db = FakeDatabase((["a"], [(1,), (2,)]))
+        rows = db_neurohub.stream_sql_query(db, "SELECT a FROM T")
+        next(rows)
+        rows.close()
+        assert db.open_snapshots == 0
+
+    def test_signal_data_stream_converts_timestamps(self):
+        recorded = datetime(2025, 7, 1, 12, 0, tzinfo=timezone.utc)
+        db = FakeDatabase((["signal_id",
+                            field("recorded_at", TypeCode.TIMESTAMP),
+                            field("session_date", TypeCode.TIMESTAMP)],
+                           [("sig-1", recorded, None)]))
+        rows = list(db_neurohub.get_signal_data_by_experiment(db, "exp-1", stream=True))
+        assert rows == [{"signal_id": "sig-1",
+                         "recorded_at": recorded.isoformat(),
+                         "session_date": None}]
+
+
+class TestRowDecoder:
+    """Test schema-aware conversion while rows are decoded."""
+
+    def test_timestamp_formats(self):
+        fields = [field("id"), field("at", TypeCode.TIMESTAMP), field("day", TypeCode.DATE)]
+        at = datetime(2025, 7, 1, 12, 0, 0, 123000, tzinfo=timezone.utc)
+        day = at.date()
+
+        iso = build_row_decoder(fields)(["x", at, day])
+        epoch = build_row_decoder(fields, "epoch_ms")(["x", at, day])
+        raw = build_row_decoder(fields, None)(["x", at, day])
+
+        assert iso == {"id": "x", "at": at.isoformat(), "day": "2025-07-01"}
+        assert epoch == {"id": "x", "at": 1751371200123, "day": "2025-07-01"}
+        assert raw == {"id": "x", "at": at, "day": day}
+
+    def test_nulls_and_untyped_columns_untouched(self):
+        decode = build_row_decoder([field("at", TypeCode.TIMESTAMP), field("n", TypeCode.INT64)])
+        assert decode([None, 5]) == {"at": None, "n": 5}
+
+    def test_keeps_nanoseconds(self):
+        from google.api_core.datetime_helpers import DatetimeWithNanoseconds
+        at = DatetimeWithNanoseconds(2025, 7, 1, 12, 0, 0, nanosecond=123456789, tzinfo=timezone.utc)
+        decode = build_row_decoder([field("at", TypeCode.TIMESTAMP)])
+        assert decode([at]) == {"at": "2025-07-01T12:00:00.123456789Z"}
+
+    def test_unknown_format(self):
+        with pytest.raises(ValueError):
+            build_row_decoder([field("at", TypeCode.TIMESTAMP)], "rfc822")
+
+    def test_field_names_override(self):
+        decode = build_row_decoder([field("a.name"), field("at", TypeCode.TIMESTAMP)],
+                                   field_names=["name", "analyzed_at"])
+        assert decode(["x", None]) == {"name": "x", "analyzed_at": None}
+
+
+class TestExperimentDetails:
+    """Test the single-query experiment page fetch."""
+
+    def test_struct_arrays_become_dicts(self):
+        session_date = datetime(2025, 7, 2, 9, 30, tzinfo=timezone.utc)
+        columns = [
+            "experiment_id",
+            "name",
+            field("start_date", TypeCode.TIMESTAMP),
+            "pi_name",
+            field("devices", struct_array(field("device_id"), field("name"))),
+            field("sessions", struct_array(field("session_id"),
+                                           field("session_date", TypeCode.TIMESTAMP))),
+            field("signal_data", struct_array(field("signal_id"))),
+        ]
+        row = ("exp-1", "Motor Imagery", None, "Dr. Sarah Chen",
+               [["dev-1", "OpenBCI Cyton 8"]],
+               [["ses-1", session_date]],
+               [["sig-1"], ["sig-2"]])
+        db = FakeDatabase((columns, [row]))
+
+        experiment = db_neurohub.get_experiment_details(db, "exp-1", include_signals=True)
+
+        assert len(db.executed) == 1
+        assert "signal_data" in db.executed[0][0]
+        assert experiment["devices"] == [{"device_id": "dev-1", "name": "OpenBCI Cyton 8"}]
+        assert experiment["sessions"] == [{"session_id": "ses-1",
+                                           "session_date": session_date.isoformat()}]
+        assert [s["signal_id"] for s in experiment["signal_data"]] == ["sig-1", "sig-2"]
+
+    def test_signals_are_optional(self):
+        db = FakeDatabase((["experiment_id"], [("exp-1",)]))
+        db_neurohub.get_experiment_details(db, "exp-1")
+        assert "signal_data" not in db.executed[0][0]
+
+    def test_missing_experiment(self):
+        db = FakeDatabase((["experiment_id"], []))
+        assert db_neurohub.get_experiment_details(db, "nope") is None
+
+
+class TestReadSnapshot:
+    """Test sharing one read-only snapshot across fetchers."""
+
+    def test_fetchers_share_one_multi_use_snapshot(self):
+        db = FakeDatabase((["experiment_id"], [("exp-1",)]),
+                          (["collaborator_id"], [("r-2",)]))
+
+        with db_neurohub.read_snapshot(db, exact_staleness=15) as snapshot:
+            experiments = db_neurohub.get_experiments_by_researcher(db, "r-1", snapshot=snapshot)
+            collaborators = db_neurohub.get_researcher_collaborations(db, "r-1", snapshot=snapshot)
+            assert db.open_snapshots == 1
+
+        assert db.open_snapshots == 0
+        assert db.snapshot_options == [{"multi_use": True,
+                                         "exact_staleness": timedelta(seconds=15)}]
+        assert experiments == [{"experiment_id": "exp-1"}]
+        assert collaborators == [{"collaborator_id": "r-2"}]
+
+    def test_strong_read_without_staleness(self):
+        db = FakeDatabase()
+        with db_neurohub.read_snapshot(db, exact_staleness=0):
+            pass
+        assert db.snapshot_options == [{"multi_use": True}]
+
+    def test_bounded_staleness_for_single_use_reads(self):
+        db = FakeDatabase((["a"], [(1,)]))
+        db_neurohub.run_sql_query(db, "SELECT a FROM T", max_staleness=10)
+        assert db.snapshot_options == [{"max_staleness": timedelta(seconds=10)}]
+
+    def test_no_database(self):
+        with db_neurohub.read_snapshot(None) as snapshot:
+            assert snapshot is None
+
+    def test_shared_read_timestamp(self, monkeypatch):
+        monkeypatch.setattr(db_neurohub.time, "time", lambda: 1_000_017.5)
+        assert db_neurohub.shared_read_timestamp(15, 5) == datetime.fromtimestamp(1_000_000, timezone.utc)
+        assert db_neurohub.shared_read_timestamp(0, 5) is None
+        assert db_neurohub.shared_read_timestamp(15, 0) is None
+
+
+class TestPagination:
+    """Test cursors threaded through the db_neurohub fetchers."""
+
+    def test_researchers_read_one_extra_row(self):
+        rows = [("r-1", "Ada"), ("r-2", "Ben"), ("r-3", "Cy")]
+        db = FakeDatabase((["researcher_id", "name"], rows))
+
+        page = db_neurohub.get_all_researchers(db, limit=2)
+
+        sql, params = db.executed[0]
+        assert params["limit"] == 3
+        assert "ORDER BY name, researcher_id" in sql
+        assert [r["researcher_id"] for r in page] == ["r-1", "r-2"]
+        assert decode_cursor(page.next_cursor) == ["Ben", "r-2"]
+
+    def test_next_page_seeks_past_cursor(self):
+        db = FakeDatabase((["researcher_id", "name"], [("r-3", "Cy")]))
+
+        page = db_neurohub.get_all_researchers(db, limit=2, cursor=encode_cursor("Ben", "r-2"))
+
+        sql, params = db.executed[0]
+        assert "name > @cursor_sort" in sql
+        assert "OFFSET" not in sql
+        assert params["cursor_sort"] == "Ben" and params["cursor_id"] == "r-2"
+        assert page.next_cursor is None
+
+    def test_last_page_has_no_cursor(self):
+        db = FakeDatabase((["researcher_id", "name"], [("r-1", "Ada")]))
+        page = db_neurohub.get_all_researchers(db, limit=2)
+        assert page == [{"researcher_id": "r-1", "name": "Ada"}]
+        assert page.next_cursor is None
+
+    @pytest.mark.parametrize("timestamp_format", ["iso", "epoch_ms"])
+    def test_cursor_keeps_raw_timestamp(self, timestamp_format):
+        analyzed = [datetime(2025, 7, 3, 0, 0, 0, 250, tzinfo=timezone.utc),
+                    datetime(2025, 7, 2, tzinfo=timezone.utc)]
+        db = FakeDatabase((["analysis_id", field("analyzed_at", TypeCode.TIMESTAMP)],
+                           [("a-2", analyzed[0]), ("a-1", analyzed[1])]))
+
+        page = db_neurohub.get_recent_analyses(db, limit=1, timestamp_format=timestamp_format)
+
+        expected = analyzed[0].isoformat() if timestamp_format == "iso" else 1751500800000
+        assert page[0]["analyzed_at"] == expected
+        # Sub-millisecond precision survives in the cursor even for epoch_ms output
+        assert decode_cursor(page.next_cursor) == [analyzed[0], "a-2"]
+
+    def test_collaborations_cursor_holds_edge_key(self):
+        started = datetime(2025, 7, 1, tzinfo=timezone.utc)
+        columns = ["collaborator_id", "collaborator_name", "project_name", "collaboration_type",
+                   field("start_date", TypeCode.TIMESTAMP), "researcher_id_a", "researcher_id_b"]
+        # Both directions of an edge with the same collaborator and start date
+        rows = [("r-2", "Ben", "P", "co-author", started, "r-2", "r-1"),
+                ("r-2", "Ben", "P", "co-author", started, "r-1", "r-2")]
+        db = FakeDatabase((columns, rows))
+
+        page = db_neurohub.get_researcher_collaborations(db, "r-1", limit=1)
+
+        sql, _ = db.executed[0]
+        assert "ORDER BY c.start_date DESC, c.researcher_id_a DESC, c.researcher_id_b DESC" in sql
+        assert decode_cursor(page.next_cursor, size=3) == [started, "r-2", "r-1"]
+
+        db = FakeDatabase((columns, rows[1:]))
+        db_neurohub.get_researcher_collaborations(db, "r-1", limit=1, cursor=page.next_cursor)
+        sql, params = db.executed[0]
+        assert "c.researcher_id_a = @cursor_id_0 AND c.researcher_id_b < @cursor_id_1" in sql
+        assert params["cursor_id_0"] == "r-2" and params["cursor_id_1"] == "r-1"
+
+    def test_query_error_returns_none(self):
+        db = FakeDatabase()  # No response queued: execute_sql raises
+        assert db_neurohub.get_all_researchers(db, limit=2) is None
+
+    def test_invalid_cursor_raises(self):
+        with pytest.raises(InvalidCursor):
+            db_neurohub.get_all_researchers(FakeDatabase(), cursor="garbage!")
+
+
+class TestResearchersWithStats:
+    """Test the choice between ResearcherStats and the aggregation query."""
+
+    RESEARCHER = ("r-1", "Ada", "ada@example.org", "MIT", "BCI", 5, 2, 1, 3)
+    COLUMNS = ["researcher_id", "name", "email", "institution", "expertise", "years_experience",
+               "projects", "publications", "collaborators"]
+
+    def test_materialized_table_used_when_present(self):
+        db = FakeDatabase((["table_name"], [("ResearcherStats",)]),
+                          (self.COLUMNS + ["total_sessions"], [self.RESEARCHER + (4,)]))
+        page = db_neurohub_enhanced.get_all_researchers_with_stats(db)
+        assert "ResearcherStats s" in db.executed[1][0]
+        assert page[0]["total_sessions"] == 4
+
+    def test_missing_table_looked_up_once(self):
+        db = FakeDatabase((["table_name"], []), (self.COLUMNS, [self.RESEARCHER]),
+                          (self.COLUMNS, [self.RESEARCHER]))
+        db_neurohub_enhanced.get_all_researchers_with_stats(db)
+        query_cache.clear()
+        page = db_neurohub_enhanced.get_all_researchers_with_stats(db)
+
+        assert len(db.executed) == 3
+        assert all("ResearcherStats s" not in sql for sql, _ in db.executed[1:])
+        assert page[0]["collaborators"] == 3
+
+    def test_query_error_not_retried(self):
+        # The materialized query fails: no response queued for it
+        db = FakeDatabase((["table_name"], [("ResearcherStats",)]))
+        assert db_neurohub_enhanced.get_all_researchers_with_stats(db) is None
+        assert len(db.executed) == 2
@@ -0,0 +1,168 @@
+"""
+Tests for the streaming experiment export.
+"""
+
+import io
+import json
+import pytest
+import sys
+import os
+
+# Add the neurohub app directory to path; its modules use flat imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'neurohub')))
+
+import experiment_export
+from experiment_export import ExportUnavailable, iter_export
+
+
+def signal_rows(count):
+    return [
+        {
+            "signal_id": f"s{i}", "session_id": "sess-1", "device_id": "d1", "device_name": "EEG-64",
+            "signal_type": "EEG", "duration_seconds": 60.0 + i, "sampling_rate": 256, "channels": 64,
+            "quality_score": None if i == 0 else 0.9, "processing_status": "raw",
+            "recorded_at": 1735689600000 + i * 1000, "file_path": f"gs://bucket/s{i}.edf",
+        }
+        for i in range(count)
+    ]
+
+
+@pytest.fixture
+def stream(monkeypatch):
+    """Replaces the Spanner stream with a generator that records how far it was read."""
+    state = {"read": 0, "calls": [], "sql": []}
+
+    def fake_stream(db_instance, sql, params=None, param_types=None, timestamp_format="iso", **kwargs):
+        state["calls"].append((params, timestamp_format))
+        state["sql"].append(sql)
+        for row in state["rows"]:
+            state["read"] += 1
+            yield row
+
+    monkeypatch.setattr(experiment_export, "stream_sql_query", fake_stream)
+    return state
+
+
+class TestColumnarExport:
+    """Test Arrow and Parquet output."""
+
+    def test_arrow_stream_round_trip(self, stream):
+        pa = pytest.importorskip("pyarrow")
+        stream["rows"] = signal_rows(5)
+
+        data = b"".join(iter_export(object(), "exp-1", "signals", "arrow", batch_rows=2))
+        table = pa.ipc.open_stream(io.BytesIO(data)).read_all()
+
+        assert table.num_rows == 5
+        assert table.column("signal_id").to_pylist() == ["s0", "s1", "s2", "s3", "s4"]
+        assert table.column("quality_score").to_pylist()[0] is None
+        assert str(table.schema.field("recorded_at").type) == "timestamp[ms, tz=UTC]"
+        assert "file_path" not in table.column_names
+        assert stream["calls"][0] == ({"experiment_id": "exp-1"}, "epoch_ms")
+
+    def test_parquet_written_in_row_groups(self, stream):
+        pytest.importorskip("pyarrow")
+        import pyarrow.parquet as pq
+        stream["rows"] = signal_rows(5)
+
+        data = b"".join(iter_export(object(), "exp-1", "signals", "parquet", include_raw_data=True, batch_rows=2))
+        parquet = pq.ParquetFile(io.BytesIO(data))
+
+        assert parquet.metadata.num_rows == 5
+        assert parquet.metadata.num_row_groups == 3
+        assert parquet.read().column("file_path").to_pylist()[4] == "gs://bucket/s4.edf"
+
+    def test_streams_batch_by_batch(self, stream):
+        pytest.importorskip("pyarrow")
+        stream["rows"] = signal_rows(6)
+
+        chunks = iter_export(object(), "exp-1", "signals", "arrow", batch_rows=2)
+        next(chunks)  # Schema
+        next(chunks)  # First batch
+        assert stream["read"] == 2
+
+    def test_empty_export_is_valid(self, stream):
+        pa = pytest.importorskip("pyarrow")
+        stream["rows"] = []
+        data = b"".join(iter_export(object(), "exp-1", "analyses", "arrow"))
+        table = pa.ipc.open_stream(io.BytesIO(data)).read_all()
+        assert table.num_rows == 0 and "confidence_score" in table.column_names
+
+    def test_missing_pyarrow(self, stream, monkeypatch):
+        monkeypatch.setitem(sys.modules, "pyarrow", None)
+        with pytest.raises(ExportUnavailable):
+            iter_export(object(), "exp-1", "signals", "parquet")
+
+
+class TestNdjsonExport:
+    """Test the line-delimited JSON format."""
+
+    def test_rows_as_lines(self, stream):
+        stream["rows"] = [dict(row, recorded_at="2025-01-01T00:00:00+00:00") for row in signal_rows(3)]
+        data = b"".join(iter_export(object(), "exp-1", "signals", "ndjson"))
+        lines = [json.loads(line) for line in data.decode("utf-8").splitlines()]
+
+        assert [line["signal_id"] for line in lines] == ["s0", "s1", "s2"]
+        assert stream["calls"][0][1] == "iso"
+
+    def test_unknown_table_or_format(self, stream):
+        with pytest.raises(KeyError):
+            iter_export(object(), "exp-1", "devices", "ndjson")
+        with pytest.raises(KeyError):
+            iter_export(object(), "exp-1", "signals", "xlsx")
+
+
+class TestPartitionedExport:
+    """Test exports read with one stream per partition."""
+
+    def test_partitioned_rows(self, stream, monkeypatch):
+        calls = []
+
+        def fake_partitioned(db_instance, sql, params=None, param_types=None, workers=1, **kwargs):
+            calls.append((sql, workers))
+            for row in signal_rows(3):
+                row.pop("device_name")
+                yield row
+
+        monkeypatch.setattr(experiment_export, "iter_partitioned_query", fake_partitioned)
+        # The device name lookup
+        stream["rows"] = [{"device_id": "d1", "name": "EEG-64"}]
+        lines = b"".join(iter_export(object(), "exp-1", "signals", "ndjson", workers=4)).splitlines()
+
+        assert [json.loads(line)["device_name"] for line in lines] == ["EEG-64"] * 3
+        assert calls[0][1] == 4
+        assert "ORDER BY" not in calls[0][0] and "JOIN" not in calls[0][0]
+        assert stream["sql"] == [experiment_export.DEVICE_NAMES_SQL]
+
+    def test_partitioned_analyses_by_signal_ids(self, stream, monkeypatch):
+        calls = []
+
+        def fake_partitioned(db_instance, sql, params=None, param_types=None, workers=1, **kwargs):
+            calls.append((sql, params))
+            for signal_id in params["signal_ids"]:
+                yield {"analysis_id": f"a-{signal_id}", "signal_id": signal_id, "researcher_id": "r1",
+                       "analysis_type": "FFT", "parameters": None, "results": None, "findings": None,
+                       "confidence_score": 0.5, "analyzed_at": "2025-01-01T00:00:00+00:00"}
+
+        monkeypatch.setattr(experiment_export, "iter_partitioned_query", fake_partitioned)
+        stream["rows"] = [{"signal_id": "s0"}, {"signal_id": "s1"}]
+        lines = b"".join(iter_export(object(), "exp-1", "analyses", "ndjson", workers=4)).splitlines()
+
+        assert [json.loads(line)["analysis_id"] for line in lines] == ["a-s0", "a-s1"]
+        assert "JOIN" not in calls[0][0]
+        assert calls[0][1] == {"signal_ids": ["s0", "s1"]}
+        assert stream["sql"] == [experiment_export.EXPERIMENT_SIGNALS_SQL]
+
+    def test_falls_back_to_ordered_stream(self, stream, monkeypatch):
+        from google.api_core import exceptions
+
+        def not_partitionable(*args, **kwargs):
+            raise exceptions.InvalidArgument("Query is not root partitionable")
+            yield
+
+        monkeypatch.setattr(experiment_export, "iter_partitioned_query", not_partitionable)
+        stream["rows"] = signal_rows(2)
+        lines = b"".join(iter_export(object(), "exp-1", "signals", "ndjson", workers=4)).splitlines()
+
+        assert [json.loads(line)["signal_id"] for line in lines] == ["s0", "s1"]
+        assert len(stream["calls"]) == 1 and "ORDER BY" in stream["sql"][0]
@@ -0,0 +1,71 @@
+"""
+Tests for the async signal processor tools.
+"""
+
+import asyncio
+import inspect
+import threading
+import time
+import pytest
+import sys
+import os
+
+# Add the agents directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'agents')))
+
+from signal_processor import neurohub, neurohub_async
+
+
+class TestAsyncTools:
+    """Test the thread-pool wrappers around the Spanner tools."""
+
+    def test_wrappers_keep_tool_metadata(self):
+        tool = neurohub_async.get_researcher_experiments
+        assert inspect.iscoroutinefunction(tool)
+        assert tool.__name__ == "get_researcher_experiments"
+        assert tool.__doc__ == neurohub.get_researcher_experiments.__doc__
+        assert inspect.signature(tool) == inspect.signature(neurohub.get_researcher_experiments)
+
+    @pytest.mark.asyncio
+    async def test_runs_off_the_event_loop(self):
+        def blocking_lookup(session_id):
+            time.sleep(0.2)
+            return threading.current_thread().name, session_id
+
+        tool = neurohub_async._to_async(blocking_lookup)
+        ticks = []
+
+        async def ticker():
+            for _ in range(3):
+                ticks.append(time.monotonic())
+                await asyncio.sleep(0.05)
+
+        (thread_name, session_id), _ = await asyncio.gather(tool(session_id="s-1"), ticker())
+
+        assert session_id == "s-1"
+        assert thread_name.startswith("neurohub-tool")
+        assert len(ticks) == 3  # The loop kept running while the lookup blocked
+
+    @pytest.mark.asyncio
+    async def test_gather_calls_is_concurrent_and_ordered(self):
+        def blocking_lookup(experiment_id):
+            time.sleep(0.2)
+            return experiment_id
+
+        tool = neurohub_async._to_async(blocking_lookup)
+        started = time.monotonic()
+        results = await neurohub_async.gather_calls(tool, [{"experiment_id": f"exp-{i}"} for i in range(4)])
+
+        assert results == ["exp-0", "exp-1", "exp-2", "exp-3"]
+        assert time.monotonic() - started < 0.6
+
+
+class TestSharedConnection:
+    """Test the agent uses the web app's pool module rather than its own."""
+
+    def test_pool_module_is_shared(self):
+        from neurohub_common import spanner_pool
+        from signal_processor import spanner_utils
+
+        assert spanner_utils.get_database is spanner_pool.get_database
+        assert neurohub_async.POOL_SIZE == spanner_pool.POOL_SIZE
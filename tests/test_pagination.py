@@ -0,0 +1,101 @@
+"""
+Tests for keyset (cursor) pagination helpers.
+"""
+
+import pytest
+from datetime import datetime, timezone
+import sys
+import os
+
+# Add the neurohub app directory to path; its modules use flat imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'neurohub')))
+
+from google.api_core.datetime_helpers import DatetimeWithNanoseconds
+from google.cloud.spanner_v1 import param_types
+
+from neurohub_common.pagination import InvalidCursor, Page, decode_cursor, encode_cursor, keyset_filter, paginate
+
+
+class TestCursor:
+    """Test cursor encoding."""
+
+    def test_round_trip(self):
+        cursor = encode_cursor("Dr. Sarah Chen", "r-1")
+        assert decode_cursor(cursor) == ["Dr. Sarah Chen", "r-1"]
+
+    def test_timestamp_keeps_nanoseconds(self):
+        analyzed_at = DatetimeWithNanoseconds(2025, 7, 1, 12, 0, 0, nanosecond=123456789, tzinfo=timezone.utc)
+        sort_value, _ = decode_cursor(encode_cursor(analyzed_at, "a-1"))
+        assert sort_value == analyzed_at
+        assert sort_value.nanosecond == 123456789
+
+    def test_empty_cursor_is_first_page(self):
+        assert decode_cursor(None) is None
+        assert decode_cursor("") is None
+
+    @pytest.mark.parametrize("cursor", ["not-a-cursor!", "e30", encode_cursor("only-one-value")[:-2]])
+    def test_malformed_cursor(self, cursor):
+        with pytest.raises(InvalidCursor):
+            decode_cursor(cursor)
+
+
+class TestKeysetFilter:
+    """Test the cursor WHERE condition."""
+
+    def test_first_page(self):
+        assert keyset_filter("name", "researcher_id", None) == ("TRUE", {}, {})
+
+    def test_ascending(self):
+        condition, params, types = keyset_filter("name", "researcher_id", encode_cursor("Chen", "r-1"))
+        assert condition == "(name > @cursor_sort OR (name = @cursor_sort AND researcher_id > @cursor_id))"
+        assert params == {"cursor_sort": "Chen", "cursor_id": "r-1"}
+        assert types["cursor_sort"] == param_types.STRING
+
+    def test_descending_includes_trailing_nulls(self):
+        cursor = encode_cursor(datetime(2025, 7, 1, tzinfo=timezone.utc), "a-1")
+        condition, _, types = keyset_filter("a.analyzed_at", "a.analysis_id", cursor,
+                                            descending=True, sort_type=param_types.TIMESTAMP)
+        assert condition.endswith("OR a.analyzed_at IS NULL)")
+        assert types["cursor_sort"] == param_types.TIMESTAMP
+
+    def test_null_sort_value(self):
+        condition, params, _ = keyset_filter("name", "researcher_id", encode_cursor(None, "r-1"))
+        assert condition == "(name IS NOT NULL OR researcher_id > @cursor_id)"
+        assert params == {"cursor_id": "r-1"}
+
+
+    def test_composite_tie_breaker(self):
+        cursor = encode_cursor("Chen", "r-1", "r-2")
+        condition, params, _ = keyset_filter("name", ("a", "b"), cursor)
+        assert condition == ("(name > @cursor_sort OR (name = @cursor_sort AND "
+                             "(a > @cursor_id_0 OR (a = @cursor_id_0 AND b > @cursor_id_1))))")
+        assert params == {"cursor_sort": "Chen", "cursor_id_0": "r-1", "cursor_id_1": "r-2"}
+
+    def test_composite_cursor_size_checked(self):
+        with pytest.raises(InvalidCursor):
+            keyset_filter("name", ("a", "b"), encode_cursor("Chen", "r-1"))
+
+    def test_iso_timestamp_from_decoded_row(self):
+        cursor = encode_cursor("2025-07-01T12:00:00.123456789Z", "a-1")
+        _, params, _ = keyset_filter("a.analyzed_at", "a.analysis_id", cursor,
+                                     descending=True, sort_type=param_types.TIMESTAMP)
+        assert params["cursor_sort"].nanosecond == 123456789
+
+    def test_malformed_iso_timestamp(self):
+        with pytest.raises(InvalidCursor):
+            keyset_filter("a.analyzed_at", "a.analysis_id", encode_cursor("yesterday", "a-1"),
+                          sort_type=param_types.TIMESTAMP)
+
+class TestPage:
+    """Test the page container."""
+
+    def test_to_dict(self):
+        assert Page([1], next_cursor="c").to_dict() == {"items": [1], "next_cursor": "c"}
+
+    def test_paginate_decoded_rows(self):
+        rows = [{"name": name, "a": "x", "b": name.lower()} for name in ("Ada", "Bo", "Cy")]
+        page = paginate(rows, 2, "name", ("a", "b"))
+        assert [row["name"] for row in page["items"]] == ["Ada", "Bo"]
+        assert decode_cursor(page["next_cursor"], size=3) == ["Bo", "x", "bo"]
+        assert paginate(rows, 3, "name", "a") == {"items": rows, "next_cursor": None}
+        assert paginate(None, 3, "name", "a") is None
@@ -0,0 +1,123 @@
+"""
+Tests for partitioned parallel reads.
+"""
+
+import pytest
+import sys
+import os
+import threading
+import time
+from types import SimpleNamespace
+
+# Add the neurohub app directory to path; its modules use flat imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'neurohub')))
+
+from google.api_core import exceptions
+from google.cloud.spanner_v1 import TypeCode
+
+from partitioned_query import iter_partitioned_query, map_partitions, run_partitioned_query
+
+FIELDS = [SimpleNamespace(name="researcher_id", type_=SimpleNamespace(code=TypeCode.STRING)),
+          SimpleNamespace(name="n", type_=SimpleNamespace(code=TypeCode.INT64))]
+
+
+class FakeResults:
+    """A streamed result set: fields are known once the first row arrives."""
+
+    def __init__(self, db, rows):
+        self.db = db
+        self.rows = rows
+        self.fields = None
+
+    def __iter__(self):
+        with self.db.lock:
+            self.db.active += 1
+            self.db.max_active = max(self.db.max_active, self.db.active)
+        try:
+            for row in self.rows:
+                self.fields = FIELDS
+                if self.db.delay:
+                    time.sleep(self.db.delay)
+                yield list(row)
+        finally:
+            with self.db.lock:
+                self.db.active -= 1
+
+
+class FakeBatchSnapshot:
+    def __init__(self, db):
+        self.db = db
+        self.closed = False
+
+    def generate_query_batches(self, sql, params=None, param_types=None, max_partitions=None,
+                               data_boost_enabled=False):
+        if "ORDER BY" in sql:
+            raise exceptions.InvalidArgument("Query is not root partitionable")
+        for index in range(len(self.db.partitions)):
+            yield {"partition": index, "query": {"sql": sql}}
+
+    def process_query_batch(self, batch):
+        return FakeResults(self.db, self.db.partitions[batch["partition"]])
+
+    def close(self):
+        self.closed = True
+
+
+class FakeDatabase:
+    def __init__(self, partitions, delay=0.0):
+        self.partitions = partitions
+        self.delay = delay
+        self.snapshots = []
+        self.lock = threading.Lock()
+        self.active = 0
+        self.max_active = 0
+
+    def batch_snapshot(self, exact_staleness=None):
+        self.snapshots.append(FakeBatchSnapshot(self))
+        return self.snapshots[-1]
+
+
+def partitions(count, rows_each):
+    return [[(f"r{p}-{i}", i) for i in range(rows_each)] for p in range(count)]
+
+
+class TestIterPartitionedQuery:
+    """Test fanning partitions across threads and merging their rows."""
+
+    def test_merges_every_partition(self):
+        db = FakeDatabase(partitions(6, 1234))
+        rows = list(iter_partitioned_query(db, "SELECT researcher_id, n FROM Researcher", workers=3))
+
+        assert len(rows) == 6 * 1234
+        assert {row["researcher_id"] for row in rows} == {f"r{p}-{i}" for p in range(6) for i in range(1234)}
+        assert rows[0].keys() == {"researcher_id", "n"}
+        assert db.snapshots[0].closed
+
+    def test_partitions_read_concurrently(self):
+        db = FakeDatabase(partitions(4, 5), delay=0.01)
+        list(iter_partitioned_query(db, "SELECT researcher_id, n FROM Researcher", workers=4))
+        assert db.max_active > 1
+
+    def test_closing_early_stops_readers(self):
+        db = FakeDatabase(partitions(4, 100000))
+        rows = iter_partitioned_query(db, "SELECT researcher_id, n FROM Researcher", workers=2)
+        next(rows)
+        rows.close()
+        assert db.snapshots[0].closed and db.active == 0
+
+    def test_not_partitionable(self):
+        db = FakeDatabase(partitions(2, 1))
+        with pytest.raises(exceptions.InvalidArgument):
+            next(iter_partitioned_query(db, "SELECT researcher_id FROM Researcher ORDER BY name"))
+        assert db.snapshots[0].closed
+        assert run_partitioned_query(db, "SELECT researcher_id FROM Researcher ORDER BY name") is None
+
+
+class TestMapPartitions:
+    """Test per-partition aggregation."""
+
+    def test_thread_pool(self):
+        db = FakeDatabase(partitions(5, 10))
+        totals = map_partitions(db, "SELECT researcher_id, n FROM Researcher", lambda rows: sum(r["n"] for r in rows))
+        assert totals == [45] * 5
+        assert db.snapshots[0].closed
@@ -0,0 +1,94 @@
+"""
+Tests for the aggregate signal quality tools.
+"""
+
+import pytest
+import sys
+import os
+
+# Add the agents directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'agents')))
+
+from signal_processor import quality_stats
+from signal_processor.quality_stats import build_quality_stats, quantiles
+
+
+GROUPS = [{"signal_type": "EEG", "device_name": "BioSemi", "signals": 3, "scored": 3, "mean": 0.8333,
+           "stddev": 0.1528, "min": 0.7, "max": 1.0, "low_quality": 1}]
+HISTOGRAM = [{"signal_type": "EEG", "device_name": "BioSemi", "bin": 7, "signals": 1},
+             {"signal_type": "EEG", "device_name": "BioSemi", "bin": 9, "signals": 2}]
+STATUSES = [{"signal_type": "EEG", "processing_status": "raw", "signals": 1},
+            {"signal_type": "EEG", "processing_status": "processed", "signals": 2}]
+CONFIDENCE = [{"analysis_type": "ERP", "analyses": 4, "mean": 0.85, "scores": [0.9, 0.8, 0.95, 0.75]}]
+OUTLIERS = [{"signal_id": "sig-1", "session_id": "s-1", "signal_type": "EEG", "device_name": "BioSemi",
+             "quality_score": 0.7, "processing_status": "raw"}]
+
+
+class TestQuantiles:
+    def test_interpolates(self):
+        assert quantiles([4, 1, 3, 2, 5], points=(0.5, 0.25)) == {"p50": 3, "p25": 2}
+        assert quantiles([0.0, 1.0], points=(0.1,)) == {"p10": 0.1}
+
+    def test_empty(self):
+        assert quantiles([]) is None
+
+
+class TestBuildQualityStats:
+    """Test shaping of the aggregate query results."""
+
+    def test_shapes_groups(self):
+        stats = build_quality_stats(GROUPS, HISTOGRAM, STATUSES, CONFIDENCE, OUTLIERS)
+
+        (group,) = stats["quality_by_group"]
+        assert stats["signals"] == 3
+        assert group["mean"] == 0.833
+        assert group["histogram"] == [0, 0, 0, 0, 0, 0, 0, 1, 0, 2]
+        assert len(stats["quality_bins"]) == quality_stats.QUALITY_BINS + 1
+        assert stats["processing_status"] == {"EEG": {"raw": 1, "processed": 2}}
+        assert stats["confidence_by_analysis_type"][0]["quantiles"]["p50"] == 0.85
+        assert stats["outliers"] == OUTLIERS
+
+    def test_out_of_range_bins_clamped(self):
+        histogram = [{"signal_type": "EEG", "device_name": "BioSemi", "bin": -3, "signals": 1},
+                     {"signal_type": "EEG", "device_name": "BioSemi", "bin": 0, "signals": 1},
+                     {"signal_type": "EEG", "device_name": "BioSemi", "bin": 9, "signals": 2}]
+        stats = build_quality_stats(GROUPS, histogram, STATUSES, CONFIDENCE, OUTLIERS)
+        assert stats["quality_by_group"][0]["histogram"] == [2, 0, 0, 0, 0, 0, 0, 0, 0, 2]
+        assert "GREATEST(" in quality_stats.QUALITY_HISTOGRAM_SQL
+
+    def test_experiment_without_signals(self):
+        stats = build_quality_stats([], [], [], [], [])
+        assert stats["signals"] == 0
+        assert stats["quality_by_group"] == []
+
+
+class TestExperimentQualityStats:
+    """Test the tool's per-experiment cache."""
+
+    @pytest.fixture(autouse=True)
+    def fake_queries(self, monkeypatch):
+        self.calls = []
+
+        def run_all(statements, params, types):
+            self.calls.append(params["experiment_id"])
+            return [GROUPS, HISTOGRAM, STATUSES, CONFIDENCE, OUTLIERS]
+
+        monkeypatch.setattr(quality_stats, "db_instance", object())
+        monkeypatch.setattr(quality_stats, "_run_all", run_all)
+        quality_stats.clear_stats_cache()
+        yield
+        quality_stats.clear_stats_cache()
+
+    def test_cached_per_experiment(self):
+        first = quality_stats.get_experiment_quality_stats("e-1")
+        assert quality_stats.get_experiment_quality_stats("e-1") is first
+        quality_stats.get_experiment_quality_stats("e-2")
+        assert self.calls == ["e-1", "e-2"]
+
+    def test_query_error_is_not_cached(self, monkeypatch):
+        def failing(statements, params, types):
+            raise RuntimeError("deadline exceeded")
+
+        monkeypatch.setattr(quality_stats, "_run_all", failing)
+        assert quality_stats.get_experiment_quality_stats("e-1") is None
+        assert quality_stats._cache_get("e-1") is None
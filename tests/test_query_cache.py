@@ -0,0 +1,162 @@
+"""
+Tests for the NeuroHub fetcher result cache.
+"""
+
+import pytest
+import sys
+import os
+from datetime import datetime, timezone
+
+# Add the neurohub app directory to path; its modules use flat imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'neurohub')))
+
+import query_cache
+from query_cache import InMemoryBackend, QueryCache
+
+
+@pytest.fixture
+def cache():
+    return QueryCache(backend=InMemoryBackend(max_entries=2), ttl=60)
+
+
+class FakeSnapshot:
+    def __init__(self, read_timestamp):
+        self._read_timestamp = read_timestamp
+
+
+def make_fetcher(cache, *tables):
+    calls = []
+
+    @cache.cached(*tables)
+    def fetch(db_instance, key, limit=10, snapshot=None, stream=False):
+        calls.append((key, limit))
+        return [{"key": key, "limit": limit}]
+
+    return fetch, calls
+
+
+class TestQueryCache:
+    """Test hit/miss accounting, TTL, LRU and invalidation."""
+
+    def test_hit_after_miss(self, cache):
+        fetch, calls = make_fetcher(cache, "Researcher")
+        assert fetch("db", "a") == fetch("db", "a")
+        assert len(calls) == 1
+        assert cache.stats()["hits"] == 1
+        assert cache.stats()["misses"] == 1
+
+    def test_params_are_part_of_key(self, cache):
+        fetch, calls = make_fetcher(cache, "Researcher")
+        fetch("db", "a", limit=5)
+        fetch("db", "a", limit=6)
+        assert len(calls) == 2
+
+    def test_snapshots_cached_by_read_timestamp(self, cache):
+        fetch, calls = make_fetcher(cache, "Researcher")
+        first, second = datetime(2025, 1, 1, tzinfo=timezone.utc), datetime(2025, 1, 1, 0, 0, 5, tzinfo=timezone.utc)
+        fetch("db", "a", snapshot=FakeSnapshot(first))
+        fetch("db", "a", snapshot=FakeSnapshot(first))
+        fetch("db", "a", snapshot=FakeSnapshot(second))
+        assert len(calls) == 2
+
+    def test_snapshots_without_read_timestamp_bypass_cache(self, cache):
+        fetch, calls = make_fetcher(cache, "Researcher")
+        fetch("db", "a")
+        # A strong or exact-staleness snapshot must not be answered from the cache
+        fetch("db", "a", snapshot=FakeSnapshot(None))
+        fetch("db", "a", 10, FakeSnapshot(None))
+        assert len(calls) == 3
+
+    def test_positional_and_keyword_calls_share_entries(self, cache):
+        fetch, calls = make_fetcher(cache, "Researcher")
+        fetch("db", "a", 5)
+        fetch("db", key="a", limit=5)
+        assert len(calls) == 1
+
+    def test_stream_and_missing_db_bypass_cache(self, cache):
+        fetch, calls = make_fetcher(cache, "Researcher")
+        fetch("db", "a", stream=True)
+        fetch("db", "a", stream=True)
+        fetch("db", "a", 10, None, True)
+        fetch(None, "a")
+        assert len(calls) == 4
+
+    def test_none_results_are_not_cached(self, cache):
+        calls = []
+
+        @cache.cached("Researcher")
+        def failing(db_instance):
+            calls.append(1)
+            return None
+
+        failing("db")
+        failing("db")
+        assert len(calls) == 2
+
+    def test_ttl_expiry(self, cache, monkeypatch):
+        fetch, calls = make_fetcher(cache, "Researcher")
+        now = [1000.0]
+        monkeypatch.setattr("query_cache.time.monotonic", lambda: now[0])
+        fetch("db", "a")
+        now[0] += 61
+        fetch("db", "a")
+        assert len(calls) == 2
+
+    def test_lru_eviction(self, cache):
+        fetch, calls = make_fetcher(cache, "Researcher")
+        fetch("db", "a")
+        fetch("db", "b")
+        fetch("db", "a")        # a is now most recently used
+        fetch("db", "c")        # evicts b
+        fetch("db", "a")
+        fetch("db", "b")
+        assert [c[0] for c in calls] == ["a", "b", "c", "b"]
+        assert cache.stats()["evictions"] == 2
+
+    def test_invalidate_by_table(self, cache):
+        researchers, researcher_calls = make_fetcher(cache, "Researcher")
+        experiments, experiment_calls = make_fetcher(cache, "Experiment", "Researcher")
+        researchers("db", "a")
+        experiments("db", "a")
+
+        cache.invalidate("Experiment")
+        researchers("db", "a")
+        experiments("db", "a")
+
+        assert len(researcher_calls) == 1
+        assert len(experiment_calls) == 2
+
+    def test_disabled_cache(self):
+        cache = QueryCache(backend=None)
+        fetch, calls = make_fetcher(cache, "Researcher")
+        fetch("db", "a")
+        fetch("db", "a")
+        cache.invalidate("Researcher")
+        assert len(calls) == 2
+
+
+class TestBackendSelection:
+    """Test the backend and TTL chosen from the environment."""
+
+    def test_memory_backend_gets_short_ttl(self, monkeypatch):
+        monkeypatch.setattr(query_cache, "CACHE_BACKEND", "memory")
+        cache = QueryCache.from_env()
+        assert isinstance(cache.backend, InMemoryBackend)
+        assert cache.ttl == query_cache.MEMORY_CACHE_TTL_SECONDS
+
+    def test_redis_backend_gets_shared_ttl(self, monkeypatch):
+        monkeypatch.setattr(query_cache, "CACHE_BACKEND", "redis")
+        monkeypatch.setattr(query_cache, "RedisBackend", lambda: "redis-backend")
+        cache = QueryCache.from_env()
+        assert cache.backend == "redis-backend"
+        assert cache.ttl == query_cache.CACHE_TTL_SECONDS
+
+    def test_unavailable_redis_falls_back_with_short_ttl(self, monkeypatch):
+        def unavailable():
+            raise ConnectionError("no redis")
+
+        monkeypatch.setattr(query_cache, "CACHE_BACKEND", "redis")
+        monkeypatch.setattr(query_cache, "RedisBackend", unavailable)
+        cache = QueryCache.from_env()
+        assert isinstance(cache.backend, InMemoryBackend)
+        assert cache.ttl == query_cache.MEMORY_CACHE_TTL_SECONDS
@@ -0,0 +1,159 @@
+"""
+Tests for the batched inserts behind the POST API endpoints.
+"""
+
+import json
+import pytest
+import sys
+import os
+
+# Add the neurohub app directory to path; its modules use flat imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'neurohub')))
+
+import record_writes
+from record_writes import WriteError, create_analyses, create_experiments, create_sessions
+
+RESEARCHERS = {"Dr. Ada Lovelace": ["r1"], "Dr. Alan Turing": ["r2"], "Dr. Same Name": ["r3", "r4"]}
+
+
+class FakeTransaction:
+    def __init__(self, db):
+        self.db = db
+
+    def read(self, table, columns, keyset):
+        if table == "ResearcherStats":
+            return []
+        return [[key[0]] for key in keyset.keys if key[0] in self.db.existing.get(table, ())]
+
+    def insert(self, table, columns, values):
+        self.db.inserts.append((table, columns, list(values)))
+
+    def insert_or_update(self, table, columns, values):
+        self.db.stats.append(list(values))
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.existing = {"Researcher": {"r1", "r2", "r3", "r4"}, "SignalData": {"s1", "s2"},
+                         "Experiment": {"e1"}, "Device": {"d1"}}
+        self.inserts = []
+        self.stats = []
+        self.commits = 0
+
+    def run_in_transaction(self, func):
+        transaction = FakeTransaction(self)
+        func(transaction)
+        self.commits += 1
+
+    def rows(self, table):
+        return [dict(zip(columns, row)) for name, columns, values in self.inserts if name == table for row in values]
+
+
+@pytest.fixture
+def db(monkeypatch):
+    lookups = []
+
+    def lookup(db_instance, name):
+        lookups.append(name)
+        return RESEARCHERS.get(name, [])
+
+    monkeypatch.setattr(record_writes, "get_researcher_ids_by_name", lookup)
+    monkeypatch.setattr(record_writes, "invalidate_tables", lambda *tables: None)
+    database = FakeDatabase()
+    database.lookups = lookups
+    return database
+
+
+class TestCreateExperiments:
+    """Test experiment inserts and their PI resolution."""
+
+    def test_single_experiment(self, db):
+        ids = create_experiments(db, {"experiment_name": "Motor imagery", "principal_investigator_name": "Dr. Ada Lovelace",
+                                      "start_date": "2025-03-01T09:00:00Z"})
+        row, = db.rows("Experiment")
+        assert row["experiment_id"] == ids[0] and len(ids[0]) == 36
+        assert row["principal_investigator_id"] == "r1"
+        assert row["status"] == "planning"
+        assert row["start_date"].isoformat() == "2025-03-01T09:00:00+00:00"
+        # Counted in the PI's ResearcherStats in the same commit
+        assert db.commits == 1 and db.stats[0][0][:2] == ("r1", 1)
+
+    def test_unknown_or_ambiguous_pi(self, db):
+        with pytest.raises(WriteError, match="not found"):
+            create_experiments(db, {"experiment_name": "X", "principal_investigator_name": "Nobody"})
+        with pytest.raises(WriteError, match="ambiguous"):
+            create_experiments(db, {"experiment_name": "X", "principal_investigator_name": "Dr. Same Name"})
+        assert db.commits == 0
+
+
+class TestCreateAnalyses:
+    """Test many reports in one request."""
+
+    def test_array_is_one_commit(self, db):
+        reports = [
+            {"signal_id": f"s{1 + i % 2}", "researcher_name": "Dr. Alan Turing", "analysis_type": "spectral",
+             "parameters": {"low_hz": 1}, "results": json.dumps({"alpha": 0.4}), "confidence_score": 0.9}
+            for i in range(30)
+        ]
+        ids = create_analyses(db, reports)
+
+        assert len(set(ids)) == 30
+        assert db.commits == 1 and len(db.inserts) == 1
+        rows = db.rows("Analysis")
+        assert rows[0]["parameters"] == '{"low_hz": 1}' and rows[0]["results"] == '{"alpha": 0.4}'
+        assert rows[0]["analyzed_at"] is not None
+        # The name was resolved once per request, not once per report
+        assert db.lookups == ["Dr. Alan Turing"]
+        assert db.stats == []
+
+    def test_invalid_record_rejects_whole_request(self, db):
+        reports = [{"signal_id": "s1", "researcher_id": "r1", "analysis_type": "spectral"},
+                   {"signal_id": "s1", "researcher_id": "r1", "analysis_type": "spectral", "confidence_score": 3}]
+        with pytest.raises(WriteError, match="Record 1: confidence_score"):
+            create_analyses(db, reports)
+        with pytest.raises(WriteError, match="Unknown signal_id: missing"):
+            create_analyses(db, [{"signal_id": "missing", "researcher_id": "r1", "analysis_type": "spectral"}])
+        assert db.inserts == []
+
+    def test_mutation_limit(self, db, monkeypatch):
+        monkeypatch.setattr(record_writes, "MAX_REQUEST_MUTATIONS", 50)
+        with pytest.raises(WriteError, match="split it"):
+            create_analyses(db, [{"signal_id": "s1", "researcher_id": "r1", "analysis_type": "spectral"}] * 6)
+
+
+class TestCreateSessions:
+    """Test sessions with their recorded signals."""
+
+    def test_session_with_signals(self, db):
+        created = create_sessions(db, {
+            "experiment_id": "e1", "researcher_name": "Dr. Ada Lovelace", "participant_id": "P-7",
+            "session_date": "2025-03-02T10:00:00+01:00", "duration_minutes": 45,
+            "signals": [{"device_id": "d1", "signal_type": "EEG", "sampling_rate": 256, "channels": 64},
+                        {"device_id": "d1", "signal_type": "EMG", "quality_score": 0.8}],
+        })
+
+        session, = db.rows("Session")
+        signals = db.rows("SignalData")
+        assert created == [{"session_id": session["session_id"], "signal_ids": [s["signal_id"] for s in signals]}]
+        assert {s["session_id"] for s in signals} == {session["session_id"]}
+        assert all(s["experiment_id"] == "e1" and s["processing_status"] == "raw" for s in signals)
+        assert signals[0]["recorded_at"] == session["session_date"]
+        assert db.stats[0][0][0] == "r1" and db.stats[0][0][4] == 1
+
+    def test_file_path_must_stay_under_signal_root(self, db):
+        for file_path in ("/etc/passwd", "../../etc/passwd"):
+            with pytest.raises(WriteError, match="file_path|signal root"):
+                create_sessions(db, {"experiment_id": "e1", "researcher_id": "r1",
+                                     "signals": [{"device_id": "d1", "signal_type": "EEG", "file_path": file_path}]})
+        assert db.inserts == []
+
+    def test_ids_must_be_strings(self, db):
+        with pytest.raises(WriteError, match="experiment_id must be a string"):
+            create_sessions(db, {"experiment_id": 7, "researcher_id": "r1"})
+        with pytest.raises(WriteError, match="researcher_id must be a string"):
+            create_analyses(db, {"signal_id": "s1", "researcher_id": 3, "analysis_type": "spectral"})
+
+    def test_unknown_device(self, db):
+        with pytest.raises(WriteError, match="Unknown device_id: d9"):
+            create_sessions(db, [{"experiment_id": "e1", "researcher_id": "r1",
+                                  "signals": [{"device_id": "d9", "signal_type": "EEG"}]}])
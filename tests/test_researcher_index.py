@@ -0,0 +1,99 @@
+"""
+Tests for the in-process researcher name index.
+"""
+
+from contextlib import contextmanager
+from datetime import datetime, timezone
+import sys
+import os
+
+# Add the agents directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'agents')))
+
+from signal_processor.researcher_index import ResearcherNameIndex, normalize_name
+
+
+def created(minute):
+    return datetime(2025, 7, 1, 12, minute, tzinfo=timezone.utc)
+
+
+class FakeDatabase:
+    """Serves (researcher_id, name, create_time) rows newer than @since."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = []
+        self.fail = False
+
+    @contextmanager
+    def snapshot(self):
+        yield self
+
+    def execute_sql(self, sql, params=None, param_types=None):
+        if self.fail:
+            raise RuntimeError("unavailable")
+        since = params["since"]
+        self.queries.append(since)
+        if isinstance(since, str):
+            return list(self.rows)
+        return [row for row in self.rows if row[2] > since]
+
+
+class TestNormalizeName:
+    def test_ignores_case_and_spacing(self):
+        assert normalize_name("  Dr.  Sarah   CHEN ") == normalize_name("dr. sarah chen")
+
+    def test_empty(self):
+        assert normalize_name(None) == ""
+
+
+class TestResearcherNameIndex:
+    """Test loading, lookups and incremental refresh."""
+
+    def make_index(self, rows):
+        database = FakeDatabase(rows)
+        index = ResearcherNameIndex(database, refresh_seconds=3600, reload_seconds=3600)
+        assert index.refresh()
+        return database, index
+
+    def test_lookup_from_memory(self):
+        database, index = self.make_index([("r-1", "Dr. Sarah Chen", created(0)),
+                                           ("r-2", "Dr. Raj Patel", created(1))])
+
+        assert index.lookup(["dr. sarah chen", "DR. RAJ  PATEL"]) == {
+            "dr. sarah chen": "r-1", "DR. RAJ  PATEL": "r-2"
+        }
+        assert len(database.queries) == 1
+
+    def test_miss_reads_only_new_researchers(self):
+        database, index = self.make_index([("r-1", "Dr. Sarah Chen", created(0))])
+        database.rows.append(("r-2", "Dr. Raj Patel", created(5)))
+        index._refreshed_at -= 60  # Past the miss refresh interval
+
+        assert index.lookup(["Dr. Raj Patel"]) == {"Dr. Raj Patel": "r-2"}
+        assert database.queries[-1] == created(0)
+
+    def test_duplicate_names_resolve_to_earliest(self):
+        _, index = self.make_index([("r-1", "Dr. Sarah Chen", created(0)),
+                                    ("r-9", "dr. sarah chen", created(3))])
+        assert index.lookup(["Dr. Sarah Chen"]) == {"Dr. Sarah Chen": "r-1"}
+
+    def test_failed_refresh_keeps_entries(self):
+        database, index = self.make_index([("r-1", "Dr. Sarah Chen", created(0))])
+        database.fail = True
+
+        assert index.refresh(full=True) is False
+        assert index.lookup(["Dr. Sarah Chen"]) == {"Dr. Sarah Chen": "r-1"}
+
+    def test_not_loaded_without_database(self):
+        index = ResearcherNameIndex(None)
+        assert index.refresh() is False
+        assert not index.loaded
+
+    def test_find_in_text(self):
+        _, index = self.make_index([("r-1", "Dr. Sarah Chen", created(0)),
+                                    ("r-2", "Dr. Raj Patel", created(1)),
+                                    ("r-3", "Dr. Raj", created(2))])
+
+        assert index.find_in_text("Compare raj patel with  DR. SARAH CHEN.") == ["Dr. Raj Patel", "Dr. Sarah Chen"]
+        assert index.find_in_text("Any news?") == []
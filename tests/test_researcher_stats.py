@@ -0,0 +1,108 @@
+"""
+Tests for incremental maintenance of the ResearcherStats table.
+"""
+
+import pytest
+import sys
+import os
+
+# Add the neurohub app directory to path; its modules use flat imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'neurohub')))
+
+from google.cloud import spanner
+from researcher_stats import STATS_COLUMNS, apply_stats_deltas, new_collaborations, stats_deltas
+
+
+class FakeTransaction:
+    def __init__(self, stored):
+        self.stored = stored
+        self.reads = []
+        self.writes = []
+
+    def read(self, table, columns, keyset):
+        self.reads.append((table, keyset.keys))
+        return [[key[0]] + list(self.stored[key[0]]) for key in keyset.keys if key[0] in self.stored]
+
+    def insert_or_update(self, table, columns, values):
+        self.writes.append((table, columns, values))
+
+
+class FakeCollaborationTransaction:
+    def __init__(self, stored_pairs):
+        self.stored_pairs = stored_pairs
+        self.reads = []
+
+    def read(self, table, columns, keyset):
+        self.reads.append((table, keyset.keys))
+        return [list(key) for key in keyset.keys if tuple(key) in self.stored_pairs]
+
+
+class TestStatsDeltas:
+    """Test building counter increments from inserted rows."""
+
+    def test_counts_each_kind_of_row(self):
+        deltas = stats_deltas(
+            experiments=[{"principal_investigator_id": "r1"}, {"principal_investigator_id": "r1"}],
+            sessions=[{"researcher_id": "r2"}],
+            publication_pis=["r1", None],
+            collaborations=[{"researcher_id_a": "r1", "researcher_id_b": "r2"}],
+        )
+        assert deltas["r1"] == {"projects": 2, "publications": 1, "collaborators": 1}
+        assert deltas["r2"] == {"total_sessions": 1, "collaborators": 1}
+
+
+    def test_reverse_and_repeated_pairs_count_once(self):
+        deltas = stats_deltas(collaborations=[
+            {"researcher_id_a": "r1", "researcher_id_b": "r2"},
+            {"researcher_id_a": "r2", "researcher_id_b": "r1"},
+            {"researcher_id_a": "r1", "researcher_id_b": "r2"},
+            {"researcher_id_a": "r3", "researcher_id_b": "r3"},
+        ])
+        assert deltas == {"r1": {"collaborators": 1}, "r2": {"collaborators": 1}, "r3": {"collaborators": 1}}
+
+
+class TestNewCollaborations:
+    """Test that pairs already stored in either order add no collaborator."""
+
+    def test_reverse_pair_of_stored_row(self):
+        transaction = FakeCollaborationTransaction({("r1", "r2")})
+        added = new_collaborations(transaction, [
+            {"researcher_id_a": "r2", "researcher_id_b": "r1"},
+            {"researcher_id_a": "r1", "researcher_id_b": "r3"},
+            {"researcher_id_a": "r3", "researcher_id_b": "r1"},
+        ])
+
+        assert added == [{"researcher_id_a": "r1", "researcher_id_b": "r3"}]
+        table, keys = transaction.reads[0]
+        assert table == "Collaboration"
+        assert sorted(keys) == [["r1", "r2"], ["r1", "r3"], ["r2", "r1"], ["r3", "r1"]]
+        assert stats_deltas(collaborations=added) == {"r1": {"collaborators": 1}, "r3": {"collaborators": 1}}
+
+    def test_no_collaborations_no_read(self):
+        transaction = FakeCollaborationTransaction(set())
+        assert new_collaborations(transaction, []) == []
+        assert transaction.reads == []
+
+
+class TestApplyStatsDeltas:
+    """Test the read-modify-write inside a transaction."""
+
+    def test_adds_to_existing_and_creates_missing_rows(self):
+        transaction = FakeTransaction({"r1": (3, 1, 2, 10)})
+        deltas = stats_deltas(experiments=[{"principal_investigator_id": "r1"}],
+                              sessions=[{"researcher_id": "r2"}, {"researcher_id": "r2"}])
+
+        assert apply_stats_deltas(transaction, deltas) == 2
+
+        assert len(transaction.reads) == 1
+        table, columns, values = transaction.writes[0]
+        assert table == "ResearcherStats"
+        assert columns == ("researcher_id",) + STATS_COLUMNS + ("update_time",)
+        rows = {row[0]: row[1:5] for row in values}
+        assert rows == {"r1": (4, 1, 2, 10), "r2": (0, 0, 0, 2)}
+        assert all(row[5] is spanner.COMMIT_TIMESTAMP for row in values)
+
+    def test_no_deltas_no_io(self):
+        transaction = FakeTransaction({})
+        assert apply_stats_deltas(transaction, stats_deltas()) == 0
+        assert transaction.reads == [] and transaction.writes == []
@@ -0,0 +1,189 @@
+"""
+Tests for the block-wise signal analysis engine.
+"""
+
+import json
+import numpy as np
+import pytest
+import sys
+import os
+
+# Add the neurohub app directory to path; its modules use flat imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'neurohub')))
+
+from flask import Flask
+from scipy import signal
+
+import analysis_cache
+import neurohub_routes
+from signal_analysis import (
+    WelchAccumulator, analyze_recording, design_bandpass, iter_analysis, iter_filtered_blocks
+)
+from signal_io import open_signal
+import signal_io
+
+FS = 256
+
+
+def synthetic_eeg(seconds=120, channels=4, seed=0):
+    """10 Hz alpha rhythm plus white noise, in microvolts."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(seconds * FS) / FS
+    alpha = 20 * np.sin(2 * np.pi * 10 * t)
+    return alpha + rng.normal(0, 2, size=(channels, t.size))
+
+
+@pytest.fixture(autouse=True)
+def signal_root(tmp_path, monkeypatch):
+    # Recordings are written under tmp_path, which stands in for the signal root
+    monkeypatch.setattr(signal_io, "SIGNAL_ROOT", str(tmp_path))
+
+
+@pytest.fixture
+def recording_path(tmp_path):
+    data = synthetic_eeg()
+    data[2, 50 * FS + 10:50 * FS + 20] += 500  # Spike artifact in epoch 50 of channel 3
+    path = tmp_path / "rec.npy"
+    np.save(path, data)
+    (tmp_path / "rec.json").write_text(json.dumps({"sampling_rate": FS, "channel_names": ["Fz", "Cz", "Pz", "Oz"]}))
+    return str(path)
+
+
+class TestFiltering:
+    def test_blocks_match_whole_signal_filter(self, recording_path):
+        with open_signal(recording_path) as rec:
+            sos, low, _ = design_bandpass(FS)
+            blocks = list(iter_filtered_blocks(rec, sos, low, 30 * FS))
+            chunked = np.concatenate([filtered for _, _, _, filtered in blocks], axis=1)
+            whole = signal.sosfiltfilt(sos, rec.read(), axis=-1)
+
+        assert [start for start, _, _, _ in blocks] == [0, 30 * FS, 60 * FS, 90 * FS]
+        np.testing.assert_allclose(chunked, whole, atol=1e-3 * np.abs(whole).max())
+
+    def test_high_cutoff_limited_by_nyquist(self):
+        _, _, high = design_bandpass(64, 0.5, 45.0)
+        assert high == pytest.approx(30.4)
+
+    def test_invalid_passband(self):
+        with pytest.raises(ValueError):
+            design_bandpass(FS, 40.0, 10.0)
+
+
+class TestWelch:
+    @pytest.mark.parametrize("nperseg", [512, 511])
+    def test_matches_scipy(self, nperseg):
+        data = synthetic_eeg(seconds=20)
+        accumulator = WelchAccumulator(FS, nperseg)
+        # Blocks that hold whole steps, so the segments are the same as on the whole signal
+        step = nperseg - nperseg // 2
+        for start in range(0, data.shape[1], 4 * step):
+            accumulator.add(data[:, start:start + 3 * step + nperseg])
+
+        freqs, psd = accumulator.psd()
+        expected_freqs, expected = signal.welch(data, fs=FS, nperseg=nperseg, axis=-1)
+        np.testing.assert_allclose(freqs, expected_freqs)
+        np.testing.assert_allclose(psd, expected, rtol=1e-9)
+
+
+class TestAnalysis:
+    """Test the analysis results and progress events."""
+
+    def test_results(self, recording_path):
+        with open_signal(recording_path) as rec:
+            results = analyze_recording(rec, chunk_seconds=30)
+
+        assert results["dominant_frequency"] == pytest.approx(10.0, abs=0.5)
+        assert max(results["band_powers"], key=lambda b: results["band_powers"][b]["relative"]) == "alpha"
+        assert results["snr"] > 10
+        assert results["epochs"] == 120
+        assert results["artifacts_detected"] == 1
+        assert "Alpha band activity is prominent" in results["recommendations"]
+
+    def test_progress_is_monotonic(self, recording_path):
+        with open_signal(recording_path) as rec:
+            events = list(iter_analysis(rec, chunk_seconds=30))
+
+        progress = [event["progress"] for event in events if event["type"] == "progress"]
+        assert progress == sorted(progress)
+        assert len(progress) == 4 + 2  # One event per block, plus load and summary
+        assert events[-1]["type"] == "results"
+
+    def test_noisy_channel(self, tmp_path):
+        data = synthetic_eeg()
+        data[1, ::FS // 2] += 400  # Spikes in every epoch of Cz
+        path = tmp_path / "noisy.npy"
+        np.save(path, data)
+
+        with open_signal(str(path), sampling_rate=FS, channel_names=["Fz", "Cz", "Pz", "Oz"]) as rec:
+            results = analyze_recording(rec, artifact_threshold=150)
+
+        assert results["noisy_channels"] == ["Cz"]
+        assert results["summary"] == "Signal quality: Poor"
+
+
+class TestStreamAnalysisStatus:
+    """Test the SSE route streams the real analysis."""
+
+    @pytest.fixture(autouse=True)
+    def cache_dir(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(analysis_cache, "CACHE_DIR", str(tmp_path / "cache"))
+        monkeypatch.setattr(analysis_cache, "_default_cache", None)
+        monkeypatch.setattr(neurohub_routes, "get_analysis_results_by_cache_key", lambda db, signal_id, key: None)
+
+    @pytest.fixture
+    def client(self):
+        app = Flask(__name__)
+        app.register_blueprint(neurohub_routes.ally_bp)
+        with app.test_client() as client:
+            yield client
+
+    def events(self, response):
+        return [json.loads(line[len("data: "):]) for line in response.get_data(as_text=True).split("\n\n") if line]
+
+    def test_streams_progress_and_results(self, client, recording_path, monkeypatch):
+        monkeypatch.setattr(neurohub_routes, "get_signal_data",
+                            lambda db, signal_id: {"file_path": recording_path, "sampling_rate": FS})
+
+        response = client.post('/api/neurohub-ally/stream-analysis-status', json={"signal_data_id": "sig-1"})
+        events = self.events(response)
+
+        assert response.mimetype == 'text/event-stream'
+        assert events[-1]["type"] == "results"
+        assert events[-1]["content"]["signal_id"] == "sig-1"
+        assert sum(event["type"] == "progress" for event in events) > 3
+
+    def test_repeated_request_is_served_from_cache(self, client, recording_path, monkeypatch):
+        monkeypatch.setattr(neurohub_routes, "get_signal_data",
+                            lambda db, signal_id: {"file_path": recording_path, "sampling_rate": FS})
+        request = {"signal_data_id": "sig-1", "low_hz": 1}
+
+        first = self.events(client.post('/api/neurohub-ally/stream-analysis-status', json=request))
+        second = self.events(client.post('/api/neurohub-ally/stream-analysis-status', json=request))
+
+        assert first[-1]["content"]["cached"] is False
+        assert [event["type"] for event in second] == ["progress", "progress", "results"]
+        assert second[-1]["content"]["cached"] is True
+        assert second[-1]["content"]["snr"] == first[-1]["content"]["snr"]
+
+    def test_results_recorded_in_spanner(self, client, recording_path, monkeypatch):
+        recorded = []
+        monkeypatch.setattr(neurohub_routes, "db", object())
+        monkeypatch.setattr(neurohub_routes, "get_signal_data",
+                            lambda db, signal_id: {"file_path": recording_path, "sampling_rate": FS,
+                                                   "experiment_id": "exp-1", "processing_status": "raw"})
+        monkeypatch.setattr(neurohub_routes, "record_analysis",
+                            lambda db, signal, analysis: recorded.append((signal, analysis)))
+
+        events = self.events(client.post('/api/neurohub-ally/stream-analysis-status',
+                                         json={"signal_data_id": "sig-1"}))
+
+        (signal, analysis), = recorded
+        assert signal["signal_id"] == "sig-1"
+        assert analysis["cache_key"] == analysis_cache.analysis_key("sig-1", recording_path, FS)["cache_key"]
+        assert "cached" not in analysis["results"]
+        assert events[1]["step"] == "Checking for stored results..."
+
+    def test_unknown_signal(self, client, monkeypatch):
+        monkeypatch.setattr(neurohub_routes, "get_signal_data", lambda db, signal_id: None)
+        response = client.post('/api/neurohub-ally/stream-analysis-status', json={"signal_data_id": "missing"})
+        assert self.events(response)[-1]["type"] == "error"
@@ -0,0 +1,134 @@
+"""
+Tests for the deterministic signal digest stage.
+"""
+
+import json
+import pytest
+from types import SimpleNamespace
+import sys
+import os
+
+# Add the agents directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'agents')))
+
+from google.genai import types
+
+from signal_processor import digest
+from signal_processor.digest import DIGEST_STATE_KEY, SignalDigestStage, build_signal_digest
+
+
+def make_tree():
+    def signal(signal_id, quality, status, analyses):
+        return {"signal_id": signal_id, "signal_type": "EEG", "duration_seconds": 60.0, "sampling_rate": 256,
+                "channels": 32, "quality_score": quality, "processing_status": status,
+                "device_name": "BioSemi", "analyses": analyses}
+
+    def analysis(analysis_id, confidence, analyzed_at):
+        return {"analysis_id": analysis_id, "analysis_type": "ERP", "findings": f"finding {analysis_id}",
+                "confidence_score": confidence, "analyzed_at": analyzed_at}
+
+    session = {"session_id": "s-1", "session_date": "2025-07-01T10:00:00+00:00", "duration_minutes": 45,
+               "signals": [
+                   signal("sig-1", 0.95, "processed", [analysis("a-1", 0.9, "2025-07-02T00:00:00+00:00"),
+                                                        analysis("a-2", 0.8, "2025-07-03T00:00:00+00:00")]),
+                   signal("sig-2", 0.6, "raw", []),
+               ]}
+    experiment = {"experiment_id": "e-1", "experiment_name": "Attention", "experiment_status": "active",
+                  "start_date": "2025-06-01T00:00:00+00:00", "sessions": [session]}
+    return {
+        "researchers": [{"researcher_id": "r-1", "researcher_name": "Dr. Sarah Chen", "experiments": [experiment]}],
+        "not_found": ["Dr. Nobody"],
+        "truncated": False,
+    }
+
+
+class TestBuildSignalDigest:
+    """Test the aggregation of the signal tree."""
+
+    def test_aggregates_quality_and_analyses(self):
+        result = build_signal_digest(make_tree())
+        (researcher,) = result["researchers"]
+
+        assert result["not_found"] == ["Dr. Nobody"]
+        assert researcher["experiments"] == [{"experiment_id": "e-1", "name": "Attention", "status": "active",
+                                              "start_date": "2025-06-01T00:00:00+00:00",
+                                              "sessions": 1, "signals": 2}]
+        assert researcher["sessions"] == {"count": 1, "total_minutes": 45, "mean_minutes": 45.0}
+
+        signals = researcher["signals"]
+        assert signals["processing_status"] == {"processed": 1, "raw": 1}
+        assert signals["quality"] == {"count": 2, "mean": 0.775, "min": 0.6, "max": 0.95}
+        assert [s["signal_id"] for s in signals["low_quality"]] == ["sig-2"]
+
+        analyses = researcher["analyses"]
+        assert analyses["count"] == 2
+        assert analyses["unanalyzed_signals"] == 1
+        assert [a["findings"] for a in analyses["recent_findings"]] == ["finding a-2", "finding a-1"]
+
+    def test_researcher_without_data(self):
+        tree = {"researchers": [{"researcher_id": "r-1", "researcher_name": "Chen", "experiments": []}],
+                "not_found": [], "truncated": False}
+        (researcher,) = build_signal_digest(tree)["researchers"]
+        assert researcher["signals"]["quality"] is None
+        assert researcher["sessions"]["mean_minutes"] is None
+
+
+class TestSignalDigestStage:
+    """Test the stage writes the digest to session state."""
+
+    async def run_stage(self, text):
+        ctx = SimpleNamespace(user_content=types.Content(role="user", parts=[types.Part(text=text)]))
+        return [event async for event in SignalDigestStage(name="signal_digest")._run_async_impl(ctx)]
+
+    @pytest.mark.asyncio
+    async def test_named_researchers(self, monkeypatch):
+        requested = []
+
+        async def fake_tree(names):
+            requested.append(names)
+            return make_tree()
+
+        async def fake_in_request(text):
+            return ["Dr. Sarah Chen"] if "sarah chen" in text.lower() else []
+
+        monkeypatch.setattr(digest, "get_researcher_signal_tree", fake_tree)
+        monkeypatch.setattr(digest, "researchers_in_request", fake_in_request)
+
+        (event,) = await self.run_stage("Summarize Sarah Chen's EEG work")
+        state = json.loads(event.actions.state_delta[DIGEST_STATE_KEY])
+
+        assert requested == [["Dr. Sarah Chen"]]
+        assert state["scope"] == "requested researchers"
+        assert state["researchers"][0]["signals"]["count"] == 2
+
+    @pytest.mark.asyncio
+    async def test_falls_back_to_all_researchers(self, monkeypatch):
+        async def no_names(text):
+            return []
+
+        async def all_names():
+            return ["Dr. Raj Patel", "Dr. Sarah Chen"]
+
+        async def fake_tree(names):
+            return make_tree()
+
+        monkeypatch.setattr(digest, "researchers_in_request", no_names)
+        monkeypatch.setattr(digest, "all_researcher_names", all_names)
+        monkeypatch.setattr(digest, "get_researcher_signal_tree", fake_tree)
+
+        (event,) = await self.run_stage("Give me an overview")
+        assert json.loads(event.actions.state_delta[DIGEST_STATE_KEY])["scope"] == "all researchers"
+
+    @pytest.mark.asyncio
+    async def test_database_error(self, monkeypatch):
+        async def no_names(text):
+            return ["Dr. Sarah Chen"]
+
+        async def failing_tree(names):
+            return None
+
+        monkeypatch.setattr(digest, "researchers_in_request", no_names)
+        monkeypatch.setattr(digest, "get_researcher_signal_tree", failing_tree)
+
+        (event,) = await self.run_stage("Sarah Chen")
+        assert "error" in json.loads(event.actions.state_delta[DIGEST_STATE_KEY])
@@ -0,0 +1,224 @@
+"""
+Tests for live signal ingest.
+"""
+
+import io
+import json
+import numpy as np
+import pytest
+import sys
+import os
+from contextlib import contextmanager
+
+# Add the neurohub app directory to path; its modules use flat imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'neurohub')))
+
+import signal_ingest
+import signal_io
+from signal_ingest import (
+    IngestBusy, IngestError, SignalWriter, encode_frame, ingest_frames, read_frames, start_signal
+)
+from signal_io import open_signal
+
+FS = 250
+T0 = 1_750_000_000_000_000  # Microseconds since the epoch
+
+
+class FakeBatch:
+    def __init__(self, db):
+        self.db = db
+
+    def insert(self, table, columns, values):
+        for value in values:
+            row = dict(zip(columns, value))
+            self.db.signals[row["signal_id"]] = row
+
+    def update(self, table, columns, values):
+        for value in values:
+            row = dict(zip(columns, value))
+            self.db.signals[row["signal_id"]].update(row)
+            self.db.updates.append(row)
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.signals = {}
+        self.updates = []
+
+    @contextmanager
+    def batch(self):
+        yield FakeBatch(self)
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(signal_io, "SIGNAL_ROOT", str(tmp_path))
+    database = FakeDatabase()
+    monkeypatch.setattr(signal_ingest, "get_signal_data",
+                        lambda db_instance, signal_id: dict(database.signals[signal_id])
+                        if signal_id in database.signals else None)
+    monkeypatch.setattr(signal_ingest, "run_sql_query",
+                        lambda db_instance, sql, params=None, param_types=None: [{"experiment_id": "exp-1"}])
+    monkeypatch.setattr(signal_ingest, "invalidate_tables", lambda *tables: None)
+    return database
+
+
+def frames(data, device_id="dev-1", start_us=T0, per_frame=50):
+    """Splits (samples, channels) data into consecutive frames."""
+    return b"".join(
+        encode_frame(device_id, data[i:i + per_frame], start_us + i * 1_000_000 // FS)
+        for i in range(0, len(data), per_frame)
+    )
+
+
+def samples(seconds, channels=4, seed=0):
+    return np.random.default_rng(seed).normal(0, 10, size=(seconds * FS, channels)).astype(np.float32)
+
+
+class TestFrames:
+    """Test the binary frame format."""
+
+    def test_round_trip(self):
+        data = samples(1)
+        (header, payload), = list(read_frames(io.BytesIO(encode_frame("dev-1", data, T0))))
+        assert header == {"channels": 4, "dtype": "<f4", "samples": FS, "timestamp_us": T0, "device_id": "dev-1"}
+        np.testing.assert_array_equal(np.frombuffer(payload, "<f4").reshape(-1, 4), data)
+
+    def test_truncated_and_corrupt_streams(self):
+        frame = encode_frame("dev-1", samples(1), T0)
+        with pytest.raises(IngestError):
+            list(read_frames(io.BytesIO(frame[:-3])))
+        with pytest.raises(IngestError):
+            list(read_frames(io.BytesIO(b"XXXX" + frame[4:])))
+
+
+class TestIngest:
+    """Test recording a signal across uploads."""
+
+    def test_records_in_pieces_and_closes(self, db, tmp_path):
+        signal = start_signal(db, "sess-1", "dev-1", "EEG", FS, 4, channel_names=["C3", "C4", "Cz", "Pz"])
+        signal_id = signal["signal_id"]
+        assert db.signals[signal_id]["processing_status"] == "recording"
+        assert signal["file_path"] == f"ingest/exp-1/{signal_id}.bin"
+
+        data = samples(4)
+        first = ingest_frames(db, signal_id, io.BytesIO(frames(data[:2 * FS])))
+        assert first["samples"] == 2 * FS and first["processing_status"] == "recording"
+        assert db.signals[signal_id]["duration_seconds"] == 2.0
+        assert db.signals[signal_id]["recorded_at"].timestamp() == T0 / 1e6
+
+        # Readable while recording, although the file is preallocated beyond the data
+        path = str(tmp_path / signal["file_path"])
+        assert os.path.getsize(path) > 2 * FS * 16
+        with open_signal(signal["file_path"]) as recording:
+            assert recording.n_samples == 2 * FS
+            assert recording.channel_names == ["C3", "C4", "Cz", "Pz"]
+
+        # A reconnect continues the same file
+        second = ingest_frames(db, signal_id, io.BytesIO(frames(data[2 * FS:], start_us=T0 + 2_000_000)), close=True)
+        assert second["samples"] == 4 * FS and second["processing_status"] == "raw"
+        assert db.signals[signal_id]["processing_status"] == "raw"
+        assert db.signals[signal_id]["duration_seconds"] == 4.0
+        assert os.path.getsize(path) == 4 * FS * 16
+
+        with open_signal(signal["file_path"]) as recording:
+            np.testing.assert_allclose(recording.read(), data.T.astype(np.float64))
+
+    def test_gap_is_zero_filled(self, db):
+        signal_id = start_signal(db, "sess-1", "dev-1", "EEG", FS, 4)["signal_id"]
+        data = samples(2)
+        body = frames(data[:FS]) + frames(data[FS:], start_us=T0 + 1_500_000)
+
+        result = ingest_frames(db, signal_id, io.BytesIO(body), close=True)
+
+        assert result["gaps"] == 1
+        assert result["samples"] == int(2.5 * FS)
+        with open_signal(db.signals[signal_id]["file_path"]) as recording:
+            block = recording.read()
+        assert not block[:, FS:FS + FS // 2].any()
+        np.testing.assert_allclose(block[:, -FS:], data[FS:].T)
+
+    def test_oversized_gap_is_rejected(self, db, tmp_path):
+        signal = start_signal(db, "sess-1", "dev-1", "EEG", FS, 4)
+        data = samples(2)
+        body = frames(data[:FS]) + frames(data[FS:], start_us=T0 + 3600 * 1_000_000)
+
+        with pytest.raises(IngestError, match="ahead of the recording"):
+            ingest_frames(db, signal["signal_id"], io.BytesIO(body))
+        assert db.signals[signal["signal_id"]]["duration_seconds"] == 1.0
+        # Nothing was reserved for the hour-long jump
+        assert os.path.getsize(tmp_path / signal["file_path"]) < 120 * FS * 16
+
+    def test_mismatched_frames_are_rejected(self, db):
+        signal_id = start_signal(db, "sess-1", "dev-1", "EEG", FS, 4)["signal_id"]
+        good = frames(samples(1))
+        with pytest.raises(IngestError):
+            ingest_frames(db, signal_id, io.BytesIO(good + frames(samples(1), device_id="dev-2")))
+        # Frames before the bad one were kept and counted
+        assert db.signals[signal_id]["duration_seconds"] == 1.0
+        with pytest.raises(IngestError):
+            ingest_frames(db, signal_id, io.BytesIO(frames(samples(1, channels=3), start_us=T0 + 1_000_000)))
+
+    def test_closed_signal_and_unknown_signal(self, db):
+        signal_id = start_signal(db, "sess-1", "dev-1", "EEG", FS, 4)["signal_id"]
+        ingest_frames(db, signal_id, io.BytesIO(b""), close=True)
+        with pytest.raises(IngestError):
+            ingest_frames(db, signal_id, io.BytesIO(frames(samples(1))))
+        with pytest.raises(KeyError):
+            ingest_frames(db, "missing", io.BytesIO(b""))
+
+    def test_one_upload_per_signal(self, db):
+        signal_id = start_signal(db, "sess-1", "dev-1", "EEG", FS, 4)["signal_id"]
+        lock = signal_ingest._signal_lock(signal_id)
+        with lock:
+            with pytest.raises(IngestBusy):
+                ingest_frames(db, signal_id, io.BytesIO(b""))
+
+    def test_invalid_layout(self, db):
+        with pytest.raises(IngestError):
+            start_signal(db, "sess-1", "dev-1", "EEG", FS, 4, dtype="<u1")
+        with pytest.raises(IngestError):
+            start_signal(db, "sess-1", "dev-1", "EEG", FS, 2, channel_names=["C3"])
+        with pytest.raises(IngestError):
+            start_signal(db, "sess-1", "dev-1", "EEG", FS, 4, clip_limits=[100, -100])
+        with pytest.raises(IngestError):
+            start_signal(db, "sess-1", "dev-1", "EEG", FS, 4, clip_limits=100)
+
+    def test_session_checked_against_experiment(self, db, tmp_path):
+        signal = start_signal(db, "sess-1", "dev-1", "EEG", FS, 4, experiment_id="exp-1")
+        assert signal["file_path"].startswith("ingest/exp-1/")
+        with pytest.raises(IngestError):
+            start_signal(db, "sess-1", "dev-1", "EEG", FS, 4, experiment_id="../elsewhere")
+        with pytest.raises(IngestError):
+            start_signal(db, "sess-1", "dev-1", "EEG", FS, 4, experiment_id=7)
+        with pytest.raises(IngestError):
+            start_signal(db, ["sess-1"], "dev-1", "EEG", FS, 4)
+        # Nothing was created for the rejected requests
+        assert len(os.listdir(tmp_path / "ingest" / "exp-1")) == 2
+        assert not (tmp_path / "elsewhere").exists()
+
+    def test_quality_flags_written_while_recording(self, db, monkeypatch):
+        monkeypatch.setattr(signal_ingest, "QUALITY_INTERVAL_SECONDS", 0)
+        signal_id = start_signal(db, "sess-1", "dev-1", "EEG", FS, 4, channel_names=["C3", "C4", "Cz", "Pz"])["signal_id"]
+        data = samples(3)
+        data[:, 2] = 0.0  # Cz disconnected from the start
+
+        result = ingest_frames(db, signal_id, io.BytesIO(frames(data)))
+
+        assert result["channel_flags"] == {"Cz": ["flat"]}
+        assert result["quality_score"] == pytest.approx(0.75, abs=0.02)
+        # Flagged in SignalData about a second in, well before the upload ended
+        flagged = [u for u in db.updates if json.loads(u.get("channel_flags") or "{}")]
+        assert flagged and flagged[0]["duration_seconds"] <= 1.2
+        assert json.loads(db.signals[signal_id]["channel_flags"]) == {"Cz": ["flat"]}
+
+    def test_clip_limits_flag_float_samples(self, db, monkeypatch):
+        monkeypatch.setattr(signal_ingest, "QUALITY_INTERVAL_SECONDS", 0)
+        signal_id = start_signal(db, "sess-1", "dev-1", "EEG", FS, 4, channel_names=["C3", "C4", "Cz", "Pz"],
+                                 clip_limits=[-40, 40])["signal_id"]
+        data = samples(3)
+        data[::2, 1] = 40.0  # C4 saturates the amplifier half the time
+
+        result = ingest_frames(db, signal_id, io.BytesIO(frames(data)))
+
+        assert "clipping" in result["channel_flags"]["C4"]
@@ -0,0 +1,149 @@
+"""
+Tests for memory-mapped signal file access.
+"""
+
+import json
+import numpy as np
+import pytest
+import sys
+import os
+
+# Add the neurohub app directory to path; its modules use flat imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'neurohub')))
+
+from signal_io import SignalFormatError, open_signal, resolve_signal_path
+import signal_io
+
+
+def write_edf(path, data, sampling_rate, labels, bdf=False, record_seconds=1, annotations=False):
+    """Writes channels x samples of digital values as an EDF/BDF file."""
+    n_channels, n_samples = data.shape
+    spr = int(sampling_rate * record_seconds)
+    n_records = n_samples // spr
+    labels = list(labels) + (["EDF Annotations"] if annotations else [])
+    ns = len(labels)
+    digital = (-2000, 2000)
+
+    def field(values, width):
+        return b"".join(str(v).ljust(width)[:width].encode("latin-1") for v in values)
+
+    header = (b"\xffBIOSEMI" if bdf else b"0       ") + b" " * 160 + b"01.07.25" + b"12.00.00"
+    header += str(256 * (ns + 1)).ljust(8).encode() + b" " * 44
+    header += str(n_records).ljust(8).encode() + str(record_seconds).ljust(8).encode() + str(ns).ljust(4).encode()
+    header += field(labels, 16) + field([""] * ns, 80) + field(["uV"] * ns, 8)
+    # Physical range is half the digital range: physical = digital / 2
+    header += field([digital[0] / 2] * ns, 8) + field([digital[1] / 2] * ns, 8)
+    header += field([digital[0]] * ns, 8) + field([digital[1]] * ns, 8)
+    header += field([""] * ns, 80) + field([spr] * n_channels + ([2] if annotations else []), 8) + field([""] * ns, 32)
+
+    sample_bytes = 3 if bdf else 2
+    with open(path, "wb") as f:
+        f.write(header)
+        for record in range(n_records):
+            for channel in range(n_channels):
+                block = data[channel, record * spr:(record + 1) * spr].astype("<i4")
+                f.write(block.view(np.uint8).reshape(-1, 4)[:, :sample_bytes].tobytes())
+            if annotations:
+                f.write(b"\x00" * 2 * sample_bytes)
+
+
+@pytest.fixture(autouse=True)
+def signal_root(tmp_path, monkeypatch):
+    # Recordings are written under tmp_path, which stands in for the signal root
+    monkeypatch.setattr(signal_io, "SIGNAL_ROOT", str(tmp_path))
+
+
+@pytest.fixture
+def digital():
+    rng = np.random.default_rng(0)
+    return rng.integers(-1000, 1000, size=(3, 10 * 64))
+
+
+class TestResolveSignalPath:
+    def test_gcs_path_maps_under_root(self, tmp_path):
+        path = resolve_signal_path("gs://neurohub-data/exp/1/eeg.edf", root=str(tmp_path))
+        assert path == os.path.join(str(tmp_path), "neurohub-data", "exp", "1", "eeg.edf")
+
+    def test_rejects_paths_outside_root(self, tmp_path):
+        with pytest.raises(SignalFormatError):
+            resolve_signal_path("../../etc/passwd", root=str(tmp_path))
+        with pytest.raises(SignalFormatError):
+            resolve_signal_path("/etc/passwd", root=str(tmp_path))
+
+    def test_absolute_path_under_root(self, tmp_path):
+        path = str(tmp_path / "exp" / "eeg.edf")
+        assert resolve_signal_path(path, root=str(tmp_path)) == path
+
+
+class TestEDF:
+    """Test EDF and BDF decoding."""
+
+    @pytest.mark.parametrize("bdf", [False, True])
+    def test_slices_match_source(self, tmp_path, digital, bdf):
+        path = tmp_path / ("rec.bdf" if bdf else "rec.edf")
+        write_edf(path, digital, 64, ["Fz", "Cz", "Pz"], bdf=bdf, annotations=True)
+
+        with open_signal(str(path)) as rec:
+            assert rec.sampling_rate == 64
+            assert rec.channel_names == ["Fz", "Cz", "Pz"]
+            assert rec.n_samples == digital.shape[1]
+            # Range spanning several data records, channels out of order
+            block = rec.read(channels=["Pz", 0], start=50, stop=300)
+            np.testing.assert_allclose(block, digital[[2, 0], 50:300] / 2)
+
+    def test_read_seconds_and_chunks(self, tmp_path, digital):
+        path = tmp_path / "rec.edf"
+        write_edf(path, digital, 64, ["Fz", "Cz", "Pz"])
+
+        with open_signal(str(path)) as rec:
+            assert rec.read_seconds(1.0, 2.0, channels=["Cz"]).shape == (1, 64)
+            chunks = list(rec.iter_chunks(200, overlap=20))
+            assert [start for start, _ in chunks] == [0, 180, 360, 540]
+            np.testing.assert_allclose(np.concatenate([b[:, 20 if s else 0:] for s, b in chunks], axis=1),
+                                       digital / 2)
+
+    def test_truncated_header(self, tmp_path):
+        path = tmp_path / "bad.edf"
+        path.write_bytes(b"0" * 100)
+        with pytest.raises(SignalFormatError):
+            open_signal(str(path))
+
+
+class TestArrayFormats:
+    """Test .npy and headerless binary recordings."""
+
+    def test_npy_with_sidecar(self, tmp_path, digital):
+        path = tmp_path / "rec.npy"
+        np.save(path, digital.astype(np.int16))
+        (tmp_path / "rec.json").write_text(json.dumps({"sampling_rate": 64, "scale": 0.5, "units": "uV"}))
+
+        with open_signal(str(path)) as rec:
+            assert rec.units == ["uV"] * 3
+            np.testing.assert_allclose(rec.read(channels=[1], start=5, stop=15), 0.5 * digital[[1], 5:15])
+
+    def test_npy_needs_sampling_rate(self, tmp_path, digital):
+        path = tmp_path / "rec.npy"
+        np.save(path, digital)
+        with pytest.raises(SignalFormatError):
+            open_signal(str(path))
+        assert open_signal(str(path), sampling_rate=64).duration_seconds == 10
+
+    def test_interleaved_binary(self, tmp_path, digital):
+        path = tmp_path / "rec.bin"
+        digital.T.astype("<i2").tofile(path)
+        (tmp_path / "rec.bin.json").write_text(json.dumps(
+            {"dtype": "<i2", "channels": 3, "sampling_rate": 64, "channel_names": ["Fz", "Cz", "Pz"]}
+        ))
+
+        with open_signal(str(path)) as rec:
+            np.testing.assert_allclose(rec.read(channels=["Cz", "Pz"], start=100, stop=110), digital[1:, 100:110])
+
+    def test_binary_without_sidecar(self, tmp_path):
+        path = tmp_path / "rec.raw"
+        path.write_bytes(b"\x00" * 16)
+        with pytest.raises(SignalFormatError):
+            open_signal(str(path))
+
+    def test_missing_file(self, tmp_path):
+        with pytest.raises(FileNotFoundError):
+            open_signal("gs://bucket/none.edf", root=str(tmp_path))
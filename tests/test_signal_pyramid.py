@@ -0,0 +1,179 @@
+"""
+Tests for min/max plotting pyramids.
+"""
+
+import json
+import numpy as np
+import pytest
+import sys
+import os
+import time
+
+# Add the neurohub app directory to path; its modules use flat imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'neurohub')))
+
+import signal_pyramid
+from signal_io import open_signal
+from signal_pyramid import (
+    BASE_BUCKET_SAMPLES, LEVEL_FACTOR, build_pyramid, ensure_pyramid, level_count, load_pyramid, read_window,
+    schedule_build
+)
+import signal_io
+
+FS = 512
+
+
+@pytest.fixture(autouse=True)
+def signal_root(tmp_path, monkeypatch):
+    # Recordings are written under tmp_path, which stands in for the signal root
+    monkeypatch.setattr(signal_io, "SIGNAL_ROOT", str(tmp_path))
+
+
+@pytest.fixture
+def recording_path(tmp_path):
+    rng = np.random.default_rng(1)
+    # 10 minutes, 3 channels, with a length that is not a multiple of any bucket size
+    data = rng.normal(0, 10, size=(3, 600 * FS + 77)).astype(np.float32)
+    data[1, 123456] = 900.0  # A single-sample spike must survive decimation
+    path = tmp_path / "rec.npy"
+    np.save(path, data)
+    (tmp_path / "rec.json").write_text(json.dumps({"sampling_rate": FS, "channel_names": ["Fz", "Cz", "Pz"]}))
+    return str(path)
+
+
+def expected_min_max(data, bucket):
+    n = -(-data.shape[1] // bucket)
+    mins = np.array([[row[i * bucket:(i + 1) * bucket].min() for i in range(n)] for row in data])
+    maxs = np.array([[row[i * bucket:(i + 1) * bucket].max() for i in range(n)] for row in data])
+    return mins, maxs
+
+
+class TestBuildPyramid:
+    """Test the stored levels against a direct computation."""
+
+    def test_levels_match_bucket_min_max(self, recording_path):
+        data = np.load(recording_path)
+        with open_signal(recording_path) as recording:
+            build_pyramid(recording)
+            pyramid = load_pyramid(recording.path)
+
+        assert len(pyramid.levels) == level_count(data.shape[1])
+        for level in (0, len(pyramid.levels) - 1):
+            mins, maxs = expected_min_max(data, BASE_BUCKET_SAMPLES * LEVEL_FACTOR ** level)
+            np.testing.assert_array_equal(pyramid.levels[level][..., 0], mins)
+            np.testing.assert_array_equal(pyramid.levels[level][..., 1], maxs)
+        assert pyramid.levels[-1].shape[1] <= signal_pyramid.TOP_LEVEL_BUCKETS
+        assert pyramid.levels[-1][1, :, 1].max() == 900.0
+
+    def test_stale_pyramid_is_rebuilt(self, recording_path):
+        with open_signal(recording_path) as recording:
+            ensure_pyramid(recording)
+        np.save(recording_path, np.zeros((3, 1000), dtype=np.float32))
+        os.utime(recording_path, (time.time() + 10, time.time() + 10))
+
+        assert load_pyramid(recording_path) is None
+        with open_signal(recording_path) as recording:
+            assert ensure_pyramid(recording).n_samples == 1000
+
+    def test_pyramid_root(self, recording_path, tmp_path, monkeypatch):
+        monkeypatch.setattr(signal_pyramid, "PYRAMID_ROOT", str(tmp_path / "pyramids"))
+        monkeypatch.setattr(signal_pyramid, "SIGNAL_ROOT", str(tmp_path))
+        with open_signal(recording_path) as recording:
+            directory = build_pyramid(recording)
+        assert directory == str(tmp_path / "pyramids" / "rec.npy.pyramid")
+        assert os.path.exists(os.path.join(directory, "meta.json"))
+
+
+class TestReadWindow:
+    """Test choosing the level that matches the window and width."""
+
+    def test_zoomed_out_uses_coarse_level(self, recording_path):
+        with open_signal(recording_path) as recording:
+            window = read_window(recording, width=800)
+
+        assert window["level"] > 0
+        points = window["min"].shape[1]
+        assert 800 <= points < LEVEL_FACTOR * 800
+        assert window["max"][1].max() == 900.0
+        assert window["channels"] == ["Fz", "Cz", "Pz"]
+
+    def test_window_and_channels(self, recording_path):
+        with open_signal(recording_path) as recording:
+            window = read_window(recording, start_seconds=100, end_seconds=160, width=500, channels=["Cz"])
+
+        bucket = round(window["bucket_seconds"] * FS)
+        assert window["min"].shape[0] == 1
+        assert window["start_seconds"] <= 100 < window["start_seconds"] + window["bucket_seconds"]
+        assert 60 * FS / bucket >= 500
+
+    def test_narrow_window_returns_raw_samples(self, recording_path):
+        data = np.load(recording_path)
+        with open_signal(recording_path) as recording:
+            window = read_window(recording, start_seconds=10, end_seconds=11, width=1000)
+
+        assert window["level"] == -1
+        np.testing.assert_array_equal(window["min"], data[:, 10 * FS:11 * FS])
+        assert window["bucket_seconds"] == 1 / FS
+
+
+class TestWithoutPyramid:
+    """Test serving plots while the pyramid is missing or being built."""
+
+    def test_request_does_not_build(self, recording_path, monkeypatch):
+        queued = []
+        monkeypatch.setattr(signal_pyramid, "schedule_build", lambda *args: queued.append(args))
+        with open_signal(recording_path) as recording:
+            raw = read_window(recording, width=800)
+            read_window(recording, width=800, build=False)
+            build_pyramid(recording)
+            built = read_window(recording, width=800)
+
+        assert len(queued) == 1 and queued[0][0] == recording_path
+        assert raw["level"] == built["level"] and not raw["approximate"]
+        np.testing.assert_array_equal(raw["min"], built["min"])
+        np.testing.assert_array_equal(raw["max"], built["max"])
+
+    def test_long_window_is_approximate(self, recording_path, monkeypatch):
+        monkeypatch.setattr(signal_pyramid, "RAW_WINDOW_MAX_SAMPLES", 10000)
+        with open_signal(recording_path) as recording:
+            window = read_window(recording, width=800, build=False)
+        assert window["approximate"]
+        assert 800 <= window["min"].shape[1] < LEVEL_FACTOR * 800
+        assert np.all(window["min"] <= window["max"])
+
+    @pytest.mark.parametrize("read_block", [64 * 1024, 1000])
+    def test_many_channel_reads_stay_within_budget(self, tmp_path, monkeypatch, read_block):
+        data = np.random.default_rng(2).normal(0, 10, size=(64, 40 * FS + 5)).astype(np.float32)
+        path = tmp_path / "wide.npy"
+        np.save(path, data)
+        (tmp_path / "wide.json").write_text(json.dumps({"sampling_rate": FS}))
+        monkeypatch.setattr(signal_pyramid, "RAW_READ_BLOCK_SAMPLES", read_block)
+        reads = []
+
+        with open_signal(str(path)) as recording:
+            read = recording.read
+
+            def counting_read(*args, **kwargs):
+                samples = read(*args, **kwargs)
+                reads.append(samples.size)
+                return samples
+
+            monkeypatch.setattr(recording, "read", counting_read)
+            window = read_window(recording, width=100, build=False)
+
+        bucket = BASE_BUCKET_SAMPLES * LEVEL_FACTOR ** window["level"]
+        mins, maxs = expected_min_max(data, bucket)
+        assert not window["approximate"]
+        assert max(reads) <= read_block
+        np.testing.assert_array_equal(window["min"], mins)
+        np.testing.assert_array_equal(window["max"], maxs)
+
+    def test_window_budget_counts_every_channel(self, recording_path, monkeypatch):
+        # 3 channels x 10 minutes: within the budget per channel, not in total
+        monkeypatch.setattr(signal_pyramid, "RAW_WINDOW_MAX_SAMPLES", 600 * FS + 1024)
+        with open_signal(recording_path) as recording:
+            assert read_window(recording, width=800, build=False)["approximate"]
+
+    def test_background_build(self, recording_path):
+        schedule_build(recording_path, FS, ["Fz", "Cz", "Pz"]).result(timeout=30)
+        assert load_pyramid(recording_path) is not None
@@ -0,0 +1,92 @@
+"""
+Tests for online signal quality scoring.
+"""
+
+import numpy as np
+import pytest
+import sys
+import os
+
+# Add the neurohub app directory to path; its modules use flat imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'neurohub')))
+
+from signal_quality import OnlineQualityEstimator
+
+FS = 256
+NAMES = ["Fz", "Cz", "Pz", "Oz"]
+
+
+def eeg(seconds, channels=4, seed=0):
+    return np.random.default_rng(seed).normal(0, 20, size=(int(seconds * FS), channels))
+
+
+def feed(estimator, data, chunk=32):
+    for i in range(0, len(data), chunk):
+        estimator.update(data[i:i + chunk])
+    return estimator.quality()
+
+
+class TestChannelFlags:
+    """Test each kind of bad electrode is flagged from a few seconds of data."""
+
+    def test_clean_recording(self):
+        quality = feed(OnlineQualityEstimator(FS, NAMES), eeg(3))
+        assert quality["channel_flags"] == {}
+        assert quality["quality_score"] > 0.95
+
+    def test_flat_channel(self):
+        data = eeg(3)
+        data[:, 1] = 42.0
+        quality = feed(OnlineQualityEstimator(FS, NAMES), data)
+        assert quality["channel_flags"] == {"Cz": ["flat"]}
+        assert quality["channels"][1]["score"] == 0.0
+
+    def test_clipping_at_integer_rails(self):
+        data = np.round(eeg(3) * 10)
+        data[:, 0] = np.clip(data[:, 0] * 200, -32768, 32767)
+        quality = feed(OnlineQualityEstimator(FS, NAMES, dtype="<i2"), data.astype(np.int16))
+        assert "clipping" in quality["channel_flags"]["Fz"]
+        # Float recordings have no rails unless given
+        assert feed(OnlineQualityEstimator(FS, NAMES), data)["channels"][0]["clipped_fraction"] == 0.0
+
+    @pytest.mark.parametrize("mains_hz", [50.0, 60.2])
+    def test_line_noise(self, mains_hz):
+        data = eeg(3)
+        t = np.arange(len(data)) / FS
+        data[:, 3] += 100 * np.sin(2 * np.pi * mains_hz * t)
+        quality = feed(OnlineQualityEstimator(FS, NAMES), data)
+        assert quality["channel_flags"] == {"Oz": ["line_noise"]}
+        assert quality["channels"][3]["line_noise_ratio"] > 0.8
+        assert quality["channels"][0]["line_noise_ratio"] < 0.1
+
+    def test_noisy_channel(self):
+        data = eeg(3)
+        data[:, 2] *= 10
+        quality = feed(OnlineQualityEstimator(FS, NAMES), data)
+        assert quality["channel_flags"] == {"Pz": ["noisy"]}
+
+
+class TestRollingState:
+    """Test the estimator follows the recording rather than its whole history."""
+
+    def test_warm_up(self):
+        estimator = OnlineQualityEstimator(FS, NAMES)
+        assert feed(estimator, eeg(0.5))["quality_score"] is None
+        assert feed(estimator, eeg(0.5, seed=1))["quality_score"] is not None
+
+    def test_recovered_channel_is_cleared(self):
+        estimator = OnlineQualityEstimator(FS, NAMES)
+        data = eeg(2)
+        data[:, 1] = 0.0
+        assert feed(estimator, data)["channel_flags"] == {"Cz": ["flat"]}
+        assert feed(estimator, eeg(10, seed=1))["channel_flags"] == {}
+
+    def test_chunking_does_not_change_statistics(self):
+        data = eeg(4)
+        whole = OnlineQualityEstimator(FS, NAMES)
+        whole.update(data)
+        pieces = feed(OnlineQualityEstimator(FS, NAMES), data, chunk=7)
+        for a, b in zip(whole.quality()["channels"], pieces["channels"]):
+            assert a["std"] == pytest.approx(b["std"])
+            # The mains bins are centred on the running mean as of each chunk
+            assert a["line_noise_ratio"] == pytest.approx(b["line_noise_ratio"], abs=0.01)
@@ -0,0 +1,54 @@
+"""
+Tests for folding signal tree rows into nested researcher results.
+"""
+
+import sys
+import os
+
+# Add the agents directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'agents')))
+
+from signal_processor.neurohub import (
+    _ANALYSIS_FIELDS, _EXPERIMENT_FIELDS, _SESSION_FIELDS, _SIGNAL_FIELDS, build_signal_tree
+)
+
+ALL_FIELDS = ("researcher_id", "researcher_name") + _EXPERIMENT_FIELDS + _SESSION_FIELDS + _SIGNAL_FIELDS + _ANALYSIS_FIELDS
+
+
+def make_row(**values):
+    row = dict.fromkeys(ALL_FIELDS)
+    row.update(values)
+    return row
+
+
+class TestBuildSignalTree:
+    """Test build_signal_tree()."""
+
+    def test_nests_levels_without_duplicates(self):
+        rows = [
+            make_row(researcher_id="r-1", researcher_name="Chen", experiment_id="e-1",
+                     session_id="s-1", signal_id="sig-1", analysis_id="a-1"),
+            make_row(researcher_id="r-1", researcher_name="Chen", experiment_id="e-1",
+                     session_id="s-1", signal_id="sig-1", analysis_id="a-2"),
+            make_row(researcher_id="r-1", researcher_name="Chen", experiment_id="e-1",
+                     session_id="s-2", signal_id="sig-2", analysis_id="a-3"),
+        ]
+
+        (researcher,) = build_signal_tree(rows)
+        (experiment,) = researcher["experiments"]
+        assert [s["session_id"] for s in experiment["sessions"]] == ["s-1", "s-2"]
+        (signal,) = experiment["sessions"][0]["signals"]
+        assert [a["analysis_id"] for a in signal["analyses"]] == ["a-1", "a-2"]
+
+    def test_null_levels_leave_empty_children(self):
+        rows = [
+            make_row(researcher_id="r-1", researcher_name="Chen"),
+            make_row(researcher_id="r-2", researcher_name="Patel", experiment_id="e-2", session_id="s-3"),
+        ]
+
+        chen, patel = build_signal_tree(rows)
+        assert chen["experiments"] == []
+        assert patel["experiments"][0]["sessions"][0]["signals"] == []
+
+    def test_empty_result(self):
+        assert build_signal_tree([]) == []
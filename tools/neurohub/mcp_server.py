@@ -89,10 +89,10 @@ async def create_session_log(
 @app.tool()
 async def export_findings(
     experiment_id: str,
-    output_format: str = "markdown",
+    output_format: str = "parquet",
     include_raw_data: bool = False
 ) -> str:
-    """Export research findings in publication format."""
+    """Export an experiment's signals, sessions and analyses (parquet, arrow or ndjson)."""
     from neurohub import export_findings as export_func
     result = export_func(
         experiment_id=experiment_id,
@@ -91,10 +91,10 @@ async def create_session_log_tool(
 @app.tool()
 async def export_findings_tool(
     experiment_id: str,
-    output_format: str = "markdown",
+    output_format: str = "parquet",
     include_raw_data: bool = False
 ) -> str:
-    """Export research findings in publication format."""
+    """Export an experiment's signals, sessions and analyses (parquet, arrow or ndjson)."""
     result = export_findings(
         experiment_id=experiment_id,
         output_format=output_format,
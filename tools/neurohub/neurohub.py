@@ -114,6 +114,39 @@ def create_analysis_report(
         print(f"Error decoding JSON response from {url}. Response text: {response.text}")
         return None
 
+def create_analysis_reports(
+    reports: List[Dict],
+    base_url: str = BASE_URL
+) -> Dict:
+    """
+    Creates many analysis reports with one request and one commit.
+
+    Args:
+        reports (list): Reports with the create_analysis_report fields
+            (signal_id, researcher_name, analysis_type, parameters, results,
+            findings, confidence_score); all are stored or none are
+        base_url (str): Base URL of the API
+
+    Returns:
+        dict: {"created": count, "analysis_ids": [...]} if successful, None if error
+    """
+    url = f"{base_url}/analyses"
+    headers = {"Content-Type": "application/json"}
+    analyzed_at = datetime.now(timezone.utc).isoformat()
+    payload = [dict(report, analyzed_at=report.get("analyzed_at", analyzed_at)) for report in reports]
+
+    try:
+        response = requests.post(url, headers=headers, json=payload)
+        response.raise_for_status()
+        print(f"Successfully created {len(payload)} analysis reports. Status Code: {response.status_code}")
+        return response.json()
+    except requests.exceptions.RequestException as e:
+        print(f"Error creating analysis reports: {e}")
+        return None
+    except json.JSONDecodeError:
+        print(f"Error decoding JSON response from {url}. Response text: {response.text}")
+        return None
+
 def create_session_log(
     experiment_id: str,
     researcher_name: str,
@@ -164,41 +197,64 @@ def create_session_log(
         print(f"Error decoding JSON response from {url}. Response text: {response.text}")
         return None
 
+EXPORT_TABLES = ("signals", "sessions", "analyses")
+EXPORT_EXTENSIONS = {"arrow": "arrows", "parquet": "parquet", "ndjson": "ndjson"}
+
 def export_findings(
     experiment_id: str,
-    format: str = "markdown",
+    output_format: str = "parquet",
     include_raw_data: bool = False,
+    tables: List[str] = EXPORT_TABLES,
+    output_dir: str = ".",
     base_url: str = BASE_URL
 ) -> Dict:
     """
-    Exports experiment findings in a publication-ready format.
+    Exports an experiment's signals, sessions and analyses for downstream analysis.
+    
+    Each table is streamed to its own file, <experiment_id>_<table>.<ext>,
+    without holding the export in memory.
     
     Args:
         experiment_id (str): ID of the experiment to export
-        format (str): Export format (markdown, latex, json)
-        include_raw_data (bool): Whether to include raw data references
+        output_format (str): Export format (parquet, arrow, ndjson)
+        include_raw_data (bool): Whether to include raw data references (recording file paths)
+        tables (list): Tables to export (signals, sessions, analyses)
+        output_dir (str): Directory the files are written to
         base_url (str): Base URL of the API
     
     Returns:
-        dict: Export data including formatted content and metadata
+        dict: {"experiment_id", "format", "files": [{"table", "path", "bytes"}]}, None if error
     """
+    if output_format not in EXPORT_EXTENSIONS:
+        print(f"Error exporting findings: unsupported format {output_format!r}")
+        return None
+
     url = f"{base_url}/experiments/{experiment_id}/export"
-    headers = {"Content-Type": "application/json"}
-    params = {
-        "format": format,
-        "include_raw_data": include_raw_data
-    }
-    
+    files = []
     try:
-        response = requests.get(url, headers=headers, params=params)
-        response.raise_for_status()
-        print(f"Successfully exported findings. Status Code: {response.status_code}")
-        return response.json()
+        os.makedirs(output_dir, exist_ok=True)
+        for table in tables:
+            params = {
+                "table": table,
+                "format": output_format,
+                "include_raw_data": str(include_raw_data).lower()
+            }
+            path = os.path.join(output_dir, f"{experiment_id}_{table}.{EXPORT_EXTENSIONS[output_format]}")
+            with requests.get(url, params=params, stream=True) as response:
+                response.raise_for_status()
+                size = 0
+                with open(path, "wb") as f:
+                    for chunk in response.iter_content(chunk_size=1024 * 1024):
+                        f.write(chunk)
+                        size += len(chunk)
+            files.append({"table": table, "path": path, "bytes": size})
+        print(f"Successfully exported findings: {', '.join(file['path'] for file in files)}")
+        return {"experiment_id": experiment_id, "format": output_format, "files": files}
     except requests.exceptions.RequestException as e:
         print(f"Error exporting findings: {e}")
         return None
-    except json.JSONDecodeError:
-        print(f"Error decoding JSON response from {url}. Response text: {response.text}")
+    except OSError as e:
+        print(f"Error writing export files: {e}")
         return None
 
 def register_device(